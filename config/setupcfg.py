@@ -62,6 +62,39 @@ host_opts = [
                default='/root/.ssh/ssh_known_hosts',
                help='File containing SSH host keys for the systems with which '
                     'the plugin needs to communicate'),
+    cfg.BoolOpt('enable_etcd_metadata_cache',
+                default=False,
+                help='Serve volume and share metadata reads from an '
+                     'in-memory copy kept current by an etcd watch'),
+    cfg.IntOpt('etcd_metadata_cache_max_staleness',
+               default=10,
+               min=1,
+               help='Seconds for which the metadata cache may go without '
+                    'hearing from etcd before reads fall back to etcd'),
+    cfg.IntOpt('read_request_threads',
+               default=4,
+               min=1,
+               help='Threads serving Get, Path and List requests'),
+    cfg.IntOpt('mount_request_threads',
+               default=8,
+               min=1,
+               help='Threads serving Mount requests'),
+    cfg.IntOpt('unmount_request_threads',
+               default=4,
+               min=1,
+               help='Threads serving Unmount requests'),
+    cfg.IntOpt('provision_request_threads',
+               default=4,
+               min=1,
+               help='Threads serving Create and Remove requests'),
+    cfg.IntOpt('list_cache_ttl',
+               default=0,
+               min=0,
+               help='Seconds for which the response to a List request is '
+                    'reused for later List requests. Changes made through '
+                    'this node are reflected right away, changes made '
+                    'through other nodes may show up this much later. 0 '
+                    'only shares the response among concurrent requests'),
 ]
 
 CONF = cfg.CONF
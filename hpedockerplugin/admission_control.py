@@ -0,0 +1,212 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import contextlib
+import threading
+import time
+
+from oslo_log import log as logging
+
+import hpedockerplugin.exception as exception
+
+LOG = logging.getLogger(__name__)
+
+MOUNT = 'Mount'
+UNMOUNT = 'Unmount'
+
+# Queues in the order they are served. Unmount goes first as it frees
+# the capacity held by the mounts being torn down.
+_PRIORITIES = (UNMOUNT, MOUNT)
+
+# Weight of a new sample in the moving average of the latency
+LATENCY_WEIGHT = 0.2
+# The concurrency limit is cut by this factor when the array or etcd is
+# slower than its target latency, at most once per DECREASE_INTERVAL
+DECREASE_FACTOR = 0.75
+DECREASE_INTERVAL = 1.0
+
+# Controllers are shared by all backends using the same 3PAR array
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+class LatencyTracker(object):
+    """Exponentially weighted moving average of call latencies"""
+    def __init__(self, name):
+        self._name = name
+        self._lock = threading.Lock()
+        self._average = None
+
+    def observe(self, seconds):
+        with self._lock:
+            if self._average is None:
+                self._average = seconds
+            else:
+                self._average += LATENCY_WEIGHT * (seconds - self._average)
+
+    @property
+    def average(self):
+        return self._average or 0.0
+
+
+# etcd is shared by all arrays, so is the latency observed while using it
+etcd_latency = LatencyTracker('etcd')
+
+
+class AdmissionController(object):
+    """Admits Mount and Unmount requests against a 3PAR array
+
+    Requests beyond the concurrency limit wait in a FIFO queue per
+    operation, unmounts being admitted ahead of mounts. A request that
+    is not admitted within queue_timeout seconds fails.
+
+    The limit adapts to the load of the array: it is cut back while the
+    average WSAPI or etcd latency exceeds its target and raised by one
+    for each completed request while requests are waiting and latencies
+    are on target.
+    """
+    def __init__(self, name, max_concurrency, min_concurrency=1,
+                 queue_timeout=120, wsapi_target_latency=2.0,
+                 etcd_target_latency=0.5):
+        self._name = name
+        self._max_concurrency = max_concurrency
+        self._min_concurrency = min(min_concurrency, max_concurrency)
+        self._queue_timeout = queue_timeout
+        self._wsapi_target_latency = wsapi_target_latency
+        self._etcd_target_latency = etcd_target_latency
+        self._wsapi_latency = LatencyTracker('wsapi')
+
+        self._cond = threading.Condition()
+        self._queues = {op: collections.deque() for op in _PRIORITIES}
+        self._limit = max_concurrency
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._admitted = 0
+        self._timed_out = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def observe_wsapi_latency(self, seconds):
+        self._wsapi_latency.observe(seconds)
+
+    @contextlib.contextmanager
+    def admitted(self, operation, name):
+        self._acquire(operation, name)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, operation, name):
+        waiter = object()
+        enqueued_at = time.time()
+        deadline = enqueued_at + self._queue_timeout
+        with self._cond:
+            queue = self._queues[operation]
+            queue.append(waiter)
+            if not self._can_admit(waiter):
+                LOG.info("%s request for %s queued on array %s: %s"
+                         % (operation, name, self._name,
+                            self._get_stats()))
+            while not self._can_admit(waiter):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    queue.remove(waiter)
+                    self._timed_out += 1
+                    self._cond.notify_all()
+                    ex = exception.HPEPluginAdmissionTimeout(
+                        operation=operation, name=name,
+                        timeout=self._queue_timeout, array=self._name)
+                    LOG.error(ex.msg)
+                    raise ex
+                self._cond.wait(remaining)
+
+            queue.popleft()
+            self._in_flight += 1
+            self._admitted += 1
+            wait = time.time() - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            # Capacity may be left for the next request in line
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._adjust_limit()
+            self._cond.notify_all()
+
+    def _can_admit(self, waiter):
+        if self._in_flight >= self._limit:
+            return False
+        for op in _PRIORITIES:
+            if self._queues[op]:
+                return self._queues[op][0] is waiter
+        return False
+
+    def _is_overloaded(self):
+        return (self._wsapi_latency.average > self._wsapi_target_latency or
+                etcd_latency.average > self._etcd_target_latency)
+
+    def _adjust_limit(self):
+        limit = self._limit
+        if self._is_overloaded():
+            now = time.time()
+            if now - self._last_decrease >= DECREASE_INTERVAL:
+                self._last_decrease = now
+                limit = max(self._min_concurrency,
+                            int(limit * DECREASE_FACTOR))
+        elif any(self._queues.values()):
+            limit = min(self._max_concurrency, limit + 1)
+
+        if limit != self._limit:
+            self._limit = limit
+            LOG.info("Concurrency limit of array %s changed to %d: %s"
+                     % (self._name, limit, self._get_stats()))
+
+    def _get_stats(self):
+        return {
+            'limit': self._limit,
+            'in_flight': self._in_flight,
+            'queued_unmounts': len(self._queues[UNMOUNT]),
+            'queued_mounts': len(self._queues[MOUNT]),
+            'admitted': self._admitted,
+            'timed_out': self._timed_out,
+            'avg_wait': (self._total_wait / self._admitted
+                         if self._admitted else 0.0),
+            'max_wait': self._max_wait,
+            'wsapi_latency': self._wsapi_latency.average,
+            'etcd_latency': etcd_latency.average,
+        }
+
+    def stats(self):
+        with self._cond:
+            return self._get_stats()
+
+
+def get_controller(config):
+    """Returns the admission controller of the array of config"""
+    key = config.hpe3par_api_url
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = AdmissionController(
+                key, config.mount_admission_max_concurrency,
+                min_concurrency=config.mount_admission_min_concurrency,
+                queue_timeout=config.mount_admission_queue_timeout,
+                wsapi_target_latency=config.wsapi_target_latency,
+                etcd_target_latency=config.etcd_target_latency)
+            _controllers[key] = controller
+    return controller
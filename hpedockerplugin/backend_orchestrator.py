@@ -31,8 +31,11 @@ from oslo_log import log as logging
 import os
 import six
 import uuid
+import hpedockerplugin.admission_control as admission_control
+import hpedockerplugin.exception as exception
 import hpedockerplugin.volume_manager as mgr
 import hpedockerplugin.etcdutil as util
+import hpedockerplugin.single_flight as single_flight
 import threading
 import hpedockerplugin.backend_async_initializer as async_initializer
 
@@ -55,6 +58,11 @@ class Orchestrator(object):
         self.volume_backends_map = {}
         self.volume_backend_lock = threading.Lock()
 
+        # Identical reads running concurrently share one execution
+        self._reads = single_flight.SingleFlight('reads')
+        self._listing = single_flight.SingleFlight(
+            'list', result_ttl=host_config.list_cache_ttl)
+
     @staticmethod
     def _initialize_orchestrator(host_config):
         pass
@@ -66,6 +74,13 @@ class Orchestrator(object):
     def _get_etcd_client(self, host_config):
         pass
 
+    @staticmethod
+    def _get_cache_max_staleness(host_config):
+        # None keeps the metadata cache of the etcd client disabled
+        if host_config.enable_etcd_metadata_cache:
+            return host_config.etcd_metadata_cache_max_staleness
+        return None
+
     @staticmethod
     def _get_node_id():
         # Save node-id if it doesn't exist
@@ -195,7 +210,8 @@ class VolumeBackendOrchestrator(Orchestrator):
             host_config.host_etcd_ip_address,
             host_config.host_etcd_port_number,
             host_config.host_etcd_client_cert,
-            host_config.host_etcd_client_key)
+            host_config.host_etcd_client_key,
+            self._get_cache_max_staleness(host_config))
 
     def get_manager(self, host_config, config, etcd_client,
                     node_id, backend_name):
@@ -213,8 +229,11 @@ class VolumeBackendOrchestrator(Orchestrator):
         return vol is not None
 
     def get_path(self, volname):
-        return self._execute_request('get_path', volname)
+        return self._reads.do(('Path', volname),
+                              self._execute_request, 'get_path', volname)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def volumedriver_remove(self, volname):
         ret_val = self._execute_request('remove_volume', volname)
         with self.volume_backend_lock:
@@ -226,18 +245,41 @@ class VolumeBackendOrchestrator(Orchestrator):
                 del self.volume_backends_map[volname]
         return ret_val
 
-    def volumedriver_unmount(self, volname, vol_mount, mount_id):
-        return self._execute_request('unmount_volume',
-                                     volname,
-                                     vol_mount,
-                                     mount_id)
+    def _execute_admitted_request(self, operation, request, volname,
+                                  *args, **kwargs):
+        backend = self.get_volume_backend_details(volname)
+        volume_mgr_info = self._manager.get(backend)
+        volume_mgr = volume_mgr_info['mgr'] if volume_mgr_info else None
+        if volume_mgr is None:
+            # Let the request fail with the backend initialization error
+            return self._execute_request_for_backend(
+                backend, request, volname, *args, **kwargs)
 
+        try:
+            with volume_mgr.admit(operation, volname):
+                return self._execute_request_for_backend(
+                    backend, request, volname, *args, **kwargs)
+        except exception.HPEPluginAdmissionTimeout as ex:
+            return json.dumps({u'Err': ex.msg})
+
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
+    def volumedriver_unmount(self, volname, vol_mount, mount_id):
+        return self._execute_admitted_request(admission_control.UNMOUNT,
+                                              'unmount_volume',
+                                              volname,
+                                              vol_mount,
+                                              mount_id)
+
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def volumedriver_create(self, volname, vol_size,
                             vol_prov, vol_flash,
                             compression_val, vol_qos,
                             fs_mode, fs_owner,
                             mount_conflict_delay, cpg,
-                            snap_cpg, current_backend, rcg_name):
+                            snap_cpg, current_backend, rcg_name,
+                            fs_preformat=None, fs_opts=None):
         ret_val = self._execute_request_for_backend(
             current_backend,
             'create_volume',
@@ -252,10 +294,14 @@ class VolumeBackendOrchestrator(Orchestrator):
             cpg,
             snap_cpg,
             current_backend,
-            rcg_name)
+            rcg_name,
+            fs_preformat,
+            fs_opts)
 
         return ret_val
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def clone_volume(self, src_vol_name, clone_name, size, cpg,
                      snap_cpg, clone_options):
         # Imran: Redundant call to get_volume_backend_details
@@ -267,6 +313,8 @@ class VolumeBackendOrchestrator(Orchestrator):
                                      size, cpg, snap_cpg, backend,
                                      clone_options)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def create_snapshot(self, src_vol_name, schedName, snapshot_name,
                         snapPrefix, expiration_hrs, exphrs, retention_hrs,
                         rethrs, mount_conflict_delay, has_schedule,
@@ -288,14 +336,21 @@ class VolumeBackendOrchestrator(Orchestrator):
                                      has_schedule,
                                      schedFrequency, backend)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def mount_volume(self, volname, vol_mount, mount_id):
-        return self._execute_request('mount_volume', volname,
-                                     vol_mount, mount_id)
+        return self._execute_admitted_request(admission_control.MOUNT,
+                                              'mount_volume', volname,
+                                              vol_mount, mount_id)
 
     def get_volume_snap_details(self, volname, snapname, qualified_name):
-        return self._execute_request('get_volume_snap_details', volname,
-                                     snapname, qualified_name)
+        return self._reads.do(('Get', qualified_name),
+                              self._execute_request,
+                              'get_volume_snap_details', volname,
+                              snapname, qualified_name)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def manage_existing(self, volname, existing_ref, backend, manage_opts):
         ret_val = self._execute_request_for_backend(
             backend, 'manage_existing', volname, existing_ref,
@@ -304,6 +359,9 @@ class VolumeBackendOrchestrator(Orchestrator):
         return ret_val
 
     def volumedriver_list(self):
+        return self._listing.do('List', self._list_volumes)
+
+    def _list_volumes(self):
         # Use the first volume manager list volumes
         volume_mgr = None
         volume_mgr_info = self._manager.get('DEFAULT')
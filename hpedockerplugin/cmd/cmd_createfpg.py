@@ -10,7 +10,8 @@ FPG_SIZE = 16
 
 
 class CreateFpgCmd(cmd.Cmd):
-    def __init__(self, file_mgr, cpg_name, fpg_name, set_default_fpg=False):
+    def __init__(self, file_mgr, cpg_name, fpg_name, set_default_fpg=False,
+                 on_progress=None):
         self._file_mgr = file_mgr
         self._fp_etcd = file_mgr.get_file_etcd()
         self._mediator = file_mgr.get_mediator()
@@ -18,6 +19,7 @@ class CreateFpgCmd(cmd.Cmd):
         self._cpg_name = cpg_name
         self._fpg_name = fpg_name
         self._set_default_fpg = set_default_fpg
+        self._on_progress = on_progress
         self._backend_fpg_created = False
         self._default_set = False
         self._fpg_metadata_saved = False
@@ -37,7 +39,8 @@ class CreateFpgCmd(cmd.Cmd):
                 self._mediator.create_fpg(
                     self._cpg_name,
                     self._fpg_name,
-                    fpg_size
+                    fpg_size,
+                    on_progress=self._on_progress
                 )
                 self._backend_fpg_created = True
 
@@ -93,53 +96,21 @@ class CreateFpgCmd(cmd.Cmd):
                                              self._fpg_name,
                                              six.text_type(ex)))
 
-    def _add_to_default_fpg(self):
-        with self._fp_etcd.get_file_backend_lock(self._backend):
-            try:
-                backend_metadata = self._fp_etcd.get_backend_metadata(
-                    self._backend)
-                default_fpgs = backend_metadata.get('default_fpgs')
-                if default_fpgs:
-                    fpg_list = default_fpgs.get(self._cpg_name)
-                    if fpg_list:
-                        fpg_list.append(self._fpg_name)
-                    else:
-                        default_fpgs[self._cpg_name] = [self._fpg_name]
-                else:
-                    backend_metadata['default_fpgs'] = {
-                        self._cpg_name: [self._fpg_name]
-                    }
+    def set_as_default_fpg(self):
+        """Adds an FPG created with set_default_fpg False to default FPGs"""
+        self._add_to_default_fpg()
+        self._default_set = True
 
-                # Save updated backend_metadata
-                self._fp_etcd.save_backend_metadata(self._backend,
-                                                    backend_metadata)
-            except exception.EtcdMetadataNotFound as ex:
-                LOG.error("ERROR: Failed to set default FPG for backend %s"
-                          % self._backend)
-                raise ex
-            except Exception as ex:
-                msg = "Failed to update default FPG list with FPG %s. " \
-                      "Exception: %s " % (self._fpg_name, six.text_type(ex))
-                LOG.error(msg)
-                raise exception.HPEPluginEtcdException(reason=msg)
+    def _add_to_default_fpg(self):
+        try:
+            self._fp_etcd.add_default_fpg(self._backend, self._cpg_name,
+                                          self._fpg_name)
+        except Exception as ex:
+            msg = "Failed to update default FPG list with FPG %s. " \
+                  "Exception: %s " % (self._fpg_name, six.text_type(ex))
+            LOG.error(msg)
+            raise exception.HPEPluginEtcdException(reason=msg)
 
     def _remove_as_default_fpg(self):
-        with self._fp_etcd.get_file_backend_lock(self._backend):
-            try:
-                backend_metadata = self._fp_etcd.get_backend_metadata(
-                    self._backend)
-                default_fpgs = backend_metadata['default_fpgs']
-                if default_fpgs:
-                    fpg_list = default_fpgs.get(self._cpg_name)
-                    if fpg_list:
-                        fpg_list.remove(self._fpg_name)
-                        if not fpg_list:
-                            backend_metadata.pop('default_fpgs')
-
-                    # Save updated backend_metadata
-                    self._fp_etcd.save_backend_metadata(self._backend,
-                                                        backend_metadata)
-            except exception.EtcdMetadataNotFound as ex:
-                LOG.error("ERROR: Failed to remove default FPG for backend %s"
-                          % self._backend)
-                raise ex
+        self._fp_etcd.remove_default_fpg(self._backend, self._cpg_name,
+                                         self._fpg_name)
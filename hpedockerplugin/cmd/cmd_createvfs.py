@@ -8,7 +8,8 @@ LOG = logging.getLogger(__name__)
 
 
 class CreateVfsCmd(cmd.Cmd):
-    def __init__(self, file_mgr, cpg_name, fpg_name, vfs_name, ip, netmask):
+    def __init__(self, file_mgr, cpg_name, fpg_name, vfs_name, ip, netmask,
+                 on_progress=None):
         self._file_mgr = file_mgr
         self._share_etcd = file_mgr.get_etcd()
         self._fp_etcd = file_mgr.get_file_etcd()
@@ -19,13 +20,15 @@ class CreateVfsCmd(cmd.Cmd):
         self._vfs_name = vfs_name
         self._ip = ip
         self._netmask = netmask
+        self._on_progress = on_progress
 
     def execute(self):
         try:
             LOG.info("Creating VFS %s on the backend" % self._vfs_name)
             result = self._mediator.create_vfs(self._vfs_name,
                                                self._ip, self._netmask,
-                                               fpg=self._fpg_name)
+                                               fpg=self._fpg_name,
+                                               on_progress=self._on_progress)
 
             self._update_fpg_metadata(self._ip, self._netmask)
             LOG.info("create_vfs result: %s" % result)
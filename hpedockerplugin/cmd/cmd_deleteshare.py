@@ -65,6 +65,13 @@ class DeleteShareCmd(cmd.Cmd):
     def _continue_delete_on_thread(self):
         LOG.info("Deleting file store %s and FPG if this is the last share "
                  "on child thread..." % self._share_info['name'])
+        # Released before the file store is deleted so that a concurrent
+        # reconciliation can only leave the share accounted, never count
+        # it out twice
+        if self._share_info.get('quota_id'):
+            self._file_mgr.charge_fpg_capacity(self._cpg_name,
+                                               self._fpg_name,
+                                               -self._share_info['size'])
         self._delete_file_store()
         with self._fp_etcd.get_fpg_lock(
                 self._backend, self._cpg_name, self._fpg_name
@@ -74,27 +81,23 @@ class DeleteShareCmd(cmd.Cmd):
             if not self._mediator.shares_present_on_fpg(self._fpg_name):
                 if self._fpg_owned_by_docker():
                     self._delete_fpg()
-                    self._update_backend_metadata()
+                    self._release_ip()
+                    self._remove_from_default_fpgs()
 
     def unexecute(self):
         pass
 
-    def _update_backend_metadata(self):
-        with self._fp_etcd.get_file_backend_lock(self._backend):
-            try:
-                backend_metadata = self._fp_etcd.get_backend_metadata(
-                    self._backend
-                )
-                self._release_ip(backend_metadata)
-                self._remove_fpg_from_default_fpgs(backend_metadata)
-                # Update backend metadata
-                self._fp_etcd.save_backend_metadata(self._backend,
-                                                    backend_metadata)
-            except Exception as ex:
-                msg = "WARNING: Metadata for backend %s is not " \
-                      "present. Exception: %s" % \
-                      (self._backend, six.text_type(ex))
-                LOG.warning(msg)
+    def _remove_from_default_fpgs(self):
+        LOG.info("Removing default FPG entry [cpg:%s,fpg:%s]..."
+                 % (self._cpg_name, self._fpg_name))
+        try:
+            self._fp_etcd.remove_default_fpg(self._backend, self._cpg_name,
+                                             self._fpg_name)
+        except Exception as ex:
+            msg = "WARNING: Failed to remove FPG %s from default FPGs of " \
+                  "backend %s. Exception: %s" % \
+                  (self._fpg_name, self._backend, six.text_type(ex))
+            LOG.warning(msg)
 
     def _fpg_owned_by_docker(self):
         LOG.info("Checking if FPG %s is owned by Docker..." % self._fpg_name)
@@ -217,29 +220,14 @@ class DeleteShareCmd(cmd.Cmd):
             self._backend, self._cpg_name, self._fpg_name
         )
 
-    def _release_ip(self, backend_metadata):
+    def _release_ip(self):
         vfs_ip = self._share_info.get('vfsIPs')[0]
-        ip_to_release = vfs_ip[0]
+        ip_to_release, netmask = vfs_ip[0], vfs_ip[1]
         LOG.info("Releasing IP %s to IP Pool..." % ip_to_release)
-
-        # Release IP to server IP pool
-        ips_in_use = backend_metadata['ips_in_use']
-
-        # 'vfsIPs': [(IP1, Subnet1), (IP2, Subnet2)...],
-        ips_in_use.remove(ip_to_release)
-
-    def _remove_fpg_from_default_fpgs(self, backend_metadata):
-        # Remove FPG from default FPG list
-        default_fpgs = backend_metadata.get('default_fpgs')
-        if default_fpgs:
-            fpg_list = default_fpgs.get(self._cpg_name)
-            if self._fpg_name in fpg_list:
-                LOG.info("Removing default FPG entry [cpg:%s,"
-                         "fpg:%s..."
-                         % (self._cpg_name, self._fpg_name))
-                fpg_list.remove(self._fpg_name)
-
-                # If last fpg got removed from the list, remove
-                # the CPG entry from default_fpgs
-                if not fpg_list:
-                    del default_fpgs[self._cpg_name]
+        try:
+            self._file_mgr.get_vfs_ip_allocator().release(ip_to_release,
+                                                          netmask)
+        except Exception as ex:
+            # The IP is freed by the next reconciliation with the array
+            LOG.warning("Failed to release IP %s of backend %s: %s"
+                        % (ip_to_release, self._backend, six.text_type(ex)))
@@ -21,6 +21,7 @@ class SetQuotaCmd(cmd.Cmd):
         self._fpg_name = fpg_name
         self._vfs_name = vfs_name
         self._quota_id = None
+        self._capacity_charged = False
 
     def execute(self):
         # import pdb
@@ -31,6 +32,9 @@ class SetQuotaCmd(cmd.Cmd):
                 fstore, self._size, self._fpg_name, self._vfs_name)
 
             share = self._update_share_metadata(self._quota_id, add=True)
+            self._file_mgr.charge_fpg_capacity(self._cpg_name,
+                                               self._fpg_name, self._size)
+            self._capacity_charged = True
 
             LOG.info("Updated quota metadata for share: %s" % share)
 
@@ -45,6 +49,10 @@ class SetQuotaCmd(cmd.Cmd):
         if self._quota_id:
             try:
                 self._mediator.remove_quota(self._quota_id)
+                if self._capacity_charged:
+                    self._file_mgr.charge_fpg_capacity(self._cpg_name,
+                                                       self._fpg_name,
+                                                       -self._size)
                 self._update_share_metadata(self._quota_id, add=False)
             except Exception:
                 LOG.error("ERROR: Undo quota failed for %s" %
@@ -0,0 +1,89 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+import time
+
+from oslo_log import log as logging
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 5
+
+
+class DetachReaper(object):
+    """Tears down the attachments kept alive after their last unmount
+
+    An unmounted volume keeps its host devices and VLUNs for a grace
+    period so that a remount on this node can reuse them. The reaper
+    tracks these volumes and calls reap(volname) for each of them at
+    least every poll_interval seconds, and right after its deadline.
+    reap returns True once nothing is left to do for the volume, e.g.
+    because it got detached or remounted, and False to be called again.
+    """
+    def __init__(self, backend, reap, poll_interval=DEFAULT_POLL_INTERVAL):
+        self._backend = backend
+        self._reap = reap
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        # volname -> deadline
+        self._pending = {}
+        self._changed = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='%s-detach-reaper' % self._backend)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, volname, deadline):
+        with self._lock:
+            self._pending[volname] = deadline
+        self._changed.set()
+
+    def discard(self, volname):
+        with self._lock:
+            self._pending.pop(volname, None)
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def _run(self):
+        while True:
+            self.reap_all()
+            self._changed.wait(self._next_wakeup())
+            self._changed.clear()
+
+    def _next_wakeup(self):
+        now = time.time()
+        with self._lock:
+            # Volumes past their deadline that could not be reaped yet are
+            # retried at the poll interval
+            upcoming = [deadline - now for deadline in self._pending.values()
+                        if deadline > now]
+        return min([self._poll_interval] + upcoming)
+
+    def reap_all(self):
+        for volname in sorted(self.pending()):
+            try:
+                done = self._reap(volname)
+            except Exception as ex:
+                LOG.exception("Detach of volume %s failed: %s"
+                              % (volname, six.text_type(ex)))
+                done = False
+            if done:
+                self.discard(volname)
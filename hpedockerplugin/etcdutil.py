@@ -12,16 +12,23 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import copy
 import etcd
+import functools
 import json
 from oslo_log import log as logging
 import six
+import threading
+import time
 from hpedockerplugin.i18n import _, _LI
+import hpedockerplugin.admission_control as admission_control
 import hpedockerplugin.exception as exception
 
 LOG = logging.getLogger(__name__)
 
 VOLUMEROOT = '/volumes'
+VOLUME_NAME_INDEX_ROOT = '/volumes-by-name'
+WARM_POOL_ROOT = '/volumes-warm-pool'
 RCROOT = '/remote-copy'
 RC_KEY_FMT_STR = "%s/%s#%s"
 BACKENDROOT = '/backend'
@@ -35,6 +42,20 @@ SHARE_LOCKROOT = "/share-lock"
 FILE_BACKEND_LOCKROOT = "/fp-backend-lock"
 FILE_CPG_LOCKROOT = "/fp-cpg-lock"
 FILE_FPG_LOCKROOT = "/fp-fpg-lock"
+FILE_SPARE_FPG_LOCKROOT = "/fp-spare-fpg-lock"
+WARM_POOL_LOCKROOT = '/volumes-warm-pool-lock'
+
+# Attempts made by a compare-and-swap update before giving up
+UPDATE_MAX_ATTEMPTS = 5
+
+# Bounds of the interval at which a held lock is polled by a waiter
+LOCK_POLL_MIN_INTERVAL = 0.1
+LOCK_POLL_MAX_INTERVAL = 2
+
+# Seconds after which a lock taken by a background task expires unless the
+# task refreshes it, so that a node dying during the task does not leave
+# it locked for good
+TASK_LOCK_TTL = 60
 
 
 class HpeEtcdClient(object):
@@ -94,7 +115,7 @@ class HpeEtcdClient(object):
     def save_object(self, etcd_key, obj):
         val = json.dumps(obj)
         try:
-            self.client.write(etcd_key, val)
+            result = self.client.write(etcd_key, val)
         except Exception as ex:
             msg = 'Failed to save object to ETCD: %s'\
                   % six.text_type(ex)
@@ -102,20 +123,38 @@ class HpeEtcdClient(object):
             raise exception.HPEPluginSaveFailed(obj=obj)
         else:
             LOG.info('Write key: %s to ETCD, value is: %s', etcd_key, val)
+            return result
+
+    def create_object(self, etcd_key, obj):
+        """Saves obj unless etcd_key exists, raising EtcdAlreadyExist"""
+        val = json.dumps(obj)
+        try:
+            result = self.client.write(etcd_key, val, prevExist=False)
+        except etcd.EtcdAlreadyExist:
+            raise
+        except Exception as ex:
+            msg = 'Failed to save object to ETCD: %s'\
+                  % six.text_type(ex)
+            LOG.error(msg)
+            raise exception.HPEPluginSaveFailed(obj=obj)
+        LOG.info('Write key: %s to ETCD, value is: %s', etcd_key, val)
+        return result
 
     def update_object(self, etcd_key, key_to_update, val):
         result = self.client.read(etcd_key)
-        val = json.loads(result.value)
-        val[key_to_update] = val
-        val = json.dumps(val)
-        result.value = val
-        self.client.update(result)
-        LOG.info(_LI('Update key: %s to ETCD, value is: %s'), etcd_key, val)
+        obj = json.loads(result.value)
+        obj[key_to_update] = val
+        result.value = json.dumps(obj)
+        result = self.client.update(result)
+        LOG.info(_LI('Update key: %s to ETCD, value is: %s'), etcd_key,
+                 result.value)
+        return result
 
     def delete_object(self, etcd_key):
         try:
-            self.client.delete(etcd_key)
+            result = self.client.delete(etcd_key)
             LOG.info(_LI('Deleted key: %s from ETCD'), etcd_key)
+            return result
         except etcd.EtcdKeyNotFound:
             msg = "Key to delete not found ETCD: [key=%s]" % etcd_key
             LOG.info(msg)
@@ -153,6 +192,166 @@ class HpeEtcdClient(object):
         return result.value
 
 
+class LatencyObservingClient(object):
+    """etcd client whose reads and writes feed the etcd latency
+
+    The admission control of Mount and Unmount requests adapts to the
+    latency observed here. Watches are passed through as they wait for
+    changes by design.
+    """
+    _OBSERVED = ('read', 'write', 'update', 'delete')
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name not in self._OBSERVED:
+            return attr
+
+        @functools.wraps(attr)
+        def _observed(*args, **kwargs):
+            start = time.time()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                admission_control.etcd_latency.observe(time.time() - start)
+        return _observed
+
+
+class EtcdWatchCache(object):
+    """In-memory copy of the JSON objects stored directly under a root key
+
+    The tree is loaded once and then kept current by a recursive watch on
+    the root, resumed from the last modifiedIndex seen. Readers must check
+    is_fresh() and go to etcd when the cache has not heard from etcd within
+    max_staleness seconds or when the watch fell behind the etcd event
+    history and a reload is pending.
+    """
+    DELETE_ACTIONS = ('delete', 'expire', 'compareAndDelete')
+
+    def __init__(self, client, root, max_staleness):
+        self._client = client
+        self._root = root
+        self._max_staleness = max_staleness
+        self._watch_timeout = max(1, max_staleness // 2)
+        self._lock = threading.Lock()
+        # key -> (modifiedIndex, object)
+        self._objects = {}
+        # Deleted keys are remembered until the watch has moved past
+        # them so that an older event cannot resurrect the object
+        self._tombstones = {}
+        self._index = 0
+        self._synced = False
+        self._last_sync = 0
+        self._stopped = threading.Event()
+        self._watcher = None
+
+    def start(self):
+        try:
+            self._load()
+        except Exception as ex:
+            LOG.error('Failed to load %s into cache: %s',
+                      self._root, six.text_type(ex))
+        self._watcher = threading.Thread(target=self._watch,
+                                         name='watch%s' % self._root)
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def is_fresh(self):
+        return self._synced and \
+            time.time() - self._last_sync <= self._max_staleness
+
+    def get(self, key):
+        return self.get_with_index(key)[1]
+
+    def get_with_index(self, key):
+        with self._lock:
+            index, obj = self._objects.get(key, (None, None))
+        # Callers modify the returned metadata before saving it back
+        return index, copy.deepcopy(obj)
+
+    def get_all(self):
+        return copy.deepcopy(self.values())
+
+    def values(self):
+        # Shared with the cache - for lookups only, never to be modified
+        with self._lock:
+            return [obj for index, obj in self._objects.values()]
+
+    def apply(self, result):
+        """Record the outcome of a write made by this process
+
+        Makes the change visible to readers without waiting for the
+        watch to deliver it.
+        """
+        with self._lock:
+            self._apply(result)
+
+    def _apply(self, result):
+        if result.dir or result.key == self._root:
+            return
+        index = result.modifiedIndex
+        last_index = self._tombstones.get(
+            result.key, self._objects.get(result.key, (0, None))[0])
+        if index < last_index:
+            return
+        if result.action in self.DELETE_ACTIONS:
+            self._objects.pop(result.key, None)
+            self._tombstones[result.key] = index
+        else:
+            self._objects[result.key] = (index, json.loads(result.value))
+            self._tombstones.pop(result.key, None)
+
+    def _load(self):
+        tree = self._client.read(self._root, recursive=True)
+        objects = {}
+        for child in tree.children:
+            if child.key != self._root and not child.dir:
+                objects[child.key] = (child.modifiedIndex,
+                                      json.loads(child.value))
+        with self._lock:
+            self._objects = objects
+            self._tombstones = {}
+            self._index = tree.etcd_index
+            self._synced = True
+            self._last_sync = time.time()
+        LOG.info('Loaded %s objects under %s into cache at index %s',
+                 len(objects), self._root, self._index)
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            try:
+                if not self._synced:
+                    self._load()
+                result = self._client.watch(self._root,
+                                            index=self._index + 1,
+                                            timeout=self._watch_timeout,
+                                            recursive=True)
+                with self._lock:
+                    self._apply(result)
+                    self._index = max(self._index, result.modifiedIndex)
+                    self._last_sync = time.time()
+                    self._tombstones = dict(
+                        (k, i) for k, i in self._tombstones.items()
+                        if i > self._index)
+            except etcd.EtcdWatchTimedOut:
+                # No change since the last index seen
+                self._last_sync = time.time()
+            except etcd.EtcdEventIndexCleared:
+                LOG.info('Cache of %s fell behind etcd event history, '
+                         'reloading', self._root)
+                self._synced = False
+            except Exception as ex:
+                LOG.error('Cache of %s lost its watch: %s',
+                          self._root, six.text_type(ex))
+                self._synced = False
+                self._stopped.wait(1)
+
+
 # Manages File Persona metadata under /file-persona key
 class HpeFilePersonaEtcdClient(object):
     def __init__(self, host, port, client_cert, client_key):
@@ -198,6 +397,179 @@ class HpeFilePersonaEtcdClient(object):
         etcd_key = '%s/%s/%s' % (self._root, backend, cpg)
         return self._client.get_objects(etcd_key)
 
+    def get_all_backend_fpg_metadata(self, backend):
+        """Returns (cpg, FPG metadata) of every FPG of the backend"""
+        etcd_key = '%s/%s' % (self._root, backend)
+        try:
+            result = self._client.client.read(etcd_key, recursive=True)
+        except etcd.EtcdKeyNotFound:
+            return []
+        fpgs = []
+        for child in result.leaves:
+            # Leaves of the backend key are FPGs under /<backend>/<cpg>/
+            if child.dir or child.key.count('/') != etcd_key.count('/') + 2:
+                continue
+            cpg = child.key.split('/')[-2]
+            fpgs.append((cpg, json.loads(child.value)))
+        return fpgs
+
+    def _read_with_index(self, etcd_key):
+        try:
+            result = self._client.client.read(etcd_key)
+        except etcd.EtcdKeyNotFound:
+            msg = "Key not found ETCD: [key=%s]" % etcd_key
+            raise exception.EtcdMetadataNotFound(msg)
+        return result.modifiedIndex, json.loads(result.value)
+
+    def charge_fpg_capacity(self, backend, cpg, fpg, used_delta_gib,
+                            share_delta=0):
+        """Adds used_delta_gib to the capacity accounted as used on an FPG
+
+        share_delta is added to the number of shares accounted on it.
+
+        Nothing is charged to an FPG whose capacity has not been
+        reconciled with the array yet, as reconciling it counts every
+        share on it. A concurrent change to the FPG metadata is merged by
+        re-reading it.
+        """
+        etcd_key = '/'.join([self._root, backend, cpg, fpg])
+        for attempt in range(UPDATE_MAX_ATTEMPTS):
+            index, fpg_info = self._read_with_index(etcd_key)
+            if 'used_capacity_gib' not in fpg_info:
+                return
+            fpg_info['used_capacity_gib'] = max(
+                0, fpg_info['used_capacity_gib'] + used_delta_gib)
+            fpg_info['share_count'] = max(
+                0, fpg_info.get('share_count', 0) + share_delta)
+            try:
+                self._client.client.write(etcd_key, json.dumps(fpg_info),
+                                          prevIndex=index)
+            except etcd.EtcdCompareFailed:
+                LOG.info('Key %s modified concurrently, retrying update',
+                         etcd_key)
+                continue
+            LOG.info(_LI('Update key: %s to ETCD, value is: %s'), etcd_key,
+                     fpg_info)
+            return
+        raise exception.HPEPluginUpdateConflict(obj=etcd_key)
+
+    def reconcile_fpg_capacity(self, backend, cpg, fpg, get_capacity):
+        """Replaces the capacity accounted on an FPG by that of the array
+
+        get_capacity() returns the total and used capacity in GiB of the
+        FPG on the array and the number of shares on it. The result is
+        saved only if the FPG metadata was not changed while the array was
+        queried, so that a share charged meanwhile is not lost, and the
+        array is queried again otherwise.
+
+        Returns the updated FPG metadata.
+        """
+        etcd_key = '/'.join([self._root, backend, cpg, fpg])
+        for attempt in range(UPDATE_MAX_ATTEMPTS):
+            index, fpg_info = self._read_with_index(etcd_key)
+            total_gib, used_gib, share_count = get_capacity()
+            fpg_info['total_capacity_gib'] = total_gib
+            fpg_info['used_capacity_gib'] = used_gib
+            fpg_info['share_count'] = share_count
+            fpg_info['capacity_reconciled_at'] = time.time()
+            try:
+                self._client.client.write(etcd_key, json.dumps(fpg_info),
+                                          prevIndex=index)
+            except etcd.EtcdCompareFailed:
+                LOG.info('Key %s modified concurrently, reconciling again',
+                         etcd_key)
+                continue
+            LOG.info(_LI('Update key: %s to ETCD, value is: %s'), etcd_key,
+                     fpg_info)
+            return fpg_info
+        raise exception.HPEPluginUpdateConflict(obj=etcd_key)
+
+    def _update_with_cas(self, etcd_key, update, initial):
+        """Applies update() to the object at etcd_key with compare-and-swap
+
+        update(obj) changes obj in place and returns the result of the
+        update. initial() returns the object to update if the key does not
+        exist yet. The update is applied again to the latest object if the
+        key is changed concurrently.
+        """
+        for attempt in range(UPDATE_MAX_ATTEMPTS):
+            try:
+                index, obj = self._read_with_index(etcd_key)
+                cas = {'prevIndex': index}
+            except exception.EtcdMetadataNotFound:
+                obj = initial()
+                cas = {'prevExist': False}
+            result = update(obj)
+            try:
+                self._client.client.write(etcd_key, json.dumps(obj), **cas)
+            except (etcd.EtcdCompareFailed, etcd.EtcdAlreadyExist):
+                LOG.info('Key %s modified concurrently, retrying update',
+                         etcd_key)
+                continue
+            LOG.info(_LI('Update key: %s to ETCD, value is: %s'), etcd_key,
+                     obj)
+            return result
+        raise exception.HPEPluginUpdateConflict(obj=etcd_key)
+
+    def _get_legacy_backend_metadata(self, backend):
+        # Counter and default FPGs of the backend used to be kept in its
+        # metadata. They are carried over to their own keys on first use
+        try:
+            return self.get_backend_metadata(backend)
+        except exception.EtcdMetadataNotFound:
+            return {}
+
+    def next_fpg_counter(self, backend):
+        """Returns the number the next default FPG of the backend is named by
+
+        Numbering starts at 0.
+        """
+        etcd_key = '%s/%s.counter' % (self._root, backend)
+
+        def _increment(counter):
+            counter['counter'] += 1
+            return counter['counter']
+
+        def _initial():
+            legacy_metadata = self._get_legacy_backend_metadata(backend)
+            return {'counter': int(legacy_metadata.get('counter', -1))}
+        return self._update_with_cas(etcd_key, _increment, _initial)
+
+    def _get_legacy_default_fpgs(self, backend, cpg):
+        legacy_metadata = self._get_legacy_backend_metadata(backend)
+        default_fpgs = legacy_metadata.get('default_fpgs') or {}
+        return list(default_fpgs.get(cpg, []))
+
+    def get_default_fpgs(self, backend, cpg):
+        """Returns the names of the default FPGs of a CPG"""
+        etcd_key = '%s/%s.default_fpgs/%s' % (self._root, backend, cpg)
+        try:
+            return self._read_with_index(etcd_key)[1]
+        except exception.EtcdMetadataNotFound:
+            return self._get_legacy_default_fpgs(backend, cpg)
+
+    def add_default_fpg(self, backend, cpg, fpg):
+        etcd_key = '%s/%s.default_fpgs/%s' % (self._root, backend, cpg)
+
+        def _add(fpgs):
+            if fpg not in fpgs:
+                fpgs.append(fpg)
+        self._update_with_cas(
+            etcd_key, _add,
+            lambda: self._get_legacy_default_fpgs(backend, cpg))
+
+    def remove_default_fpg(self, backend, cpg, fpg):
+        # The list is kept once empty so that the legacy default FPGs of
+        # the CPG are not read again
+        etcd_key = '%s/%s.default_fpgs/%s' % (self._root, backend, cpg)
+
+        def _remove(fpgs):
+            if fpg in fpgs:
+                fpgs.remove(fpg)
+        self._update_with_cas(
+            etcd_key, _remove,
+            lambda: self._get_legacy_default_fpgs(backend, cpg))
+
     def save_backend_metadata(self, backend, metadata):
         etcd_key = '%s/%s.metadata' % (self._root, backend)
         self._client.save_object(etcd_key, metadata)
@@ -214,6 +586,29 @@ class HpeFilePersonaEtcdClient(object):
         etcd_key = '%s/%s.metadata' % (self._root, backend)
         return self._client.get_object(etcd_key)
 
+    def get_vfs_ip_map(self, backend):
+        """Returns the modifiedIndex and the VFS IP map of the backend"""
+        etcd_key = '%s/%s.ips' % (self._root, backend)
+        return self._read_with_index(etcd_key)
+
+    def save_vfs_ip_map(self, backend, ip_map, prev_index=None):
+        """Saves the VFS IP map of the backend if it is still at prev_index
+
+        Without prev_index the map is saved only if it does not exist yet.
+        HPEPluginUpdateConflict is raised if the map was changed meanwhile.
+        """
+        etcd_key = '%s/%s.ips' % (self._root, backend)
+        val = json.dumps(ip_map)
+        try:
+            if prev_index is None:
+                self._client.client.write(etcd_key, val, prevExist=False)
+            else:
+                self._client.client.write(etcd_key, val,
+                                          prevIndex=prev_index)
+        except (etcd.EtcdCompareFailed, etcd.EtcdAlreadyExist):
+            raise exception.HPEPluginUpdateConflict(obj=etcd_key)
+        LOG.info('Write key: %s to ETCD, value is: %s', etcd_key, val)
+
     def get_lock(self, lock_type, name=None):
         lockroot_map = {
             'FP_BACKEND': FILE_BACKEND_LOCKROOT,
@@ -222,6 +617,9 @@ class HpeFilePersonaEtcdClient(object):
         lock_root = lockroot_map.get(lock_type)
         if lock_root:
             return EtcdLock(lock_root + '/', self._client.client, name)
+        if lock_type == 'FP_SPARE_FPG':
+            return EtcdLock(FILE_SPARE_FPG_LOCKROOT + '/',
+                            self._client.client, name, ttl=TASK_LOCK_TTL)
         raise exception.EtcdInvalidLockType(type=lock_type)
 
     def get_file_backend_lock(self, backend):
@@ -241,7 +639,8 @@ class HpeFilePersonaEtcdClient(object):
 
 class HpeShareEtcdClient(object):
 
-    def __init__(self, host, port, client_cert, client_key):
+    def __init__(self, host, port, client_cert, client_key,
+                 cache_max_staleness=None):
         self._client = HpeEtcdClient(host, port,
                                      client_cert, client_key)
         self._client.make_root(SHAREROOT)
@@ -250,23 +649,80 @@ class HpeShareEtcdClient(object):
         self._client.make_root(BACKENDROOT)
         self.backendroot = BACKENDROOT + '/'
 
+        self._cache = None
+        if cache_max_staleness:
+            self._cache = EtcdWatchCache(self._client.client, SHAREROOT,
+                                         cache_max_staleness)
+            self._cache.start()
+
+    def _update_cache(self, result):
+        if self._cache and result is not None:
+            self._cache.apply(result)
+
+    def _use_cache(self):
+        return self._cache is not None and self._cache.is_fresh()
+
     def save_share(self, share):
         etcd_key = self._root + share['name']
-        self._client.save_object(etcd_key, share)
+        self._update_cache(self._client.save_object(etcd_key, share))
+
+    def save_new_share(self, share):
+        """Saves a share unless a share with its name exists"""
+        etcd_key = self._root + share['name']
+        try:
+            result = self._client.create_object(etcd_key, share)
+        except etcd.EtcdAlreadyExist:
+            raise exception.ShareAlreadyExists(share_name=share['name'])
+        self._update_cache(result)
 
     def update_share(self, name, key, val):
         etcd_key = self._root + name
-        self._client.update_object(etcd_key, key, val)
+        self._update_cache(self._client.update_object(etcd_key, key, val))
+
+    def get_share_with_index(self, name):
+        """Returns the modifiedIndex and the metadata of a share"""
+        etcd_key = self._root + name
+        try:
+            result = self._client.client.read(etcd_key)
+        except etcd.EtcdKeyNotFound:
+            msg = "Key not found ETCD: [key=%s]" % etcd_key
+            raise exception.EtcdMetadataNotFound(msg)
+        return result.modifiedIndex, json.loads(result.value)
+
+    def save_share_at_index(self, share, prev_index):
+        """Saves a share if it is still at prev_index
+
+        HPEPluginUpdateConflict is raised if the share was changed or
+        removed meanwhile.
+        """
+        etcd_key = self._root + share['name']
+        val = json.dumps(share)
+        try:
+            result = self._client.client.write(etcd_key, val,
+                                               prevIndex=prev_index)
+        except (etcd.EtcdCompareFailed, etcd.EtcdKeyNotFound):
+            raise exception.HPEPluginUpdateConflict(obj=etcd_key)
+        LOG.info('Write key: %s to ETCD, value is: %s', etcd_key, val)
+        self._update_cache(result)
 
     def delete_share(self, share_name):
         etcd_key = self._root + share_name
-        self._client.delete_object(etcd_key)
+        self._update_cache(self._client.delete_object(etcd_key))
 
     def get_share(self, name):
         etcd_key = self._root + name
+        if self._use_cache():
+            share = self._cache.get(etcd_key)
+            if share is None:
+                msg = "Key not found ETCD: [key=%s]" % etcd_key
+                LOG.info(msg)
+                raise exception.EtcdMetadataNotFound(msg)
+            return share
         return self._client.get_object(etcd_key)
 
     def get_all_shares(self):
+        if self._use_cache():
+            return self._cache.get_all()
         return self._client.get_objects(SHAREROOT)
 
     def get_lock(self, lock_type, name=None):
@@ -357,7 +813,8 @@ class HpeShareEtcdClient(object):
 
 class EtcdUtil(object):
 
-    def __init__(self, host, port, client_cert, client_key):
+    def __init__(self, host, port, client_cert, client_key,
+                 cache_max_staleness=None):
         self.host = host
         self.port = port
 
@@ -378,6 +835,8 @@ class EtcdUtil(object):
 
         self.volumeroot = VOLUMEROOT + '/'
         self.backendroot = BACKENDROOT + '/'
+        self.nameindexroot = VOLUME_NAME_INDEX_ROOT + '/'
+        self._name_index_ready = False
         if client_cert is not None and client_key is not None:
             if len(host_tuple) > 0:
                 LOG.info('ETCDUTIL host tuple is not None')
@@ -399,7 +858,22 @@ class EtcdUtil(object):
                                           allow_reconnect=True)
             else:
                 self.client = etcd.Client(host, port)
+        self.client = LatencyObservingClient(self.client)
         self._make_root()
+        self._backfill_vol_name_index()
+
+        self._cache = None
+        if cache_max_staleness:
+            self._cache = EtcdWatchCache(self.client, VOLUMEROOT,
+                                         cache_max_staleness)
+            self._cache.start()
+
+    def _update_cache(self, result):
+        if self._cache:
+            self._cache.apply(result)
+
+    def _use_cache(self):
+        return self._cache is not None and self._cache.is_fresh()
 
     def _make_root(self):
         try:
@@ -414,13 +888,43 @@ class EtcdUtil(object):
             msg = (_('Could not init EtcUtil: %s'), six.text_type(ex))
             LOG.error(msg)
             raise exception.HPEPluginMakeEtcdRootException(reason=msg)
+        try:
+            self.client.read(VOLUME_NAME_INDEX_ROOT)
+        except etcd.EtcdKeyNotFound:
+            self.client.write(VOLUME_NAME_INDEX_ROOT, None, dir=True)
         return
 
+    def _backfill_vol_name_index(self):
+        # Volumes created by an older version of the plugin don't have
+        # an entry under /volumes-by-name. Index all of them once so that
+        # get_vol_byname doesn't need to scan /volumes to resolve a name
+        try:
+            volumes = self.client.read(self.volumeroot, recursive=True)
+            backfilled = 0
+            for child in volumes.children:
+                if child.key == VOLUMEROOT or child.value is None:
+                    continue
+                vol = json.loads(child.value)
+                try:
+                    self.client.write(self.nameindexroot +
+                                      vol['display_name'],
+                                      vol['id'], prevExist=False)
+                    backfilled += 1
+                except etcd.EtcdAlreadyExist:
+                    pass
+            self._name_index_ready = True
+            LOG.info('Volume name index backfilled with %s entries',
+                     backfilled)
+        except Exception as ex:
+            # Lookups keep falling back to scanning /volumes
+            LOG.error('Failed to backfill volume name index: %s',
+                      six.text_type(ex))
+
     def save_vol(self, vol):
         volkey = self.volumeroot + vol['id']
         volval = json.dumps(vol)
         try:
-            self.client.write(volkey, volval)
+            result = self.client.write(volkey, volval)
         except Exception as ex:
             msg = 'Failed to save volume to ETCD: %s'\
                   % six.text_type(ex)
@@ -428,52 +932,234 @@ class EtcdUtil(object):
             raise exception.HPEPluginSaveFailed(obj=vol['display_name'])
         else:
             LOG.info('Write key: %s to etc, value is: %s', volkey, volval)
+        self._update_cache(result)
+        self._save_vol_name_index(vol)
+
+    def _save_vol_name_index(self, vol):
+        idxkey = self.nameindexroot + vol['display_name']
+        try:
+            self.client.write(idxkey, vol['id'])
+        except Exception as ex:
+            # Not fatal - lookups that miss the index scan /volumes again
+            # until the index is backfilled
+            LOG.error('Failed to index volume name %s: %s',
+                      vol['display_name'], six.text_type(ex))
+            self._name_index_ready = False
+
+    def _delete_vol_name_index(self, volname, volid):
+        # Compare-and-delete so that an index entry re-pointed to a
+        # newer volume by the same name is left alone
+        try:
+            self.client.delete(self.nameindexroot + volname,
+                               prevValue=volid)
+        except (etcd.EtcdKeyNotFound, etcd.EtcdCompareFailed):
+            pass
+        except Exception as ex:
+            LOG.error('Failed to remove volume name index %s: %s',
+                      volname, six.text_type(ex))
 
     def update_vol(self, volid, key, val):
-        volkey = self.volumeroot + volid
-        result = self.client.read(volkey)
-        volval = json.loads(result.value)
-        volval[key] = val
-        volval = json.dumps(volval)
-        result.value = volval
-        self.client.update(result)
+        self.update_vol_fields(volid, {key: val})
+
+    def update_vol_fields(self, volid, fields, expected_index=None,
+                          remove_fields=()):
+        """Update several fields of a volume record in a single write
 
-        LOG.info(_LI('Update key: %s to etcd, value is: %s'), volkey, volval)
+        The record is written with prevIndex set to the index it was read
+        at. Without expected_index a concurrent change to the record is
+        merged by re-reading and re-applying the fields. With
+        expected_index the update is applied only if the record is still
+        at that index and HPEPluginUpdateConflict is raised otherwise.
+
+        Returns the modifiedIndex of the updated record.
+        """
+        volkey = self.volumeroot + volid
+        for attempt in range(UPDATE_MAX_ATTEMPTS):
+            index, volval = None, None
+            # The cache may lag behind the index expected_index was read at
+            if attempt == 0 and expected_index is None and \
+                    self._use_cache():
+                index, volval = self._cache.get_with_index(volkey)
+            if volval is None:
+                result = self.client.read(volkey)
+                index, volval = result.modifiedIndex, json.loads(result.value)
+
+            if expected_index is not None and index != expected_index:
+                raise exception.HPEPluginUpdateConflict(obj=volkey)
+
+            volval.update(fields)
+            for field in remove_fields:
+                volval.pop(field, None)
+            volval = json.dumps(volval)
+            try:
+                result = self.client.write(volkey, volval, prevIndex=index)
+            except etcd.EtcdCompareFailed:
+                if expected_index is not None:
+                    raise exception.HPEPluginUpdateConflict(obj=volkey)
+                LOG.info('Key %s modified concurrently, retrying update',
+                         volkey)
+                continue
+            self._update_cache(result)
+            LOG.info(_LI('Update key: %s to etcd, value is: %s'),
+                     volkey, volval)
+            return result.modifiedIndex
+
+        raise exception.HPEPluginUpdateConflict(obj=volkey)
 
     def delete_vol(self, vol):
         volkey = self.volumeroot + vol['id']
 
-        self.client.delete(volkey)
+        self._update_cache(self.client.delete(volkey))
         LOG.info(_LI('Deleted key: %s from etcd'), volkey)
+        self._delete_vol_name_index(vol['display_name'], vol['id'])
 
     def get_lock(self, lock_type):
+        # Locks observe the etcd latency themselves
+        if lock_type == 'WARM_POOL':
+            return EtcdLock(WARM_POOL_LOCKROOT + '/', self.client.client,
+                            ttl=TASK_LOCK_TTL)
         # By default this is volume lock-root
         lock_root = LOCKROOT
         if lock_type == 'RCG':
             lock_root = RCG_LOCKROOT
-        return EtcdLock(lock_root + '/', self.client)
+        return EtcdLock(lock_root + '/', self.client.client)
 
     def get_vol_byname(self, volname):
-        volumes = self.client.read(self.volumeroot, recursive=True)
         LOG.info(_LI('Get volbyname: volname is %s'), volname)
+        if self._use_cache():
+            return copy.deepcopy(
+                self._find_vol_byname(self._cache.values(), volname))
 
-        for child in volumes.children:
-            if child.key != VOLUMEROOT:
-                volmember = json.loads(child.value)
-                vol = volmember['display_name']
-                if vol.startswith(volname, 0, len(volname)):
-                    if volmember['display_name'] == volname:
-                        return volmember
-                elif volmember['name'] == volname:
+        vol = self._get_vol_by_name_index(volname)
+        if vol:
+            return vol
+
+        if not self._name_index_ready:
+            self._backfill_vol_name_index()
+            if self._name_index_ready:
+                vol = self._get_vol_by_name_index(volname)
+                if vol:
+                    return vol
+
+        if self._name_index_ready:
+            # Every volume is indexed by display name. What remains is
+            # the match on 'name' which for volumes is always the id
+            try:
+                vol = self.get_vol_by_id(volname)
+            except etcd.EtcdKeyNotFound:
+                return None
+            if vol.get('name') == volname:
+                return vol
+            return None
+        return self._scan_vol_byname(volname)
+
+    def _get_vol_by_name_index(self, volname):
+        try:
+            volid = self.client.read(self.nameindexroot + volname).value
+        except etcd.EtcdKeyNotFound:
+            return None
+
+        try:
+            vol = self.get_vol_by_id(volid)
+        except etcd.EtcdKeyNotFound:
+            vol = None
+
+        if vol and vol['display_name'] == volname:
+            return vol
+
+        # Index entry outlived its volume, or missed an update of the
+        # volume now holding the name
+        LOG.info('Removing stale volume name index %s -> %s',
+                 volname, volid)
+        self._delete_vol_name_index(volname, volid)
+        vol = self._scan_vol_byname(volname)
+        if vol and vol['display_name'] == volname:
+            self._save_vol_name_index(vol)
+        return vol
+
+    def _scan_vol_byname(self, volname):
+        volumes = self.client.read(self.volumeroot, recursive=True)
+        return self._find_vol_byname(
+            (json.loads(child.value) for child in volumes.children
+             if child.key != VOLUMEROOT), volname)
+
+    @staticmethod
+    def _find_vol_byname(volumes, volname):
+        for volmember in volumes:
+            vol = volmember['display_name']
+            if vol.startswith(volname, 0, len(volname)):
+                if volmember['display_name'] == volname:
                     return volmember
+            elif volmember['name'] == volname:
+                return volmember
         return None
 
     def get_vol_by_id(self, volid):
         volkey = self.volumeroot + volid
+        if self._use_cache():
+            vol = self._cache.get(volkey)
+            if vol is None:
+                raise etcd.EtcdKeyNotFound('Key not found : %s' % volkey)
+            return vol
         result = self.client.read(volkey)
         return json.loads(result.value)
 
+    def get_vol_with_index(self, volid):
+        """Returns the modifiedIndex and the volume with the given id
+
+        The volume is read from etcd, so the index can be passed to
+        update_vol_fields as expected_index.
+        """
+        result = self.client.read(self.volumeroot + volid)
+        return result.modifiedIndex, json.loads(result.value)
+
+    def get_vol_byname_with_index(self, volname):
+        """Returns the modifiedIndex and the volume with the given name
+
+        Returns (None, None) if there is no such volume.
+        """
+        vol = self.get_vol_byname(volname)
+        if vol is None:
+            return None, None
+        try:
+            return self.get_vol_with_index(vol['id'])
+        except etcd.EtcdKeyNotFound:
+            return None, None
+
+    def wait_for_vol(self, volid, predicate, timeout):
+        """Waits for the volume to satisfy predicate
+
+        Watches the volume key from the version read last, so a change
+        is seen as soon as etcd applies it. Returns the volume, or None if
+        it did not satisfy predicate within timeout seconds. Raises
+        EtcdKeyNotFound if the volume does not exist or gets deleted.
+        """
+        volkey = self.volumeroot + volid
+        deadline = time.time() + timeout
+        result = self.client.read(volkey)
+        while True:
+            if result.value is None:
+                raise etcd.EtcdKeyNotFound('Key not found : %s' % volkey)
+            vol = json.loads(result.value)
+            if predicate(vol):
+                return vol
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            try:
+                result = self.client.watch(volkey,
+                                           index=result.modifiedIndex + 1,
+                                           timeout=remaining)
+            except etcd.EtcdWatchTimedOut:
+                return None
+            except etcd.EtcdEventIndexCleared:
+                # Changes since the last read are no longer in the event
+                # history of etcd
+                result = self.client.read(volkey)
+
     def get_all_vols(self):
+        if self._use_cache():
+            return self._cache.get_all()
         ret_vol_list = []
         volumes = self.client.read(self.volumeroot, recursive=True)
         for volinfo in volumes.children:
@@ -501,14 +1187,67 @@ class EtcdUtil(object):
         result = self.client.read(passphrase)
         return result.value
 
+    @staticmethod
+    def _pooled_vol_key(backend, profile, volid):
+        return '%s/%s/%s/%s' % (WARM_POOL_ROOT, backend, profile, volid)
+
+    def _read_pooled_vols(self, key):
+        try:
+            result = self.client.read(key, recursive=True)
+        except etcd.EtcdKeyNotFound:
+            return []
+        return [child for child in result.leaves
+                if not child.dir and child.value is not None]
+
+    def save_pooled_vol(self, backend, profile, vol):
+        self.client.write(self._pooled_vol_key(backend, profile, vol['id']),
+                          json.dumps(vol))
+
+    def get_pooled_vols(self, backend):
+        """Returns the warm pool of backend as {profile: [vol, ...]}"""
+        pooled = {}
+        for child in self._read_pooled_vols(WARM_POOL_ROOT + '/' + backend):
+            profile = child.key.split('/')[-2]
+            pooled.setdefault(profile, []).append(json.loads(child.value))
+        return pooled
+
+    def claim_pooled_vol(self, backend, profile):
+        """Takes one volume out of the warm pool of profile
+
+        The pool entry is deleted at the index it was read at, so a volume
+        is handed to one claimer only. Returns None if the pool is empty.
+        """
+        key = '%s/%s/%s' % (WARM_POOL_ROOT, backend, profile)
+        for child in self._read_pooled_vols(key):
+            try:
+                self.client.delete(child.key, prevIndex=child.modifiedIndex)
+            except (etcd.EtcdKeyNotFound, etcd.EtcdCompareFailed):
+                # Claimed by another request
+                continue
+            return json.loads(child.value)
+        return None
+
+    def remove_pooled_vol(self, backend, profile, volid):
+        """Returns False if the volume is no longer in the pool"""
+        try:
+            self.client.delete(self._pooled_vol_key(backend, profile, volid))
+        except etcd.EtcdKeyNotFound:
+            return False
+        return True
+
 
 class EtcdLock(object):
     # To use this class with "with" clause, passing
     # name is MUST
-    def __init__(self, lock_root, client, name=None):
+    # With a ttl, a lock expires ttl seconds after its holder stopped
+    # refreshing it. It is refreshed until it is unlocked.
+    def __init__(self, lock_root, client, name=None, ttl=None):
         self._lock_root = lock_root
         self._client = client
         self._name = name
+        self._ttl = ttl
+        # name -> event stopping the refresh of its lock
+        self._refreshers = {}
 
     def __enter__(self):
         if self._name:
@@ -519,18 +1258,83 @@ class EtcdLock(object):
             self.try_unlock_name(self._name)
 
     def try_lock_name(self, name):
+        start = time.time()
         try:
             LOG.debug("Try locking name %s", name)
-            self._client.write(self._lock_root + name, name,
-                               prevExist=False)
+            self._write_lock(name)
             LOG.debug("Name is locked : %s", name)
         except Exception as ex:
             msg = 'Name: %(name)s is already locked' % {'name': name}
             LOG.exception(msg)
             LOG.exception(ex)
             raise exception.HPEPluginLockFailed(obj=name)
+        finally:
+            admission_control.etcd_latency.observe(time.time() - start)
+
+    def lock_name(self, name, timeout):
+        """Waits up to timeout seconds for name to be unlocked and locks it
+
+        Raises HPEPluginLockFailed if name is still locked by then.
+        """
+        deadline = time.time() + timeout
+        interval = LOCK_POLL_MIN_INTERVAL
+        while not self._acquire(name):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                LOG.info("Name %s is still locked after %s seconds"
+                         % (name, timeout))
+                raise exception.HPEPluginLockFailed(obj=name)
+            LOG.debug("Name %s is locked, waiting...", name)
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, LOCK_POLL_MAX_INTERVAL)
+        LOG.debug("Name is locked : %s", name)
+
+    def _acquire(self, name):
+        """Locks name, returns False if it is locked already"""
+        start = time.time()
+        try:
+            self._write_lock(name)
+            return True
+        except etcd.EtcdAlreadyExist:
+            return False
+        except Exception as ex:
+            LOG.exception('Name: %s lock failed: %s'
+                          % (name, six.text_type(ex)))
+            raise exception.HPEPluginLockFailed(obj=name)
+        finally:
+            admission_control.etcd_latency.observe(time.time() - start)
+
+    def _write_lock(self, name):
+        if not self._ttl:
+            self._client.write(self._lock_root + name, name,
+                               prevExist=False)
+            return
+        self._client.write(self._lock_root + name, name,
+                           prevExist=False, ttl=self._ttl)
+        stopped = threading.Event()
+        self._refreshers[name] = stopped
+        thread = threading.Thread(target=self._refresh, args=(name, stopped),
+                                  name='lock-refresh-%s' % name)
+        thread.daemon = True
+        thread.start()
+
+    def _refresh(self, name, stopped):
+        while not stopped.wait(self._ttl / 3.0):
+            try:
+                self._client.refresh(self._lock_root + name, self._ttl)
+            except etcd.EtcdKeyNotFound:
+                LOG.error("Lock of name %s expired while it was held"
+                          % name)
+                return
+            except Exception as ex:
+                LOG.warning("Failed to refresh lock of name %s: %s"
+                            % (name, six.text_type(ex)))
 
     def try_unlock_name(self, name):
+        stopped = self._refreshers.pop(name, None)
+        if stopped:
+            stopped.set()
+        start = time.time()
         try:
             LOG.debug("Try unlocking name %s", name)
             self._client.delete(self._lock_root + name)
@@ -540,3 +1344,5 @@ class EtcdLock(object):
             LOG.exception(msg)
             LOG.exception(ex)
             raise exception.HPEPluginUnlockFailed(obj=name)
+        finally:
+            admission_control.etcd_latency.observe(time.time() - start)
@@ -253,6 +253,21 @@ class HPEPluginUnlockFailed(HPEPluginEtcdException):
     message = _("ETCD unlock failed: %(obj)s")
 
 
+class HPEPluginUpdateConflict(HPEPluginEtcdException):
+    message = _("ETCD data was modified concurrently while updating: "
+                "%(obj)s")
+
+
+class HPEPluginAdmissionTimeout(PluginException):
+    message = _("%(operation)s request for %(name)s was not admitted "
+                "within %(timeout)s seconds as array %(array)s is busy")
+
+
+class HPEPluginVolumeCloning(PluginException):
+    message = _("Volume %(name)s is still being copied from its source "
+                "(%(progress)s), retry once the copy is complete")
+
+
 class HPEDriverException(PluginException):
     message = _("Driver exception: %(msg)")
 
@@ -427,6 +442,10 @@ class FpgAlreadyExists(PluginException):
     message = _("FPG already exists: %(reason)s")
 
 
+class ShareAlreadyExists(PluginException):
+    message = _("Share already exists: %(share_name)s")
+
+
 class UserGroupNotFoundOn3PAR(PluginException):
     message = _("fsusergroup or fsuser doesn't exist on 3PAR: %(reason)s")
 
@@ -45,7 +45,8 @@ class FileBackendOrchestrator(Orchestrator):
             host_config.host_etcd_ip_address,
             host_config.host_etcd_port_number,
             host_config.host_etcd_client_cert,
-            host_config.host_etcd_client_key)
+            host_config.host_etcd_client_key,
+            self._get_cache_max_staleness(host_config))
 
     def get_meta_data_by_name(self, name):
         LOG.info("Fetching share details from ETCD: %s" % name)
@@ -89,10 +90,22 @@ class FileBackendOrchestrator(Orchestrator):
         resp = "\n%s\nNAME%sSTATUS\n%s\n" % (line, spaces, line)
 
         printable_len = 45
+        queue_stats = {}
         for k, v in self._manager.items():
             backend_state = v['backend_state']
             padding = (printable_len - len(k)) * ' '
             resp += "%s%s  %s\n" % (k, padding, backend_state)
+            if v.get('mgr'):
+                queue_stats[k] = v['mgr'].get_share_queue_stats()
+
+        if queue_stats:
+            resp += "\n%s\nSHARE CREATION QUEUE\n%s\n" % (line, line)
+            for k, stats in sorted(queue_stats.items()):
+                resp += "%s: queued=%s, creating=%s, created=%s, " \
+                        "failed=%s, workers=%s\n" \
+                        % (k, stats['queued'], stats['creating'],
+                           stats['created'], stats['failed'],
+                           stats['workers'])
         return json.dumps({u'Err': resp})
 
     def remove_object(self, obj):
@@ -3,7 +3,8 @@ import json
 import sh
 import six
 import os
-from threading import Thread
+import threading
+import time
 
 from oslo_log import log as logging
 from oslo_utils import netutils
@@ -23,7 +24,11 @@ import hpedockerplugin.fileutil as fileutil
 import hpedockerplugin.hpe.array_connection_params as acp
 from hpedockerplugin.i18n import _
 from hpedockerplugin.hpe import hpe_3par_mediator
-from hpedockerplugin import synchronization
+from hpedockerplugin.hpe import task_tracker
+from hpedockerplugin.hpe import vfs_ip_allocator
+from hpedockerplugin import fpg_placement
+from hpedockerplugin import share_queue
+from hpedockerplugin import spare_fpg_pool
 from hpedockerplugin.hpe import utils
 
 LOG = logging.getLogger(__name__)
@@ -64,6 +69,53 @@ class FileManager(object):
             raise exception.HPEPluginStartPluginException(
                 reason=msg)
 
+        ip_pool = {}
+        if self.src_bkend_config.hpe3par_server_ip_pool:
+            ip_pool = self.src_bkend_config.hpe3par_server_ip_pool[0]
+        self._vfs_ip_allocator = vfs_ip_allocator.VfsIpAllocator(
+            backend_name, self._fp_etcd_client, ip_pool,
+            self._get_all_vfs_ips,
+            self.src_bkend_config.vfs_ip_reconcile_interval)
+
+        self._spare_fpg_pool = None
+        if self.src_bkend_config.spare_fpgs:
+            cpgs = self.src_bkend_config.spare_fpg_cpgs or \
+                self.src_bkend_config.hpe3par_cpg[:1]
+            self._spare_fpg_pool = spare_fpg_pool.SpareFpgPool(
+                backend_name, self._fp_etcd_client, cpgs,
+                self.src_bkend_config.spare_fpgs,
+                self.src_bkend_config.spare_fpg_min_free_capacity,
+                self._get_default_fpg_capacities,
+                self._provision_spare_fpg,
+                check_interval=(
+                    self.src_bkend_config.spare_fpg_check_interval))
+            self._spare_fpg_pool.start()
+
+        self._share_queue = share_queue.ShareCreationQueue(
+            backend_name, self._create_share,
+            self.src_bkend_config.share_creation_workers)
+        self._share_queue.start()
+        self._requeue_shares()
+
+        lease_timeout = self.src_bkend_config.share_queue_lease_timeout
+        if lease_timeout:
+            thread = threading.Thread(
+                target=self._check_queued_shares_periodically,
+                args=(lease_timeout,),
+                name='%s-share-queue-lease' % backend_name)
+            thread.daemon = True
+            thread.start()
+
+        reconcile_interval = \
+            self.src_bkend_config.fpg_capacity_reconcile_interval
+        if reconcile_interval:
+            thread = threading.Thread(
+                target=self._reconcile_capacity_periodically,
+                args=(reconcile_interval,),
+                name='%s-fpg-capacity' % backend_name)
+            thread.daemon = True
+            thread.start()
+
     def get_backend(self):
         return self._backend
 
@@ -73,6 +125,16 @@ class FileManager(object):
     def get_file_etcd(self):
         return self._fp_etcd_client
 
+    def get_vfs_ip_allocator(self):
+        return self._vfs_ip_allocator
+
+    def _get_all_vfs_ips(self):
+        ips = []
+        for vfs in self._hpeplugin_driver.get_all_vfs():
+            for ip_info in vfs['IPInfo']:
+                ips.append(ip_info['IPAddr'])
+        return ips
+
     def get_etcd(self):
         return self._etcd
 
@@ -119,31 +181,122 @@ class FileManager(object):
 
     def create_share(self, share_name, **args):
         share_args = copy.deepcopy(args)
-        # ====== TODO: Uncomment later ===============
-        thread = Thread(target=self._create_share,
-                        args=(share_name, share_args))
 
-        # Process share creation on child thread
-        thread.start()
-        # ====== TODO: Uncomment later ===============
+        # The QUEUED record is the persistent copy of the queue entry. It
+        # is replaced by the CREATING record once the creation starts.
+        queued_share = copy.deepcopy(share_args)
+        queued_share['status'] = share_queue.QUEUED
+        queued_share['queue'] = {'node_id': self._node_id,
+                                 'queued_at': time.time()}
+        try:
+            self._etcd.save_new_share(queued_share)
+        except exception.ShareAlreadyExists:
+            # Created by a concurrent request since the REST layer checked
+            LOG.info("Share %s already exists, nothing to create"
+                     % share_name)
+            return json.dumps({"Err": ""})
 
-        # ======= TODO: Remove this later ========
-        # import pdb
-        # pdb.set_trace()
-        # self._create_share(share_name, share_args)
-        # ======= TODO: Remove this later ========
+        # Process share creation on a worker of the backend
+        self._share_queue.submit(share_name, share_args)
 
         # Return success
         return json.dumps({"Err": ""})
 
+    def _requeue_shares(self):
+        """Submits again the shares this node queued before a restart"""
+        queued_shares = [
+            share for share in self._etcd.get_all_shares()
+            if share.get('status') == share_queue.QUEUED and
+            share.get('backend') == self._backend and
+            share['queue']['node_id'] == self._node_id]
+        for share in sorted(queued_shares,
+                            key=lambda s: s['queue']['queued_at']):
+            LOG.info("Queueing creation of share %s again..."
+                     % share['name'])
+            self._submit_queued_share(share)
+
+    def _submit_queued_share(self, share):
+        share_args = copy.deepcopy(share)
+        share_args.pop('status')
+        share_args.pop('queue')
+        self._share_queue.submit(share['name'], share_args)
+
+    def _check_queued_shares_periodically(self, lease_timeout):
+        # Leases are renewed a few times per timeout so that a late
+        # renewal does not get a share taken over from a live node
+        while True:
+            time.sleep(lease_timeout / 3.0)
+            try:
+                self._check_queued_shares(lease_timeout)
+            except Exception as ex:
+                LOG.error("Failed to check the queued shares of backend "
+                          "%s: %s" % (self._backend, six.text_type(ex)))
+
+    def _check_queued_shares(self, lease_timeout):
+        """Renews the lease of the node on the shares it has queued
+
+        and takes over the QUEUED shares of the backend whose owner let
+        its lease expire, e.g. because it is down. Of the nodes taking
+        over a share at the same time, only the first to save it does.
+        """
+        for share in self._etcd.get_all_shares():
+            if share.get('status') != share_queue.QUEUED or \
+                    share.get('backend') != self._backend:
+                continue
+            share_name = share['name']
+            queue = share['queue']
+            if queue['node_id'] == self._node_id:
+                if self._share_queue.position(share_name) is not None:
+                    self._renew_queued_share(share_name, queue['node_id'])
+            elif time.time() - queue.get('renewed_at', queue['queued_at']) \
+                    > lease_timeout:
+                share = self._renew_queued_share(share_name,
+                                                 queue['node_id'])
+                if share:
+                    LOG.info("Taking over creation of share %s queued by "
+                             "node %s" % (share_name, queue['node_id']))
+                    self._submit_queued_share(share)
+
+    def _renew_queued_share(self, share_name, owner):
+        """Renews the lease on a share queued by owner for this node
+
+        The share is taken over if owner is another node. Returns the
+        share saved, or None if the share is no longer queued by owner or
+        was changed meanwhile.
+        """
+        try:
+            index, share = self._etcd.get_share_with_index(share_name)
+        except exception.EtcdMetadataNotFound:
+            return None
+        if share.get('status') != share_queue.QUEUED or \
+                share['queue']['node_id'] != owner:
+            return None
+        share['queue']['node_id'] = self._node_id
+        share['queue']['renewed_at'] = time.time()
+        try:
+            self._etcd.save_share_at_index(share, index)
+        except exception.HPEPluginUpdateConflict:
+            LOG.info("Share %s was changed while renewing its lease"
+                     % share_name)
+            return None
+        return share
+
+    def get_share_queue_stats(self):
+        return self._share_queue.stats()
+
     def _get_existing_fpg(self, share_args):
         cpg_name = share_args['cpg']
         fpg_name = share_args['fpg']
 
-        def _check_if_space_sufficient(backend_fpg=None):
+        def _check_if_space_sufficient(fpg_info=None, backend_fpg=None):
             LOG.info("Checking if FPG %s has enough capcity..." % fpg_name)
-            available_capacity = self._get_fpg_available_capacity(fpg_name,
-                                                                  backend_fpg)
+            if fpg_info:
+                available_capacity = self._get_fpg_available_capacity(
+                    cpg_name, fpg_info)
+            else:
+                total, used, share_count = self._get_backend_fpg_capacity(
+                    fpg_name, backend_fpg)
+                available_capacity = total - used
             share_size_in_gib = share_args['size'] / 1024
             if available_capacity < share_size_in_gib:
                 LOG.info("FPG %s doesn't have enough capcity..." % fpg_name)
@@ -155,7 +308,7 @@ class FileManager(object):
                 self._backend,
                 cpg_name, fpg_name
             )
-            _check_if_space_sufficient()
+            _check_if_space_sufficient(fpg_info=fpg_info)
         except exception.EtcdMetadataNotFound:
             LOG.info("Specified FPG %s not found in ETCD. Checking "
                      "if this is a legacy FPG..." % fpg_name)
@@ -163,7 +316,7 @@ class FileManager(object):
             leg_fpg = self._hpeplugin_driver.get_fpg(fpg_name)
             LOG.info("FPG %s is a legacy FPG" % fpg_name)
 
-            _check_if_space_sufficient(leg_fpg)
+            _check_if_space_sufficient(backend_fpg=leg_fpg)
 
             # CPG passed can be different than actual CPG
             # used for creating legacy FPG. Override default
@@ -197,115 +350,219 @@ class FileManager(object):
             LOG.error("Share could not be created on FPG %s" % fpg_name)
             raise exception.ShareCreationFailed(share_args['cpg'])
 
-    def _get_fpg_available_capacity(self, fpg_name, backend_fpg=None):
+    def _get_fpg_available_capacity(self, cpg_name, fpg_info):
+        """Returns the capacity left on an FPG created by the plugin
+
+        The capacity is accounted in the FPG metadata as shares are created
+        and removed. The FPG is reconciled with the array first if its
+        capacity has never been accounted, e.g. as it was created by an
+        older plugin.
+        """
+        fpg_name = fpg_info['fpg']
+        if 'used_capacity_gib' not in fpg_info:
+            LOG.info("Capacity of FPG %s not accounted yet" % fpg_name)
+            fpg_info = self._reconcile_fpg_capacity(cpg_name, fpg_name)
+        fpg_avail_capacity = fpg_info['total_capacity_gib'] - \
+            fpg_info['used_capacity_gib']
+        LOG.info("Available capacity on FPG %s is %s GiB" %
+                 (fpg_name, fpg_avail_capacity))
+        return fpg_avail_capacity
+
+    def charge_fpg_capacity(self, cpg_name, fpg_name, size_in_mib):
+        """Accounts a share of size_in_mib created on an FPG
+
+        A negative size releases the capacity of a removed share. Legacy
+        FPGs are not accounted. A failure is only logged as the next
+        reconciliation of the FPG corrects it.
+        """
+        share_delta = 1 if size_in_mib > 0 else -1
+        try:
+            self._fp_etcd_client.charge_fpg_capacity(
+                self._backend, cpg_name, fpg_name, size_in_mib / 1024,
+                share_delta)
+        except exception.EtcdMetadataNotFound:
+            LOG.info("FPG %s is not owned by Docker, its capacity is not "
+                     "accounted" % fpg_name)
+        except Exception as ex:
+            LOG.error("Failed to account %s MiB on FPG %s: %s"
+                      % (size_in_mib, fpg_name, six.text_type(ex)))
+
+    def _reconcile_fpg_capacity(self, cpg_name, fpg_name, backend_fpg=None,
+                                quotas=None):
+        """Replaces the capacity accounted on an FPG by that of the array
+
+        backend_fpg and quotas, when already listed from the array, are
+        used on the first attempt only. The array is queried again if the
+        FPG metadata changed meanwhile as they may be stale by then.
+        """
+        LOG.info("Reconciling capacity of FPG %s with the backend..."
+                 % fpg_name)
+        listed = [backend_fpg, quotas]
+
+        def _get_capacity():
+            capacity = self._get_backend_fpg_capacity(fpg_name, *listed)
+            listed[:] = [None, None]
+            return capacity
+        return self._fp_etcd_client.reconcile_fpg_capacity(
+            self._backend, cpg_name, fpg_name, _get_capacity)
+
+    def _reconcile_fpgs_capacity(self, fpgs):
+        """Reconciles the capacity of several FPGs in one pass
+
+        fpgs is a list of (cpg, FPG name). The FPGs and quotas of the array
+        are listed once for all of them. Returns the updated metadata of
+        the FPGs reconciled. FPGs that fail to be reconciled are logged
+        and left out.
+        """
+        LOG.info("Getting all FPGs and quotas from backend...")
+        with self._hpeplugin_driver.unit_of_work():
+            backend_fpgs = {backend_fpg['name']: backend_fpg for backend_fpg
+                            in self._hpeplugin_driver.get_all_fpgs()}
+            all_quotas = self._hpeplugin_driver.get_all_quotas()
+        quotas = {}
+        for quota in all_quotas:
+            quotas.setdefault(quota['fpg'], []).append(quota)
+
+        reconciled = []
+        for cpg_name, fpg_name in fpgs:
+            if fpg_name not in backend_fpgs:
+                LOG.warning("FPG %s present in ETCD but not found on "
+                            "backend" % fpg_name)
+                continue
+            try:
+                reconciled.append(self._reconcile_fpg_capacity(
+                    cpg_name, fpg_name, backend_fpgs[fpg_name],
+                    quotas.get(fpg_name, [])))
+            except Exception as ex:
+                LOG.error("Failed to reconcile capacity of FPG %s: %s"
+                          % (fpg_name, six.text_type(ex)))
+        return reconciled
+
+    def _reconcile_capacity_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                fpgs = self._fp_etcd_client.get_all_backend_fpg_metadata(
+                    self._backend)
+                self._reconcile_fpgs_capacity(
+                    [(cpg_name, fpg_info['fpg'])
+                     for cpg_name, fpg_info in fpgs])
+            except Exception as ex:
+                LOG.error("Failed to reconcile capacity of FPGs of backend "
+                          "%s: %s" % (self._backend, six.text_type(ex)))
+
+    def _get_backend_fpg_capacity(self, fpg_name, backend_fpg=None,
+                                  quotas=None):
+        """Returns the total and used capacity of an FPG on the array
+
+        along with the number of shares on it.
+        """
         if not backend_fpg:
             LOG.info("Getting FPG %s from backend..." % fpg_name)
             backend_fpg = self._hpeplugin_driver.get_fpg(fpg_name)
         LOG.info("%s" % six.text_type(backend_fpg))
-        LOG.info("Getting all quotas for FPG %s..." % fpg_name)
-        quotas = self._hpeplugin_driver.get_quotas_for_fpg(fpg_name)
+        if quotas is None:
+            LOG.info("Getting all quotas for FPG %s..." % fpg_name)
+            quotas = self._hpeplugin_driver.get_quotas_for_fpg(
+                fpg_name)['members']
         used_capacity_GiB = 0
-        for quota in quotas['members']:
+        for quota in quotas:
             used_capacity_GiB += (quota['hardBlockMiB'] / 1024)
         fpg_total_capacity_GiB = backend_fpg['availCapacityGiB']
         LOG.info("Total capacity of FPG %s: %s GiB" %
                  (fpg_name, fpg_total_capacity_GiB))
-        LOG.info("Capacity used on FPG %s is %s GiB" %
-                 (fpg_name, used_capacity_GiB))
-        fpg_avail_capacity = fpg_total_capacity_GiB - used_capacity_GiB
-        LOG.info("Available capacity on FPG %s is %s GiB" %
-                 (fpg_name, fpg_avail_capacity))
-        return fpg_avail_capacity
+        LOG.info("Capacity used on FPG %s is %s GiB by %s shares" %
+                 (fpg_name, used_capacity_GiB, len(quotas)))
+        return fpg_total_capacity_GiB, used_capacity_GiB, len(quotas)
+
+    def _get_default_fpgs_metadata(self, cpg_name, fpg_names):
+        """Returns the metadata of default FPGs with their capacity
+
+        FPGs whose capacity has never been accounted are reconciled
+        together with a single listing of the array.
+        """
+        fpgs = {}
+        unaccounted = []
+        for fpg_name in fpg_names:
+            try:
+                fpg_info = self._fp_etcd_client.get_fpg_metadata(
+                    self._backend, cpg_name, fpg_name)
+            except exception.EtcdMetadataNotFound:
+                LOG.warning("Metadata of default FPG %s not found in ETCD. "
+                            "Skipping it" % fpg_name)
+                continue
+            if 'used_capacity_gib' in fpg_info:
+                fpgs[fpg_name] = fpg_info
+            else:
+                LOG.info("Capacity of FPG %s not accounted yet" % fpg_name)
+                unaccounted.append((cpg_name, fpg_name))
+        if unaccounted:
+            for fpg_info in self._reconcile_fpgs_capacity(unaccounted):
+                fpgs[fpg_info['fpg']] = fpg_info
+        return [fpgs[fpg_name] for fpg_name in fpg_names
+                if fpg_name in fpgs]
+
+    def _get_vfs_info(self, fpg_info):
+        """Returns the FPG, VFS and IPs shares are placed with"""
+        if fpg_info.get('vfs') and fpg_info.get('ips'):
+            return fpg_info
+        # VFS of FPGs created by older plugins is known only to the array
+        fpg_name = fpg_info['fpg']
+        LOG.info("Getting VFS of FPG %s from backend..." % fpg_name)
+        vfs_info = self._hpeplugin_driver.get_vfs(fpg_name)
+        ip_info = vfs_info['IPInfo'][0]
+        return {
+            'ips': {ip_info['netmask']: [ip_info['IPAddr']]},
+            'fpg': fpg_name,
+            'vfs': vfs_info['name'],
+        }
 
-    # If default FPG is full, it raises exception
-    # EtcdMaxSharesPerFpgLimitException
+    # If no default FPG can hold the share, it raises exception
+    # EtcdDefaultFpgNotPresent
     def _get_default_available_fpg(self, share_args):
         LOG.info("Getting default available FPG...")
-        processing_done = False
-        for fpg_name in self._get_current_default_fpg_name(share_args):
-            try:
-                fpg_available_capacity = self._get_fpg_available_capacity(
-                    fpg_name
-                )
-                LOG.info("FPG available capacity in GiB: %s" %
-                         fpg_available_capacity)
-                # Share size in MiB - convert it to GiB
-                share_size_in_gib = share_args['size'] / 1024
-
-                # Yield only those default FPGs that have enough available
-                # capacity to create the requested share
-                if fpg_available_capacity >= share_size_in_gib:
-                    LOG.info("Found default FPG with enough available "
-                             "capacity %s GiB to create share of size %s GiB"
-                             % (fpg_available_capacity, share_size_in_gib))
-                    # Get backend VFS information
-                    vfs_info = self._hpeplugin_driver.get_vfs(fpg_name)
-                    vfs_name = vfs_info['name']
-                    ip_info = vfs_info['IPInfo'][0]
-                    netmask = ip_info['netmask']
-                    ip = ip_info['IPAddr']
-
-                    fpg_info = {
-                        'ips': {netmask: [ip]},
-                        'fpg': fpg_name,
-                        'vfs': vfs_name,
-                    }
-                    fpg_data = {'fpg': fpg_info}
-                    yield fpg_data
-
-                    if fpg_data['result'] == 'DONE':
-                        LOG.info("Share creation done using FPG %s" %
-                                 fpg_name)
-                        processing_done = True
-                        break
-                    else:
-                        LOG.info("Share could not be created on FPG %s. "
-                                 "Finding another default FPG with enough "
-                                 "capacity to create share of size %s"
-                                 % (fpg_name, share_size_in_gib))
-                        continue
-
-            except exception.FpgNotFound:
-                LOG.warning("FPG %s present in ETCD but not found on backend. "
-                            "Looking for next FPG" % fpg_name)
-                continue
+        cpg_name = share_args['cpg']
+        fpg_names = self._get_default_fpg_names(cpg_name)
+        # Share size in MiB - convert it to GiB
+        share_size_in_gib = share_args['size'] / 1024
+
+        # Score all the default FPGs at once instead of probing them one
+        # by one, trying them in the order of the placement policy
+        fpgs = fpg_placement.order_fpgs(
+            self._get_default_fpgs_metadata(cpg_name, fpg_names),
+            share_size_in_gib,
+            self.src_bkend_config.fpg_placement_policy)
+        for fpg_info in fpgs:
+            fpg_name = fpg_info['fpg']
+            LOG.info("Trying default FPG %s with available capacity %s GiB "
+                     "to create share of size %s GiB"
+                     % (fpg_name, fpg_info['total_capacity_gib'] -
+                        fpg_info['used_capacity_gib'], share_size_in_gib))
+            fpg_data = {'fpg': self._get_vfs_info(fpg_info)}
+            yield fpg_data
+
+            if fpg_data['result'] == 'DONE':
+                LOG.info("Share creation done using FPG %s" % fpg_name)
+                return
+            LOG.info("Share could not be created on FPG %s. Trying next "
+                     "default FPG with enough capacity to create share of "
+                     "size %s GiB" % (fpg_name, share_size_in_gib))
 
         # Default FPGs were there but none of them could satisfy the
         # requirement of creating share. New FPG must be created
         # hence raising exception to execute FPG creation flow
-        if not processing_done:
-            raise exception.EtcdDefaultFpgNotPresent(share_args['cpg'])
-
-    # TODO:Imran: Backend metadata needs modification
-    # Instead of one FPG, we need FPG listz
-    # Backend metadata
-    # {'default_fpgs': {
-    #       cpg1: [fpg1, fpg2],
-    #       cpg2: [fpg3]
-    # }
-    def _get_current_default_fpg_name(self, share_args):
-        cpg_name = share_args['cpg']
-        try:
-            LOG.info("Fetching metadata for backend %s..." % self._backend)
-            backend_metadata = self._fp_etcd_client.get_backend_metadata(
-                self._backend)
-            LOG.info("Backend metadata: %s" % backend_metadata)
-            default_fpgs = backend_metadata.get('default_fpgs')
-            if default_fpgs:
-                LOG.info("Checking if default FPG present for CPG %s..." %
-                         cpg_name)
-                fpg_list = default_fpgs.get(cpg_name, [])
-                for default_fpg in fpg_list:
-                    LOG.info("Default FPG %s found for CPG %s" %
-                             (default_fpg, cpg_name))
-                    yield default_fpg
-            else:
-                LOG.info("Default FPG not found under backend %s for CPG %s"
-                         % (self._backend, cpg_name))
-                raise exception.EtcdDefaultFpgNotPresent(cpg=cpg_name)
-        except exception.EtcdMetadataNotFound:
-            LOG.info("Metadata not found for backend %s" % self._backend)
+        raise exception.EtcdDefaultFpgNotPresent(cpg_name)
+
+    def _get_default_fpg_names(self, cpg_name):
+        LOG.info("Checking if default FPG present for CPG %s..." % cpg_name)
+        fpg_list = self._fp_etcd_client.get_default_fpgs(self._backend,
+                                                         cpg_name)
+        if not fpg_list:
+            LOG.info("Default FPG not found under backend %s for CPG %s"
+                     % (self._backend, cpg_name))
             raise exception.EtcdDefaultFpgNotPresent(cpg=cpg_name)
+        LOG.info("Default FPGs %s found for CPG %s" % (fpg_list, cpg_name))
+        return fpg_list
 
     def _unexecute(self, undo_cmds):
         for undo_cmd in reversed(undo_cmds):
@@ -339,13 +596,25 @@ class FileManager(object):
         LOG.info("Names generated: FPG=%s, VFS=%s" %
                  (fpg_name, vfs_name))
         LOG.info("Creating FPG %s using CPG %s" % (fpg_name, cpg))
-        create_fpg_cmd = CreateFpgCmd(self, cpg, fpg_name, False)
+        create_fpg_cmd = CreateFpgCmd(
+            self, cpg, fpg_name, False,
+            on_progress=self._share_progress_reporter(
+                share_args['name'], "Creating FPG %s" % fpg_name))
         create_fpg_cmd.execute()
         LOG.info("FPG %s created successfully using CPG %s" %
                  (fpg_name, cpg))
         undo_cmds.append(create_fpg_cmd)
         return fpg_name, vfs_name
 
+    def _share_progress_reporter(self, share_name, step):
+        # Records how far the backend task of step has got in the share
+        # so that it is reported by Get while the share is CREATING. The
+        # share is saved without it once created.
+        def _report(task):
+            progress = "%s: %s" % (step, task_tracker.describe_progress(task))
+            self._etcd.update_share(share_name, 'progress', progress)
+        return _report
+
     def _create_default_fpg(self, share_args, undo_cmds):
         LOG.info("Generating FPG and VFS names...")
         cpg = share_args['cpg']
@@ -357,7 +626,10 @@ class FileManager(object):
                      (fpg_name, vfs_name))
             LOG.info("Creating FPG %s using CPG %s" % (fpg_name, cpg))
             try:
-                create_fpg_cmd = CreateFpgCmd(self, cpg, fpg_name, True)
+                create_fpg_cmd = CreateFpgCmd(
+                    self, cpg, fpg_name, True,
+                    on_progress=self._share_progress_reporter(
+                        share_args['name'], "Creating FPG %s" % fpg_name))
                 create_fpg_cmd.execute()
                 LOG.info("FPG %s created successfully using CPG %s" %
                          (fpg_name, cpg))
@@ -376,6 +648,82 @@ class FileManager(object):
             except Exception as ex:
                 raise ex
 
+    def _claim_vfs_ip(self, undo_cmds):
+        """Claims a free IP from the IP pool for a new VFS
+
+        Returns the claim command along with the IP and netmask.
+        """
+        LOG.info("Trying to claim free IP from IP pool for "
+                 "backend %s..." % self._backend)
+        claim_free_ip_cmd = ClaimAvailableIPCmd(
+            self._backend,
+            self._vfs_ip_allocator
+        )
+        ip, netmask = claim_free_ip_cmd.execute()
+        LOG.info("Acquired IP %s for VFS creation" % ip)
+        undo_cmds.append(claim_free_ip_cmd)
+        return claim_free_ip_cmd, ip, netmask
+
+    def _create_vfs(self, cpg, fpg_name, vfs_name, undo_cmds,
+                    on_progress=None, claimed_ip=None):
+        """Creates the VFS of an FPG with an IP claimed from the IP pool
+
+        claimed_ip is what _claim_vfs_ip returned if the IP was claimed
+        already. Returns the IP and netmask of the VFS.
+        """
+        claim_free_ip_cmd, ip, netmask = \
+            claimed_ip or self._claim_vfs_ip(undo_cmds)
+
+        LOG.info("Creating VFS %s under FPG %s" %
+                 (vfs_name, fpg_name))
+        create_vfs_cmd = CreateVfsCmd(
+            self, cpg, fpg_name, vfs_name, ip, netmask,
+            on_progress=on_progress
+        )
+        create_vfs_cmd.execute()
+        LOG.info("VFS %s created successfully under FPG %s" %
+                 (vfs_name, fpg_name))
+        undo_cmds.append(create_vfs_cmd)
+
+        LOG.info("Marking IP %s to be in use by VFS /%s/%s"
+                 % (ip, fpg_name, vfs_name))
+        # Now that VFS has been created successfully, move the IP
+        # from locked to in use in the IP map
+        claim_free_ip_cmd.mark_ip_in_use()
+        return ip, netmask
+
+    def _provision_spare_fpg(self, cpg):
+        """Creates a default FPG and its VFS ahead of the shares"""
+        undo_cmds = []
+        try:
+            # The IP is claimed first, so that no FPG is created only to be
+            # removed for lack of an IP for its VFS
+            claimed_ip = self._claim_vfs_ip(undo_cmds)
+            fpg_name, vfs_name = self._generate_default_fpg_vfs_names(
+                {'cpg': cpg})
+            LOG.info("Creating spare FPG %s using CPG %s" % (fpg_name, cpg))
+            create_fpg_cmd = CreateFpgCmd(self, cpg, fpg_name, False)
+            create_fpg_cmd.execute()
+            undo_cmds.append(create_fpg_cmd)
+
+            self._create_vfs(cpg, fpg_name, vfs_name, undo_cmds,
+                             claimed_ip=claimed_ip)
+            self._reconcile_fpg_capacity(cpg, fpg_name)
+
+            # Shares are placed on the FPG only once its VFS is ready
+            create_fpg_cmd.set_as_default_fpg()
+            LOG.info("Spare FPG %s created successfully using CPG %s"
+                     % (fpg_name, cpg))
+        except Exception:
+            self._unexecute(undo_cmds)
+            raise
+
+    def _get_default_fpg_capacities(self, cpg):
+        fpgs = self._get_default_fpgs_metadata(
+            cpg, self._fp_etcd_client.get_default_fpgs(self._backend, cpg))
+        return [fpg_info['total_capacity_gib'] - fpg_info['used_capacity_gib']
+                for fpg_info in fpgs]
+
     def _create_share_on_fpg(self, share_args, fpg_getter,
                              fpg_creator, undo_cmds):
         share_name = share_args['name']
@@ -383,27 +731,29 @@ class FileManager(object):
         cpg = share_args['cpg']
 
         def __create_share_and_quota():
-            LOG.info("Creating share %s..." % share_name)
-            create_share_cmd = CreateShareCmd(
-                self,
-                share_args
-            )
-            create_share_cmd.execute()
-            LOG.info("Share created successfully %s" % share_name)
-            undo_cmds.append(create_share_cmd)
-
-            LOG.info("Setting quota for share %s..." % share_name)
-            set_quota_cmd = cmd_setquota.SetQuotaCmd(
-                self,
-                share_args['cpg'],
-                share_args['fpg'],
-                share_args['vfs'],
-                share_args['name'],
-                share_args['size']
-            )
-            set_quota_cmd.execute()
-            LOG.info("Quota set for share successfully %s" % share_name)
-            undo_cmds.append(set_quota_cmd)
+            # Share and quota are created on the same WSAPI session
+            with self._hpeplugin_driver.unit_of_work():
+                LOG.info("Creating share %s..." % share_name)
+                create_share_cmd = CreateShareCmd(
+                    self,
+                    share_args
+                )
+                create_share_cmd.execute()
+                LOG.info("Share created successfully %s" % share_name)
+                undo_cmds.append(create_share_cmd)
+
+                LOG.info("Setting quota for share %s..." % share_name)
+                set_quota_cmd = cmd_setquota.SetQuotaCmd(
+                    self,
+                    share_args['cpg'],
+                    share_args['fpg'],
+                    share_args['vfs'],
+                    share_args['name'],
+                    share_args['size']
+                )
+                set_quota_cmd.execute()
+                LOG.info("Quota set for share successfully %s" % share_name)
+                undo_cmds.append(set_quota_cmd)
 
         with self._fp_etcd_client.get_cpg_lock(self._backend, cpg):
             try:
@@ -459,35 +809,11 @@ class FileManager(object):
                     share_args['fpg'] = fpg_name
                     share_args['vfs'] = vfs_name
 
-                    LOG.info("Trying to claim free IP from IP pool for "
-                             "backend %s..." % self._backend)
-                    # Acquire IP even before FPG creation. This will save the
-                    # time by not creating FPG in case IP pool is exhausted
-                    claim_free_ip_cmd = ClaimAvailableIPCmd(
-                        self._backend,
-                        self.src_bkend_config,
-                        self._fp_etcd_client,
-                        self._hpeplugin_driver
-                    )
-                    ip, netmask = claim_free_ip_cmd.execute()
-                    LOG.info("Acquired IP %s for VFS creation" % ip)
-                    undo_cmds.append(claim_free_ip_cmd)
-
-                    LOG.info("Creating VFS %s under FPG %s" %
-                             (vfs_name, fpg_name))
-                    create_vfs_cmd = CreateVfsCmd(
-                        self, cpg, fpg_name, vfs_name, ip, netmask
-                    )
-                    create_vfs_cmd.execute()
-                    LOG.info("VFS %s created successfully under FPG %s" %
-                             (vfs_name, fpg_name))
-                    undo_cmds.append(create_vfs_cmd)
-
-                    LOG.info("Marking IP %s to be in use by VFS /%s/%s"
-                             % (ip, fpg_name, vfs_name))
-                    # Now that VFS has been created successfully, move the IP
-                    # from locked-ip-list to ips-in-use list
-                    claim_free_ip_cmd.mark_ip_in_use()
+                    ip, netmask = self._create_vfs(
+                        cpg, fpg_name, vfs_name, undo_cmds,
+                        on_progress=self._share_progress_reporter(
+                            share_args['name'],
+                            "Creating VFS %s" % vfs_name))
                     share_args['vfsIPs'] = [(ip, netmask)]
 
                     __create_share_and_quota()
@@ -515,14 +841,35 @@ class FileManager(object):
                       "on new FPG. Reason: %s" % six.text_type(ex)
                 raise exception.ShareCreationFailed(reason=msg)
 
-    @synchronization.synchronized_fp_share('{share_name}')
     def _create_share(self, share_name, share_args):
-        # Check if share already exists
+        # Mount, Unmount and Remove of the share hold its lock. Rather than
+        # waiting for them, the worker moves on and the share is queued
+        # again
+        lock = self._etcd.get_lock('FP_SHARE')
         try:
-            self._etcd.get_share(share_name)
-            return
+            lock.try_lock_name(share_name)
+        except exception.HPEPluginLockFailed:
+            LOG.info("Share %s is locked by another request, queueing its "
+                     "creation again" % share_name)
+            return share_queue.RETRY
+        try:
+            return self._create_queued_share(share_name, share_args)
+        finally:
+            try:
+                lock.try_unlock_name(share_name)
+            except exception.HPEPluginUnlockFailed:
+                LOG.exception("Failed to unlock share %s" % share_name)
+
+    def _create_queued_share(self, share_name, share_args):
+        # Nothing to do unless the share is still queued. It may have
+        # been removed, or created by an earlier run of this request.
+        try:
+            share = self._etcd.get_share(share_name)
         except exception.EtcdMetadataNotFound:
-            pass
+            LOG.info("Share %s was removed while queued" % share_name)
+            return None
+        if share.get('status') != share_queue.QUEUED:
+            return None
 
         # Make copy of args as we are going to modify it
         fpg_name = share_args.get('fpg')
@@ -549,8 +896,31 @@ class FileManager(object):
             share_args['detailedStatus'] = ex.msg
             self._etcd.save_share(share_args)
             self._unexecute(undo_cmds)
+            return False
+        if self._spare_fpg_pool:
+            self._spare_fpg_pool.check()
+        return True
+
+    def _remove_queued_share(self, share_name):
+        # Called with the share locked by the Remove request
+        self._share_queue.discard(share_name)
+        try:
+            share = self._etcd.get_share(share_name)
+        except exception.EtcdMetadataNotFound:
+            return json.dumps({u"Err": ''})
+        if share.get('status') != share_queue.QUEUED:
+            msg = "Share %s is in %s state. Please wait for it to be in " \
+                  "AVAILABLE or FAILED state and then attempt remove." \
+                  % (share_name, share.get('status'))
+            LOG.info(msg)
+            return json.dumps({u"Err": msg})
+        LOG.info("Removing queued share %s from ETCD..." % share_name)
+        self._etcd.delete_share(share_name)
+        return json.dumps({u"Err": ''})
 
     def remove_share(self, share_name, share):
+        if share.get('status') == share_queue.QUEUED:
+            return self._remove_queued_share(share_name)
         if 'path_info' in share:
             msg = "Cannot delete share %s as it is in mounted state" \
                   % share_name
@@ -572,6 +942,7 @@ class FileManager(object):
         db_share_copy.pop("comment")
         if 'path_info' in db_share_copy:
             db_share_copy.pop('path_info')
+        db_share_copy.pop('queue', None)
 
         LOG.info("Implementation details removed: %s" % db_share_copy)
         return db_share_copy
@@ -590,6 +961,11 @@ class FileManager(object):
 
         db_share_copy = FileManager._rm_implementation_details(db_share)
         db_share_copy['sharePath'] = share_path
+        if db_share['status'] == share_queue.QUEUED:
+            # Known only to the node that queued the share
+            position = self._share_queue.position(share_name)
+            if position:
+                db_share_copy['queuePosition'] = position
         size_in_gib = "%d GiB" % (db_share_copy['size'] / 1024)
         db_share_copy['size'] = size_in_gib
         LOG.info("Returning share: %s" % db_share_copy)
@@ -717,10 +1093,10 @@ class FileManager(object):
                       "create a new one and then retry mount" % share_name
                 LOG.error(msg)
                 return json.dumps({u"Err": msg})
-            elif share['status'] == 'CREATING':
-                msg = "Share %s is in CREATING state. Please wait for it " \
+            elif share['status'] in ('CREATING', share_queue.QUEUED):
+                msg = "Share %s is in %s state. Please wait for it " \
                       "to be in AVAILABLE state and then retry mount" \
-                      % share_name
+                      % (share_name, share['status'])
                 LOG.error(msg)
                 return json.dumps({u"Err": msg})
             elif share['status'] == 'AVAILABLE':
@@ -14,19 +14,16 @@
 
 from sh import blkid
 from sh import mkfs
-from sh import mkdir
 from sh import mount
 from sh import umount
-from sh import grep
-import subprocess
-from sh import rm
 from oslo_log import log as logging
 import os
+import shutil
 from hpedockerplugin.i18n import _, _LI
 import hpedockerplugin.exception as exception
+from hpedockerplugin import mount_table
 import six
 
-from twisted.python.filepath import FilePath
 from retrying import retry
 
 LOG = logging.getLogger(__name__)
@@ -54,7 +51,15 @@ def retry_if_io_error(exception1):
 @retry(retry_on_exception=retry_if_io_error,
        stop_max_attempt_number=3,
        wait_fixed=20000)
-def create_filesystem(path):
+def create_filesystem(path, lazy_init=False, nodiscard=False):
+    # lazy_init leaves the inode tables and the journal to be initialized
+    # by the kernel after the first mount, nodiscard skips discarding the
+    # blocks of the device. Both make mkfs of a large volume much faster.
+    ext_opts = []
+    if lazy_init:
+        ext_opts.append('lazy_itable_init=1,lazy_journal_init=1')
+    if nodiscard:
+        ext_opts.append('nodiscard')
     try:
         # Create filesystem without user intervention, -F
         # NEED to be extra careful here!!!!
@@ -63,7 +68,10 @@ def create_filesystem(path):
         # and there is no default mkfs. Therefore, we link
         # mkfs to mkfs.ext4 in our Dockerfile, so no need to
         # specify -t ext4.
-        mkfs("-F", path)
+        if ext_opts:
+            mkfs("-F", "-E", ','.join(ext_opts), path)
+        else:
+            mkfs("-F", path)
     except Exception as ex:
         msg = (_('create file system failed exception is : %s'),
                six.text_type(ex))
@@ -98,7 +106,7 @@ def mkdir_for_mounting(path, mount_prefix):
         LOG.info('MOUNT PREFIX : %s' % prefix)
 
         directory = prefix + uuid
-        mkdir("-p", directory)
+        os.makedirs(directory, exist_ok=True)
     except Exception as ex:
         msg = (_('Make directory failed exception is : %s'), six.text_type(ex))
         LOG.error(msg)
@@ -113,44 +121,21 @@ def mount_dir(src, tgt):
         msg = (_('exception is : %s'), six.text_type(ex))
         LOG.error(msg)
         raise exception.HPEPluginMountException(reason=msg)
+    finally:
+        mount_table.get_mount_table().invalidate()
     return True
 
 
 def check_if_mounted(src, tgt):
+    # The mount table lists the device under one of its names only,
+    # e.g. /dev/mapper/360002ac00000000001008506000187b7 for /dev/dm-3,
+    # so the device is matched by device number rather than by name.
     try:
-        # List all mounts with "mount -l".
-        # Then grep the list for the source and the target of the mount
-        # using regular expression with the paths.
-        # _ok_code=[0,1] is used because grep returns an ErrorCode_1
-        # if it cannot find any matches on the pattern.
-        mountpoint = grep(grep(mount("-l"), "-E", src, _ok_code=[0, 1]), "-E",
-                          tgt, _ok_code=[0, 1])
+        return mount_table.get_mount_table().is_mounted(src, tgt)
     except Exception as ex:
         msg = (_('exception is : %s'), six.text_type(ex))
         LOG.error(msg)
         raise exception.HPEPluginCheckMountException(reason=msg)
-    # If there is no line matching the criteria from above then the
-    # mount is not present, return False.
-    if not mountpoint:
-        # there could be cases where the src, tgt mount directories
-        # will not be present in mount -l output , but the
-        # symbolic links pointing to either src/tgt folder will be
-        # present. Eg. /dev/dm-3 will not be there in mount -l
-        # but there will be symlink from
-        # /dev/mapper/360002ac00000000001008506000187b7
-        # or /dev/disk/by-id/dm-uuid-mpath-360002ac00000000001008506000187b7
-        # So, we need to check for the file existence of both src/tgt folders
-        if check_if_file_exists(src) and \
-                check_if_file_exists(tgt):
-            LOG.info('SRC and TGT is present')
-            return True
-        else:
-            LOG.info('SRC %s or TGT %s does not exist' % (src, tgt))
-            return False
-    # If there is a mountpoint meeting the criteria then
-    # everything is ok, return True
-    else:
-        return True
 
 
 def check_if_file_exists(path):
@@ -158,42 +143,42 @@ def check_if_file_exists(path):
 
 
 def umount_dir(tgt):
-    # For some reason sh.mountpoint does not work, so
-    # using subprocess instead.
-    result = subprocess.Popen(["mountpoint", "-q", tgt])
-
-    # we must explictly wait for the process to finish.
-    # Otherwise, we do not get the correct result
-    result.wait()
-    if result.returncode == 0:
+    table = mount_table.get_mount_table()
+    if table.is_mount_point(tgt):
         try:
             umount("-l", tgt)
         except Exception as ex:
             msg = (_('exception is : %s'), six.text_type(ex))
             LOG.error(msg)
             raise exception.HPEPluginUMountException(reason=msg)
+        finally:
+            table.invalidate()
     return True
 
 
 def remove_dir(tgt):
-    path = FilePath(tgt)
-    if path.exists:
-        try:
-            rm("-rf", tgt)
-        except Exception as ex:
-            msg = (_('exception is : %s'), six.text_type(ex))
-            LOG.error(msg)
-            raise exception.HPEPluginRemoveDirException(reason=msg)
+    try:
+        # Like rm -rf, a link or a file at tgt is removed itself
+        if os.path.islink(tgt) or not os.path.isdir(tgt):
+            os.remove(tgt)
+        else:
+            shutil.rmtree(tgt)
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        msg = (_('exception is : %s'), six.text_type(ex))
+        LOG.error(msg)
+        raise exception.HPEPluginRemoveDirException(reason=msg)
     return True
 
 
 def remove_file(tgt):
-    path = FilePath(tgt)
-    if path.exists:
-        try:
-            rm(tgt)
-        except Exception as ex:
-            msg = (_('exception is : %s'), six.text_type(ex))
-            LOG.error(msg)
-            raise exception.HPEPluginRemoveDirException(reason=msg)
+    try:
+        os.remove(tgt)
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        msg = (_('exception is : %s'), six.text_type(ex))
+        LOG.error(msg)
+        raise exception.HPEPluginRemoveDirException(reason=msg)
     return True
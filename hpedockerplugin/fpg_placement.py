@@ -0,0 +1,56 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Placement policies of default shares
+BEST_FIT = 'best-fit'
+WORST_FIT = 'worst-fit'
+SHARE_COUNT_BALANCED = 'share-count-balanced'
+
+POLICIES = (BEST_FIT, WORST_FIT, SHARE_COUNT_BALANCED)
+
+
+def _available_capacity(fpg_info):
+    return fpg_info['total_capacity_gib'] - fpg_info['used_capacity_gib']
+
+
+_SORT_KEYS = {
+    # Fill the FPG with the least room left that can hold the share,
+    # keeping the larger ones for larger shares
+    BEST_FIT: lambda fpg_info: _available_capacity(fpg_info),
+    # Spread shares over the FPGs with the most room left
+    WORST_FIT: lambda fpg_info: -_available_capacity(fpg_info),
+    # Fewest shares first, the one with the most room left on a tie
+    SHARE_COUNT_BALANCED: lambda fpg_info: (
+        fpg_info.get('share_count', 0), -_available_capacity(fpg_info)),
+}
+
+
+def order_fpgs(fpgs, share_size_in_gib, policy=BEST_FIT):
+    """Orders the default FPGs that can hold a share by placement policy
+
+    fpgs is the metadata of the default FPGs of a CPG with their capacity
+    accounted. The FPGs without enough available capacity for the share are
+    left out. FPGs scored equally keep their order in fpgs.
+    """
+    candidates = [fpg_info for fpg_info in fpgs
+                  if _available_capacity(fpg_info) >= share_size_in_gib]
+    candidates.sort(key=_SORT_KEYS[policy])
+    LOG.info("FPGs that can hold share of size %s GiB in %s order: %s"
+             % (share_size_in_gib, policy,
+                [fpg_info['fpg'] for fpg_info in candidates]))
+    return candidates
@@ -0,0 +1,145 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import threading
+import time
+
+from oslo_log import log as logging
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 300
+
+
+def _build_nsp(port_pos):
+    return '%s:%s:%s' % (port_pos['node'],
+                         port_pos['slot'],
+                         port_pos['cardPort'])
+
+
+class ISCSIInventory(object):
+    """Cached iSCSI target ports of an array and their active VLUN counts
+
+    Port selection used to fetch every VLUN of the array, and the list of
+    ready iSCSI ports, on each export. The inventory loads both once and
+    keeps the VLUN counts current as this plugin creates and removes
+    VLUNs. Changes made by others are picked up by a full reload, done in
+    the background by the first lookup made after refresh_interval.
+
+    session_pool hands out the sessions used for background reloads.
+    """
+    def __init__(self, name, session_pool, refresh_interval=None):
+        self._name = name
+        self._session_pool = session_pool
+        self._refresh_interval = refresh_interval or DEFAULT_REFRESH_INTERVAL
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._refreshing = False
+        self._ready_ports = []
+        # nsp -> number of active VLUNs
+        self._nsp_vluns = collections.Counter()
+        # hostname -> nsp -> number of active VLUNs
+        self._host_vluns = collections.defaultdict(collections.Counter)
+
+    def get_ready_ports(self, common):
+        self._ensure_loaded(common)
+        with self._lock:
+            return list(self._ready_ports)
+
+    def get_host_nsps(self, common, hostname):
+        """Returns the nsps through which hostname has active VLUNs"""
+        self._ensure_loaded(common)
+        with self._lock:
+            return [nsp for nsp, count in self._host_vluns[hostname].items()
+                    if count > 0]
+
+    def get_least_used_nsp(self, common, nsps):
+        """Returns the nsp among nsps with the fewest active VLUNs
+
+        None is returned when nsps is empty.
+        """
+        if not nsps:
+            return None
+        self._ensure_loaded(common)
+        with self._lock:
+            return min(nsps, key=lambda nsp: self._nsp_vluns[nsp])
+
+    def vlun_created(self, hostname, nsp):
+        with self._lock:
+            self._nsp_vluns[nsp] += 1
+            self._host_vluns[hostname][nsp] += 1
+
+    def vluns_removed(self, hostname, vluns):
+        """Accounts for the removal of the template VLUNs vluns
+
+        Removing a template VLUN removes the active VLUN it created.
+        """
+        with self._lock:
+            for vlun in vluns:
+                if 'portPos' not in vlun:
+                    continue
+                nsp = _build_nsp(vlun['portPos'])
+                host = vlun.get('hostname', hostname)
+                if self._host_vluns[host][nsp] > 0:
+                    self._host_vluns[host][nsp] -= 1
+                    self._nsp_vluns[nsp] -= 1
+
+    def _ensure_loaded(self, common):
+        with self._lock:
+            loaded_at = self._loaded_at
+            refresh = loaded_at is not None and not self._refreshing and \
+                time.time() - loaded_at > self._refresh_interval
+            if refresh:
+                self._refreshing = True
+
+        if loaded_at is None:
+            self._load(common)
+        elif refresh:
+            thread = threading.Thread(target=self._refresh,
+                                      name='%s-inventory' % self._name)
+            thread.daemon = True
+            thread.start()
+
+    def _refresh(self):
+        try:
+            with self._session_pool.session() as common:
+                self._load(common)
+        except Exception as ex:
+            LOG.warning("Failed to refresh iSCSI inventory of %s: %s"
+                        % (self._name, six.text_type(ex)))
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _load(self, common):
+        LOG.info("Loading iSCSI ports and VLUNs of %s" % self._name)
+        ready_ports = common.client.getiSCSIPorts(
+            state=common.client.PORT_STATE_READY)
+        vluns = common.client.getVLUNs()
+
+        nsp_vluns = collections.Counter()
+        host_vluns = collections.defaultdict(collections.Counter)
+        for vlun in vluns['members']:
+            if vlun['active'] and 'portPos' in vlun:
+                nsp = _build_nsp(vlun['portPos'])
+                nsp_vluns[nsp] += 1
+                host_vluns[vlun['hostname']][nsp] += 1
+
+        with self._lock:
+            self._ready_ports = ready_ports
+            self._nsp_vluns = nsp_vluns
+            self._host_vluns = host_vluns
+            self._loaded_at = time.time()
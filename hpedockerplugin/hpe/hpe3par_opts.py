@@ -37,6 +37,115 @@ hpe3par_opts = [
                 default=False,
                 help="Enable CHAP authentication for iSCSI connections.",
                 deprecated_name='hp3par_iscsi_chap_enabled'),
+    cfg.IntOpt('hpe3par_max_sessions',
+               default=4,
+               min=1,
+               help="Maximum number of concurrent WSAPI sessions the "
+                    "plugin keeps open to the 3PAR array"),
+    cfg.IntOpt('hpe3par_session_idle_timeout',
+               default=300,
+               min=1,
+               help="Seconds after which an unused WSAPI session is "
+                    "logged out instead of being reused"),
+    cfg.IntOpt('hpe3par_inventory_refresh_interval',
+               default=300,
+               min=1,
+               help="Seconds after which the cached iSCSI ports and VLUN "
+                    "counts used to pick the target port of an export are "
+                    "reloaded from the 3PAR array"),
+    cfg.IntOpt('hpe3par_task_poll_interval',
+               default=3,
+               min=1,
+               help="Seconds between two polls of the outstanding 3PAR "
+                    "tasks, such as online copies and FPG and VFS "
+                    "creations. All the tasks of an array are polled "
+                    "together"),
+    cfg.IntOpt('rcg_state_cache_ttl',
+               default=30,
+               min=0,
+               help="Seconds for which the active array of an "
+                    "Active/Passive remote copy group is cached instead of "
+                    "being looked up on both arrays for every mount. 0 "
+                    "disables the cache"),
+    cfg.IntOpt('mount_admission_max_concurrency',
+               default=8,
+               min=1,
+               help="Upper bound for the number of Mount and Unmount "
+                    "requests run against the 3PAR array at a time. The "
+                    "actual limit adapts to the observed WSAPI and etcd "
+                    "latency"),
+    cfg.IntOpt('mount_admission_min_concurrency',
+               default=1,
+               min=1,
+               help="Lower bound for the adaptive Mount and Unmount "
+                    "concurrency limit"),
+    cfg.IntOpt('mount_admission_queue_timeout',
+               default=120,
+               min=1,
+               help="Seconds a Mount or Unmount request may wait for "
+                    "admission before it is failed"),
+    cfg.FloatOpt('wsapi_target_latency',
+                 default=2.0,
+                 help="Average WSAPI call latency in seconds above which "
+                      "the Mount and Unmount concurrency limit is lowered"),
+    cfg.FloatOpt('etcd_target_latency',
+                 default=0.5,
+                 help="Average etcd call latency in seconds above which "
+                      "the Mount and Unmount concurrency limit is lowered"),
+    cfg.BoolOpt('preformat_volumes',
+                default=False,
+                help="Create the filesystem of a new volume in the "
+                     "background right after it is created, instead of on "
+                     "its first mount. Can be set per volume with the "
+                     "fsPreformat create option"),
+    cfg.IntOpt('preformat_threads',
+               default=2,
+               min=1,
+               help="Number of volumes formatted in the background at a "
+                    "time"),
+    cfg.IntOpt('preformat_timeout',
+               default=900,
+               min=1,
+               help="Seconds a Mount request waits for the background "
+                    "formatting of its volume. Past this, the volume is "
+                    "formatted by the mount if it still has no "
+                    "filesystem"),
+    cfg.ListOpt('warm_pool_profiles',
+                default=[],
+                help="Profiles of the volumes kept pre-created for Create "
+                     "requests, as a list of "
+                     "size:provisioning[:compression[:cpg]] entries, e.g. "
+                     "10:thin,100:dedup:true. A Create request without "
+                     "qos-name, flash-cache, snapcpg and replicationGroup "
+                     "whose size, provisioning, compression and cpg match a "
+                     "profile is served with a pooled volume"),
+    cfg.IntOpt('warm_pool_size',
+               default=0,
+               min=0,
+               help="Number of pre-created volumes kept per warm pool "
+                    "profile. 0 disables the warm pool"),
+    cfg.IntOpt('warm_pool_max_capacity',
+               default=0,
+               min=0,
+               help="Capacity in GiB that all pre-created volumes of the "
+                    "backend may take at most. 0 means no limit"),
+    cfg.BoolOpt('warm_pool_preformat',
+                default=False,
+                help="Create the filesystem of pre-created volumes before "
+                     "adding them to the warm pool"),
+    cfg.IntOpt('warm_pool_refill_interval',
+               default=60,
+               min=1,
+               help="Seconds between checks that the warm pool is full. "
+                    "A pool is also refilled right after a claim"),
+    cfg.IntOpt('detach_grace_period',
+               default=0,
+               min=0,
+               help="Seconds the host devices and VLUNs of a volume are "
+                    "kept after its last unmount on a node, so that a "
+                    "remount on the same node reuses them. A mount on "
+                    "another node removes them right away. 0 detaches "
+                    "volumes on unmount"),
     cfg.BoolOpt('suppress_requests_ssl_warnings',
                 default=False,
                 help='Suppress requests library SSL certificate warnings.'),
@@ -52,6 +161,61 @@ hpe3par_opts = [
     cfg.IntOpt('hpe3par_default_fpg_size',
                default=16,
                help='FPG size in TiB'),
+    cfg.IntOpt('share_creation_workers',
+               default=4,
+               min=1,
+               help="Number of shares of the backend that are created at "
+                    "the same time. Further shares are queued and created "
+                    "in the order they were requested"),
+    cfg.IntOpt('share_queue_lease_timeout',
+               default=300,
+               min=0,
+               help="Seconds after which a share queued by a node that no "
+                    "longer renews its lease on it, e.g. because the node "
+                    "is down, is taken over and created by another node. "
+                    "0 disables the takeover"),
+    cfg.IntOpt('spare_fpgs',
+               default=0,
+               min=0,
+               help="Number of default FPGs, each with its VFS, kept per "
+                    "CPG with at least spare_fpg_min_free_capacity GiB "
+                    "available, so that shares are not created on a new "
+                    "FPG. 0 disables the provisioning of spare FPGs"),
+    cfg.IntOpt('spare_fpg_min_free_capacity',
+               default=1024,
+               min=1,
+               help="Available capacity in GiB below which a default FPG "
+                    "no longer counts as a spare FPG"),
+    cfg.ListOpt('spare_fpg_cpgs',
+                default=[],
+                help="CPGs on which spare FPGs are kept. Defaults to the "
+                     "first CPG of hpe3par_cpg"),
+    cfg.IntOpt('spare_fpg_check_interval',
+               default=300,
+               min=1,
+               help="Seconds between checks that each CPG has its spare "
+                    "FPGs. The check is also done after a share creation"),
+    cfg.IntOpt('fpg_capacity_reconcile_interval',
+               default=3600,
+               min=0,
+               help="Seconds between two reconciliations of the capacity "
+                    "accounted on the FPGs of the backend with the quotas "
+                    "set on the array. 0 disables the reconciliation"),
+    cfg.StrOpt('fpg_placement_policy',
+               default='best-fit',
+               choices=['best-fit', 'worst-fit', 'share-count-balanced'],
+               help="How a share is placed among the default FPGs that "
+                    "can hold it. best-fit picks the FPG with the least "
+                    "capacity left, worst-fit the one with the most "
+                    "capacity left and share-count-balanced the one with "
+                    "the fewest shares"),
+    cfg.IntOpt('vfs_ip_reconcile_interval',
+               default=3600,
+               min=0,
+               help="Seconds after which the IP addresses of the "
+                    "hpe3par_server_ip_pool allocated to VFSs are "
+                    "reconciled with the VFSs of the array on the next "
+                    "claim. 0 reconciles them on every claim"),
     cfg.MultiOpt('hpe3par_server_ip_pool',
                  item_type=ip_pool.VfsIpPool(),
                  help='Target server IP pool'),
@@ -77,6 +241,16 @@ san_opts = [
     cfg.IntOpt('ssh_conn_timeout',
                default=30,
                help="SSH connection timeout in seconds"),
+    cfg.IntOpt('ssh_keepalive_interval',
+               default=30,
+               min=1,
+               help="Seconds between keepalives sent on idle SSH "
+                    "connections to the SAN controller"),
+    cfg.IntOpt('hpe3par_max_ssh_sessions',
+               default=2,
+               min=1,
+               help="Maximum number of concurrent SSH connections the "
+                    "plugin keeps open to the 3PAR array"),
     cfg.IntOpt('timeout',
                default=10000,
                help=''),
@@ -23,6 +23,7 @@ from oslo_log import log as logging
 from oslo_utils import units
 
 from hpedockerplugin import exception
+from hpedockerplugin.hpe import session_pool
 from hpedockerplugin.hpe import utils
 from hpedockerplugin.i18n import _, _LE, _LI, _LW
 
@@ -165,20 +166,10 @@ class HPE3PARCommon(object):
             LOG.error(msg)
             raise exception.InvalidInput(reason=msg)
 
-        known_hosts_file = self._host_config.ssh_hosts_key_file
-
-        policy = "AutoAddPolicy"
-        if self._host_config.strict_ssh_host_key_policy:
-            policy = "RejectPolicy"
-        self.client.setSSHOptions(
-            self.src_bkend_config.san_ip,
-            self.src_bkend_config.san_login,
-            self.src_bkend_config.san_password,
-            port=self.src_bkend_config.san_ssh_port,
-            conn_timeout=self.src_bkend_config.ssh_conn_timeout,
-            privatekey=self.src_bkend_config.san_private_key,
-            missing_key_policy=policy,
-            known_hosts_file=known_hosts_file)
+        # CLI commands run over SSH connections shared with the other
+        # users of this array
+        self.client.ssh = session_pool.get_ssh_client(
+            self._host_config, self.src_bkend_config)
 
     def client_logout(self):
         LOG.debug("Disconnect from 3PAR REST and SSH %s", self.uuid)
@@ -561,6 +552,10 @@ class HPE3PARCommon(object):
                 LOG.info("Removed host '%s' from 3PAR!" % hostname)
 
     def delete_vlun(self, volume, hostname, is_snap):
+        """Deletes the VLUNs of volume on hostname
+
+        Returns the template VLUNs that were deleted.
+        """
         volume_name = utils.get_3par_name(volume['id'], is_snap)
         vluns = self.client.getHostVLUNs(hostname)
 
@@ -581,7 +576,7 @@ class HPE3PARCommon(object):
                 _LW("3PAR vlun for volume %(name)s not found on "
                     "host %(host)s"), {'name': volume_name, 'host': hostname})
             LOG.warning(msg)
-            return
+            return []
 
         # VLUN Type of MATCHED_SET 4 requires the port to be provided
         for vlun in volume_vluns:
@@ -632,6 +627,8 @@ class HPE3PARCommon(object):
                          {'name': volume_name, 'host': hostname,
                           'reason': ex.get_description()})
 
+        return volume_vluns
+
     def _get_key_value(self, hpe3par_keys, key, default=None):
         if hpe3par_keys is not None and key in hpe3par_keys:
             return hpe3par_keys[key]
@@ -686,6 +683,15 @@ class HPE3PARCommon(object):
             return self.src_bkend_config.hpe3par_cpg[0]
         return None
 
+    def update_volume_comment(self, volume):
+        """Writes the Docker identity of volume to its 3PAR comment"""
+        comments = {'volume_id': volume['id'],
+                    'name': volume['name'],
+                    'type': 'Docker',
+                    'display_name': volume['display_name']}
+        self.client.modifyVolume(utils.get_3par_vol_name(volume['id']),
+                                 {'comment': json.dumps(comments)})
+
     def _get_3par_vol_comment(self, volume_name):
         vol = self.client.getVolume(volume_name)
         if 'comment' in vol:
@@ -1084,8 +1090,7 @@ class HPE3PARCommon(object):
             hostname = hosts['members'][0]['name']
 
         try:
-            self.delete_vlun(volume, hostname, is_snap)
-            return
+            return self.delete_vlun(volume, hostname, is_snap)
         except hpeexceptions.HTTPNotFound as e:
             if 'host does not exist' in e.get_description():
                 # use the wwn to see if we can find the hostname
@@ -1100,7 +1105,7 @@ class HPE3PARCommon(object):
                 raise
 
         # try again with name retrieved from 3par
-        self.delete_vlun(volume, hostname, is_snap)
+        return self.delete_vlun(volume, hostname, is_snap)
 
     def build_nsp(self, portPos):
         return '%s:%s:%s' % (portPos['node'],
@@ -1341,24 +1346,23 @@ class HPE3PARCommon(object):
 
                 # make the 3PAR copy the contents.
                 # can't delete the original until the copy is done.
-                self._copy_volume(src_3par_vol_name, dst_3par_vol_name,
-                                  cpg=cpg, snap_cpg=snap_cpg,
-                                  tpvv=tpvv, tdvv=tdvv,
-                                  compression=compression)
+                # The caller tracks the copy task through copy_task_id.
+                dst_volume['copy_task_id'] = self._copy_volume(
+                    src_3par_vol_name, dst_3par_vol_name,
+                    cpg=cpg, snap_cpg=snap_cpg,
+                    tpvv=tpvv, tdvv=tdvv,
+                    compression=compression)
                 return dst_3par_vol_name
             else:
                 # The size of the new volume is different, so we have to
-                # copy the volume and wait.  Do the resize after the copy
-                # is complete.
+                # copy the volume and wait.  The copy is started by the
+                # caller through start_offline_copy, which returns as soon
+                # as the copy task is created.
                 LOG.debug("Creating a clone of volume, using offline copy.")
 
                 # we first have to create the destination volume
                 self.create_volume(dst_volume)
-
-                optional = {'priority': 1}
-                self.client.copyVolume(src_3par_vol_name,
-                                       dst_3par_vol_name, None,
-                                       optional=optional)
+                dst_volume['offline_copy'] = True
 
                 comments = {'volume_id': dst_volume['id'],
                             'name': dst_volume['name'],
@@ -1378,6 +1382,27 @@ class HPE3PARCommon(object):
             LOG.error("Exception: %s", ex)
             raise exception.PluginException(ex)
 
+    def start_offline_copy(self, dst_volume, src_vref):
+        """Starts copying src_vref into the clone dst_volume
+
+        Returns the id of the copy task.
+        """
+        dst_3par_vol_name = utils.get_3par_vol_name(dst_volume['id'])
+        src_3par_vol_name = utils.get_3par_vol_name(src_vref['id'])
+        LOG.info('Starting offline copy of volume %(src)s to %(dest)s.',
+                 {'src': src_3par_vol_name, 'dest': dst_3par_vol_name})
+        try:
+            optional = {'priority': 1}
+            body = self.client.copyVolume(src_3par_vol_name,
+                                          dst_3par_vol_name, None,
+                                          optional=optional)
+            return body['taskid']
+        except hpeexceptions.HTTPForbidden:
+            raise exception.NotAuthorized()
+        except Exception as ex:
+            LOG.error("Exception: %s", ex)
+            raise exception.PluginException(ex)
+
     def _copy_volume(self, src_name, dest_name, cpg, snap_cpg=None,
                      tpvv=True, tdvv=False, compression=None):
         # Virtual volume sets are not supported with the -online option
@@ -26,6 +26,7 @@ Set the following in the hpe.conf file to enable the
 hpedockerplugin_driver = hpe.hpe_3par_fc.HPE3PARFCDriver
 """
 
+import contextlib
 
 try:
     from hpe3parclient import exceptions as hpeexceptions
@@ -34,10 +35,13 @@ except ImportError:
 
 from oslo_log import log as logging
 
+from hpedockerplugin import admission_control
 from hpedockerplugin import exception
 # from hpedockerplugin.i18n import _, _LI, _LW, _LE
 from hpedockerplugin.i18n import _, _LE
 from hpedockerplugin.hpe import hpe_3par_common as hpecommon
+from hpedockerplugin.hpe import session_pool
+from hpedockerplugin.hpe import task_tracker
 from oslo_utils.excutils import save_and_reraise_exception
 
 LOG = logging.getLogger(__name__)
@@ -64,19 +68,35 @@ class HPE3PARFCDriver(object):
         self.src_bkend_config = src_bkend_config
         self.tgt_bkend_config = tgt_bkend_config
 
+        self._session_pool = session_pool.WSAPISessionPool(
+            src_bkend_config.hpe3par_api_url, self._create_session,
+            src_bkend_config.hpe3par_max_sessions,
+            src_bkend_config.hpe3par_session_idle_timeout,
+            admission_control.get_controller(
+                src_bkend_config).observe_wsapi_latency)
+        self._task_tracker = task_tracker.TaskTracker(
+            src_bkend_config.hpe3par_api_url, self._task_session,
+            src_bkend_config.hpe3par_task_poll_interval)
+
     def _init_common(self):
         return hpecommon.HPE3PARCommon(self._host_config,
                                        self.src_bkend_config,
                                        self.tgt_bkend_config)
 
-    def _login(self):
+    def _create_session(self):
         common = self._init_common()
         common.do_setup()
         common.client_login()
         return common
 
-    def _logout(self, common):
-        common.client_logout()
+    @contextlib.contextmanager
+    def _task_session(self):
+        with self._session_pool.session() as common:
+            yield common.client
+
+    def track_task(self, task_id, on_progress=None):
+        """Returns a future completed with the task once it is finished"""
+        return self._task_tracker.track(task_id, on_progress)
 
     def _check_flags(self, common):
         required_flags = ['hpe3par_api_url', 'hpe3par_username',
@@ -95,32 +115,24 @@ class HPE3PARFCDriver(object):
         pass
 
     def create_volume(self, volume):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.create_volume(volume)
-        finally:
-            self._logout(common)
 
     def delete_volume(self, volume, is_snapshot=False):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             common.delete_volume(volume, is_snapshot)
-        finally:
-            self._logout(common)
+
+    def update_volume_comment(self, volume):
+        with self._session_pool.session() as common:
+            common.update_volume_comment(volume)
 
     def get_snapcpg(self, volume, is_snap):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_snapcpg(volume, is_snap)
-        finally:
-            self._logout(common)
 
     def get_cpg(self, volume, is_snap, allowSnap=False):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_cpg(volume, is_snap, allowSnap)
-        finally:
-            self._logout(common)
 
     def initialize_connection(self, volume, connector, is_snap):
         """Assigns the volume to a server.
@@ -161,8 +173,7 @@ class HPE3PARFCDriver(object):
           * Create a VLUN for that HOST with the volume we want to export.
 
         """
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             # we have to make sure we have a host
             host = self._create_host(common, volume, connector, is_snap)
             target_wwns, init_targ_map, numPaths = \
@@ -221,13 +232,10 @@ class HPE3PARFCDriver(object):
             encryption_key_id = volume.get('encryption_key_id', None)
             info['data']['encrypted'] = encryption_key_id is not None
             return info
-        finally:
-            self._logout(common)
 
     def terminate_connection(self, volume, connector, is_snap, **kwargs):
         """Driver entry point to unattach a volume from an instance."""
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             hostname = common._safe_hostname(connector['host'])
             common.terminate_connection(volume, hostname, is_snap,
                                         wwn=connector['wwpns'])
@@ -249,9 +257,6 @@ class HPE3PARFCDriver(object):
             #                    'initiator_target_map': init_targ_map}
             return info
 
-        finally:
-            self._logout(common)
-
     def _build_initiator_target_map(self, common, connector):
         """Build the target_wwns and the initiator target map."""
 
@@ -391,176 +396,108 @@ class HPE3PARFCDriver(object):
             return hostname
 
     def create_snapshot(self, snapshot):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.create_snapshot(snapshot)
-        finally:
-            self._logout(common)
 
     def revert_snap_to_vol(self, volume, snapshot):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             common.revert_snap_to_vol(volume, snapshot)
-        finally:
-            self._logout(common)
 
     def create_cloned_volume(self, volume, src_vref):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.create_cloned_volume(volume, src_vref)
-        finally:
-            self._logout(common)
+
+    def start_offline_copy(self, volume, src_vref):
+        with self._session_pool.session() as common:
+            return common.start_offline_copy(volume, src_vref)
 
     def get_snapshots_by_vol(self, vol_id, snap_cpg):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_snapshots_by_vol(vol_id, snap_cpg)
-        finally:
-            self._logout(common)
 
     def get_qos_detail(self, vvset):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_qos_detail(vvset)
-        finally:
-            self._logout(common)
 
     def get_vvset_detail(self, vvset):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_vvset_detail(vvset)
-        finally:
-            self._logout(common)
 
     def get_vvset_from_volume(self, volume):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_vvset_from_volume(volume)
-        finally:
-            self._logout(common)
 
     def get_volume_detail(self, volume):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_volume_detail(volume)
-        finally:
-            self._logout(common)
 
     def manage_existing(self, volume, existing_ref_details, is_snap=False,
                         target_vol_name=None, comment=None):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.manage_existing(
                 volume, existing_ref_details, is_snap=is_snap,
                 target_vol_name=target_vol_name, comment=comment)
-        finally:
-            self._logout(common)
 
     def create_vvs(self, id):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.create_vvs(id)
-        finally:
-            self._logout(common)
 
     def delete_vvset(self, id):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.delete_vvset(id)
-        finally:
-            self._logout(common)
 
     def add_volume_to_volume_set(self, vol, vvs_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.add_volume_to_volume_set(vol, vvs_name)
-        finally:
-            self._logout(common)
 
     def remove_volume_from_volume_set(self, vol_name, vvs_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.remove_volume_from_volume_set(vol_name, vvs_name)
-        finally:
-            self._logout(common)
 
     def set_flash_cache_policy_on_vvs(self, flash_cache, vvs_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.set_flash_cache_policy_on_vvs(flash_cache,
                                                         vvs_name)
-        finally:
-            self._logout(common)
 
     def force_remove_volume_vlun(self, vol_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.force_remove_volume_vlun(vol_name)
-        finally:
-            self._logout(common)
 
     def add_volume_to_rcg(self, **kwargs):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.add_volume_to_rcg(**kwargs)
-        finally:
-            self._logout(common)
 
     def remove_volume_from_rcg(self, **kwargs):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.remove_volume_from_rcg(**kwargs)
-        finally:
-            self._logout(common)
 
     def create_rcg(self, **kwargs):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.create_rcg(**kwargs)
-        finally:
-            self._logout(common)
 
     def delete_rcg(self, **kwargs):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.delete_rcg(**kwargs)
-        finally:
-            self._logout(common)
 
     def force_remove_3par_schedule(self, schedule_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.force_remove_3par_schedule(schedule_name)
-        finally:
-            self._logout(common)
 
     def create_snap_schedule(self, src_vol_name, schedName, snapPrefix,
                              exphrs, rethrs, schedFrequency):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.create_snap_schedule(src_vol_name, schedName,
                                                snapPrefix, exphrs, rethrs,
                                                schedFrequency)
-        finally:
-            self._logout(common)
 
     def get_rcg(self, rcg_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_rcg(rcg_name)
-        finally:
-            self._logout(common)
 
     def is_vol_having_active_task(self, vol_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.is_vol_having_active_task(vol_name)
-        finally:
-            self._logout(common)
 
     def get_domain(self, cpg_name):
-        common = self._login()
-        try:
+        with self._session_pool.session() as common:
             return common.get_domain(cpg_name)
-        finally:
-            self._logout(common)
@@ -16,13 +16,17 @@
 This 'mediator' de-couples the 3PAR focused client from the OpenStack focused
 driver.
 """
+import contextlib
+import threading
+
 import six
 
 from oslo_log import log
-from oslo_service import loopingcall
 from oslo_utils import importutils
 
 from hpedockerplugin import exception
+from hpedockerplugin.hpe import session_pool
+from hpedockerplugin.hpe import task_tracker
 from hpedockerplugin.i18n import _
 
 hpe3parclient = importutils.try_import("hpe3parclient")
@@ -71,8 +75,21 @@ class HPE3ParMediator(object):
     def __init__(self, host_config, config):
         self._host_config = host_config
         self._config = config
-        self._client = None
         self.client_version = None
+        # WSAPI sessions are kept logged in and reused across calls. A
+        # thread holds one from its first call until the last one nested
+        # in it, or in its unit of work, returns
+        self._session_pool = session_pool.FilePersonaSessionPool(
+            config.hpe3par_api_url, self._create_session,
+            config.hpe3par_max_sessions,
+            config.hpe3par_session_idle_timeout)
+        self._thread_session = threading.local()
+        # Client used only by the task tracker, kept logged in between polls
+        self._task_client = None
+        self._task_logged_in = False
+        self._task_tracker = task_tracker.TaskTracker(
+            config.hpe3par_api_url, self._task_session,
+            config.hpe3par_task_poll_interval)
 
     @staticmethod
     def no_client():
@@ -82,6 +99,46 @@ class HPE3ParMediator(object):
         return file_client.HPE3ParFilePersonaClient(
             self._config.hpe3par_api_url)
 
+    def _create_session(self):
+        try:
+            client = self._create_client()
+        except Exception as e:
+            msg = (_('Failed to connect to HPE 3PAR File Persona Client: %s') %
+                   six.text_type(e))
+            LOG.exception(msg)
+            raise exception.ShareBackendException(message=msg)
+
+        try:
+            # Share the SSH connections to the array with the block drivers
+            client.ssh = session_pool.get_ssh_client(
+                self._host_config, self._config)
+        except Exception as e:
+            msg = (_('Failed to set SSH options for HPE 3PAR File Persona '
+                     'Client: %s') % six.text_type(e))
+            LOG.exception(msg)
+            raise exception.ShareBackendException(message=msg)
+
+        if self._config.hpe3par_debug:
+            client.debug_rest(True)  # Includes SSH debug (setSSH above)
+
+        try:
+            client.login(self._config.hpe3par_username,
+                         self._config.hpe3par_password)
+        except Exception as e:
+            msg = (_("Failed to Login to 3PAR (%(url)s) as %(user)s "
+                     "because: %(err)s") %
+                   {'url': self._config.hpe3par_api_url,
+                    'user': self._config.hpe3par_username,
+                    'err': six.text_type(e)})
+            LOG.error(msg)
+            raise exception.ShareBackendException(msg=msg)
+        return client
+
+    @property
+    def _client(self):
+        """Client of the WSAPI session held by the calling thread"""
+        return getattr(self._thread_session, 'client', None)
+
     def do_setup(self, timeout=30):
 
         if self.no_client():
@@ -104,99 +161,139 @@ class HPE3ParMediator(object):
             raise exception.HPE3ParInvalidClient(message=msg)
 
         try:
-            self._client = self._create_client()
+            self._task_client = self._create_client()
         except Exception as e:
             msg = (_('Failed to connect to HPE 3PAR File Persona Client: %s') %
                    six.text_type(e))
             LOG.exception(msg)
             raise exception.ShareBackendException(message=msg)
 
-        try:
-            ssh_kwargs = {}
-            if self._config.san_ssh_port:
-                ssh_kwargs['port'] = self._config.san_ssh_port
-            if self._config.ssh_conn_timeout:
-                ssh_kwargs['conn_timeout'] = self._config.ssh_conn_timeout
-            if self._config.san_private_key:
-                ssh_kwargs['privatekey'] = \
-                    self._config.san_private_key
-
-            self._client.setSSHOptions(
-                self._config.san_ip,
-                self._config.san_login,
-                self._config.san_password,
-                **ssh_kwargs
-            )
-
-        except Exception as e:
-            msg = (_('Failed to set SSH options for HPE 3PAR File Persona '
-                     'Client: %s') % six.text_type(e))
-            LOG.exception(msg)
-            raise exception.ShareBackendException(message=msg)
-
         LOG.info("HPE3ParMediator %(version)s, "
                  "hpe3parclient %(client_version)s",
                  {"version": self.VERSION,
                   "client_version": hpe3parclient.get_version_string()})
 
-        try:
-            wsapi_version = self._client.getWsApiVersion()['build']
-            LOG.info("3PAR WSAPI %s", wsapi_version)
-        except Exception as e:
-            msg = (_('Failed to get 3PAR WSAPI version: %s') %
-                   six.text_type(e))
-            LOG.exception(msg)
-            raise exception.ShareBackendException(message=msg)
+        # Opens the first session of the pool
+        with self.unit_of_work():
+            try:
+                wsapi_version = self._client.getWsApiVersion()['build']
+                LOG.info("3PAR WSAPI %s", wsapi_version)
+            except Exception as e:
+                msg = (_('Failed to get 3PAR WSAPI version: %s') %
+                       six.text_type(e))
+                LOG.exception(msg)
+                raise exception.ShareBackendException(message=msg)
 
-        if self._config.hpe3par_debug:
-            self._client.debug_rest(True)  # Includes SSH debug (setSSH above)
+    @contextlib.contextmanager
+    def unit_of_work(self):
+        """Runs all the mediator calls made in the block on one session
 
-    def _wsapi_login(self):
-        try:
-            self._client.login(self._config.hpe3par_username,
-                               self._config.hpe3par_password)
-        except Exception as e:
-            msg = (_("Failed to Login to 3PAR (%(url)s) as %(user)s "
-                     "because: %(err)s") %
-                   {'url': self._config.hpe3par_api_url,
-                    'user': self._config.hpe3par_username,
-                    'err': six.text_type(e)})
-            LOG.error(msg)
-            raise exception.ShareBackendException(msg=msg)
+        Calls made on the calling thread within the block reuse the
+        session instead of each borrowing one from the pool.
+        """
+        with self._wsapi_session():
+            yield
+
+    @contextlib.contextmanager
+    def _wsapi_session(self):
+        """Runs the block on the session bound to the calling thread
 
-    def _wsapi_logout(self):
+        An error raised by the block is what decides whether the session
+        can go back to the pool, not whatever the caller may be handling.
+        """
+        self._wsapi_login()
+        error = None
         try:
-            self._client.http.unauthenticate()
-        except Exception as e:
-            msg = ("Failed to Logout from 3PAR (%(url)s) because %(err)s")
-            LOG.warning(msg, {'url': self._config.hpe3par_api_url,
-                              'err': six.text_type(e)})
-            # don't raise exception on logout()
+            yield
+        except Exception as ex:
+            error = ex
+            raise
+        finally:
+            self._wsapi_logout(error)
 
-    def get_fpgs(self, filter):
+    def _wsapi_login(self):
+        """Binds a logged in session from the pool to the calling thread
+
+        Nested calls reuse the session bound by the outermost one.
+        """
+        depth = getattr(self._thread_session, 'depth', 0)
+        if not depth:
+            self._thread_session.client = self._session_pool.get()
+        self._thread_session.depth = depth + 1
+
+    def _wsapi_logout(self, error=None):
+        """Returns the session of the calling thread to the pool
+
+        once the outermost call that bound it is done. An error raised by
+        any of the nested calls is kept until then, even if an outer call
+        handled it. A call whose login failed has nothing to return.
+        """
+        depth = getattr(self._thread_session, 'depth', 0)
+        if not depth:
+            return
+        if error is not None:
+            self._thread_session.error = error
+        self._thread_session.depth = depth - 1
+        if depth == 1:
+            client = self._thread_session.client
+            error = getattr(self._thread_session, 'error', None)
+            self._thread_session.client = None
+            self._thread_session.error = None
+            self._session_pool.put(client, error=error)
+
+    @contextlib.contextmanager
+    def _session_released(self):
+        """Lends the session of the calling thread back to the pool
+
+        for the duration of the block, e.g. while waiting minutes for a
+        backend task, and binds a session again afterwards.
+        """
+        depth = getattr(self._thread_session, 'depth', 0)
+        if not depth:
+            yield
+            return
+        self._thread_session.depth = 1
+        self._wsapi_logout()
         try:
+            yield
+        finally:
             self._wsapi_login()
+            self._thread_session.depth = depth
+
+    @contextlib.contextmanager
+    def _task_session(self):
+        if not self._task_logged_in:
+            self._task_client.login(self._config.hpe3par_username,
+                                    self._config.hpe3par_password)
+            self._task_logged_in = True
+        try:
+            yield self._task_client
+        except Exception:
+            # Start over with a new session on the next poll
+            self._task_logged_in = False
+            try:
+                self._task_client.http.unauthenticate()
+            except Exception:
+                pass
+            raise
+
+    def get_fpgs(self, filter):
+        with self._wsapi_session():
             uri = '/fpgs?query="name EQ %s"' % filter
             resp, body = self._client.http.get(uri)
             return body['members'][0]
-        finally:
-            self._wsapi_logout()
 
     def get_fpg(self, fpg_name):
-        try:
-            self._wsapi_login()
+        with self._wsapi_session():
             uri = '/fpgs?query="name EQ %s"' % fpg_name
             resp, body = self._client.http.get(uri)
             if not body['members']:
                 LOG.info("FPG %s not found" % fpg_name)
                 raise exception.FpgNotFound(fpg=fpg_name)
             return body['members'][0]
-        finally:
-            self._wsapi_logout()
 
     def get_vfs(self, fpg_name):
-        try:
-            self._wsapi_login()
+        with self._wsapi_session():
             uri = '/virtualfileservers?query="fpg EQ %s"' % fpg_name
             resp, body = self._client.http.get(uri)
             if not body['members']:
@@ -204,17 +301,30 @@ class HPE3ParMediator(object):
                 LOG.info(msg)
                 raise exception.ShareBackendException(msg=msg)
             return body['members'][0]
-        finally:
-            self._wsapi_logout()
 
     def get_all_vfs(self):
-        try:
-            self._wsapi_login()
+        with self._wsapi_session():
             uri = '/virtualfileservers'
             resp, body = self._client.http.get(uri)
             return body['members']
-        finally:
-            self._wsapi_logout()
+
+    def get_all_fpgs(self):
+        with self._wsapi_session():
+            uri = '/fpgs'
+            resp, body = self._client.http.get(uri)
+            return body['members']
+
+    def get_all_quotas(self):
+        uri = '/filepersonaquotas'
+        try:
+            with self._wsapi_session():
+                resp, body = self._client.http.get(uri)
+                return body['members']
+        except Exception as ex:
+            msg = "mediator:get_all_quotas - failed to get quotas " \
+                  "from the backend. Exception: %s" % six.text_type(ex)
+            LOG.error(msg)
+            raise exception.ShareBackendException(msg=msg)
 
     @staticmethod
     def _get_nfs_options(proto_opts, readonly):
@@ -256,40 +366,36 @@ class HPE3ParMediator(object):
 
     def delete_file_store(self, fpg_name, fstore_name):
         try:
-            self._wsapi_login()
-            query = '/filestores?query="name EQ %s AND fpg EQ %s"' %\
-                    (fstore_name, fpg_name)
-            body, fstore = self._client.http.get(query)
-            if body['status'] == '200' and fstore['total'] == 1:
-                fstore_id = fstore['members'][0]['id']
-                del_uri = '/filestores/%s' % fstore_id
-                self._client.http.delete(del_uri)
+            with self._wsapi_session():
+                query = '/filestores?query="name EQ %s AND fpg EQ %s"' %\
+                        (fstore_name, fpg_name)
+                body, fstore = self._client.http.get(query)
+                if body['status'] == '200' and fstore['total'] == 1:
+                    fstore_id = fstore['members'][0]['id']
+                    del_uri = '/filestores/%s' % fstore_id
+                    self._client.http.delete(del_uri)
         except Exception:
             msg = (_('ERROR: File store deletion failed: [fstore: %s,'
                      'fpg:%s') % (fstore_name, fpg_name))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def delete_fpg(self, fpg_name):
         try:
-            self._wsapi_login()
-            query = '/fpgs?query="name EQ %s"' % fpg_name
-            resp, body = self._client.http.get(query)
-            if resp['status'] == '200' and body['total'] == 1:
-                fpg_id = body['members'][0]['id']
-                del_uri = '/fpgs/%s' % fpg_id
-                resp, body = self._client.http.delete(del_uri)
-                if resp['status'] == '202':
-                    task_id = body['taskId']
-                    self._wait_for_task_completion(task_id, 10)
+            with self._wsapi_session():
+                query = '/fpgs?query="name EQ %s"' % fpg_name
+                resp, body = self._client.http.get(query)
+                if resp['status'] == '200' and body['total'] == 1:
+                    fpg_id = body['members'][0]['id']
+                    del_uri = '/fpgs/%s' % fpg_id
+                    resp, body = self._client.http.delete(del_uri)
+                    if resp['status'] == '202':
+                        task_id = body['taskId']
+                        self._wait_for_task_completion(task_id)
         except Exception:
             msg = (_('ERROR: FPG deletion failed: [fpg: %s,') % fpg_name)
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def update_capacity_quotas(self, fstore, size, fpg, vfs):
 
@@ -310,23 +416,23 @@ class HPE3ParMediator(object):
             return self._client.http.post(uri, body=req_body)
 
         try:
-            self._wsapi_login()
-            resp, body = _sync_update_capacity_quotas(
-                fstore, size, fpg, vfs)
-            if resp['status'] != '201':
-                msg = (_('Failed to update capacity quota '
-                         '%(size)s on %(fstore)s') %
-                       {'size': size,
-                        'fstore': fstore})
-                LOG.error(msg)
-                raise exception.ShareBackendException(msg=msg)
-
-            href = body['links'][0]['href']
-            uri, quota_id = href.split('filepersonaquotas/')
-
-            LOG.debug("Quota successfully set: resp=%s, body=%s"
-                      % (resp, body))
-            return quota_id
+            with self._wsapi_session():
+                resp, body = _sync_update_capacity_quotas(
+                    fstore, size, fpg, vfs)
+                if resp['status'] != '201':
+                    msg = (_('Failed to update capacity quota '
+                             '%(size)s on %(fstore)s') %
+                           {'size': size,
+                            'fstore': fstore})
+                    LOG.error(msg)
+                    raise exception.ShareBackendException(msg=msg)
+
+                href = body['links'][0]['href']
+                uri, quota_id = href.split('filepersonaquotas/')
+
+                LOG.debug("Quota successfully set: resp=%s, body=%s"
+                          % (resp, body))
+                return quota_id
         except Exception as e:
             msg = (_('Failed to update capacity quota '
                      '%(size)s on %(fstore)s with exception: %(e)s') %
@@ -335,37 +441,31 @@ class HPE3ParMediator(object):
                     'e': six.text_type(e)})
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def remove_quota(self, quota_id):
         uri = '/filepersonaquotas/%s' % quota_id
         try:
-            self._wsapi_login()
-            self._client.http.delete(uri)
+            with self._wsapi_session():
+                self._client.http.delete(uri)
         except Exception as ex:
             msg = "mediator:remove_quota - failed to remove quota %s" \
                   "at the backend. Exception: %s" % \
                   (quota_id, six.text_type(ex))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def get_file_stores_for_fpg(self, fpg_name):
         uri = '/filestores?query="fpg EQ %s"' % fpg_name
         try:
-            self._wsapi_login()
-            resp, body = self._client.http.get(uri)
-            return body
+            with self._wsapi_session():
+                resp, body = self._client.http.get(uri)
+                return body
         except Exception as ex:
             msg = "mediator:get_file_shares - failed to get file stores " \
                   "for  FPG %s from the backend. Exception: %s" % \
                   (fpg_name, six.text_type(ex))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def shares_present_on_fpg(self, fpg_name):
         fstores = self.get_file_stores_for_fpg(fpg_name)
@@ -377,17 +477,15 @@ class HPE3ParMediator(object):
     def get_quotas_for_fpg(self, fpg_name):
         uri = '/filepersonaquotas?query="fpg EQ %s"' % fpg_name
         try:
-            self._wsapi_login()
-            resp, body = self._client.http.get(uri)
-            return body
+            with self._wsapi_session():
+                resp, body = self._client.http.get(uri)
+                return body
         except Exception as ex:
             msg = "mediator:get_quota - failed to get quotas for FPG %s" \
                   "from the backend. Exception: %s" % \
                   (fpg_name, six.text_type(ex))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def _create_share(self, share_details):
         fpg_name = share_details['fpg']
@@ -428,18 +526,15 @@ class HPE3ParMediator(object):
             raise exception.ShareBackendException(msg=msg)
 
     def create_share(self, share_details):
-        try:
-            self._wsapi_login()
+        with self._wsapi_session():
             return self._create_share(share_details)
-        finally:
-            self._wsapi_logout()
 
     def delete_share(self, share_id):
         LOG.info("Mediator:delete_share %s: Entering..." % share_id)
         uri = '/fileshares/%s' % share_id
         try:
-            self._wsapi_login()
-            self._client.http.delete(uri)
+            with self._wsapi_session():
+                self._client.http.delete(uri)
         except hpeexceptions.HTTPNotFound:
             LOG.warning("Share %s not found on backend" % share_id)
             pass
@@ -448,54 +543,40 @@ class HPE3ParMediator(object):
                   % (share_id, six.text_type(ex))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
-    def _wait_for_task_completion(self, task_id, interval=1):
+    def _wait_for_task_completion(self, task_id, on_progress=None):
         """This waits for a 3PAR background task complete or fail.
-        This looks for a task to get out of the 'active' state.
+        The task is polled along with the other outstanding tasks of the
+        array until it gets out of the 'active' state. on_progress(task)
+        is called on each poll that finds it still active.
         """
-
-        # Wait for the physical copy task to complete
-        def _wait_for_task(task_id, task_status):
-            status = self._client.getTask(task_id)
-            LOG.debug("3PAR Task id %(id)s status = %(status)s",
-                      {'id': task_id,
-                       'status': status['status']})
-            if status['status'] is not self._client.TASK_ACTIVE:
-                task_status.append(status)
-                raise loopingcall.LoopingCallDone()
-
-        task_status = []
-
-        timer = loopingcall.FixedIntervalLoopingCall(
-            _wait_for_task, task_id, task_status)
-        timer.start(interval=interval).wait()
-
-        if task_status[0]['status'] is not self._client.TASK_DONE:
-            msg = "ERROR: Task with id %d has failed with status %s" %\
-                  (task_id, task_status)
-            LOG.exception(msg)
+        with self._session_released():
+            task = self._task_tracker.wait(task_id, on_progress)
+        if task['status'] != self._task_client.TASK_DONE:
+            msg = "ERROR: Task with id %s has failed with status %s" %\
+                  (task_id, task)
+            LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
+        return task
 
-    def create_fpg(self, cpg, fpg_name, size=16):
+    def create_fpg(self, cpg, fpg_name, size=16, on_progress=None):
         try:
-            self._wsapi_login()
-            uri = '/fpgs/'
-            args = {
-                'name': fpg_name,
-                'cpg': cpg,
-                'sizeTiB': size,
-                'comment': 'Docker created FPG'
-            }
-            resp, body = self._client.http.post(uri, body=args)
-
-            LOG.info("Create FPG Response: %s" % six.text_type(resp))
-            LOG.info("Create FPG Response Body: %s" % six.text_type(body))
-
-            task_id = body.get('taskId')
-            if task_id:
-                self._wait_for_task_completion(task_id, interval=10)
+            with self._wsapi_session():
+                uri = '/fpgs/'
+                args = {
+                    'name': fpg_name,
+                    'cpg': cpg,
+                    'sizeTiB': size,
+                    'comment': 'Docker created FPG'
+                }
+                resp, body = self._client.http.post(uri, body=args)
+
+                LOG.info("Create FPG Response: %s" % six.text_type(resp))
+                LOG.info("Create FPG Response Body: %s" % six.text_type(body))
+
+                task_id = body.get('taskId')
+                if task_id:
+                    self._wait_for_task_completion(task_id, on_progress)
         except hpeexceptions.HTTPBadRequest as ex:
             error_code = ex.get_code()
             LOG.error("Exception: %s" % six.text_type(ex))
@@ -525,11 +606,9 @@ class HPE3ParMediator(object):
                      'Exception: %s') % (fpg_name, size, cpg, ex))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def create_vfs(self, vfs_name, ip, subnet, cpg=None, fpg=None,
-                   size=16):
+                   size=16, on_progress=None):
         uri = '/virtualfileservers/'
         ip_info = {
             'IPAddr': ip,
@@ -542,43 +621,40 @@ class HPE3ParMediator(object):
             'fpg': fpg,
             'comment': 'Docker created VFS'
         }
-        try:
-            self._wsapi_login()
-            resp, body = self._client.http.post(uri, body=args)
-            if resp['status'] != '202':
-                msg = 'Create VFS task failed: vfs=%s, cpg=%s,fpg=%s' \
-                      % (vfs_name, cpg, fpg)
+        with self._wsapi_session():
+            try:
+                resp, body = self._client.http.post(uri, body=args)
+                if resp['status'] != '202':
+                    msg = 'Create VFS task failed: vfs=%s, cpg=%s,fpg=%s' \
+                          % (vfs_name, cpg, fpg)
+                    LOG.exception(msg)
+                    raise exception.ShareBackendException(msg=msg)
+
+                task_id = body['taskId']
+                task = self._wait_for_task_completion(task_id, on_progress)
+                LOG.info("Created VFS '%s' successfully" % vfs_name)
+            except exception.ShareBackendException as ex:
+                msg = 'Create VFS task failed: vfs=%s, cpg=%s,fpg=%s, ex=%s'\
+                      % (vfs_name, cpg, fpg, six.text_type(ex))
                 LOG.exception(msg)
                 raise exception.ShareBackendException(msg=msg)
 
-            task_id = body['taskId']
-            self._wait_for_task_completion(task_id, interval=3)
-            LOG.info("Created VFS '%s' successfully" % vfs_name)
-        except exception.ShareBackendException as ex:
-            msg = 'Create VFS task failed: vfs=%s, cpg=%s,fpg=%s, ex=%s'\
-                  % (vfs_name, cpg, fpg, six.text_type(ex))
-            LOG.exception(msg)
-            raise exception.ShareBackendException(msg=msg)
-
-        except Exception:
-            msg = (_('ERROR: VFS creation failed: [vfs: %s, ip:%s, subnet:%s,'
-                     'cpg:%s, fpg:%s, size=%s') % (vfs_name, ip, subnet, cpg,
-                                                   fpg, size))
-            LOG.exception(msg)
-            raise exception.ShareBackendException(msg=msg)
-        else:
-            self._check_vfs_status(task_id, fpg)
-        finally:
-            self._wsapi_logout()
+            except Exception:
+                msg = (_('ERROR: VFS creation failed: [vfs: %s, ip:%s, '
+                         'subnet:%s,cpg:%s, fpg:%s, size=%s') %
+                       (vfs_name, ip, subnet, cpg, fpg, size))
+                LOG.exception(msg)
+                raise exception.ShareBackendException(msg=msg)
+            else:
+                self._check_vfs_status(task, fpg)
 
-    def _check_vfs_status(self, task_id, fpg):
+    def _check_vfs_status(self, task, fpg):
         LOG.info("Checking status of VFS under FPG %s..." % fpg)
         vfs = self.get_vfs(fpg)
         overall_state = vfs['overallState']
 
         if overall_state != TASK_STATUS_NORMAL:
             LOG.info("Overall state of VFS is not normal")
-            task = self._client.getTask(task_id)
             detailed_status = task['detailedStatus']
             lines = detailed_status.split('\n')
             error_line = ''
@@ -622,20 +698,18 @@ class HPE3ParMediator(object):
         }
         LOG.info("ACL args being passed is %s  ", args)
         try:
-            self._wsapi_login()
-            uri = '/fileshares/' + fUserId + '/dirperms'
+            with self._wsapi_session():
+                uri = '/fileshares/' + fUserId + '/dirperms'
 
-            self._client.http.put(uri, body=args)
+                self._client.http.put(uri, body=args)
 
-            LOG.debug("Share permissions changed successfully")
+                LOG.debug("Share permissions changed successfully")
 
         except hpeexceptions.HTTPBadRequest as ex:
             msg = (_("File share permission change failed. Exception %s : ")
                    % six.text_type(ex))
             LOG.error(msg)
             raise exception.ShareBackendException(msg=msg)
-        finally:
-            self._wsapi_logout()
 
     def _check_usr_grp_existence(self, fUserOwner, res_cmd):
         fuserowner = str(fUserOwner)
@@ -663,23 +737,25 @@ class HPE3ParMediator(object):
         LOG.info("I am inside usr_check")
         cmd1 = ['showfsuser']
         cmd2 = ['showfsgroup']
-        try:
-            LOG.info("Executing first command: %s..." % cmd1)
-            cmd1.append('\r')
-            res_cmd1 = self._client._run(cmd1)
-            LOG.info("Resp: %s" % res_cmd1)
-            f_user_name = self._check_usr_grp_existence(fUser, res_cmd1)
-            LOG.info("Executing second command: %s..." % cmd2)
-            cmd2.append('\r')
-            res_cmd2 = self._client._run(cmd2)
-            LOG.info("Resp: %s" % res_cmd2)
-            f_group_name = self._check_usr_grp_existence(fGroup, res_cmd2)
-            return f_user_name, f_group_name
-        except hpeexceptions.SSHException as ex:
-            msg = (_('Failed to get the corresponding user and group name '
-                     'reason is %s:') % six.text_type(ex))
-            LOG.error(msg)
-            raise exception.ShareBackendException(msg=msg)
+        with self._wsapi_session():
+            try:
+                # The commands run over SSH on the client of a session
+                LOG.info("Executing first command: %s..." % cmd1)
+                cmd1.append('\r')
+                res_cmd1 = self._client._run(cmd1)
+                LOG.info("Resp: %s" % res_cmd1)
+                f_user_name = self._check_usr_grp_existence(fUser, res_cmd1)
+                LOG.info("Executing second command: %s..." % cmd2)
+                cmd2.append('\r')
+                res_cmd2 = self._client._run(cmd2)
+                LOG.info("Resp: %s" % res_cmd2)
+                f_group_name = self._check_usr_grp_existence(fGroup, res_cmd2)
+                return f_user_name, f_group_name
+            except hpeexceptions.SSHException as ex:
+                msg = (_('Failed to get the corresponding user and group name '
+                         'reason is %s:') % six.text_type(ex))
+                LOG.error(msg)
+                raise exception.ShareBackendException(msg=msg)
 
     def add_client_ip_for_share(self, share_id, client_ip):
         uri = '/fileshares/%s' % share_id
@@ -688,15 +764,13 @@ class HPE3ParMediator(object):
             'nfsClientlist': [client_ip]
         }
         try:
-            self._wsapi_login()
-            self._client.http.put(uri, body=body)
+            with self._wsapi_session():
+                self._client.http.put(uri, body=body)
         except hpeexceptions.HTTPBadRequest as ex:
             msg = (_("It is first mount request but ip is already"
                      " added to the share. Exception %s : ")
                    % six.text_type(ex))
             LOG.info(msg)
-        finally:
-            self._wsapi_logout()
 
     def remove_client_ip_for_share(self, share_id, client_ip):
         uri = '/fileshares/%s' % share_id
@@ -704,8 +778,5 @@ class HPE3ParMediator(object):
             'nfsClientlistOperation': 2,
             'nfsClientlist': [client_ip]
         }
-        try:
-            self._wsapi_login()
+        with self._wsapi_session():
             self._client.http.put(uri, body=body)
-        finally:
-            self._wsapi_logout()
@@ -0,0 +1,108 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+import time
+
+from oslo_log import log as logging
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30
+
+
+class RcgStateCache(object):
+    """Active array of each remote copy group
+
+    Finding the active array of an Active/Passive RCG takes a login to
+    both arrays and a fetch of both copies of the RCG. The volumes of an
+    RCG share its active array, so it is resolved once per RCG and kept
+    for ttl seconds. Lookups made in the second half of the ttl return
+    the cached array and resolve it again in the background.
+
+    resolve(rcg_info) returns the active array. It raises when the RCG
+    cannot be fetched or is in transition, in which case nothing is
+    cached and the error reaches the caller. Callers also invalidate
+    the entry of an RCG on any error from the array it resolved to.
+    A ttl of 0 disables caching.
+    """
+    def __init__(self, name, resolve, ttl=DEFAULT_TTL):
+        self._name = name
+        self._resolve = resolve
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # local RCG name -> (active array, resolved at)
+        self._entries = {}
+        self._refreshing = set()
+        # local RCG name -> number of times its entry was invalidated
+        self._generations = {}
+
+    def get_active(self, rcg_info):
+        if not self._ttl:
+            return self._resolve(rcg_info)
+
+        rcg_name = rcg_info.get('local_rcg_name')
+        with self._lock:
+            entry = self._entries.get(rcg_name)
+            refresh = False
+            if entry:
+                age = time.time() - entry[1]
+                if age >= self._ttl:
+                    entry = None
+                elif age >= self._ttl / 2.0 and \
+                        rcg_name not in self._refreshing:
+                    self._refreshing.add(rcg_name)
+                    refresh = True
+
+        if entry is None:
+            return self._resolve_and_store(rcg_name, rcg_info)
+        if refresh:
+            thread = threading.Thread(target=self._refresh,
+                                      args=(rcg_name, rcg_info),
+                                      name='%s-rcg-state' % self._name)
+            thread.daemon = True
+            thread.start()
+        return entry[0]
+
+    def invalidate(self, rcg_name):
+        with self._lock:
+            self._entries.pop(rcg_name, None)
+            self._generations[rcg_name] = \
+                self._generations.get(rcg_name, 0) + 1
+
+    def _resolve_and_store(self, rcg_name, rcg_info):
+        with self._lock:
+            generation = self._generations.get(rcg_name, 0)
+        try:
+            active = self._resolve(rcg_info)
+        except Exception:
+            self.invalidate(rcg_name)
+            raise
+        with self._lock:
+            # An array resolved before the entry was invalidated may be
+            # the one that just failed, so it is not cached
+            if self._generations.get(rcg_name, 0) == generation:
+                self._entries[rcg_name] = (active, time.time())
+        return active
+
+    def _refresh(self, rcg_name, rcg_info):
+        try:
+            self._resolve_and_store(rcg_name, rcg_info)
+        except Exception as ex:
+            LOG.warning("Failed to refresh the state of remote copy group "
+                        "%s: %s" % (rcg_name, six.text_type(ex)))
+        finally:
+            with self._lock:
+                self._refreshing.discard(rcg_name)
@@ -0,0 +1,300 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import contextlib
+import threading
+import time
+
+from oslo_log import log as logging
+from oslo_utils import importutils
+import six
+
+from hpedockerplugin import exception
+
+hpe3parclient = importutils.try_import("hpe3parclient")
+if hpe3parclient:
+    from hpe3parclient import exceptions as hpeexceptions
+    from hpe3parclient import ssh
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 4
+DEFAULT_SESSION_IDLE_TIMEOUT = 300
+DEFAULT_MAX_SSH_SESSIONS = 2
+DEFAULT_SSH_KEEPALIVE_INTERVAL = 30
+
+# SSH pools are shared by all drivers and mediators talking to an array
+_ssh_pools = {}
+_ssh_pools_lock = threading.Lock()
+
+
+class SessionPool(object):
+    """Bounded pool of long-lived sessions to a 3PAR array
+
+    At most max_sessions are handed out at a time, callers beyond that
+    wait for a session to be returned. Sessions that sat unused for
+    longer than idle_timeout, or that fail the health check of the pool,
+    are closed instead of being reused.
+    """
+    def __init__(self, name, create_session, max_sessions=None,
+                 idle_timeout=None):
+        self._name = name
+        self._create_session = create_session
+        self._max_sessions = max_sessions or DEFAULT_MAX_SESSIONS
+        self._idle_timeout = idle_timeout or DEFAULT_SESSION_IDLE_TIMEOUT
+        self._slots = threading.BoundedSemaphore(self._max_sessions)
+        self._lock = threading.Lock()
+        # (session, time returned to the pool), most recently used last
+        self._idle = collections.deque()
+
+    def get(self):
+        self._slots.acquire()
+        try:
+            session = self._get_idle_session()
+            if session is None:
+                LOG.debug("Creating new session for %s" % self._name)
+                session = self._create_session()
+            return session
+        except Exception:
+            self._slots.release()
+            raise
+
+    def put(self, session, error=None):
+        """Return a session to the pool
+
+        error is the exception raised while the session was in use, if
+        any. A session it may have left broken is closed instead.
+        """
+        if error is not None and not self._is_reusable(session, error):
+            LOG.info("Closing session of %s after %s"
+                     % (self._name, type(error).__name__))
+            self.discard(session)
+            return
+        with self._lock:
+            self._idle.append((session, time.time()))
+        self._slots.release()
+
+    def discard(self, session):
+        """Return a session that must not be reused"""
+        self._close_quietly(session)
+        self._slots.release()
+
+    @contextlib.contextmanager
+    def session(self):
+        session = self.get()
+        try:
+            yield session
+        except Exception as ex:
+            self.put(session, error=ex)
+            raise
+        else:
+            self.put(session)
+
+    def close(self):
+        with self._lock:
+            sessions = [s for s, returned_at in self._idle]
+            self._idle.clear()
+        for session in sessions:
+            self._close_quietly(session)
+
+    def _get_idle_session(self):
+        stale = []
+        session = None
+        now = time.time()
+        with self._lock:
+            while self._idle and \
+                    now - self._idle[0][1] > self._idle_timeout:
+                stale.append(self._idle.popleft()[0])
+            while self._idle and session is None:
+                session = self._idle.pop()[0]
+                if not self._is_usable(session):
+                    stale.append(session)
+                    session = None
+        for s in stale:
+            self._close_quietly(s)
+        return session
+
+    def _is_usable(self, session):
+        return True
+
+    def _is_reusable(self, session, error):
+        return self._is_usable(session)
+
+    def _close(self, session):
+        raise NotImplementedError()
+
+    def _close_quietly(self, session):
+        try:
+            self._close(session)
+        except Exception as ex:
+            LOG.info("Ignoring failure to close session of %s: %s"
+                     % (self._name, six.text_type(ex)))
+
+
+class WSAPISessionPool(SessionPool):
+    """Keeps logged in WSAPI sessions alive across driver operations
+
+    A session is whatever create_session returns - for the block drivers
+    an HPE3PARCommon whose client has already fetched the WSAPI version
+    and logged in. Expired WSAPI session keys are renewed by hpe3parclient
+    itself, which re-authenticates and retries a request that fails with
+    401/403.
+
+    hpe3parclient records the timing of every request a client makes.
+    These are handed to latency_observer, if given, and cleared each time
+    a session is returned to the pool.
+    """
+    def __init__(self, name, create_session, max_sessions=None,
+                 idle_timeout=None, latency_observer=None):
+        super(WSAPISessionPool, self).__init__(
+            name, create_session, max_sessions=max_sessions,
+            idle_timeout=idle_timeout)
+        self._latency_observer = latency_observer
+
+    def put(self, session, error=None):
+        self._collect_timings(session)
+        super(WSAPISessionPool, self).put(session, error=error)
+
+    def _collect_timings(self, session):
+        http = getattr(self._get_client(session), 'http', None)
+        if http is None:
+            return
+        if self._latency_observer:
+            for request, start, end in http.get_timings():
+                self._latency_observer(end - start)
+        http.reset_timings()
+
+    @staticmethod
+    def _get_client(session):
+        return session.client
+
+    def _is_reusable(self, session, error):
+        # The array turning down a request (HTTP 4xx) leaves the session
+        # as it was. Any other failure, such as a dropped connection or a
+        # 5xx, may have left it broken. Errors of the plugin itself are
+        # judged by the error they were raised from, if any
+        while error is not None:
+            if hpe3parclient and \
+                    isinstance(error, hpeexceptions.ClientException):
+                status = getattr(error, 'http_status', None)
+                return isinstance(status, int) and 400 <= status < 500
+            if not isinstance(error, exception.PluginException):
+                return False
+            error = error.__cause__ or error.__context__
+        return True
+
+    def _close(self, session):
+        session.client_logout()
+
+
+class FilePersonaSessionPool(WSAPISessionPool):
+    """Keeps logged in WSAPI sessions of the File Persona mediator alive
+
+    Sessions are logged in HPE3ParFilePersonaClient objects.
+    """
+    @staticmethod
+    def _get_client(session):
+        return session
+
+    def _close(self, session):
+        session.http.unauthenticate()
+
+
+class SSHSessionPool(SessionPool):
+    """Keeps connected SSH clients to the 3PAR CLI alive
+
+    Sessions are hpe3parclient HPE3PARSSHClient objects. The transport of
+    a connected session sends keepalives and a session whose transport
+    went down is dropped when it is next checked out of the pool.
+    """
+    def __init__(self, name, ssh_args, ssh_kwargs, max_sessions=None,
+                 idle_timeout=None, keepalive_interval=None):
+        super(SSHSessionPool, self).__init__(
+            name, self._connect, max_sessions=max_sessions,
+            idle_timeout=idle_timeout)
+        self._ssh_args = ssh_args
+        self._ssh_kwargs = ssh_kwargs
+        self._keepalive_interval = \
+            keepalive_interval or DEFAULT_SSH_KEEPALIVE_INTERVAL
+
+    def _connect(self):
+        client = ssh.HPE3PARSSHClient(*self._ssh_args, **self._ssh_kwargs)
+        client.open()
+        client.ssh.get_transport().set_keepalive(self._keepalive_interval)
+        return client
+
+    def _is_usable(self, session):
+        transport = session.ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _close(self, session):
+        session.close()
+
+    def run(self, cmd, multi_line_stripper=False):
+        with self.session() as session:
+            return session.run(cmd, multi_line_stripper=multi_line_stripper)
+
+
+class PooledSSHClient(object):
+    """Stands in for the ssh attribute of an HPE3ParClient
+
+    HPE3ParClient._run() opens its SSH client and runs the command on it,
+    and logout() closes it. With this in place the command runs on a
+    connection borrowed from the SSH pool of the array while opening and
+    closing are left to the pool.
+    """
+    def __init__(self, pool):
+        self._pool = pool
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def set_debug_flag(self, flag):
+        pass
+
+    def run(self, cmd, multi_line_stripper=False):
+        return self._pool.run(cmd, multi_line_stripper=multi_line_stripper)
+
+
+def get_ssh_client(host_config, config):
+    """Returns an SSH client for the array of config backed by its pool"""
+    key = (config.san_ip, config.san_ssh_port, config.san_login)
+    with _ssh_pools_lock:
+        pool = _ssh_pools.get(key)
+        if pool is None:
+            policy = "AutoAddPolicy"
+            if host_config.strict_ssh_host_key_policy:
+                policy = "RejectPolicy"
+            ssh_args = (config.san_ip, config.san_login,
+                        config.san_password)
+            ssh_kwargs = {
+                'port': config.san_ssh_port,
+                'conn_timeout': config.ssh_conn_timeout,
+                'privatekey': config.san_private_key,
+                'missing_key_policy': policy,
+                'known_hosts_file': host_config.ssh_hosts_key_file
+            }
+            pool = SSHSessionPool(
+                '%s@%s' % (config.san_login, config.san_ip),
+                ssh_args, ssh_kwargs,
+                max_sessions=config.hpe3par_max_ssh_sessions or
+                DEFAULT_MAX_SSH_SESSIONS,
+                idle_timeout=config.hpe3par_session_idle_timeout,
+                keepalive_interval=config.ssh_keepalive_interval)
+            _ssh_pools[key] = pool
+    return PooledSSHClient(pool)
@@ -0,0 +1,179 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+import time
+
+from concurrent import futures
+from oslo_log import log as logging
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 3
+# Consecutive polls failing to query a task before its waiters are failed
+DEFAULT_MAX_POLL_FAILURES = 5
+# Final status of a successful task, as in hpe3parclient
+TASK_DONE = 1
+
+
+def describe_progress(task):
+    """Returns a short description of how far a 3PAR task has got"""
+    for unit in ('Steps', 'Phases'):
+        total = task.get('total%s' % unit)
+        if total:
+            return "%s/%s %s completed" % (task.get('completed%s' % unit, 0),
+                                           total, unit.lower())
+    return "in progress"
+
+
+class TaskTracker(object):
+    """Waits for the background tasks of an array with a single poller
+
+    Every caller waiting for a 3PAR task used to poll it on its own. The
+    tracker instead polls all the outstanding tasks of an array together,
+    with a single query of all tasks when more than one is outstanding,
+    every interval seconds. The poller thread runs only while there are
+    tasks to track.
+
+    session() returns a context manager yielding a logged in client.
+    track(task_id) returns a future that completes with the task once it
+    is no longer active, whatever its final status, or fails if the task
+    cannot be queried by max_failures consecutive polls. A single failed
+    poll, e.g. while the array fails over, leaves the task outstanding.
+    on_progress(task) is called on each poll that finds the task still
+    active.
+    """
+    def __init__(self, name, session, interval=DEFAULT_POLL_INTERVAL,
+                 max_failures=DEFAULT_MAX_POLL_FAILURES):
+        self._name = name
+        self._session = session
+        self._interval = interval
+        self._max_failures = max_failures
+        self._lock = threading.Lock()
+        # task id -> (future, progress callbacks)
+        self._tasks = {}
+        # task id -> number of consecutive polls that failed to query it
+        self._failures = {}
+        self._poller = None
+
+    def track(self, task_id, on_progress=None):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                entry = (futures.Future(), [])
+                self._tasks[task_id] = entry
+            if on_progress:
+                entry[1].append(on_progress)
+            if self._poller is None:
+                self._poller = threading.Thread(
+                    target=self._run, name='%s-task-tracker' % self._name)
+                self._poller.daemon = True
+                self._poller.start()
+        return entry[0]
+
+    def wait(self, task_id, on_progress=None):
+        return self.track(task_id, on_progress).result()
+
+    def outstanding(self):
+        with self._lock:
+            return list(self._tasks)
+
+    def _run(self):
+        while True:
+            self.poll()
+            with self._lock:
+                if not self._tasks:
+                    self._poller = None
+                    return
+            time.sleep(self._interval)
+
+    def poll(self):
+        task_ids = self.outstanding()
+        if not task_ids:
+            return
+        try:
+            with self._session() as client:
+                tasks = self._fetch(client, task_ids)
+                task_active = client.TASK_ACTIVE
+        except Exception as ex:
+            LOG.error("Failed to poll tasks %s of %s: %s"
+                      % (task_ids, self._name, six.text_type(ex)))
+            for task_id in task_ids:
+                self._poll_failed(task_id, ex)
+            return
+
+        for task_id, task in tasks.items():
+            if isinstance(task, Exception):
+                LOG.error("Failed to poll task %s of %s: %s"
+                          % (task_id, self._name, six.text_type(task)))
+                self._poll_failed(task_id, task)
+                continue
+            with self._lock:
+                self._failures.pop(task_id, None)
+            if task['status'] != task_active:
+                LOG.debug("3PAR Task id %(id)s status = %(status)s",
+                          {'id': task_id, 'status': task['status']})
+                self._finish(task_id, task=task)
+            else:
+                self._report_progress(task_id, task)
+
+    def _fetch(self, client, task_ids):
+        """Returns the current state of each task, or why it is unknown"""
+        listed = {}
+        if len(task_ids) > 1:
+            for task in client.getAllTasks().get('members', []):
+                listed[six.text_type(task.get('id'))] = task
+
+        tasks = {}
+        for task_id in task_ids:
+            task = listed.get(six.text_type(task_id))
+            # The task list leaves out the detailed status that callers
+            # report on failure, so finished tasks are fetched in full
+            if task is None or task.get('status') != client.TASK_ACTIVE:
+                try:
+                    task = client.getTask(task_id)
+                except Exception as ex:
+                    task = ex
+            tasks[task_id] = task
+        return tasks
+
+    def _report_progress(self, task_id, task):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            callbacks = list(entry[1]) if entry else []
+        for on_progress in callbacks:
+            try:
+                on_progress(task)
+            except Exception as ex:
+                LOG.warning("Failed to report progress of task %s: %s"
+                            % (task_id, six.text_type(ex)))
+
+    def _poll_failed(self, task_id, error):
+        with self._lock:
+            failures = self._failures.get(task_id, 0) + 1
+            self._failures[task_id] = failures
+        if failures >= self._max_failures:
+            self._finish(task_id, error=error)
+
+    def _finish(self, task_id, task=None, error=None):
+        with self._lock:
+            entry = self._tasks.pop(task_id, None)
+            self._failures.pop(task_id, None)
+        if entry is None:
+            return
+        if error is not None:
+            entry[0].set_exception(error)
+        else:
+            entry[0].set_result(task)
@@ -165,6 +165,33 @@ def is_host_os_rhel():
         return False
 
 
+def run_concurrently(executor, first_call, second_call):
+    """Runs two independent calls concurrently
+
+    first_call runs on executor while second_call runs on the calling
+    thread. The results of both are returned once both completed. If
+    either raises, the exception is raised once both completed, so that
+    the caller can undo whatever the other call did. If both raise, the
+    exception of first_call is raised and the other one is logged.
+    """
+    first = executor.submit(first_call)
+    second_ex = None
+    try:
+        second_result = second_call()
+    except Exception as ex:
+        second_ex = ex
+    try:
+        first_result = first.result()
+    except Exception:
+        if second_ex:
+            LOG.error("Concurrent call also failed: %s"
+                      % six.text_type(second_ex))
+        raise
+    if second_ex:
+        raise second_ex
+    return first_result, second_result
+
+
 class PasswordDecryptor(object):
     def __init__(self, backend_name, etcd):
         self._backend_name = backend_name
@@ -0,0 +1,190 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import time
+import zlib
+
+from oslo_log import log as logging
+
+from hpedockerplugin import etcdutil
+from hpedockerplugin import exception
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_RECONCILE_INTERVAL = 3600
+
+# State of an address in the free map of its subnet
+FREE = '.'
+LOCKED = 'L'
+IN_USE = 'U'
+
+
+def _ip_key(ip):
+    return tuple(int(token) for token in ip.split('.'))
+
+
+def _pool_digest(ips):
+    digest = zlib.crc32(','.join(ips).encode('utf-8')) & 0xffffffff
+    return '%08x' % digest
+
+
+class VfsIpAllocator(object):
+    """Allocates the VFS IP addresses of a backend from its IP pool
+
+    The state of the pool is kept in etcd as one free map per subnet: a
+    character per address of the subnet in hpe3par_server_ip_pool, in
+    address order, telling whether the address is free, locked for a VFS
+    being created or in use by a VFS. Addresses are claimed and released
+    with compare-and-swap updates of the map instead of under the backend
+    lock.
+
+    A claim reconciles the map with the VFSs of the array first if the map
+    is older than reconcile_interval seconds or no longer matches the
+    configured pool. get_backend_ips() returns the IP addresses of all the
+    VFSs of the array. Addresses that nodes of earlier versions locked in
+    the ips_locked_for_use list of the backend metadata are kept locked.
+    """
+    def __init__(self, backend, fp_etcd, ip_pool, get_backend_ips,
+                 reconcile_interval=DEFAULT_RECONCILE_INTERVAL):
+        self._backend = backend
+        self._fp_etcd = fp_etcd
+        self._get_backend_ips = get_backend_ips
+        self._reconcile_interval = reconcile_interval
+        # netmask -> addresses of the subnet in the order of its free map
+        self._pool = {}
+        # netmask -> {address: position in the free map}
+        self._positions = {}
+        self._digests = {}
+        for netmask, ips in ip_pool.items():
+            ips = sorted(ips, key=_ip_key)
+            self._pool[netmask] = ips
+            self._positions[netmask] = {ip: pos for pos, ip in enumerate(ips)}
+            self._digests[netmask] = _pool_digest(ips)
+
+    def claim(self):
+        """Locks a free address until its VFS is created
+
+        Returns the address and its netmask.
+        """
+        # Listing the VFSs of the array takes a while. It is done once,
+        # before the map to update is read, rather than between the read
+        # and the compare-and-swap write on each attempt
+        used_ips = []
+        if self._is_stale(self._read_map()[1]):
+            used_ips.append(self._list_used_ips())
+
+        def _claim(ip_map):
+            if self._is_stale(ip_map):
+                if not used_ips:
+                    # Rebuilt for another pool since it was first read
+                    used_ips.append(self._list_used_ips())
+                self._reconcile(ip_map, *used_ips[0])
+            for netmask in sorted(self._pool):
+                free_map = ip_map['subnets'][netmask]['map']
+                pos = free_map.find(FREE)
+                if pos >= 0:
+                    self._set_state(ip_map, netmask, pos, LOCKED)
+                    return self._pool[netmask][pos], netmask
+            raise exception.IPAddressPoolExhausted()
+
+        ip, netmask = self._update(_claim)
+        LOG.info("Claimed IP %s of subnet %s for backend %s"
+                 % (ip, netmask, self._backend))
+        return ip, netmask
+
+    def mark_in_use(self, ip, netmask):
+        self._update(lambda ip_map: self._set_ip_state(ip_map, ip, netmask,
+                                                       IN_USE))
+
+    def release(self, ip, netmask):
+        self._update(lambda ip_map: self._set_ip_state(ip_map, ip, netmask,
+                                                       FREE))
+
+    def _read_map(self):
+        try:
+            return self._fp_etcd.get_vfs_ip_map(self._backend)
+        except exception.EtcdMetadataNotFound:
+            return None, {'subnets': {}}
+
+    def _update(self, update):
+        for attempt in range(etcdutil.UPDATE_MAX_ATTEMPTS):
+            index, ip_map = self._read_map()
+            result = update(ip_map)
+            try:
+                self._fp_etcd.save_vfs_ip_map(self._backend, ip_map, index)
+            except exception.HPEPluginUpdateConflict:
+                LOG.info("IP map of backend %s modified concurrently, "
+                         "retrying..." % self._backend)
+                continue
+            return result
+        raise exception.HPEPluginUpdateConflict(
+            obj="IP map of backend %s" % self._backend)
+
+    def _is_stale(self, ip_map):
+        reconciled_at = ip_map.get('reconciled_at', 0)
+        if time.time() - reconciled_at >= self._reconcile_interval:
+            return True
+        subnets = ip_map['subnets']
+        return any(subnets.get(netmask, {}).get('pool') != digest
+                   for netmask, digest in self._digests.items())
+
+    def _list_used_ips(self):
+        """Returns the addresses of the array VFSs and the legacy locks"""
+        try:
+            legacy_metadata = self._fp_etcd.get_backend_metadata(
+                self._backend)
+        except exception.EtcdMetadataNotFound:
+            legacy_metadata = {}
+        return (set(self._get_backend_ips()),
+                set(legacy_metadata.get('ips_locked_for_use', [])))
+
+    def _reconcile(self, ip_map, backend_ips, legacy_locked_ips):
+        LOG.info("Reconciling IP map of backend %s with the VFSs of the "
+                 "array..." % self._backend)
+        subnets = {}
+        for netmask, ips in self._pool.items():
+            digest = self._digests[netmask]
+            old_subnet = ip_map['subnets'].get(netmask)
+            # Locks can be carried over only while the pool is unchanged
+            old_map = None
+            if old_subnet and old_subnet['pool'] == digest:
+                old_map = old_subnet['map']
+            states = []
+            for pos, ip in enumerate(ips):
+                if ip in backend_ips:
+                    states.append(IN_USE)
+                elif (old_map and old_map[pos] == LOCKED) or \
+                        ip in legacy_locked_ips:
+                    states.append(LOCKED)
+                else:
+                    states.append(FREE)
+            subnets[netmask] = {'pool': digest, 'map': ''.join(states)}
+        ip_map['subnets'] = subnets
+        ip_map['reconciled_at'] = time.time()
+
+    def _set_ip_state(self, ip_map, ip, netmask, state):
+        subnet = ip_map['subnets'].get(netmask)
+        pos = self._positions.get(netmask, {}).get(ip)
+        if pos is None or not subnet or \
+                subnet['pool'] != self._digests[netmask]:
+            LOG.info("IP %s is not in the IP map of backend %s. Leaving it "
+                     "to the next reconciliation" % (ip, self._backend))
+            return
+        self._set_state(ip_map, netmask, pos, state)
+
+    @staticmethod
+    def _set_state(ip_map, netmask, pos, state):
+        subnet = ip_map['subnets'][netmask]
+        free_map = subnet['map']
+        subnet['map'] = free_map[:pos] + state + free_map[pos + 1:]
@@ -11,6 +11,11 @@ DEFAULT_MOUNT_CONFLICT_DELAY = 30
 DEFAULT_TO_SNAP_TYPE = False
 DEFAULT_SCHEDULE = False
 
+# Status of a clone until the copy of its source is complete, and of a
+# clone whose copy failed
+CLONING = 'CLONING'
+CLONE_FAILED = 'CLONE_FAILED'
+
 QOS_PRIORITY = {1: 'Low', 2: 'Normal', 3: 'High'}
 RCG_ROLE = {1: 'Primary', 2: 'Secondary'}
 PROVISIONING = {1: 'full', 2: 'thin', 6: 'dedup'}
@@ -35,6 +35,7 @@ import hpedockerplugin.backend_orchestrator as orchestrator
 import hpedockerplugin.request_validator as req_validator
 import hpedockerplugin.file_backend_orchestrator as f_orchestrator
 import hpedockerplugin.request_router as req_router
+import hpedockerplugin.request_dispatcher as req_dispatcher
 
 LOG = logging.getLogger(__name__)
 
@@ -111,10 +112,21 @@ class VolumePlugin(object):
                 self._f_host_config, self._f_backend_configs,
                 self._f_def_backend_name)
 
+        # Node wide settings are the same in the block and file configs
+        host_config = (all_configs.get('block') or all_configs['file'])[0]
         self._req_router = req_router.RequestRouter(
             vol_orchestrator=self.orchestrator,
             file_orchestrator=self._file_orchestrator,
-            all_configs=all_configs)
+            all_configs=all_configs,
+            host_config=host_config)
+
+        self._dispatcher = req_dispatcher.RequestDispatcher(
+            reactor,
+            {req_dispatcher.READ: host_config.read_request_threads,
+             req_dispatcher.MOUNT: host_config.mount_request_threads,
+             req_dispatcher.UNMOUNT: host_config.unmount_request_threads,
+             req_dispatcher.PROVISION:
+                 host_config.provision_request_threads})
 
     def is_backend_initialized(self, backend_name):
         if (backend_name not in self._backend_configs and
@@ -148,6 +160,7 @@ class VolumePlugin(object):
     @on_exception(expo, RateLimitException, max_tries=8)
     @limits(calls=25, period=30)
     @app.route("/VolumeDriver.Remove", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.PROVISION, by_name=True)
     def volumedriver_remove(self, name):
         """
         Remove a Docker volume.
@@ -185,9 +198,8 @@ class VolumePlugin(object):
 
         return json.dumps({"Err": ""})
 
-    @on_exception(expo, RateLimitException, max_tries=8)
-    @limits(calls=25, period=30)
     @app.route("/VolumeDriver.Unmount", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.UNMOUNT, by_name=True)
     def volumedriver_unmount(self, name):
         """
         The Docker container is no longer using the given volume,
@@ -218,6 +230,7 @@ class VolumePlugin(object):
                                   % volname})
 
     @app.route("/VolumeDriver.Create", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.PROVISION, by_name=True)
     def volumedriver_create(self, request, opts=None):
         """
         Create a volume with the given name.
@@ -282,6 +295,8 @@ class VolumePlugin(object):
         cpg = None
         snap_cpg = None
         rcg_name = None
+        fs_preformat = None
+        fs_opts = {}
 
         current_backend = self._def_backend_name
         if 'Opts' in contents and contents['Opts']:
@@ -293,7 +308,8 @@ class VolumePlugin(object):
                 'mountConflictDelay', 'help', 'importVol', 'cpg',
                 'snapcpg', 'scheduleName', 'scheduleFrequency',
                 'snapshotPrefix', 'expHrs', 'retHrs', 'backend',
-                'replicationGroup', 'manager'
+                'replicationGroup', 'manager', 'fsPreformat', 'fsLazyInit',
+                'fsNoDiscard'
             ]
             valid_snap_schedule_opts = ['scheduleName', 'scheduleFrequency',
                                         'snapshotPrefix', 'expHrs', 'retHrs']
@@ -454,6 +470,24 @@ class VolumePlugin(object):
                                               "specify an integer value." %
                                               mount_conflict_delay_str})
 
+            fs_bool_opts = {}
+            for opt in ['fsPreformat', 'fsLazyInit', 'fsNoDiscard']:
+                if (opt in contents['Opts'] and
+                        contents['Opts'][opt] != ""):
+                    val = str(contents['Opts'][opt]).lower()
+                    if val not in valid_bool_opts:
+                        msg = \
+                            _('create volume failed, error is: '
+                              'passed %(opt)s parameter do not have a '
+                              'valid value. Valid values are: %(valid)s') % {
+                                'opt': opt, 'valid': valid_bool_opts}
+                        LOG.error(msg)
+                        return json.dumps({u'Err': six.text_type(msg)})
+                    fs_bool_opts[opt] = val == 'true'
+            fs_preformat = fs_bool_opts.get('fsPreformat')
+            fs_opts = {'lazy_init': fs_bool_opts.get('fsLazyInit', False),
+                       'nodiscard': fs_bool_opts.get('fsNoDiscard', False)}
+
             if ('virtualCopyOf' in contents['Opts']):
                 if (('cpg' in contents['Opts'] and
                      contents['Opts']['cpg'] is not None) or
@@ -517,7 +551,9 @@ class VolumePlugin(object):
                                                      mount_conflict_delay,
                                                      cpg, snap_cpg,
                                                      current_backend,
-                                                     rcg_name)
+                                                     rcg_name,
+                                                     fs_preformat,
+                                                     fs_opts)
 
     def _process_help(self, help):
         LOG.info("Working on help content generation...")
@@ -778,9 +814,8 @@ class VolumePlugin(object):
         LOG.info(' Schedule Name auto generated is %s' % scheduleNameGenerated)
         return scheduleNameGenerated
 
-    @on_exception(expo, RateLimitException, max_tries=8)
-    @limits(calls=25, period=30)
     @app.route("/VolumeDriver.Mount", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.MOUNT, by_name=True)
     def volumedriver_mount(self, name):
         """
         Mount the volume
@@ -822,6 +857,7 @@ class VolumePlugin(object):
                                   volname})
 
     @app.route("/VolumeDriver.Path", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.READ)
     def volumedriver_path(self, name):
         """
         Return the path of a locally mounted volume if possible.
@@ -850,6 +886,7 @@ class VolumePlugin(object):
         return response
 
     @app.route("/VolumeDriver.Get", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.READ)
     def volumedriver_get(self, name):
         """
         Return volume information.
@@ -889,6 +926,7 @@ class VolumePlugin(object):
         return json.dumps({u"Err": ''})
 
     @app.route("/VolumeDriver.List", methods=["POST"])
+    @req_dispatcher.dispatch(req_dispatcher.READ)
     def volumedriver_list(self, body):
         """
         Return a list of all volumes.
@@ -0,0 +1,155 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import os
+import re
+import select
+import stat
+import threading
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+MOUNTINFO = '/proc/self/mountinfo'
+
+MountEntry = collections.namedtuple(
+    'MountEntry', ['device', 'root', 'mount_point', 'fs_type', 'source'])
+
+_OCTAL_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+
+def _unescape(field):
+    # Spaces, tabs, newlines and backslashes are written as \ooo
+    return _OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), field)
+
+
+def parse_mountinfo(content):
+    """Parses the content of a mountinfo file into MountEntry tuples
+
+    A line is "id parent major:minor root mount-point options
+    [optional-fields...] - fs-type source super-options".
+    """
+    entries = []
+    for line in content.splitlines():
+        fields = line.split()
+        try:
+            sep = fields.index('-', 6)
+            entries.append(MountEntry(device=fields[2],
+                                      root=_unescape(fields[3]),
+                                      mount_point=_unescape(fields[4]),
+                                      fs_type=fields[sep + 1],
+                                      source=_unescape(fields[sep + 2])))
+        except (ValueError, IndexError):
+            LOG.warning("Ignoring malformed mountinfo line: %s" % line)
+    return entries
+
+
+def _device_number(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISBLK(st.st_mode):
+        return None
+    return '%d:%d' % (os.major(st.st_rdev), os.minor(st.st_rdev))
+
+
+class MountTable(object):
+    """In-process view of the mounts of this process' mount namespace
+
+    The table is read from mountinfo only when it changed since it was
+    last read. The kernel flags a change of the mount namespace with
+    POLLPRI on an open mountinfo file, so checking for a change is a
+    poll(2) with no timeout instead of the "mount -l | grep" pipelines
+    previously run for every check.
+    """
+    def __init__(self, path=MOUNTINFO):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._poller = None
+        self._entries = None
+
+    def entries(self):
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self._entries is None or self._changed():
+                self._file.seek(0)
+                self._entries = parse_mountinfo(self._file.read())
+            return self._entries
+
+    def invalidate(self):
+        """Makes the next lookup read the table again
+
+        For callers that just mounted or unmounted something and do not
+        want to depend on the change notification.
+        """
+        with self._lock:
+            self._entries = None
+
+    def _open(self):
+        self._file = open(self._path)
+        # Only proc files notify changes, any other file is read again
+        # on every lookup
+        if self._path.startswith('/proc/'):
+            self._poller = select.poll()
+            self._poller.register(self._file, select.POLLPRI)
+
+    def _changed(self):
+        if self._poller is None:
+            return True
+        return any(event & (select.POLLPRI | select.POLLERR)
+                   for fd, event in self._poller.poll(0))
+
+    def is_mount_point(self, path):
+        path = os.path.realpath(path)
+        return any(entry.mount_point == path for entry in self.entries())
+
+    def is_mounted(self, src, tgt):
+        """Tells whether the block device src is mounted on tgt
+
+        src may be any of the names of the device, e.g. /dev/dm-3 and
+        /dev/mapper/<wwn> refer to the same multipath device. Devices are
+        compared by device number, and by resolved path for sources that
+        are not device nodes.
+        """
+        tgt = os.path.realpath(tgt)
+        entries = [entry for entry in self.entries()
+                   if entry.mount_point == tgt]
+        if not entries:
+            return False
+
+        src_path = os.path.realpath(src)
+        src_device = _device_number(src_path)
+        for entry in entries:
+            if src_device is not None and entry.device == src_device:
+                return True
+            if os.path.realpath(entry.source) == src_path:
+                return True
+        return False
+
+
+_mount_table = None
+_mount_table_lock = threading.Lock()
+
+
+def get_mount_table():
+    global _mount_table
+    with _mount_table_lock:
+        if _mount_table is None:
+            _mount_table = MountTable()
+        return _mount_table
@@ -0,0 +1,194 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import functools
+import json
+import threading
+import time
+
+from oslo_log import log as logging
+from twisted.internet import defer
+from twisted.internet import threads
+from twisted.python import threadpool
+
+LOG = logging.getLogger(__name__)
+
+# Operation classes. Each one gets its own thread pool so that requests
+# of one class never wait for threads busy with another class. Unmount is
+# kept apart from Mount so that Mounts waiting for admission to the array
+# cannot take all the threads the Unmounts need to be admitted first
+READ = 'read'
+MOUNT = 'mount'
+UNMOUNT = 'unmount'
+PROVISION = 'provision'
+
+DEFAULT_POOL_SIZES = {READ: 4, MOUNT: 8, UNMOUNT: 4, PROVISION: 4}
+
+
+class RequestPool(object):
+    """Bounded thread pool running the requests of one operation class"""
+    def __init__(self, reactor, name, max_threads):
+        self._reactor = reactor
+        self._name = name
+        self._pool = threadpool.ThreadPool(minthreads=0,
+                                           maxthreads=max_threads,
+                                           name='hpe-%s-requests' % name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def start(self):
+        self._pool.start()
+
+    def stop(self):
+        self._pool.stop()
+
+    def submit(self, f, *args, **kwargs):
+        submitted_at = time.time()
+        with self._lock:
+            self._queued += 1
+            queued = self._queued
+        if queued > 1:
+            LOG.info("%s request %s queued behind %d other request(s)"
+                     % (self._name, f.__name__, queued - 1))
+
+        def _run():
+            wait = time.time() - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            LOG.debug("%s request %s started after waiting %.3fs"
+                      % (self._name, f.__name__, wait))
+            try:
+                return f(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        return threads.deferToThreadPool(self._reactor, self._pool, _run)
+
+    def stats(self):
+        with self._lock:
+            started = self._completed + self._active
+            return {
+                'max_threads': self._pool.max,
+                'queued': self._queued,
+                'active': self._active,
+                'completed': self._completed,
+                'max_wait': self._max_wait,
+                'avg_wait': self._total_wait / started if started else 0.0,
+            }
+
+
+class RequestDispatcher(object):
+    """Runs plugin API handlers off the reactor thread
+
+    Handlers are executed in the thread pool of their operation class and
+    the caller gets back a Deferred, which Klein waits on before writing
+    the response. While the reactor is not running, e.g. when handlers
+    are invoked directly by the unit tests, they run inline and their
+    result is returned as is.
+
+    Requests dispatched with a key run one at a time per key, in the order
+    they were dispatched, whatever their operation class.
+    """
+    def __init__(self, reactor, pool_sizes=None):
+        self._reactor = reactor
+        sizes = dict(DEFAULT_POOL_SIZES)
+        sizes.update(pool_sizes or {})
+        self._pools = {name: RequestPool(reactor, name, size)
+                       for name, size in sizes.items()}
+        self._keys_lock = threading.Lock()
+        # key -> Deferred fired once the last request for key is done
+        self._key_tails = {}
+        reactor.callWhenRunning(self._start)
+        reactor.addSystemEventTrigger('during', 'shutdown', self._stop)
+
+    def _start(self):
+        for pool in self._pools.values():
+            pool.start()
+
+    def _stop(self):
+        for pool in self._pools.values():
+            pool.stop()
+
+    def dispatch(self, op_class, f, *args, **kwargs):
+        if not self._reactor.running:
+            return f(*args, **kwargs)
+        return self._pools[op_class].submit(f, *args, **kwargs)
+
+    def dispatch_by_key(self, op_class, key, f, *args, **kwargs):
+        if not self._reactor.running or key is None:
+            return self.dispatch(op_class, f, *args, **kwargs)
+
+        done = defer.Deferred()
+        with self._keys_lock:
+            previous = self._key_tails.get(key)
+            self._key_tails[key] = done
+
+        def _finish(result):
+            with self._keys_lock:
+                if self._key_tails.get(key) is done:
+                    del self._key_tails[key]
+            done.callback(None)
+            return result
+
+        def _submit(ignored=None):
+            d = self._pools[op_class].submit(f, *args, **kwargs)
+            return d.addBoth(_finish)
+
+        if previous is None:
+            return _submit()
+        LOG.info("%s request %s for %s waits for an earlier request for "
+                 "the same name" % (op_class, f.__name__, key))
+        return previous.addCallback(_submit)
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+
+def _get_request_name(request):
+    try:
+        return json.loads(request.content.getvalue())['Name']
+    except Exception:
+        return None
+
+
+def dispatch(op_class, by_name=False):
+    """Runs a VolumePlugin route in the thread pool of op_class
+
+    With by_name, the requests for a volume or share name run one at a
+    time on this node, so that they do not fail on the lock of the name
+    held by one another.
+
+    Must be applied below the route decorator so that Klein registers the
+    dispatching handler.
+    """
+    def _decorator(f):
+        @functools.wraps(f)
+        def _wrapper(self, request, *args, **kwargs):
+            if by_name:
+                return self._dispatcher.dispatch_by_key(
+                    op_class, _get_request_name(request), f, self, request,
+                    *args, **kwargs)
+            return self._dispatcher.dispatch(op_class, f, self, request,
+                                             *args, **kwargs)
+        return _wrapper
+    return _decorator
@@ -2,6 +2,7 @@ from oslo_log import log as logging
 
 from hpedockerplugin import exception
 from hpedockerplugin import request_context as req_ctxt
+from hpedockerplugin import single_flight
 import hpedockerplugin.synchronization as synchronization
 
 LOG = logging.getLogger(__name__)
@@ -22,6 +23,14 @@ class RequestRouter(object):
         self._ctxt_builder_factory = \
             req_ctxt.RequestContextBuilderFactory(all_configs)
 
+        # Identical share reads running concurrently share one execution
+        host_config = kwargs['host_config']
+        self._reads = single_flight.SingleFlight('share reads')
+        self._listing = single_flight.SingleFlight(
+            'share list', result_ttl=host_config.list_cache_ttl)
+
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     def route_create_request(self, name, contents, orchestrator):
         LOG.info("route_create_request: Entering...")
         req_ctxt_builder = \
@@ -40,6 +49,8 @@ class RequestRouter(object):
             LOG.error(msg)
             raise exception.InvalidInput(msg)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     @synchronization.synchronized_fp_share('{name}')
     def route_remove_request(self, name):
         orch = self._orchestrators['file']
@@ -55,6 +66,8 @@ class RequestRouter(object):
         raise exception.EtcdMetadataNotFound(
             "Remove failed: '%s' doesn't exist" % name)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     @synchronization.synchronized_fp_share('{name}')
     def route_mount_request(self, name, mount_id):
         orch = self._orchestrators['file']
@@ -70,6 +83,8 @@ class RequestRouter(object):
         raise exception.EtcdMetadataNotFound(
             "Mount failed: '%s' doesn't exist" % name)
 
+    @single_flight.invalidates('_listing')
+    @single_flight.invalidates('_reads')
     @synchronization.synchronized_fp_share('{name}')
     def route_unmount_request(self, name, mount_id):
         orch = self._orchestrators['file']
@@ -94,6 +109,10 @@ class RequestRouter(object):
     #     # TODO: Check if we need to return empty response here?
 
     def get_object_details(self, name):
+        return self._reads.do(('Get', name), self._get_object_details,
+                              name)
+
+    def _get_object_details(self, name):
         orch = self._orchestrators['file']
         if orch:
             meta_data = orch.get_meta_data_by_name(name)
@@ -109,6 +128,10 @@ class RequestRouter(object):
             "ERROR: Meta-data details for '%s' don't exist" % name)
 
     def route_get_path_request(self, name):
+        return self._reads.do(('Path', name), self._route_get_path_request,
+                              name)
+
+    def _route_get_path_request(self, name):
         orch = self._orchestrators['file']
         if orch:
             meta_data = orch.get_meta_data_by_name(name)
@@ -125,5 +148,5 @@ class RequestRouter(object):
     def list_objects(self):
         orch = self._orchestrators['file']
         if orch:
-            return orch.list_objects()
+            return self._listing.do('List', orch.list_objects)
         return []
@@ -90,7 +90,8 @@ class RequestValidator(object):
         valid_opts = ['compression', 'size', 'provisioning',
                       'flash-cache', 'qos-name', 'fsOwner',
                       'fsMode', 'mountConflictDelay', 'cpg',
-                      'snapcpg', 'backend', 'manager']
+                      'snapcpg', 'backend', 'manager', 'fsPreformat',
+                      'fsLazyInit', 'fsNoDiscard']
         self._validate_opts("create volume", contents, valid_opts)
 
     def _validate_clone_opts(self, contents):
@@ -136,7 +137,7 @@ class RequestValidator(object):
     def _validate_rcg_opts(self, contents):
         valid_opts = ['replicationGroup', 'size', 'provisioning',
                       'backend', 'mountConflictDelay', 'compression',
-                      'manager']
+                      'manager', 'fsPreformat', 'fsLazyInit', 'fsNoDiscard']
         self._validate_opts('create replicated volume', contents, valid_opts)
 
     def _validate_help_opt(self, contents):
@@ -0,0 +1,130 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import threading
+
+from oslo_log import log as logging
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+# Status of a share waiting in the queue of its backend
+QUEUED = 'QUEUED'
+
+# Returned by create to have the share submitted again after RETRY_DELAY
+# seconds, e.g. while another request holds the share
+RETRY = 'RETRY'
+RETRY_DELAY = 5
+
+
+class ShareCreationQueue(object):
+    """Creates the shares requested on a backend with a bounded set of workers
+
+    Shares are created in the order they were submitted, by at most
+    workers threads at a time. The queue itself is kept in memory. Its
+    persistent copy is the QUEUED share records in etcd, from which the
+    caller submits the shares again after a restart.
+
+    create(share_name, share_args) returns True once the share is
+    created, False if its creation failed, RETRY if it has to be tried
+    again later and anything else if there was nothing to create, e.g.
+    because the share was removed while queued.
+    """
+    def __init__(self, backend, create, workers=DEFAULT_WORKERS):
+        self._backend = backend
+        self._create = create
+        self._workers = workers
+        self._cond = threading.Condition()
+        # Names of the queued shares, oldest first
+        self._queue = collections.deque()
+        # share name -> share args
+        self._queued_args = {}
+        self._creating = set()
+        self._created = 0
+        self._failed = 0
+
+    def start(self):
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._run,
+                name='%s-share-creation-%d' % (self._backend, i))
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, share_name, share_args):
+        with self._cond:
+            if share_name in self._queued_args or \
+                    share_name in self._creating:
+                return
+            self._queue.append(share_name)
+            self._queued_args[share_name] = share_args
+            self._cond.notify()
+
+    def discard(self, share_name):
+        """Drops a share from the queue unless its creation has started"""
+        with self._cond:
+            if share_name in self._queued_args:
+                self._queue.remove(share_name)
+                del self._queued_args[share_name]
+
+    def position(self, share_name):
+        """Returns the 1-based position of a queued share, None otherwise"""
+        with self._cond:
+            if share_name not in self._queued_args:
+                return None
+            return self._queue.index(share_name) + 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self._workers,
+                'queued': len(self._queue),
+                'creating': len(self._creating),
+                'created': self._created,
+                'failed': self._failed,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                share_name = self._queue.popleft()
+                share_args = self._queued_args.pop(share_name)
+                self._creating.add(share_name)
+            self.process(share_name, share_args)
+
+    def process(self, share_name, share_args):
+        try:
+            created = self._create(share_name, share_args)
+        except Exception as ex:
+            LOG.exception("Creation of share %s failed: %s"
+                          % (share_name, six.text_type(ex)))
+            created = False
+        with self._cond:
+            self._creating.discard(share_name)
+            if created is True:
+                self._created += 1
+            elif created is False:
+                self._failed += 1
+        if created == RETRY:
+            LOG.info("Creation of share %s is tried again in %s seconds"
+                     % (share_name, RETRY_DELAY))
+            timer = threading.Timer(RETRY_DELAY, self.submit,
+                                    (share_name, share_args))
+            timer.daemon = True
+            timer.start()
@@ -0,0 +1,107 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import functools
+import threading
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.completed_at = None
+
+
+class SingleFlight(object):
+    """Shares one execution of a read among concurrent identical callers
+
+    The first caller for a key runs the function, callers arriving with
+    the same key while it runs wait for it and get its result or its
+    exception. With a result_ttl, a successful result keeps being
+    returned for that many seconds after it was produced.
+    """
+    def __init__(self, name, result_ttl=0):
+        self._name = name
+        self._result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, f, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.completed_at is not None and \
+                    time.time() - call.completed_at > self._result_ttl:
+                del self._calls[key]
+                call = None
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if not call.done.is_set():
+                LOG.debug("%s: joining in-flight request for %s"
+                          % (self._name, key))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = f(*args, **kwargs)
+            return call.result
+        except Exception as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                # The call is gone if it was invalidated while running
+                if self._calls.get(key) is call:
+                    if call.error is None and self._result_ttl > 0:
+                        call.completed_at = time.time()
+                    else:
+                        del self._calls[key]
+            call.done.set()
+
+    def invalidate(self):
+        """Makes the next caller of every key run the function again
+
+        Used after a change that the kept results and the reads already
+        in flight may not reflect.
+        """
+        with self._lock:
+            self._calls.clear()
+
+
+def invalidates(attr):
+    """Invalidates the SingleFlight in attribute attr of self on return
+
+    For methods changing what the reads coalesced by that SingleFlight
+    return.
+    """
+    def _decorator(f):
+        @functools.wraps(f)
+        def _wrapped(self, *args, **kwargs):
+            try:
+                return f(self, *args, **kwargs)
+            finally:
+                getattr(self, attr).invalidate()
+        return _wrapped
+    return _decorator
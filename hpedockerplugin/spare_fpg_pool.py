@@ -0,0 +1,100 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+
+from oslo_log import log as logging
+import six
+
+import hpedockerplugin.exception as exception
+
+LOG = logging.getLogger(__name__)
+
+
+class SpareFpgPool(object):
+    """Default FPGs provisioned ahead of the shares that will need them
+
+    Creating an FPG and its VFS takes minutes on the array. A background
+    thread keeps spare_fpgs default FPGs per CPG whose available capacity
+    is at least min_free_capacity GiB, creating new ones as shares fill
+    them up, so that share creation finds room on an existing FPG. The
+    pool is checked every check_interval seconds and after each share
+    creation. Provisioning is done by one node at a time.
+
+    get_capacities(cpg) returns the available capacity in GiB of each
+    default FPG of the CPG. provision(cpg) creates a default FPG with its
+    VFS on the CPG.
+    """
+    def __init__(self, backend, fp_etcd, cpgs, spare_fpgs,
+                 min_free_capacity, get_capacities, provision,
+                 check_interval=300):
+        self._backend = backend
+        self._fp_etcd = fp_etcd
+        self._cpgs = cpgs
+        self._spare_fpgs = spare_fpgs
+        self._min_free_capacity = min_free_capacity
+        self._get_capacities = get_capacities
+        self._provision = provision
+        self._check_interval = check_interval
+        self._check_needed = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='%s-spare-fpgs' % self._backend)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def check(self):
+        """Has the pool checked right away, e.g. after a share creation"""
+        self._check_needed.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refill()
+            except Exception as ex:
+                LOG.exception("Spare FPG provisioning of backend %s "
+                              "failed: %s" % (self._backend,
+                                              six.text_type(ex)))
+            self._check_needed.wait(self._check_interval)
+            self._check_needed.clear()
+
+    def refill(self):
+        lock = self._fp_etcd.get_lock('FP_SPARE_FPG')
+        try:
+            lock.lock_name(self._backend, 0)
+        except exception.HPEPluginLockFailed:
+            LOG.debug("Spare FPGs of backend %s are being provisioned by "
+                      "another node" % self._backend)
+            return
+        try:
+            self._refill()
+        except exception.IPAddressPoolExhausted:
+            # Provisioning resumes with the next check once an IP is
+            # released
+            LOG.warning("No IP left in the IP pool of backend %s for the "
+                        "VFS of a spare FPG" % self._backend)
+        finally:
+            lock.try_unlock_name(self._backend)
+
+    def _refill(self):
+        for cpg in self._cpgs:
+            spares = len([capacity for capacity in self._get_capacities(cpg)
+                          if capacity >= self._min_free_capacity])
+            for i in range(self._spare_fpgs - spares):
+                LOG.info("CPG %s has %s spare FPGs out of %s. Provisioning "
+                         "a new one..." % (cpg, spares + i,
+                                           self._spare_fpgs))
+                self._provision(cpg)
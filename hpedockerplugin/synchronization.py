@@ -7,6 +7,10 @@ import hpedockerplugin.exception as exception
 
 LOG = logging.getLogger(__name__)
 
+# Seconds a request waits for the lock of its volume, share or RCG held by
+# another request, possibly of another node
+LOCK_WAIT_TIMEOUT = 120
+
 
 def __synchronized(lock_type, lock_name, f, *a, **k):
     call_args = inspect.getcallargs(f, *a, **k)
@@ -16,18 +20,19 @@ def __synchronized(lock_type, lock_name, f, *a, **k):
     self = call_args['self']
     lock = self._etcd.get_lock(lock_type)
     try:
-        lock.try_lock_name(lck_name)
+        lock.lock_name(lck_name, LOCK_WAIT_TIMEOUT)
         lock_acquired = True
         LOG.info('Lock acquired: [caller=%s, lock-name=%s]'
                  % (f.__name__, lck_name))
         return f(*a, **k)
     except exception.HPEPluginLockFailed:
-        LOG.exception('Lock acquire failed: [caller=%(caller)s, '
-                      'lock-name=%(name)s]',
-                      {'caller': f.__name__,
-                       'name': lck_name})
-        response = json.dumps({u"Err": ''})
-        return response
+        LOG.error('Lock acquire failed: [caller=%(caller)s, '
+                  'lock-name=%(name)s]',
+                  {'caller': f.__name__,
+                   'name': lck_name})
+        msg = "%s is in use by another request, please try again" \
+              % lck_name
+        return json.dumps({u"Err": msg})
     finally:
         if lock_acquired:
             try:
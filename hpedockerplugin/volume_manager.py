@@ -1,6 +1,8 @@
+from concurrent import futures
 import json
 import os
 import six
+import threading
 import time
 from sh import chmod
 
@@ -13,23 +15,36 @@ from oslo_utils import netutils
 from oslo_utils import units
 from twisted.python.filepath import FilePath
 
+import hpedockerplugin.admission_control as admission_control
+import hpedockerplugin.detach_reaper as detach_reaper
+import hpedockerplugin.etcdutil as etcdutil
 import hpedockerplugin.exception as exception
 import hpedockerplugin.fileutil as fileutil
 import math
 import re
 import hpedockerplugin.hpe.array_connection_params as acp
 import datetime
+from hpedockerplugin.hpe import rcg_state_cache
+from hpedockerplugin.hpe import task_tracker
 from hpedockerplugin.hpe import volume
 from hpedockerplugin.hpe import utils
 from hpedockerplugin.i18n import _, _LE, _LI, _LW
 import hpedockerplugin.synchronization as synchronization
+import hpedockerplugin.warm_pool as warm_pool
 
+hpe3parclient = importutils.try_import("hpe3parclient")
+if hpe3parclient:
+    from hpe3parclient import exceptions as hpeexceptions
 
 LOG = logging.getLogger(__name__)
 PRIMARY = 1
 PRIMARY_REV = 1
 SECONDARY = 2
 
+# Threads running the primary array side of replicated operations while
+# the request thread runs the secondary array side
+ARRAY_CALL_WORKERS = 8
+
 CONF = cfg.CONF
 
 
@@ -74,8 +89,15 @@ class VolumeManager(object):
                 reason=msg)
 
         # If replication enabled, then initialize secondary driver
+        self._array_executor = None
+        self._rcg_state_cache = None
         if self.tgt_bkend_config:
             LOG.info("Replication enabled!")
+            self._array_executor = futures.ThreadPoolExecutor(
+                max_workers=ARRAY_CALL_WORKERS)
+            self._rcg_state_cache = rcg_state_cache.RcgStateCache(
+                backend_name, self._resolve_target_driver,
+                ttl=self.src_bkend_config.rcg_state_cache_ttl)
             try:
                 LOG.info("Initializing 3PAR driver for remote array...")
                 self._remote_driver = self._initialize_driver(
@@ -89,10 +111,46 @@ class VolumeManager(object):
                 LOG.info(msg)
                 raise exception.HPEPluginStartPluginException(reason=msg)
 
+        self._admission_controller = admission_control.get_controller(
+            self.src_bkend_config)
+
         self._connector = self._get_connector(hpepluginconfig)
 
         # Volume fencing requirement
         self._node_id = node_id
+        self._backend_name = backend_name
+
+        self._preformat_slots = threading.BoundedSemaphore(
+            self.src_bkend_config.preformat_threads)
+
+        self._warm_pool = None
+        if self.src_bkend_config.warm_pool_size and \
+                self.src_bkend_config.warm_pool_profiles:
+            self._warm_pool = warm_pool.WarmVolumePool(
+                backend_name, self._etcd,
+                warm_pool.parse_profiles(
+                    self.src_bkend_config.warm_pool_profiles),
+                self.src_bkend_config.warm_pool_size,
+                self._provision_pooled_volume,
+                self._release_pooled_volume,
+                max_capacity=self.src_bkend_config.warm_pool_max_capacity,
+                refill_interval=(
+                    self.src_bkend_config.warm_pool_refill_interval))
+            self._warm_pool.start()
+
+        self._detach_grace_period = self.src_bkend_config.detach_grace_period
+        self._detach_reaper = None
+        if self._detach_grace_period:
+            self._detach_reaper = detach_reaper.DetachReaper(
+                backend_name, self._reap_pending_detach)
+            self._load_pending_detaches()
+            self._detach_reaper.start()
+
+        self._resume_clone_copies()
+
+    def admit(self, operation, volname):
+        """Waits for the array to admit a Mount or Unmount request"""
+        return self._admission_controller.admitted(operation, volname)
 
     def _initialize_configuration(self):
         self.src_bkend_config = self._get_src_bkend_config()
@@ -196,7 +254,8 @@ class VolumeManager(object):
                       vol_flash, compression_val, vol_qos,
                       fs_owner, fs_mode,
                       mount_conflict_delay, cpg, snap_cpg,
-                      current_backend, rcg_name):
+                      current_backend, rcg_name, fs_preformat=None,
+                      fs_opts=None):
         LOG.info('In _volumedriver_create')
 
         # NOTE: Since Docker passes user supplied names and not a unique
@@ -226,15 +285,33 @@ class VolumeManager(object):
                 return json.dumps({u"Err": six.text_type(ex)})
 
         undo_steps = []
-        vol = volume.createvol(volname, vol_size, vol_prov,
-                               vol_flash, compression_val, vol_qos,
-                               mount_conflict_delay, False, cpg, snap_cpg,
-                               False, current_backend)
+        vol = None
+        # Pooled volumes may already carry a filesystem made with the mkfs
+        # defaults, which the first mount would keep
+        if self._warm_pool and vol_qos is None and vol_flash is None and \
+                snap_cpg is None and not rcg_name and \
+                not any((fs_opts or {}).values()):
+            vol = self._warm_pool.claim(vol_size, vol_prov,
+                                        compression_val, cpg)
+        is_pooled = vol is not None
+        if is_pooled:
+            LOG.info("Creating volume %s from warm pool volume %s"
+                     % (volname, vol['id']))
+            vol['display_name'] = volname
+            vol['mount_conflict_delay'] = mount_conflict_delay
+        else:
+            vol = volume.createvol(volname, vol_size, vol_prov,
+                                   vol_flash, compression_val, vol_qos,
+                                   mount_conflict_delay, False, cpg,
+                                   snap_cpg, False, current_backend)
 
         bkend_vol_name = ""
         try:
-            bkend_vol_name = self._create_volume(vol, undo_steps)
-            self._apply_volume_specs(vol, undo_steps)
+            if is_pooled:
+                bkend_vol_name = self._claim_pooled_volume(vol, undo_steps)
+            else:
+                bkend_vol_name = self._create_volume(vol, undo_steps)
+                self._apply_volume_specs(vol, undo_steps)
             if rcg_name:
                 # bkend_rcg_name = self._get_3par_rcg_name(rcg_name)
                 try:
@@ -245,14 +322,25 @@ class VolumeManager(object):
                 self._add_volume_to_rcg(vol, rcg_name, undo_steps)
                 vol['rcg_info'] = rcg_info
 
-            # For now just track volume to uuid mapping internally
-            # TODO: Save volume name and uuid mapping in etcd as well
-            # This will make get_vol_byname more efficient
             vol['fsOwner'] = fs_owner
             vol['fsMode'] = fs_mode
             vol['3par_vol_name'] = bkend_vol_name
+            vol['fs_opts'] = fs_opts or {}
+
+            if fs_preformat is None:
+                fs_preformat = self.src_bkend_config.preformat_volumes
+            if vol.get('fs_ready'):
+                fs_preformat = False
+            if fs_preformat:
+                # Until the background formatting is done, mounts wait for
+                # it and removal is refused
+                vol['fs_ready'] = False
+                vol['preformat_deadline'] = \
+                    time.time() + self.src_bkend_config.preformat_timeout
 
             self._etcd.save_vol(vol)
+            if fs_preformat:
+                self._start_preformat(vol)
 
         except Exception as ex:
             msg = (_('Create volume failed with error: %s'), six.text_type(ex))
@@ -742,9 +830,6 @@ class VolumeManager(object):
                                          snapshot_name,
                                          undo_steps)
 
-            # For now just track volume to uuid mapping internally
-            # TODO: Save volume name and uuid mapping in etcd as well
-            # This will make get_vol_byname more efficient
             self._etcd.save_vol(vol)
             LOG.debug('snapshot: %(name)s was successfully saved '
                       'to etcd', {'name': snapshot_name})
@@ -771,6 +856,29 @@ class VolumeManager(object):
             msg = 'Volume name to remove not found: %s' % volname
             LOG.error(msg)
             return json.dumps({u"Err": msg})
+        if self._is_preformat_pending(vol):
+            msg = 'Volume %s is being formatted, retry removing it ' \
+                  'later' % volname
+            LOG.error(msg)
+            return json.dumps({u"Err": msg})
+        if vol.get('status') == volume.CLONING:
+            msg = six.text_type(exception.HPEPluginVolumeCloning(
+                name=volname,
+                progress=vol.get('clone_progress', "in progress")))
+            LOG.error(msg)
+            return json.dumps({u"Err": msg})
+        if 'detach_pending' in vol:
+            pending = vol['detach_pending']
+            if pending['node_id'] != self._node_id:
+                msg = 'Volume %s is still attached to node %s, retry ' \
+                      'removing it after %s seconds' % \
+                      (volname, pending['node_id'],
+                       self._detach_grace_period)
+                LOG.error(msg)
+                return json.dumps({u"Err": msg})
+            index, vol = self._etcd.get_vol_with_index(vol['id'])
+            self._release_pending_detach(vol, index,
+                                         vol.get('is_snap', False))
         parent_name = None
         is_snap = False
         if 'is_snap' in vol and vol['is_snap']:
@@ -840,9 +948,6 @@ class VolumeManager(object):
                 try:
                     LOG.info("Updating volume in ETCD after snapshot "
                              "removal - vol-name: %s" % volname)
-                    # For now just track volume to uuid mapping internally
-                    # TODO: Save volume name and uuid mapping in etcd as
-                    # well. This will make get_vol_byname more efficient
                     self._etcd.update_vol(vol['id'],
                                           'snapshots',
                                           snapshots)
@@ -880,10 +985,17 @@ class VolumeManager(object):
             bkend_clone_name = self.__clone_volume__(src_vol,
                                                      clone_vol,
                                                      undo_steps)
+            copy_task_id = clone_vol.pop('copy_task_id', None)
+            offline_copy = clone_vol.pop('offline_copy', False)
+            if offline_copy:
+                # The clone cannot be used until its offline copy is
+                # complete. The copy is started once the clone is saved.
+                clone_vol['status'] = volume.CLONING
+            if copy_task_id or offline_copy:
+                clone_vol['clone_progress'] = "in progress"
+                clone_vol['clone_copy'] = {'node_id': self._node_id,
+                                           'task_id': copy_task_id}
             self._apply_volume_specs(clone_vol, undo_steps)
-            # For now just track volume to uuid mapping internally
-            # TODO: Save volume name and uuid mapping in etcd as well
-            # This will make get_vol_byname more efficient
             clone_vol['fsOwner'] = src_vol.get('fsOwner')
             clone_vol['fsMode'] = src_vol.get('fsMode')
             clone_vol['3par_vol_name'] = bkend_clone_name
@@ -899,8 +1011,98 @@ class VolumeManager(object):
             self._rollback(undo_steps)
             return json.dumps({u"Err": six.text_type(ex)})
         else:
+            if offline_copy:
+                thread = threading.Thread(target=self._start_offline_copy,
+                                          args=(clone_vol, src_vol),
+                                          name='clone-%s' % clone_vol['id'])
+                thread.daemon = True
+                thread.start()
+            elif copy_task_id:
+                self._track_clone_copy(clone_vol, copy_task_id)
             return json.dumps({u"Err": ''})
 
+    def _start_offline_copy(self, clone_vol, src_vol):
+        try:
+            task_id = self._hpeplugin_driver.start_offline_copy(clone_vol,
+                                                                src_vol)
+            self._etcd.update_vol_fields(
+                clone_vol['id'], {'clone_copy': {'node_id': self._node_id,
+                                                 'task_id': task_id}})
+        except Exception as ex:
+            self._clone_copy_failed(clone_vol, six.text_type(ex))
+            return
+        self._track_clone_copy(clone_vol, task_id)
+
+    def _track_clone_copy(self, clone_vol, task_id):
+        # The progress of the copy is kept in the clone's record, and
+        # reported by Get, until the copy task is finished
+        volid = clone_vol['id']
+        clone_name = clone_vol['display_name']
+
+        def _on_progress(task):
+            self._etcd.update_vol_fields(
+                volid,
+                {'clone_progress': task_tracker.describe_progress(task)})
+
+        def _on_done(future):
+            try:
+                task = future.result()
+            except hpeexceptions.HTTPNotFound as ex:
+                self._clone_copy_failed(clone_vol, six.text_type(ex))
+                return
+            except Exception as ex:
+                LOG.warning("Failed to get copy task %s of clone %s, "
+                            "retrying: %s"
+                            % (task_id, clone_name, six.text_type(ex)))
+                retry = threading.Timer(
+                    self.src_bkend_config.hpe3par_task_poll_interval,
+                    self._track_clone_copy, args=(clone_vol, task_id))
+                retry.daemon = True
+                retry.start()
+                return
+
+            if task['status'] != task_tracker.TASK_DONE:
+                self._clone_copy_failed(
+                    clone_vol, task.get('detailedStatus', task['status']))
+                return
+            LOG.info("Copy of clone %s completed" % clone_name)
+            try:
+                self._etcd.update_vol_fields(
+                    volid, {'status': ''},
+                    remove_fields=('clone_progress', 'clone_copy'))
+            except Exception as ex:
+                LOG.error("Failed to mark clone %s as copied: %s"
+                          % (clone_name, six.text_type(ex)))
+
+        future = self._hpeplugin_driver.track_task(task_id, _on_progress)
+        future.add_done_callback(_on_done)
+
+    def _clone_copy_failed(self, clone_vol, reason):
+        LOG.error("Copy of clone %s failed: %s"
+                  % (clone_vol['display_name'], reason))
+        try:
+            self._etcd.update_vol_fields(
+                clone_vol['id'],
+                {'status': volume.CLONE_FAILED,
+                 'clone_progress': "failed: %s" % reason},
+                remove_fields=('clone_copy',))
+        except Exception as ex:
+            LOG.error("Failed to mark clone %s as failed: %s"
+                      % (clone_vol['display_name'], six.text_type(ex)))
+
+    def _resume_clone_copies(self):
+        """Resumes tracking the copies of the clones created by this node"""
+        for vol in self._etcd.get_all_vols():
+            clone_copy = vol.get('clone_copy')
+            if not clone_copy or clone_copy['node_id'] != self._node_id or \
+                    vol.get('backend', 'DEFAULT') != self._backend_name:
+                continue
+            if clone_copy['task_id']:
+                self._track_clone_copy(vol, clone_copy['task_id'])
+            else:
+                self._clone_copy_failed(
+                    vol, "plugin restarted before the copy was started")
+
     # Commenting out unused function to increase coverage
     # @synchronization.synchronized_volume('{volumename}')
     # def revert_to_snapshot(self, volumename, snapname):
@@ -1139,6 +1341,11 @@ class VolumeManager(object):
             if 'Options' in volinfo:
                 vol_detail['Options'] = volinfo['Options']
 
+            if volinfo.get('status'):
+                vol_detail['status'] = volinfo['status']
+            if 'clone_progress' in volinfo:
+                vol_detail['clone_progress'] = volinfo['clone_progress']
+
             if volinfo.get('rcg_info'):
                 vol_detail['secondary_cpg'] = \
                     self.tgt_bkend_config.hpe3par_cpg[0]
@@ -1207,6 +1414,139 @@ class VolumeManager(object):
     def _is_vol_not_mounted(vol):
         return 'node_mount_info' not in vol
 
+    @staticmethod
+    def _is_preformat_pending(vol):
+        return vol.get('fs_ready') is False and \
+            time.time() < vol.get('preformat_deadline', 0)
+
+    def _wait_for_preformat(self, vol, index):
+        """Waits for the background formatting of vol, read at index
+
+        Returns the modifiedIndex and the volume once formatted, or index
+        and vol if the formatting did not complete in time.
+        """
+        LOG.info("Volume %s is being formatted in the background, waiting "
+                 "for it..." % vol['display_name'])
+        timeout = vol['preformat_deadline'] - time.time()
+        formatted_vol = self._etcd.wait_for_vol(
+            vol['id'], lambda v: not self._is_preformat_pending(v), timeout)
+        if formatted_vol is None:
+            LOG.warning("Background formatting of volume %s did not "
+                        "complete in time" % vol['display_name'])
+            return index, vol
+        return self._etcd.get_vol_with_index(vol['id'])
+
+    def _start_preformat(self, vol):
+        thread = threading.Thread(target=self._preformat_volume,
+                                  args=(vol,),
+                                  name='preformat-%s' % vol['id'])
+        thread.daemon = True
+        thread.start()
+
+    def _preformat_volume(self, vol):
+        """Creates the filesystem of a new volume in the background
+
+        Records fs_ready in etcd so that the first mount skips blkid and
+        mkfs. On failure fs_ready is removed and the first mount formats
+        the volume as it would without preformatting.
+        """
+        volname = vol['display_name']
+        with self._preformat_slots:
+            LOG.info("Formatting volume %s in the background..." % volname)
+            fs_ready = self._format_volume(vol)
+
+        try:
+            if fs_ready:
+                self._etcd.update_vol_fields(
+                    vol['id'], {'fs_ready': True},
+                    remove_fields=('preformat_deadline',))
+            else:
+                self._etcd.update_vol_fields(
+                    vol['id'], {},
+                    remove_fields=('fs_ready', 'preformat_deadline'))
+        except Exception as ex:
+            LOG.error("Failed to record formatting state of volume %s: %s"
+                      % (volname, six.text_type(ex)))
+
+    def _format_volume(self, vol):
+        """Creates the filesystem of vol through a temporary attach
+
+        Returns whether the volume has a filesystem.
+        """
+        volname = vol['display_name'] or vol['id']
+        undo_steps = []
+        start = time.time()
+        try:
+            if vol.get('rcg_info'):
+                driver = self._get_target_driver(vol['rcg_info'])
+            else:
+                driver = self._hpeplugin_driver
+            connector_info = connector.get_connector_properties(
+                'sudo', self._my_ip, multipath=self._use_multipath,
+                enforce_multipath=self._enforce_multipath)
+
+            driver.create_export(vol, connector_info, False)
+            connection_info = driver.initialize_connection(
+                vol, connector_info, False)
+            undo_steps.append(
+                {'undo_func': driver.terminate_connection,
+                 'params': (vol, connector_info, False),
+                 'msg': 'Terminating connection to volume: %s...'
+                        % volname})
+
+            device_info = self._connector.connect_volume(
+                connection_info['data'])
+            undo_steps.append(
+                {'undo_func': self._connector.disconnect_volume,
+                 'params': (connection_info['data'], None),
+                 'msg': 'Disconnecting volume: %s...' % volname})
+
+            path = FilePath(device_info['path']).realpath()
+            if fileutil.has_filesystem(path.path) is False:
+                fileutil.create_filesystem(path.path,
+                                           **vol.get('fs_opts', {}))
+            LOG.info("Volume %s formatted in %.1fs"
+                     % (volname, time.time() - start))
+            return True
+        except Exception as ex:
+            LOG.exception("Formatting volume %s failed, it will be "
+                          "formatted on first mount: %s"
+                          % (volname, six.text_type(ex)))
+            return False
+        finally:
+            # Detach from this node
+            self._rollback(undo_steps)
+
+    def _provision_pooled_volume(self, profile):
+        vol = volume.createvol(None, profile.size, profile.provisioning,
+                               compression_val=profile.compression,
+                               cpg=profile.cpg,
+                               current_backend=self._backend_name)
+        vol['3par_vol_name'] = self._hpeplugin_driver.create_volume(vol)
+        if self.src_bkend_config.warm_pool_preformat:
+            with self._preformat_slots:
+                if self._format_volume(vol):
+                    vol['fs_ready'] = True
+        return vol
+
+    def _release_pooled_volume(self, vol):
+        try:
+            self._hpeplugin_driver.delete_volume(vol)
+        except Exception as ex:
+            LOG.error("Failed to delete warm pool volume %s: %s"
+                      % (vol['id'], six.text_type(ex)))
+
+    def _claim_pooled_volume(self, vol, undo_steps):
+        # Deleted rather than returned to the pool on failure as its
+        # state is unknown
+        undo_steps.append(
+            {'undo_func': self._hpeplugin_driver.delete_volume,
+             'params': {'volume': vol},
+             'msg': 'Cleaning up backend volume: %s...'
+                    % vol['3par_vol_name']})
+        self._hpeplugin_driver.update_volume_comment(vol)
+        return vol['3par_vol_name']
+
     @staticmethod
     def _is_first_mount(node_mount_info):
         return (len(node_mount_info) == 0)
@@ -1227,25 +1567,48 @@ class VolumeManager(object):
         else:
             return False
 
-    def _update_mount_id_list(self, vol, mount_id):
-        node_mount_info = vol['node_mount_info']
-
+    def _update_mount_id_list(self, vol, index, mount_id, vol_updates):
         # Check if mount_id is unique
-        if mount_id in node_mount_info[self._node_id]:
+        if mount_id in vol['node_mount_info'][self._node_id]:
             LOG.info("Received duplicate mount-id: %s. Ignoring"
                      % mount_id)
-            return
+            if not vol_updates:
+                return
 
-        LOG.info("Adding new mount-id %s to node_mount_info..."
-                 % mount_id)
-        node_mount_info[self._node_id].append(mount_id)
-        LOG.info("Updating etcd with modified node_mount_info: %s..."
-                 % node_mount_info)
-        self._etcd.update_vol(vol['id'],
-                              'node_mount_info',
-                              node_mount_info)
-        LOG.info("Updated etcd with modified node_mount_info: %s!"
-                 % node_mount_info)
+        def _add_mount_id(current_vol):
+            node_mount_info = current_vol.get('node_mount_info') or {}
+            if self._node_id not in node_mount_info:
+                msg = "Volume %s got unmounted from this node while being " \
+                      "mounted" % vol['display_name']
+                raise exception.HPEPluginMountException(reason=msg)
+            if mount_id not in node_mount_info[self._node_id]:
+                LOG.info("Adding new mount-id %s to node_mount_info..."
+                         % mount_id)
+                node_mount_info[self._node_id].append(mount_id)
+            return dict(vol_updates, node_mount_info=node_mount_info), ()
+
+        LOG.info("Updating etcd with new mount-id %s..." % mount_id)
+        self._update_vol_at_index(vol, index, _add_mount_id)
+        LOG.info("Updated etcd with new mount-id %s!" % mount_id)
+
+    def _update_vol_at_index(self, vol, index, compute_updates):
+        """Writes the fields computed from vol, read at modifiedIndex index
+
+        compute_updates(vol) returns the fields to set and the fields to
+        remove. If the volume changed since it was read, it is read again
+        and its fields computed anew. Returns the new modifiedIndex.
+        """
+        for attempt in range(etcdutil.UPDATE_MAX_ATTEMPTS):
+            fields, remove_fields = compute_updates(vol)
+            try:
+                return self._etcd.update_vol_fields(
+                    vol['id'], fields, expected_index=index,
+                    remove_fields=remove_fields)
+            except exception.HPEPluginUpdateConflict:
+                LOG.info("Volume %s modified concurrently, recomputing "
+                         "its update..." % vol['display_name'])
+                index, vol = self._etcd.get_vol_with_index(vol['id'])
+        raise exception.HPEPluginUpdateConflict(obj=vol['id'])
 
     def _get_success_response(self, vol):
         path_info = json.loads(vol['path_info'])
@@ -1256,27 +1619,143 @@ class VolumeManager(object):
         return response
 
     def _wait_for_graceful_vol_unmount(self, vol):
-        unmounted = False
-        vol_id = vol['id']
         volname = vol['display_name']
         mount_conflict_delay = vol['mount_conflict_delay']
-        for checks in range(0, mount_conflict_delay):
-            time.sleep(1)
-            LOG.info("Checking if volume %s got unmounted #%s..."
-                     % (volname, checks))
-            vol = self._etcd.get_vol_by_id(vol_id)
-
-            # Check if unmount that was in progress has cleared the
-            # node entry from ETCD database
-            if 'node_mount_info' not in vol:
-                LOG.info("Volume %s got unmounted after %s "
-                         "checks!!!" % (volname, checks))
-                unmounted = True
-                break
+        LOG.info("Waiting up to %s seconds for volume %s to get "
+                 "unmounted..." % (mount_conflict_delay, volname))
+        start = time.time()
+
+        # Unmount that was in progress is over once it has cleared the
+        # node entry from ETCD database
+        unmounted_vol = self._etcd.wait_for_vol(vol['id'],
+                                                self._is_vol_not_mounted,
+                                                mount_conflict_delay)
+        if unmounted_vol is None:
+            LOG.info("Volume %s still mounted after %s seconds"
+                     % (volname, mount_conflict_delay))
+            return False
+
+        LOG.info("Volume %s got unmounted after %.1f seconds"
+                 % (volname, time.time() - start))
+        return True
 
-            LOG.info("Volume %s still unmounting #%s..."
-                     % (volname, checks))
-        return unmounted
+    def _load_pending_detaches(self):
+        for vol in self._etcd.get_all_vols():
+            pending = vol.get('detach_pending')
+            if pending and pending['node_id'] == self._node_id and \
+                    vol.get('backend', 'DEFAULT') == self._backend_name:
+                self._detach_reaper.add(vol['display_name'],
+                                        pending['deadline'])
+
+    def _defer_detach(self, vol):
+        """Keeps the attachment of an unmounted volume for a remount"""
+        volname = vol['display_name']
+        deadline = time.time() + self._detach_grace_period
+        LOG.info("Keeping volume %s attached to this node for %s "
+                 "seconds..." % (volname, self._detach_grace_period))
+        self._etcd.update_vol_fields(
+            vol['id'], {'detach_pending': {'node_id': self._node_id,
+                                           'deadline': deadline}})
+        self._detach_reaper.add(volname, deadline)
+
+    def _take_pending_detach(self, vol, index, is_snap):
+        """Takes over the attachment kept after the last unmount of vol
+
+        vol was read at modifiedIndex index. Returns the new modifiedIndex
+        along with the path info of the attachment if it can be reused by
+        a mount on this node, None if the volume has to be attached again.
+        """
+        volname = vol['display_name']
+        pending = vol['detach_pending']
+        if pending['node_id'] == self._node_id:
+            if self._detach_reaper:
+                self._detach_reaper.discard(volname)
+            path_info = json.loads(vol['path_info'])
+            if os.path.exists(path_info['path']):
+                LOG.info("Reusing attachment of volume %s kept after its "
+                         "last unmount" % volname)
+                index = self._update_vol_at_index(
+                    vol, index,
+                    lambda current_vol: ({}, ('detach_pending',)))
+                vol.pop('detach_pending')
+                return index, path_info
+            LOG.warning("Device %s of volume %s is gone, attaching the "
+                        "volume again" % (path_info['path'], volname))
+        index = self._release_pending_detach(vol, index, is_snap)
+        return index, None
+
+    def _release_pending_detach(self, vol, index, is_snap):
+        """Removes the attachment kept after the last unmount of vol
+
+        The attachment of another node is removed from the array only.
+        The reaper of that node cleans up its devices using the path info
+        saved in old_path_info, as for a volume fenced off that node.
+        vol was read at modifiedIndex index. Returns the new modifiedIndex.
+        """
+        pending = vol['detach_pending']
+        if pending['node_id'] == self._node_id:
+            if self._detach_reaper:
+                self._detach_reaper.discard(vol['display_name'])
+            index = self._detach_volume(vol, json.loads(vol['path_info']))
+        else:
+            LOG.info("Volume %s is still attached to node %s, removing "
+                     "its VLUNs..." % (vol['display_name'],
+                                       pending['node_id']))
+            self._force_remove_vlun(vol, is_snap)
+            pending_path_info = (pending['node_id'], vol['path_info'])
+
+            def _add_old_path_info(current_vol):
+                old_path_info = list(current_vol.get('old_path_info', []))
+                old_path_info.append(pending_path_info)
+                return ({'old_path_info': old_path_info},
+                        ('detach_pending',))
+            index = self._update_vol_at_index(vol, index, _add_old_path_info)
+            vol.setdefault('old_path_info', []).append(pending_path_info)
+        vol.pop('detach_pending')
+        vol['path_info'] = None
+        return index
+
+    def _reap_pending_detach(self, volname):
+        # Tell from a plain read whether the grace period is over, so that
+        # a remount within it never finds the volume locked by the reaper
+        vol = self._etcd.get_vol_byname(volname)
+        if vol is None:
+            return True
+        pending = vol.get('detach_pending')
+        if pending and pending['node_id'] == self._node_id and \
+                time.time() < pending['deadline']:
+            return False
+
+        lock = self._etcd.get_lock('VOL')
+        try:
+            lock.lock_name(volname, 0)
+        except exception.HPEPluginLockFailed:
+            LOG.debug("Volume %s is locked, checking its detach later"
+                      % volname)
+            return False
+        try:
+            index, vol = self._etcd.get_vol_byname_with_index(volname)
+            if vol is None:
+                return True
+            pending = vol.get('detach_pending')
+            if pending and pending['node_id'] == self._node_id:
+                if time.time() < pending['deadline']:
+                    return False
+                LOG.info("Grace period of volume %s is over, detaching "
+                         "it..." % volname)
+                self._detach_volume(vol, json.loads(vol['path_info']))
+                return True
+
+            # Remounted, or taken over by another node that left the
+            # devices of this node to be cleaned up
+            path_info = self._pop_old_path_info(vol, index)
+            if path_info:
+                LOG.info("Volume %s was taken over by another node, "
+                         "cleaning up its devices..." % volname)
+                self._detach_volume(vol, path_info, node_owns_volume=False)
+            return True
+        finally:
+            lock.try_unlock_name(volname)
 
     def _force_remove_vlun(self, vol, is_snap):
         bkend_vol_name = utils.get_3par_name(vol['id'], is_snap)
@@ -1287,8 +1766,12 @@ class VolumeManager(object):
             if self.tgt_bkend_config.quorum_witness_ip:
                 LOG.info("Peer Persistence setup: Removing VLUNs "
                          "forcefully from remote backend...")
-                self._primary_driver.force_remove_volume_vlun(bkend_vol_name)
-                self._remote_driver.force_remove_volume_vlun(bkend_vol_name)
+                utils.run_concurrently(
+                    self._array_executor,
+                    lambda: self._primary_driver.force_remove_volume_vlun(
+                        bkend_vol_name),
+                    lambda: self._remote_driver.force_remove_volume_vlun(
+                        bkend_vol_name))
                 LOG.info("Peer Persistence setup: VLUNs forcefully "
                          "removed from remote backend!")
             else:
@@ -1311,6 +1794,8 @@ class VolumeManager(object):
                         raise exception.HPEDriverForceRemoveVLUNFailed(
                             reason=msg)
                 except Exception as ex:
+                    self._rcg_state_cache.invalidate(
+                        vol['rcg_info']['local_rcg_name'])
                     msg = "Failed to force remove VLUN(s). " \
                           "Exception: %s" % six.text_type(ex)
                     LOG.error(msg)
@@ -1323,18 +1808,34 @@ class VolumeManager(object):
 
     @synchronization.synchronized_volume('{volname}')
     def mount_volume(self, volname, vol_mount, mount_id):
-        vol = self._etcd.get_vol_byname(volname)
+        # The mount information is written only if the volume is still at
+        # index, and computed again from the volume otherwise
+        index, vol = self._etcd.get_vol_byname_with_index(volname)
         if vol is None:
             msg = (_LE('Volume mount name not found %s'), volname)
             LOG.error(msg)
             raise exception.HPEPluginMountException(reason=msg)
 
+        if vol.get('status') == volume.CLONING:
+            raise exception.HPEPluginVolumeCloning(
+                name=volname,
+                progress=vol.get('clone_progress', "in progress"))
+        if vol.get('status') == volume.CLONE_FAILED:
+            msg = "Copy of clone %s failed (%s), please remove it" \
+                  % (volname, vol.get('clone_progress'))
+            LOG.error(msg)
+            raise exception.HPEPluginMountException(reason=msg)
+
+        if self._is_preformat_pending(vol):
+            index, vol = self._wait_for_preformat(vol, index)
+
         undo_steps = []
-        volid = vol['id']
+        # Fields to be written to etcd along with the mount information
+        vol_updates = {}
         is_snap = False
         if 'is_snap' not in vol:
             vol['is_snap'] = volume.DEFAULT_TO_SNAP_TYPE
-            self._etcd.update_vol(volid, 'is_snap', is_snap)
+            vol_updates['is_snap'] = is_snap
         elif vol['is_snap']:
             is_snap = vol['is_snap']
             vol['fsOwner'] = vol['snap_metadata'].get('fsOwner')
@@ -1343,8 +1844,16 @@ class VolumeManager(object):
         if 'mount_conflict_delay' not in vol:
             m_conf_delay = volume.DEFAULT_MOUNT_CONFLICT_DELAY
             vol['mount_conflict_delay'] = m_conf_delay
-            self._etcd.update_vol(volid, 'mount_conflict_delay',
-                                  m_conf_delay)
+            vol_updates['mount_conflict_delay'] = m_conf_delay
+
+        reused_path_info = None
+        if 'detach_pending' in vol:
+            index, reused_path_info = self._take_pending_detach(
+                vol, index, is_snap)
+
+        # Nodes the volume is taken from if it is mounted on another node
+        fenced_nodes = set()
+
         # Initialize node-mount-info if volume is being mounted
         # for the first time
         if self._is_vol_not_mounted(vol):
@@ -1358,7 +1867,8 @@ class VolumeManager(object):
 
             # If mounted on this node itself then just append mount-id
             if self._is_vol_mounted_on_this_node(node_mount_info, vol):
-                self._update_mount_id_list(vol, mount_id)
+                self._update_mount_id_list(vol, index, mount_id,
+                                           vol_updates)
                 return self._get_success_response(vol)
             else:
                 # Volume mounted on different node
@@ -1379,11 +1889,22 @@ class VolumeManager(object):
                     if 'path_info' in vol:
                         path_info = vol['path_info']
                         old_node_id = list(node_mount_info.keys())[0]
-                        old_path_info = vol.get('old_path_info', [])
-                        old_path_info.append((old_node_id, path_info))
-                        self._etcd.update_vol(volid, 'old_path_info',
-                                              old_path_info)
 
+                        def _add_old_path_info(current_vol,
+                                               updates=vol_updates):
+                            old_path_info = list(
+                                current_vol.get('old_path_info', []))
+                            old_path_info.append((old_node_id, path_info))
+                            return dict(updates,
+                                        old_path_info=old_path_info), ()
+
+                        # Save right away so that the previous node can
+                        # clean up even if this mount fails
+                        index = self._update_vol_at_index(
+                            vol, index, _add_old_path_info)
+                        vol_updates = {}
+
+                fenced_nodes = set(node_mount_info)
                 node_mount_info = {self._node_id: [mount_id]}
                 LOG.info("New node_mount_info set: %s" % node_mount_info)
 
@@ -1392,7 +1913,7 @@ class VolumeManager(object):
             root_helper, self._my_ip, multipath=self._use_multipath,
             enforce_multipath=self._enforce_multipath)
 
-        def _mount_volume(driver):
+        def _mount_volume(driver, undo_steps=undo_steps):
             LOG.info("Entered _mount_volume")
             try:
                 # Call driver to initialize the connection
@@ -1416,6 +1937,7 @@ class VolumeManager(object):
                        six.text_type(ex))
                 LOG.error(msg)
                 self._rollback(undo_steps)
+                del undo_steps[:]
                 raise exception.HPEPluginMountException(reason=msg)
 
             # Call OS Brick to connect volume
@@ -1433,28 +1955,51 @@ class VolumeManager(object):
                        six.text_type(ex))
                 LOG.error(msg)
                 self._rollback(undo_steps)
+                del undo_steps[:]
                 raise exception.HPEPluginMountException(reason=msg)
             return device_info, connection_info
 
         pri_connection_info = None
         sec_connection_info = None
+        if reused_path_info:
+            device_info = reused_path_info['device_info']
+            pri_connection_info = reused_path_info['connection_info']
+            sec_connection_info = reused_path_info.get(
+                'remote_connection_info')
+            undo_steps.append(
+                {'undo_func': self._detach_volume,
+                 'params': (vol, reused_path_info),
+                 'msg': 'Detaching volume: %s...' % volname})
         # Check if replication is configured and volume is
         # populated with the RCG
-        if (self.tgt_bkend_config and 'rcg_info' in vol and
+        elif (self.tgt_bkend_config and 'rcg_info' in vol and
                 vol['rcg_info'] is not None):
             LOG.info("This is a replication setup")
             # Check if this is Active/Passive based replication
             if self.tgt_bkend_config.quorum_witness_ip:
                 LOG.info("Peer Persistence has been configured")
-                # This is Peer Persistence setup
-                LOG.info("Mounting volume on primary array...")
-                device_info, pri_connection_info = _mount_volume(
-                    self._primary_driver)
+                # This is Peer Persistence setup. Each array records its
+                # own undo steps, as a failed mount only rolls back the
+                # steps of its array
+                pri_undo_steps = []
+                sec_undo_steps = []
+                LOG.info("Mounting volume on primary and secondary "
+                         "arrays...")
+                try:
+                    (device_info, pri_connection_info), \
+                        (sec_device_info, sec_connection_info) = \
+                        utils.run_concurrently(
+                            self._array_executor,
+                            lambda: _mount_volume(self._primary_driver,
+                                                  pri_undo_steps),
+                            lambda: _mount_volume(self._remote_driver,
+                                                  sec_undo_steps))
+                except Exception:
+                    self._rollback(pri_undo_steps + sec_undo_steps)
+                    raise
+                undo_steps.extend(pri_undo_steps + sec_undo_steps)
                 LOG.info("Volume successfully mounted on primary array!"
                          "pri_connection_info: %s" % pri_connection_info)
-                LOG.info("Mounting volume on secondary array...")
-                sec_device_info, sec_connection_info = _mount_volume(
-                    self._remote_driver)
                 LOG.info("Volume successfully mounted on secondary array!"
                          "sec_connection_info: %s" % sec_connection_info)
             else:
@@ -1463,7 +2008,13 @@ class VolumeManager(object):
                 # target array
                 LOG.info("Active/Passive replication has been configured")
                 driver = self._get_target_driver(vol['rcg_info'])
-                device_info, pri_connection_info = _mount_volume(driver)
+                try:
+                    device_info, pri_connection_info = _mount_volume(driver)
+                except Exception:
+                    # The cached active array may be stale
+                    self._rcg_state_cache.invalidate(
+                        vol['rcg_info']['local_rcg_name'])
+                    raise
                 LOG.info("Volume successfully mounted on active array!"
                          "active_connection_info: %s" % pri_connection_info)
         else:
@@ -1488,11 +2039,17 @@ class VolumeManager(object):
                   {'name': volname, 'device': device_info['path'],
                    'realpath': path.path})
 
-        # Create filesystem on the new device
-        if fileutil.has_filesystem(path.path) is False:
-            fileutil.create_filesystem(path.path)
-            LOG.debug('filesystem successfully created on : %(path)s',
-                      {'path': path.path})
+        # Create filesystem on the new device, unless it is known to
+        # have one already
+        if vol.get('fs_ready'):
+            LOG.debug('Volume %s is already formatted' % volname)
+        else:
+            if fileutil.has_filesystem(path.path) is False:
+                fileutil.create_filesystem(path.path,
+                                           **vol.get('fs_opts', {}))
+                LOG.debug('filesystem successfully created on : %(path)s',
+                          {'path': path.path})
+            vol_updates['fs_ready'] = True
 
         # Determine if we need to mount the volume
         if vol_mount == volume.DEFAULT_MOUNT_VOLUME:
@@ -1557,12 +2114,25 @@ class VolumeManager(object):
 
             LOG.info("Updating node_mount_info in etcd with mount_id %s..."
                      % mount_id)
-            self._etcd.update_vol(volid,
-                                  'node_mount_info',
-                                  node_mount_info)
+            vol_updates['path_info'] = json.dumps(path_info)
+
+            def _set_node_mount_info(current_vol):
+                current = current_vol.get('node_mount_info') or {}
+                other_nodes = set(current) - fenced_nodes - {self._node_id}
+                if other_nodes:
+                    msg = "Volume %s got mounted on node(s) %s while " \
+                          "being mounted on this node" \
+                          % (volname, list(other_nodes))
+                    raise exception.HPEPluginMountException(reason=msg)
+                mount_ids = list(current.get(self._node_id, []))
+                if mount_id not in mount_ids:
+                    mount_ids.append(mount_id)
+                return dict(vol_updates,
+                            node_mount_info={self._node_id: mount_ids}), ()
+
+            self._update_vol_at_index(vol, index, _set_node_mount_info)
             LOG.info("node_mount_info updated successfully in etcd with "
                      "mount_id %s" % mount_id)
-            self._etcd.update_vol(volid, 'path_info', json.dumps(path_info))
 
             response = json.dumps({u"Err": '', u"Name": volname,
                                    u"Mountpoint": mount_dir,
@@ -1574,29 +2144,30 @@ class VolumeManager(object):
         return response
 
     def _get_target_driver(self, rcg_info):
-        local_rcg = None
-        rcg_name = rcg_info.get('local_rcg_name')
-        try:
-            LOG.info("Getting local RCG: %s" % rcg_name)
-            local_rcg = self._primary_driver.get_rcg(rcg_name)
-            local_role_reversed = local_rcg['targets'][0]['roleReversed']
-        except Exception as ex:
-            msg = "There was an error fetching the remote copy " \
-                  "group %s from primary array: %s" % \
-                  (rcg_name, six.text_type(ex))
-            LOG.error(msg)
+        return self._rcg_state_cache.get_active(rcg_info)
 
-        remote_rcg = None
+    def _resolve_target_driver(self, rcg_info):
+        rcg_name = rcg_info.get('local_rcg_name')
         remote_rcg_name = rcg_info.get('remote_rcg_name')
-        try:
-            LOG.info("Getting remote RCG: %s" % remote_rcg_name)
-            remote_rcg = self._remote_driver.get_rcg(remote_rcg_name)
-            remote_role_reversed = remote_rcg['targets'][0]['roleReversed']
-        except Exception as ex:
-            msg = "There was an error fetching the remote copy " \
-                  "group %s from secondary array: %s" % \
-                  (remote_rcg_name, six.text_type(ex))
-            LOG.error(msg)
+
+        def _get_rcg(driver, name, array):
+            try:
+                LOG.info("Getting RCG %s from %s array" % (name, array))
+                rcg = driver.get_rcg(name)
+                return rcg, rcg['targets'][0]['roleReversed']
+            except Exception as ex:
+                msg = "There was an error fetching the remote copy " \
+                      "group %s from %s array: %s" % \
+                      (name, array, six.text_type(ex))
+                LOG.error(msg)
+                return None, None
+
+        (local_rcg, local_role_reversed), \
+            (remote_rcg, remote_role_reversed) = utils.run_concurrently(
+                self._array_executor,
+                lambda: _get_rcg(self._primary_driver, rcg_name, 'primary'),
+                lambda: _get_rcg(self._remote_driver, remote_rcg_name,
+                                 'secondary'))
 
         # Both arrays are up - this could just be a group fail-over
         if local_rcg and remote_rcg:
@@ -1643,15 +2214,12 @@ class VolumeManager(object):
 
     @synchronization.synchronized_volume('{volname}')
     def unmount_volume(self, volname, vol_mount, mount_id):
-        vol = self._etcd.get_vol_byname(volname)
+        index, vol = self._etcd.get_vol_byname_with_index(volname)
         if vol is None:
             msg = (_LE('Volume unmount name not found %s'), volname)
             LOG.error(msg)
             raise exception.HPEPluginUMountException(reason=msg)
 
-        volid = vol['id']
-        is_snap = vol['is_snap']
-
         path_info = None
         node_owns_volume = True
 
@@ -1671,31 +2239,9 @@ class VolumeManager(object):
             # by some other node, it can go to that different ETCD root to
             # fetch the volume meta-data and do the cleanup.
             if self._node_id not in node_mount_info:
-                if 'old_path_info' in vol:
-                    LOG.info("Old path info present in volume: %s"
-                             % path_info)
-                    for pi in vol['old_path_info']:
-                        node_id = pi[0]
-                        if node_id == self._node_id:
-                            LOG.info("Found matching old path info for old "
-                                     "node ID: %s" % six.text_type(pi))
-                            path_info = pi
-                            node_owns_volume = False
-                            break
-
+                path_info = self._pop_old_path_info(vol, index)
                 if path_info:
-                    LOG.info("Removing old path info for node %s from ETCD "
-                             "volume meta-data..." % self._node_id)
-                    vol['old_path_info'].remove(path_info)
-                    if len(vol['old_path_info']) == 0:
-                        LOG.info("Last old_path_info found. "
-                                 "Removing it too...")
-                        vol.pop('old_path_info')
-                    LOG.info("Updating volume meta-data: %s..." % vol)
-                    self._etcd.save_vol(vol)
-                    LOG.info("Volume meta-data updated: %s" % vol)
-
-                    path_info = json.loads(path_info[1])
+                    node_owns_volume = False
                     LOG.info("Cleaning up devices using old_path_info: %s"
                              % path_info)
                 else:
@@ -1707,38 +2253,42 @@ class VolumeManager(object):
                 LOG.info("node_id '%s' is present in vol mount info"
                          % self._node_id)
 
-                mount_id_list = node_mount_info[self._node_id]
-
-                LOG.info("Current mount_id_list %s " % mount_id_list)
-
-                try:
-                    mount_id_list.remove(mount_id)
-                except ValueError as ex:
-                    LOG.exception('Ignoring exception: %s' % ex)
-                    pass
-
-                LOG.info("Updating node_mount_info '%s' in etcd..."
-                         % node_mount_info)
-                # Update the mount_id list in etcd
-                self._etcd.update_vol(volid, 'node_mount_info',
-                                      node_mount_info)
+                LOG.info("Current mount_id_list %s "
+                         % node_mount_info[self._node_id])
+
+                # Mount IDs left on this node once mount_id is removed
+                mount_id_list = []
+
+                def _remove_mount_id(current_vol):
+                    current = current_vol.get('node_mount_info') or {}
+                    mount_id_list[:] = current.get(self._node_id, [])
+                    try:
+                        mount_id_list.remove(mount_id)
+                    except ValueError as ex:
+                        LOG.exception('Ignoring exception: %s' % ex)
+                    if mount_id_list:
+                        current[self._node_id] = list(mount_id_list)
+                    else:
+                        current.pop(self._node_id, None)
+                    if current:
+                        return {'node_mount_info': current}, ()
+                    return {}, ('node_mount_info',)
 
-                LOG.info("Updated node_mount_info '%s' in etcd!"
-                         % node_mount_info)
+                LOG.info("Removing mount_id %s from node_mount_info in "
+                         "etcd..." % mount_id)
+                self._update_vol_at_index(vol, index, _remove_mount_id)
 
                 if len(mount_id_list) > 0:
+                    LOG.info("Updated node_mount_info in etcd, mount IDs "
+                             "left on this node: %s" % mount_id_list)
+
                     # Don't proceed with unmount
                     LOG.info("Volume still in use by %s containers... "
                              "no unmounting done!" % len(mount_id_list))
                     return json.dumps({u"Err": ''})
                 else:
-                    # delete the node_id key from node_mount_info
-                    LOG.info("Removing node_mount_info %s",
-                             node_mount_info)
-                    vol.pop('node_mount_info')
-                    LOG.info("Saving volume to etcd: %s..." % vol)
-                    self._etcd.save_vol(vol)
-                    LOG.info("Volume saved to etcd: %s!" % vol)
+                    vol.pop('node_mount_info', None)
+                    LOG.info("Removed node_mount_info from etcd: %s!" % vol)
 
         # TODO: Requirement #5 will bring the flow here but the below flow
         # may result into exception. Need to ensure it doesn't happen
@@ -1748,13 +2298,77 @@ class VolumeManager(object):
         # path_info = vol.get('path_info', None)
         if path_info:
             path_name = path_info['path']
-            connection_info = path_info['connection_info']
             mount_dir = path_info['mount_dir']
         else:
             msg = (_LE('Volume unmount path info not found %s'), volname)
             LOG.error(msg)
             raise exception.HPEPluginUMountException(reason=msg)
 
+        # Determine if we need to unmount a previously mounted volume
+        if vol_mount is volume.DEFAULT_MOUNT_VOLUME:
+            # unmount directory
+            fileutil.umount_dir(mount_dir)
+            # remove directory
+            fileutil.remove_dir(mount_dir)
+
+        # Keep the devices and VLUNs around for a remount on this node
+        if node_owns_volume and self._detach_grace_period:
+            self._defer_detach(vol)
+            return json.dumps({u"Err": ''})
+
+        self._detach_volume(vol, path_info, node_owns_volume)
+
+        LOG.info(_LI('path for volume: %(name)s, was successfully removed: '
+                     '%(path_name)s'), {'name': volname,
+                                        'path_name': path_name})
+        response = json.dumps({u"Err": ''})
+        return response
+
+    def _pop_old_path_info(self, vol, index):
+        """Removes the path info left for this node from old_path_info
+
+        A volume forcibly mounted on another node keeps the path info of
+        the node it was taken from, so that node can clean up its devices.
+        vol was read at modifiedIndex index. Returns the path info, or None
+        if there is none for this node.
+        """
+        path_info = None
+        for pi in vol.get('old_path_info', []):
+            node_id = pi[0]
+            if node_id == self._node_id:
+                LOG.info("Found matching old path info for old "
+                         "node ID: %s" % six.text_type(pi))
+                path_info = pi
+                break
+
+        if not path_info:
+            return None
+
+        LOG.info("Removing old path info for node %s from ETCD "
+                 "volume meta-data..." % self._node_id)
+
+        def _remove_old_path_info(current_vol):
+            # Other nodes may have added theirs since vol was read
+            old_path_info = [pi for pi in current_vol.get('old_path_info', [])
+                             if pi[0] != self._node_id]
+            if not old_path_info:
+                LOG.info("Last old_path_info found. Removing it too...")
+                return {}, ('old_path_info',)
+            return {'old_path_info': old_path_info}, ()
+        self._update_vol_at_index(vol, index, _remove_old_path_info)
+        LOG.info("Volume meta-data updated: %s" % vol['display_name'])
+        return json.loads(path_info[1])
+
+    def _detach_volume(self, vol, path_info, node_owns_volume=True):
+        """Disconnects the devices of vol and removes its VLUNs
+
+        Returns the modifiedIndex of the volume once its path info is
+        cleared, None if the volume is not owned by this node.
+        """
+        volid = vol['id']
+        is_snap = vol.get('is_snap', False)
+        connection_info = path_info['connection_info']
+
         # Get connector info from OS Brick
         # TODO: retrieve use_multipath and enforce_multipath from config file
         root_helper = 'sudo'
@@ -1763,13 +2377,6 @@ class VolumeManager(object):
             root_helper, self._my_ip, multipath=self._use_multipath,
             enforce_multipath=self._enforce_multipath)
 
-        # Determine if we need to unmount a previously mounted volume
-        if vol_mount is volume.DEFAULT_MOUNT_VOLUME:
-            # unmount directory
-            fileutil.umount_dir(mount_dir)
-            # remove directory
-            fileutil.remove_dir(mount_dir)
-
         # Changed asynchronous disconnect_volume to sync call
         # since it causes a race condition between unmount and
         # mount operation on the same volume. This scenario is
@@ -1811,24 +2418,26 @@ class VolumeManager(object):
                 # path does not stay around
                 # raise exception.HPEPluginUMountException(reason=msg)
 
-        _unmount_volume(self._hpeplugin_driver)
-
         # In case of Peer Persistence, volume is mounted on the secondary
         # array as well. It should be unmounted too
         if self.tgt_bkend_config:
-            _unmount_volume(self._remote_driver)
+            utils.run_concurrently(
+                self._array_executor,
+                lambda: _unmount_volume(self._hpeplugin_driver),
+                lambda: _unmount_volume(self._remote_driver))
+        else:
+            _unmount_volume(self._hpeplugin_driver)
 
         # TODO: Create path_info list as we can mount the volume to multiple
         # hosts at the same time.
         # If this node owns the volume then update path_info
         if node_owns_volume:
-            self._etcd.update_vol(volid, 'path_info', None)
-
-        LOG.info(_LI('path for volume: %(name)s, was successfully removed: '
-                     '%(path_name)s'), {'name': volname,
-                                        'path_name': path_name})
-        response = json.dumps({u"Err": ''})
-        return response
+            if 'detach_pending' in vol:
+                return self._etcd.update_vol_fields(
+                    volid, {'path_info': None},
+                    remove_fields=('detach_pending',))
+            return self._etcd.update_vol_fields(volid, {'path_info': None})
+        return None
 
     def _create_volume(self, vol_specs, undo_steps):
         bkend_vol_name = self._hpeplugin_driver.create_volume(vol_specs)
@@ -0,0 +1,168 @@
+# (c) Copyright [2016] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import threading
+
+from oslo_log import log as logging
+import six
+
+import hpedockerplugin.exception as exception
+
+LOG = logging.getLogger(__name__)
+
+VALID_PROVISIONING = ['thin', 'full', 'dedup']
+
+
+class VolumeProfile(collections.namedtuple(
+        'VolumeProfile', ['size', 'provisioning', 'compression', 'cpg'])):
+    """Properties shared by the interchangeable volumes of a pool"""
+    @property
+    def key(self):
+        return '%s-%s-%s-%s' % (self.cpg or 'default', self.size,
+                                self.provisioning,
+                                self.compression or 'default')
+
+
+def parse_profiles(entries):
+    """Parses warm_pool_profiles entries
+
+    An entry is size:provisioning[:compression[:cpg]], e.g. "10:thin" or
+    "100:dedup:true:FC_r6".
+    """
+    profiles = []
+    for entry in entries:
+        fields = entry.strip().split(':')
+        try:
+            if not 2 <= len(fields) <= 4:
+                raise ValueError(entry)
+            size = int(fields[0])
+            prov = fields[1].lower()
+            if prov not in VALID_PROVISIONING:
+                raise ValueError(entry)
+            compression = fields[2].lower() if len(fields) > 2 else None
+            if compression not in (None, 'true', 'false'):
+                raise ValueError(entry)
+            cpg = fields[3] if len(fields) > 3 else None
+        except ValueError:
+            msg = "Invalid warm_pool_profiles entry '%s'. Expected " \
+                  "size:provisioning[:compression[:cpg]]" % entry
+            raise exception.InvalidInput(reason=msg)
+        profiles.append(VolumeProfile(size, prov, compression or None,
+                                      cpg or None))
+    return profiles
+
+
+class WarmVolumePool(object):
+    """Pre-created volumes handed out by Create requests that match them
+
+    The pooled volumes of a backend are kept in etcd, so any node can
+    claim one. A claim atomically removes the volume from the pool. A
+    background thread refills the pool to pool_size volumes per profile,
+    keeping the capacity of all pooled volumes within max_capacity GiB,
+    and releases the volumes of profiles no longer configured. Refilling
+    is done by one node at a time.
+
+    provision(profile) creates a volume on the array and returns its
+    record. release(vol) deletes it from the array.
+    """
+    def __init__(self, backend, etcd_util, profiles, pool_size,
+                 provision, release, max_capacity=0, refill_interval=60):
+        self._backend = backend
+        self._etcd = etcd_util
+        self._profiles = {profile.key: profile for profile in profiles}
+        self._pool_size = pool_size
+        self._provision = provision
+        self._release = release
+        self._max_capacity = max_capacity
+        self._refill_interval = refill_interval
+        self._refill_needed = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='%s-warm-pool' % self._backend)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def claim(self, size, provisioning, compression, cpg):
+        """Takes a pooled volume with the given properties out of the pool
+
+        Returns None if no profile matches or the pool of the matching
+        profile is empty.
+        """
+        if compression is not None:
+            compression = str(compression).lower()
+        profile = VolumeProfile(size, provisioning, compression, cpg)
+        if profile.key not in self._profiles:
+            return None
+        vol = self._etcd.claim_pooled_vol(self._backend, profile.key)
+        self._refill_needed.set()
+        if vol is None:
+            LOG.info("Warm pool of profile %s is empty" % profile.key)
+        return vol
+
+    def _run(self):
+        while True:
+            try:
+                self.refill()
+            except Exception as ex:
+                LOG.exception("Warm pool refill of backend %s failed: %s"
+                              % (self._backend, six.text_type(ex)))
+            self._refill_needed.wait(self._refill_interval)
+            self._refill_needed.clear()
+
+    def refill(self):
+        lock = self._etcd.get_lock('WARM_POOL')
+        try:
+            lock.lock_name(self._backend, 0)
+        except exception.HPEPluginLockFailed:
+            LOG.debug("Warm pool of backend %s is being refilled by "
+                      "another node" % self._backend)
+            return
+        try:
+            self._refill()
+        finally:
+            lock.try_unlock_name(self._backend)
+
+    def _refill(self):
+        pooled = self._etcd.get_pooled_vols(self._backend)
+
+        for key, vols in pooled.items():
+            if key in self._profiles:
+                continue
+            for vol in vols:
+                if self._etcd.remove_pooled_vol(self._backend, key,
+                                                vol['id']):
+                    LOG.info("Releasing volume %s of unconfigured warm "
+                             "pool profile %s" % (vol['id'], key))
+                    self._release(vol)
+
+        capacity = sum(vol['size'] for key, vols in pooled.items()
+                       if key in self._profiles for vol in vols)
+        for key, profile in sorted(self._profiles.items()):
+            missing = self._pool_size - len(pooled.get(key, []))
+            for i in range(missing):
+                if self._max_capacity and \
+                        capacity + profile.size > self._max_capacity:
+                    LOG.warning("Warm pool of backend %s is at its "
+                                "capacity ceiling of %s GiB, not adding "
+                                "volumes of profile %s"
+                                % (self._backend, self._max_capacity, key))
+                    break
+                vol = self._provision(profile)
+                self._etcd.save_pooled_vol(self._backend, key, vol)
+                capacity += profile.size
+                LOG.info("Added volume %s to warm pool profile %s"
+                         % (vol['id'], key))
@@ -1,9 +1,22 @@
+import threading
+
 import test.fake_3par_data as data
 import test.createvolume_tester as createvolume
 from hpedockerplugin import exception as hpe_exc
 from hpe3parclient import exceptions
 
 
+def _wait_for_background_copy():
+    # The copy of an offline clone is started by a thread of its own, and
+    # then tracked by the task tracker of the array
+    for thread in threading.enumerate():
+        if thread.name.startswith('clone-'):
+            thread.join(5)
+    for thread in threading.enumerate():
+        if thread.name.endswith('-task-tracker'):
+            thread.join(5)
+
+
 # Variation of CreateVolumeUnitTest. Nothing specific to do here
 class CloneVolumeUnitTest(createvolume.CreateVolumeUnitTest):
     pass
@@ -74,9 +87,20 @@ class TestCloneOfflineCopy(CloneVolumeUnitTest):
         self._test_case.assertEqual(resp, {u"Err": ''})
         mock_3parclient = self.mock_objects['mock_3parclient']
         mock_3parclient.createVolume.assert_called()
-        mock_3parclient.copyVolume.assert_called()
         mock_3parclient.modifyVolume.assert_called()
 
+        # The clone is saved as CLONING and its copy is done in the
+        # background
+        mock_etcd = self.mock_objects['mock_etcd']
+        clone_vol = mock_etcd.save_vol.call_args[0][0]
+        self._test_case.assertEqual('CLONING', clone_vol['status'])
+
+        _wait_for_background_copy()
+        mock_3parclient.copyVolume.assert_called()
+        mock_etcd.update_vol_fields.assert_called_with(
+            clone_vol['id'], {'status': ''},
+            remove_fields=('clone_progress', 'clone_copy'))
+
     def get_request_params(self):
         return {"Name": "clone-vol-001",
                 "Opts": {"cloneOf": data.VOLUME_NAME,
@@ -39,10 +39,6 @@ class TestCreateFirstDefaultShare(CreateShareUnitTest):
         etcd_get_share_side_effect = list()
         mock_share_etcd.get_share.side_effect = etcd_get_share_side_effect
 
-        etcd_get_backend_metadata_side_effect = list()
-        mock_fp_etcd.get_backend_metadata.side_effect = \
-            etcd_get_backend_metadata_side_effect
-
         etcd_get_fpg_metadata_side_effect = list()
         mock_fp_etcd.get_fpg_metadata.side_effect = \
             etcd_get_fpg_metadata_side_effect
@@ -73,32 +69,18 @@ class TestCreateFirstDefaultShare(CreateShareUnitTest):
             exception.EtcdMetadataNotFound(msg="Key not found")
         )
         # Step #2:
-        # Skip check for share existence <-- File Mgr
-        etcd_get_share_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Share is found QUEUED by the worker creating it <-- File Mgr
+        etcd_get_share_side_effect.append(data.queued_share)
         # Step #3:
-        # Get current default FPG. No backend metadata exists
-        # This will result in EtcdDefaultFpgNotPresent exception
-        # which will execute _create_default_fpg flow which tries
-        # to generate default FPG/VFS names using backend metadata
-        etcd_get_backend_metadata_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Get current default FPGs. The CPG has none yet. This will
+        # result in EtcdDefaultFpgNotPresent exception which will
+        # execute _create_default_fpg flow
+        mock_fp_etcd.get_default_fpgs.return_value = []
         # Step #4:
-        # _create_default_fpg flow tries to generate default FPG/VFS
-        # names using backend metadata. For first share, no backend
-        # metadata exists which results in EtcdMetadataNotFound. As a
-        # result, backend metadata is CREATED:
-        # {
-        #   'ips_in_use': [],
-        #   'ips_locked_for_use': [],
-        #   'counter': 0
-        # }
+        # _create_default_fpg flow generates default FPG/VFS names
+        # using the FPG counter of the backend. For first share,
         # DockerFpg_0 and DockerVFS_0 names are returned for creation.
-        etcd_get_backend_metadata_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        mock_fp_etcd.next_fpg_counter.return_value = 0
         # Step #5:
         # Create FPG DockerFpg_0 at the backend. This results in 3PAR
         # task creation with taskId present in fpg_create_response. Wait
@@ -107,25 +89,24 @@ class TestCreateFirstDefaultShare(CreateShareUnitTest):
             (data.fpg_create_resp, data.fpg_create_body)
         )
         # Step #6:
-        # Wait for task completion and add default_fpg to backend
-        # metadata as below:
-        # {
-        #   'default_fpgs': {cpg_name: ['Docker_Fpg0']},
-        #   'ips_in_use': [],
-        #   'ips_locked_for_use': [],
-        #   'counter': 0
-        # }
-        # Save FPG metadata as well
+        # Wait for task completion. Save FPG metadata as well
         file_client_get_task_side_effect.append(
             data.fpg_create_task_body
         )
         # Step #7:
-        # Claim available IP
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
+        # Add FPG to the default FPGs of the CPG
+        # Claim available IP. The backend has no IP map yet, nor legacy
+        # metadata. The IP map is read again when the claimed IP is
+        # marked in use
+        mock_fp_etcd.get_vfs_ip_map.side_effect = [
+            exception.EtcdMetadataNotFound(msg="Key not found"),
+            exception.EtcdMetadataNotFound(msg="Key not found"),
+            (1, data.etcd_vfs_ip_map)
+        ]
+        mock_fp_etcd.get_backend_metadata.side_effect = \
+            exception.EtcdMetadataNotFound(msg="Key not found")
         # Step #8:
-        # Get all VFS to check IPs in use
+        # Get all VFS to build the IP map from the IPs in use
         file_client_http_get_side_effect.append(
             (data.all_vfs_resp, data.all_vfs_body)
         )
@@ -147,10 +128,7 @@ class TestCreateFirstDefaultShare(CreateShareUnitTest):
         etcd_get_fpg_metadata_side_effect.append({})
 
         # Step #12:
-        # Allow marking of IP to be in use
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
+        # Mark IP in use in the IP map read in step #7
         # Step #13:
         # Create share response and body
         file_client_http_post_side_effect.append(
@@ -167,11 +145,6 @@ class TestCreateFirstDefaultShare(CreateShareUnitTest):
             (data.get_vfs_resp, data.get_vfs_body)
         )
         # Step #16:
-        # Allow marking of IP to be in use
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
-        # Step #17:
         # Allow quota_id to be updated in share
         etcd_get_share_side_effect.append(
             data.create_share_args
@@ -208,10 +181,6 @@ class TestCreateSecondDefaultShare(CreateShareUnitTest):
         etcd_get_share_side_effect = list()
         mock_share_etcd.get_share.side_effect = etcd_get_share_side_effect
 
-        etcd_get_backend_metadata_side_effect = list()
-        mock_fp_etcd.get_backend_metadata.side_effect = \
-            etcd_get_backend_metadata_side_effect
-
         file_client_http_post_side_effect = list()
         mock_file_client.http.post.side_effect = \
             file_client_http_post_side_effect
@@ -234,52 +203,30 @@ class TestCreateSecondDefaultShare(CreateShareUnitTest):
         etcd_get_share_side_effect.append(
             exception.EtcdMetadataNotFound(msg="Key not found")
         )
-        # Step #3: Skip check for share existence <-- File Mgr
-        etcd_get_share_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Step #3: Share is found QUEUED by the worker creating it
+        # <-- File Mgr
+        etcd_get_share_side_effect.append(data.queued_share)
         # Step #4:
-        # Get current default FPG. Backend metadata exists. FPG info
-        # needs to be prepared in the below format and returned. For
-        # this, step #5, #6 and #7 needs to be executed:
-        # fpg_info = {
-        #     'ips': {netmask: [ip]},
-        #     'fpg': fpg_name,
-        #     'vfs': vfs_name,
-        # }
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
-        # Step #5:
-        # Get FPG from the backend so that its total capacity can
-        # be ascertained and checked against sum of sizes of shares
-        # existing on this FPG to find out if a new share with the
-        # specified/default size can be accommodated on this FPG
-        file_client_http_get_side_effect.append(
-            (data.resp, data.bkend_fpg)
-        )
-        # Step #6:
-        # Get all quotas set for the file-stores under the current FPG
-        file_client_http_get_side_effect.append(
-            (data.resp, data.get_quotas_for_fpg)
-        )
+        # Get current default FPGs of the CPG
+        mock_fp_etcd.get_default_fpgs.return_value = ['DockerFpg_0']
+        # Step #5 and #6:
+        # Get FPG metadata holding the capacity accounted on the FPG
+        # to find out if a new share with the specified/default size
+        # can be accommodated on this FPG. The VFS and its IP are taken
+        # from the metadata too, no backend query is needed
+        mock_fp_etcd.get_fpg_metadata.return_value = \
+            data.etcd_default_fpg_metadata
         # Step #7:
-        # Get VFS corresponding the the FPG so that IP and netmask can be
-        # set within the FPG info being returned
-        file_client_http_get_side_effect.append(
-            (data.get_vfs_resp, data.get_vfs_body)
-        )
-        # Step #8:
         # Create share response and body
         file_client_http_post_side_effect.append(
             (data.sh_create_resp, data.sh_create_body)
         )
-        # Step #9:
+        # Step #8:
         # Set quota
         file_client_http_post_side_effect.append(
             (data.set_quota_resp, data.set_quota_body)
         )
-        # Step #10:
+        # Step #9:
         # Allow quota_id to be updated in share
         etcd_get_share_side_effect.append(
             data.create_share_args,
@@ -317,10 +264,6 @@ class TestCreateShareOnNewFpg(CreateShareUnitTest):
         etcd_get_share_side_effect = list()
         mock_share_etcd.get_share.side_effect = etcd_get_share_side_effect
 
-        etcd_get_backend_metadata_side_effect = list()
-        mock_fp_etcd.get_backend_metadata.side_effect = \
-            etcd_get_backend_metadata_side_effect
-
         etcd_get_fpg_metadata_side_effect = list()
         mock_fp_etcd.get_fpg_metadata.side_effect = \
             etcd_get_fpg_metadata_side_effect
@@ -348,10 +291,8 @@ class TestCreateShareOnNewFpg(CreateShareUnitTest):
             exception.EtcdMetadataNotFound(msg="Key not found")
         )
         # Step #3:
-        # Skip check for share existence <-- File Mgr
-        etcd_get_share_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Share is found QUEUED by the worker creating it <-- File Mgr
+        etcd_get_share_side_effect.append(data.queued_share)
 
         # Step #4:
         # No FPG metadata for specified FPG name present in ETCD
@@ -422,10 +363,6 @@ class TestCreateShareOnLegacyFpg(CreateShareUnitTest):
         etcd_get_share_side_effect = list()
         mock_share_etcd.get_share.side_effect = etcd_get_share_side_effect
 
-        etcd_get_backend_metadata_side_effect = list()
-        mock_fp_etcd.get_backend_metadata.side_effect = \
-            etcd_get_backend_metadata_side_effect
-
         etcd_get_fpg_metadata_side_effect = list()
         mock_fp_etcd.get_fpg_metadata.side_effect = \
             etcd_get_fpg_metadata_side_effect
@@ -453,10 +390,8 @@ class TestCreateShareOnLegacyFpg(CreateShareUnitTest):
             exception.EtcdMetadataNotFound(msg="Key not found")
         )
         # Step #3:
-        # Skip check for share existence <-- File Mgr
-        etcd_get_share_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Share is found QUEUED by the worker creating it <-- File Mgr
+        etcd_get_share_side_effect.append(data.queued_share)
 
         # Step #4:
         # No FPG metadata for specified FPG name present in ETCD
@@ -525,10 +460,6 @@ class TestCreateFirstDefaultShareSetQuotaFails(CreateShareUnitTest):
         etcd_get_share_side_effect = list()
         mock_share_etcd.get_share.side_effect = etcd_get_share_side_effect
 
-        etcd_get_backend_metadata_side_effect = list()
-        mock_fp_etcd.get_backend_metadata.side_effect = \
-            etcd_get_backend_metadata_side_effect
-
         etcd_get_fpg_metadata_side_effect = list()
         mock_fp_etcd.get_fpg_metadata.side_effect = \
             etcd_get_fpg_metadata_side_effect
@@ -556,32 +487,18 @@ class TestCreateFirstDefaultShareSetQuotaFails(CreateShareUnitTest):
             exception.EtcdMetadataNotFound(msg="Key not found")
         )
         # Step #2:
-        # Skip check for share existence <-- File Mgr
-        etcd_get_share_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Share is found QUEUED by the worker creating it <-- File Mgr
+        etcd_get_share_side_effect.append(data.queued_share)
         # Step #3:
-        # Get current default FPG. No backend metadata exists
-        # This will result in EtcdDefaultFpgNotPresent exception
-        # which will execute _create_default_fpg flow which tries
-        # to generate default FPG/VFS names using backend metadata
-        etcd_get_backend_metadata_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        # Get current default FPGs. The CPG has none yet. This will
+        # result in EtcdDefaultFpgNotPresent exception which will
+        # execute _create_default_fpg flow
+        mock_fp_etcd.get_default_fpgs.return_value = []
         # Step #4:
-        # _create_default_fpg flow tries to generate default FPG/VFS
-        # names using backend metadata. For first share, no backend
-        # metadata exists which results in EtcdMetadataNotFound. As a
-        # result, backend metadata is CREATED:
-        # {
-        #   'ips_in_use': [],
-        #   'ips_locked_for_use': [],
-        #   'counter': 0
-        # }
+        # _create_default_fpg flow generates default FPG/VFS names
+        # using the FPG counter of the backend. For first share,
         # DockerFpg_0 and DockerVFS_0 names are returned for creation.
-        etcd_get_backend_metadata_side_effect.append(
-            exception.EtcdMetadataNotFound(msg="Key not found")
-        )
+        mock_fp_etcd.next_fpg_counter.return_value = 0
         # Step #5:
         # Create FPG DockerFpg_0 at the backend. This results in 3PAR
         # task creation with taskId present in fpg_create_response. Wait
@@ -590,25 +507,25 @@ class TestCreateFirstDefaultShareSetQuotaFails(CreateShareUnitTest):
             (data.fpg_create_resp, data.fpg_create_body)
         )
         # Step #6:
-        # Wait for task completion and add default_fpg to backend
-        # metadata as below:
-        # {
-        #   'default_fpgs': {cpg_name: ['Docker_Fpg0']},
-        #   'ips_in_use': [],
-        #   'ips_locked_for_use': [],
-        #   'counter': 0
-        # }
-        # Save FPG metadata as well
+        # Wait for task completion. Save FPG metadata as well
         file_client_get_task_side_effect.append(
             data.fpg_create_task_body
         )
         # Step #7:
-        # Claim available IP
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
+        # Add FPG to the default FPGs of the CPG
+        # Claim available IP. The backend has no IP map yet, nor legacy
+        # metadata. The IP map is read again when the claimed IP is
+        # marked in use and when it is released as the quota cannot be set
+        mock_fp_etcd.get_vfs_ip_map.side_effect = [
+            exception.EtcdMetadataNotFound(msg="Key not found"),
+            exception.EtcdMetadataNotFound(msg="Key not found"),
+            (1, data.etcd_vfs_ip_map),
+            (2, data.etcd_vfs_ip_map)
+        ]
+        mock_fp_etcd.get_backend_metadata.side_effect = \
+            exception.EtcdMetadataNotFound(msg="Key not found")
         # Step #8:
-        # Get all VFS to check IPs in use
+        # Get all VFS to build the IP map from the IPs in use
         file_client_http_get_side_effect.append(
             (data.all_vfs_resp, data.all_vfs_body)
         )
@@ -636,43 +553,31 @@ class TestCreateFirstDefaultShareSetQuotaFails(CreateShareUnitTest):
         etcd_get_fpg_metadata_side_effect.append({})
 
         # Step #13:
-        # Allow marking of IP to be in use
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
+        # Mark IP in use in the IP map read in step #7
         # Step #14:
-        # Allow marking of IP to be in use
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg
-        )
-        # Step #15:
         # Create share response and body
         file_client_http_post_side_effect.append(
             (data.sh_create_resp, data.sh_create_body)
         )
-        # Step #16:
+        # Step #15:
         # Set quota FAILS
         file_client_http_post_side_effect.append(
             hpe3par_ex.HTTPBadRequest("Set Quota Failed")
         )
-        # Step #17:
+        # Step #16:
         # Delete file store requires its ID. Query file store
         # by name
         file_client_http_get_side_effect.append(
             (data.get_fstore_resp, data.get_fstore_body)
         )
-        # Step #18:
+        # Step #17:
         # IP marked for use to be returned to IP pool as part of rollback
-        # Return backend metadata that has the IPs in use
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg_and_ips
-        )
-        # Step #19:
+        # Step #18:
         # To delete backend FPG, get FPG by name to retrieve its ID
         file_client_http_get_side_effect.append(
             (data.get_bkend_fpg_resp, data.bkend_fpg)
         )
-        # Step #20:
+        # Step #19:
         # Wait for delete FPG task completion
         mock_file_client.http.delete.return_value = \
             (data.fpg_delete_task_resp, data.fpg_delete_task_body)
@@ -681,11 +586,8 @@ class TestCreateFirstDefaultShareSetQuotaFails(CreateShareUnitTest):
         )
         mock_file_client.TASK_DONE = 1
 
-        # Step #21:
-        # Allow removal of default FPG from backend metadata
-        etcd_get_backend_metadata_side_effect.append(
-            data.etcd_bkend_mdata_with_default_fpg_and_ips
-        )
+        # Step #20:
+        # Default FPG is removed from the default FPGs of the CPG
 
     def check_response(self, resp):
         pass
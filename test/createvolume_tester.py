@@ -1,9 +1,12 @@
-# import mock
+import copy
+import mock
 import test.fake_3par_data as data
+from hpedockerplugin.hpe import volume
 from hpedockerplugin import exception as hpe_exc
 import test.hpe_docker_unit_test as hpedockerunittest
 from hpe3parclient import exceptions
 from oslo_config import cfg
+import time
 CONF = cfg.CONF
 
 
@@ -231,6 +234,135 @@ class TestCreateDedupVolume(CreateVolumeUnitTest):
             data.wsapi_version_for_dedup
 
 
+# fsPreformat=true
+class TestCreateVolumeWithPreformat(CreateVolumeUnitTest):
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp, {u"Err": ''})
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        vol = mock_etcd.save_vol.call_args[0][0]
+        self._test_case.assertFalse(vol['fs_ready'])
+        self._test_case.assertEqual({'lazy_init': True, 'nodiscard': False},
+                                    vol['fs_opts'])
+
+        # Formatting happens in the background, wait for its outcome
+        for i in range(500):
+            if mock_etcd.update_vol_fields.called:
+                break
+            time.sleep(0.01)
+        mock_etcd.update_vol_fields.assert_called_once_with(
+            vol['id'], {'fs_ready': True},
+            remove_fields=('preformat_deadline',))
+
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.create_filesystem.assert_called_once_with(
+            '/tmp', lazy_init=True, nodiscard=False)
+        mock_protocol_connector = self.mock_objects['mock_protocol_connector']
+        mock_protocol_connector.disconnect_volume.assert_called()
+
+    def get_request_params(self):
+        return {"Name": "test-vol-001",
+                "Opts": {'fsPreformat': 'true',
+                         'fsLazyInit': 'true'}}
+
+    def setup_mock_objects(self):
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.get_vol_byname.return_value = None
+
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.has_filesystem.return_value = False
+
+        mock_connector = self.mock_objects['mock_osbricks_connector']
+        mock_connector.get_connector_properties.return_value = \
+            data.connector_multipath_enabled
+        mock_protocol_connector = self.mock_objects['mock_protocol_connector']
+        mock_protocol_connector.connect_volume.return_value = \
+            {'path': '/tmp'}
+
+
+# Background formatting fails, first mount formats the volume
+class TestCreateVolumePreformatFails(TestCreateVolumeWithPreformat):
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp, {u"Err": ''})
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        vol = mock_etcd.save_vol.call_args[0][0]
+        for i in range(500):
+            if mock_etcd.update_vol_fields.called:
+                break
+            time.sleep(0.01)
+        mock_etcd.update_vol_fields.assert_called_once_with(
+            vol['id'], {}, remove_fields=('fs_ready', 'preformat_deadline'))
+
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.create_filesystem.assert_not_called()
+
+    def setup_mock_objects(self):
+        super(TestCreateVolumePreformatFails, self).setup_mock_objects()
+        mock_protocol_connector = self.mock_objects['mock_protocol_connector']
+        mock_protocol_connector.connect_volume.side_effect = \
+            Exception("No path to the volume")
+
+
+# Volume matching a warm pool profile
+class TestCreateVolumeFromWarmPool(CreateVolumeUnitTest):
+    def override_configuration(self, all_configs):
+        config = all_configs['block'][1]['DEFAULT']
+        config.warm_pool_profiles = ['10:thin']
+        config.warm_pool_size = 1
+
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp, {u"Err": ''})
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.claim_pooled_vol.assert_called_once_with(
+            'DEFAULT', 'default-10-thin-default')
+        vol = mock_etcd.save_vol.call_args[0][0]
+        self._test_case.assertEqual(self._pooled_vol['id'], vol['id'])
+        self._test_case.assertEqual('test-vol-001', vol['display_name'])
+
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.createVolume.assert_not_called()
+        mock_3parclient.modifyVolume.assert_called_once_with(
+            self._pooled_vol['3par_vol_name'], mock.ANY)
+
+    def get_request_params(self):
+        return {"Name": "test-vol-001",
+                "Opts": {'size': '10'}}
+
+    def setup_mock_objects(self):
+        self._pooled_vol = volume.createvol(None, 10)
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.get_vol_byname.return_value = None
+        # Pool is full, nothing for the refill to do
+        mock_etcd.get_pooled_vols.return_value = {
+            'default-10-thin-default': [self._pooled_vol]}
+        mock_etcd.claim_pooled_vol.return_value = \
+            copy.deepcopy(self._pooled_vol)
+
+
+# Volume matching a warm pool profile but formatted with other options
+class TestCreateVolumeWithFsOptsSkipsWarmPool(TestCreateVolumeFromWarmPool):
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp, {u"Err": ''})
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.claim_pooled_vol.assert_not_called()
+        vol = mock_etcd.save_vol.call_args[0][0]
+        self._test_case.assertNotEqual(self._pooled_vol['id'], vol['id'])
+        self._test_case.assertNotIn('fs_ready', vol)
+        self._test_case.assertEqual({'lazy_init': True, 'nodiscard': False},
+                                    vol['fs_opts'])
+
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.createVolume.assert_called_once()
+
+    def get_request_params(self):
+        return {"Name": "test-vol-001",
+                "Opts": {'size': '10',
+                         'fsLazyInit': 'true'}}
+
+
 # qos-name=<vvset_name>
 class TestCreateVolumeWithQOS(CreateVolumeUnitTest):
     def check_response(self, resp):
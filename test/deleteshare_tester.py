@@ -2,6 +2,7 @@ import time
 import test.fake_3par_data as data
 import test.hpe_docker_unit_test as hpedockerunittest
 import copy
+import mock
 
 from oslo_config import cfg
 CONF = cfg.CONF
@@ -43,11 +44,13 @@ class TestDeleteShare(DeleteShareUnitTest):
         def setup_mock_objects(self, mock_objects):
             mock_share_etcd = mock_objects['mock_share_etcd']
             if 'share_with_acl' in self._params:
-                mock_share_etcd.get_share.return_value = copy.deepcopy(
-                    data.etcd_share_with_acl)
+                share = copy.deepcopy(data.etcd_share_with_acl)
             else:
-                mock_share_etcd.get_share.return_value = copy.deepcopy(
-                    data.etcd_share)
+                share = copy.deepcopy(data.etcd_share)
+            # VFS IP from the configured IP pool, released along with the
+            # FPG
+            share['vfsIPs'] = [['192.168.98.9', '255.255.192.0']]
+            mock_share_etcd.get_share.return_value = share
             mock_file_client = mock_objects['mock_file_client']
             mock_file_client.http.get.side_effect = [
                 # This file store is deleted as part of share delete
@@ -71,6 +74,10 @@ class TestDeleteShare(DeleteShareUnitTest):
             mock_file_client.getTask.return_value = data.fpg_delete_task_body
             mock_file_client.TASK_DONE = 1
 
+            ip_map = copy.deepcopy(data.etcd_vfs_ip_map)
+            ip_map['subnets']['255.255.192.0']['map'] = '.U....'
+            mock_fp_etcd.get_vfs_ip_map.return_value = (1, ip_map)
+
         def check_response(self, resp, mock_objects, test_case):
             # Check if these functions were actually invoked
             # in the flow or not
@@ -78,7 +85,35 @@ class TestDeleteShare(DeleteShareUnitTest):
             mock_3parclient.getWsApiVersion.assert_called()
             time.sleep(3)
 
+            # The VFS IP went back to the IP pool with the FPG
+            mock_fp_etcd = mock_objects['mock_fp_etcd']
+            ip_map = copy.deepcopy(data.etcd_vfs_ip_map)
+            ip_map['subnets']['255.255.192.0']['map'] = '......'
+            mock_fp_etcd.save_vfs_ip_map.assert_called_once_with(
+                mock.ANY, ip_map, 1)
+
             # mock_3parclient.deleteVolume.assert_called()
             #
             # mock_etcd = mock_objects['mock_etcd']
             # mock_etcd.delete_vol.assert_called()
+
+    # Nested class to handle a share still waiting to be created
+    class Queued(object):
+        def get_request_params(self):
+            return {"Name": data.queued_share['name'],
+                    "Opts": {}}
+
+        def setup_mock_objects(self, mock_objects):
+            mock_share_etcd = mock_objects['mock_share_etcd']
+            mock_share_etcd.get_share.return_value = copy.deepcopy(
+                data.queued_share)
+
+        def check_response(self, resp, mock_objects, test_case):
+            test_case.assertEqual({u"Err": ''}, resp)
+
+            # Nothing exists on the backend yet
+            mock_share_etcd = mock_objects['mock_share_etcd']
+            mock_share_etcd.delete_share.assert_called_once_with(
+                data.queued_share['name'])
+            mock_file_client = mock_objects['mock_file_client']
+            mock_file_client.http.delete.assert_not_called()
@@ -886,6 +886,9 @@ create_share_args = {
     'vfsIPs': [['192.168.98.41', '255.255.192.0']],
 }
 
+queued_share = dict(create_share_args, status='QUEUED',
+                    queue={'node_id': THIS_NODE_ID, 'queued_at': 0})
+
 etcd_share = {
     'id': '1422125830661572115',
     'backend': 'DEFAULT_FILE',
@@ -949,6 +952,28 @@ etcd_fpg_metadata = {
     }
 }
 
+etcd_vfs_ip_map = {
+    'subnets': {
+        '255.255.192.0': {
+            'pool': '9e2b9f64',
+            'map': 'L.....'
+        }
+    },
+    'reconciled_at': 0
+}
+
+etcd_default_fpg_metadata = {
+    "fpg": "DockerFpg_0",
+    "fpg_size": 16,
+    "vfs": "DockerVfs_0",
+    "ips": {
+        "255.255.192.0": ["192.168.98.41"]
+    },
+    "total_capacity_gib": 10234.65,
+    "used_capacity_gib": 1024.0,
+    "capacity_reconciled_at": 0,
+}
+
 get_bkend_fpg_resp = {
     'status': '200'
 }
@@ -1,10 +1,27 @@
 import copy
+import json
+import mock
+import time
 
 import test.fake_3par_data as data
 import test.hpe_docker_unit_test as hpedockerunittest
 from hpe3parclient import exceptions
 
 
+def _rcgs_by_name(primary_rcg, secondary_rcg):
+    # The RCGs of both arrays are fetched concurrently, so they are
+    # returned by name rather than in call order
+    rcgs = {data.RCG_NAME: primary_rcg,
+            data.REMOTE_RCG_NAME: secondary_rcg}
+
+    def _get_rcg(name):
+        rcg = rcgs[name]
+        if isinstance(rcg, Exception):
+            raise rcg
+        return rcg
+    return _get_rcg
+
+
 class MountVolumeUnitTest(hpedockerunittest.HpeDockerUnitTestExecutor):
     def __init__(self, is_snap=False, vol_params=None):
         self._backend_name = None
@@ -44,37 +61,33 @@ class MountVolumeUnitTest(hpedockerunittest.HpeDockerUnitTestExecutor):
             if self._rep_type == 'active-passive':
                 mock_3parclient = self.mock_objects['mock_3parclient']
                 if self._rcg_state == 'normal':
-                    mock_3parclient.getRemoteCopyGroup.side_effect = [
+                    rcgs = (
                         data.normal_rcg['primary_3par_rcg'],
-                        data.normal_rcg['secondary_3par_rcg']
-                    ]
+                        data.normal_rcg['secondary_3par_rcg'])
                 elif self._rcg_state == 'failover':
-                    mock_3parclient.getRemoteCopyGroup.side_effect = [
+                    rcgs = (
                         data.failover_rcg['primary_3par_rcg'],
-                        data.failover_rcg['secondary_3par_rcg']
-                    ]
+                        data.failover_rcg['secondary_3par_rcg'])
                 elif self._rcg_state == 'recover':
-                    mock_3parclient.getRemoteCopyGroup.side_effect = [
+                    rcgs = (
                         data.recover_rcg['primary_3par_rcg'],
-                        data.recover_rcg['secondary_3par_rcg']
-                    ]
+                        data.recover_rcg['secondary_3par_rcg'])
                 elif self._rcg_state == 'rcgs_not_gettable':
-                    mock_3parclient.getRemoteCopyGroup.side_effect = [
+                    rcgs = (
                         exceptions.HTTPNotFound("Primary RCG not found"),
-                        exceptions.HTTPNotFound("Secondary RCG not found"),
-                    ]
+                        exceptions.HTTPNotFound("Secondary RCG not found"))
                 elif self._rcg_state == 'only_primary_rcg_gettable':
-                    mock_3parclient.getRemoteCopyGroup.side_effect = [
+                    rcgs = (
                         data.normal_rcg['primary_3par_rcg'],
-                        exceptions.HTTPNotFound("Secondary RCG not found"),
-                    ]
+                        exceptions.HTTPNotFound("Secondary RCG not found"))
                 elif self._rcg_state == 'only_secondary_rcg_gettable':
-                    mock_3parclient.getRemoteCopyGroup.side_effect = [
+                    rcgs = (
                         exceptions.HTTPNotFound("Primary RCG not found"),
-                        data.failover_rcg['secondary_3par_rcg'],
-                    ]
+                        data.failover_rcg['secondary_3par_rcg'])
                 else:
                     raise Exception("Invalid rcg_state specified")
+                mock_3parclient.getRemoteCopyGroup.side_effect = \
+                    _rcgs_by_name(*rcgs)
 
             self.setup_mock_3parclient()
 
@@ -202,7 +215,7 @@ class TestMountVolumeFCHost(MountVolumeUnitTest):
             # lost+found directory removed or not
             mock_fileutil.remove_dir.assert_called()
 
-            mock_etcd.update_vol.assert_called()
+            mock_etcd.update_vol_fields.assert_called()
 
             mock_protocol_connector = \
                 self.mock_objects['mock_protocol_connector']
@@ -211,6 +224,48 @@ class TestMountVolumeFCHost(MountVolumeUnitTest):
         mock_etcd.get_vol_byname.assert_called()
 
 
+# Volume formatted in the background after its creation
+class TestMountPreformattedVolume(MountVolumeUnitTest):
+    def __init__(self, **kwargs):
+        super(TestMountPreformattedVolume, self).__init__(**kwargs)
+        self._vol['fs_ready'] = True
+
+    setup_mock_3parclient = TestMountVolumeFCHost.setup_mock_3parclient
+
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp['Err'], u'')
+        self._test_case.assertEqual(resp['Mountpoint'], u'/tmp')
+
+        # Neither blkid nor mkfs are run for a formatted volume
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.has_filesystem.assert_not_called()
+        mock_fileutil.create_filesystem.assert_not_called()
+        mock_fileutil.mount_dir.assert_called()
+
+
+# Mount waits for the background formatting to complete
+class TestMountVolumeBeingFormatted(TestMountPreformattedVolume):
+    def __init__(self, **kwargs):
+        super(TestMountVolumeBeingFormatted, self).__init__(**kwargs)
+        self._formatted_vol = copy.deepcopy(self._vol)
+        self._vol['fs_ready'] = False
+        self._vol['preformat_deadline'] = time.time() + 600
+
+    def setup_mock_etcd(self):
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.wait_for_vol.return_value = self._formatted_vol
+        mock_etcd.get_vol_with_index.return_value = (2, self._formatted_vol)
+
+    def check_response(self, resp):
+        super(TestMountVolumeBeingFormatted, self).check_response(resp)
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.wait_for_vol.assert_called()
+        # The mount information is written at the index of the formatted
+        # volume
+        mock_etcd.update_vol_fields.assert_called_once_with(
+            self._vol['id'], mock.ANY, expected_index=2, remove_fields=())
+
+
 # Host not registered with supplied name
 # Host exists for supplied WWN + VLUN exists
 # For host creation, both getHost and queryHost should not return anything
@@ -272,7 +327,7 @@ class TestMountVolumeFCHostVLUNExists(MountVolumeUnitTest):
 
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         mock_protocol_connector = self.mock_objects['mock_protocol_connector']
         mock_protocol_connector.connect_volume.assert_called()
@@ -347,7 +402,7 @@ class TestMountVolumeNoFCHostNoVLUN(MountVolumeUnitTest):
         # be moved to base class
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         # TODO: This is common check across all TCs and can
         # be moved to base class
@@ -467,7 +522,7 @@ class TestMountVolumeISCSIHostNoVLUN(MountVolumeUnitTest):
 
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         mock_protocol_connector = self.mock_objects['mock_protocol_connector']
         mock_protocol_connector.connect_volume.assert_called()
@@ -534,7 +589,7 @@ class TestMountVolumeISCSIHostVLUNExist(MountVolumeUnitTest):
 
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         mock_protocol_connector = self.mock_objects['mock_protocol_connector']
         mock_protocol_connector.connect_volume.assert_called()
@@ -615,7 +670,7 @@ class TestMountVolumeISCSIHostChapOn(MountVolumeUnitTest):
 
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         mock_protocol_connector = self.mock_objects['mock_protocol_connector']
         mock_protocol_connector.connect_volume.assert_called()
@@ -747,7 +802,7 @@ class TestMountVolumeNoISCSIHostNoVLUN(MountVolumeUnitTest):
         # be moved to base class
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         # TODO: This is common check across all TCs and can
         # be moved to base class
@@ -876,6 +931,7 @@ class TestVolFencingGracefulUnmount(MountVolumeUnitTest):
             self._vol_mounted_on_other_node,
             self._unmounted_vol
         ]
+        mock_etcd.wait_for_vol.return_value = self._unmounted_vol
         mock_etcd.get_vol_path_info.return_value = copy.deepcopy(
             data.path_info)
 
@@ -945,6 +1001,7 @@ class TestVolFencingForcedUnmount(MountVolumeUnitTest):
             self._vol_mounted_on_other_node
         mock_etcd.get_vol_by_id.return_value = \
             self._vol_mounted_on_other_node
+        mock_etcd.wait_for_vol.return_value = None
         mock_etcd.get_vol_path_info.return_value = copy.deepcopy(
             data.path_info)
         # Allow child class to make changes
@@ -982,7 +1039,8 @@ class TestVolFencingForcedUnmount(MountVolumeUnitTest):
         self._test_case.assertEqual(resp['Devicename'], u'/tmp')
 
         mock_etcd = self.mock_objects['mock_etcd']
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.wait_for_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         # Check if these functions were actually invoked
         # in the flow or not
@@ -1001,6 +1059,95 @@ class TestVolFencingForcedUnmount(MountVolumeUnitTest):
 # # Volume Fencing
 # # Add the new mount ID to the mount-id-list and return
 # # connection-info
+# Remount on the node that kept the volume attached after its last unmount
+class TestMountVolumeWithPendingDetach(MountVolumeUnitTest):
+    def __init__(self, **kwargs):
+        super(TestMountVolumeWithPendingDetach, self).__init__(**kwargs)
+        path_info = copy.deepcopy(data.path_info)
+        # MUST be an existing path for the attachment to be reused
+        path_info['path'] = '/tmp'
+        path_info['device_info']['path'] = '/tmp'
+        self._vol['path_info'] = json.dumps(path_info)
+        self._vol['fs_ready'] = True
+        self._vol['detach_pending'] = {'node_id': data.THIS_NODE_ID,
+                                       'deadline': time.time() + 60}
+
+    def setup_mock_etcd(self):
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.update_vol_fields.side_effect = [2, 3]
+
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp['Err'], u'')
+        self._test_case.assertEqual(resp['Devicename'], u'/tmp')
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.update_vol_fields.assert_any_call(
+            self._vol['id'], {}, expected_index=1,
+            remove_fields=('detach_pending',))
+        mock_etcd.update_vol_fields.assert_called_with(
+            self._vol['id'], mock.ANY, expected_index=2, remove_fields=())
+
+        # Neither the array nor the host are asked to attach the volume
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.createVLUN.assert_not_called()
+        mock_protocol_connector = \
+            self.mock_objects['mock_protocol_connector']
+        mock_protocol_connector.connect_volume.assert_not_called()
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.mount_dir.assert_called()
+
+
+# Mount of a volume another node kept attached after its last unmount
+class TestMountVolumeWithPendingDetachOnOtherNode(MountVolumeUnitTest):
+    def __init__(self, **kwargs):
+        super(TestMountVolumeWithPendingDetachOnOtherNode, self).__init__(
+            **kwargs)
+        self._vol['path_info'] = data.json_path_info
+        self._vol['detach_pending'] = {'node_id': data.OTHER_NODE_ID,
+                                       'deadline': time.time() + 60}
+
+    setup_mock_3parclient = TestVolFencingForcedUnmount.setup_mock_3parclient
+
+    def setup_mock_etcd(self):
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.update_vol_fields.side_effect = [2, 3]
+
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp['Err'], u'')
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.update_vol_fields.assert_any_call(
+            self._vol['id'],
+            {'old_path_info': [(data.OTHER_NODE_ID, data.json_path_info)]},
+            expected_index=1, remove_fields=('detach_pending',))
+        mock_etcd.update_vol_fields.assert_called_with(
+            self._vol['id'], mock.ANY, expected_index=2, remove_fields=())
+        mock_etcd.wait_for_vol.assert_not_called()
+
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.getVLUN.assert_called()
+        mock_protocol_connector = \
+            self.mock_objects['mock_protocol_connector']
+        mock_protocol_connector.connect_volume.assert_called()
+
+
+# Mount of a clone whose offline copy is still in progress
+class TestMountCloneBeingCopied(MountVolumeUnitTest):
+    def __init__(self, **kwargs):
+        super(TestMountCloneBeingCopied, self).__init__(**kwargs)
+        self._vol['status'] = 'CLONING'
+        self._vol['clone_progress'] = '2/5 steps completed'
+
+    def check_response(self, resp):
+        expected = "Volume %s is still being copied from its source " \
+                   "(2/5 steps completed), retry once the copy is " \
+                   "complete" % self._vol['display_name']
+        self._test_case.assertEqual(resp, {u"Err": expected})
+
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.createVLUN.assert_not_called()
+
+
 # class TestVolFencingForcedUnmountDelVHost(MountVolumeUnitTest):
 #     def __init__(self, **kwargs):
 #         super(type(self), self).__init__(**kwargs)
@@ -1156,7 +1303,7 @@ class TestMountPreviousVersionVolumeFCHost(MountVolumeUnitTest):
 
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.get_vol_byname.assert_called()
-        mock_etcd.update_vol.assert_called()
+        mock_etcd.update_vol_fields.assert_called()
 
         mock_protocol_connector = self.mock_objects['mock_protocol_connector']
         mock_protocol_connector.connect_volume.assert_called()
@@ -152,3 +152,29 @@ class TestRemoveVolumeWithChildSnapshot(RemoveVolumeUnitTest):
 
         mock_etcd = self.mock_objects['mock_etcd']
         mock_etcd.delete_vol.assert_not_called()
+
+
+# Removal of a clone whose offline copy is still in progress
+class TestRemoveCloneBeingCopied(RemoveVolumeUnitTest):
+    def get_request_params(self):
+        return {"Name": data.VOLUME_NAME,
+                "Opts": {}}
+
+    def setup_mock_objects(self):
+        vol = copy.deepcopy(data.volume)
+        vol['status'] = 'CLONING'
+        vol['clone_progress'] = '2/5 steps completed'
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.get_vol_byname.return_value = vol
+
+    def check_response(self, resp):
+        msg = "Volume %s is still being copied from its source " \
+              "(2/5 steps completed), retry once the copy is " \
+              "complete" % data.VOLUME_NAME
+        self._test_case.assertEqual(resp, {u"Err": msg})
+
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.deleteVolume.assert_not_called()
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.delete_vol.assert_not_called()
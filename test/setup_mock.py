@@ -103,6 +103,9 @@ def mock_decorator(func):
                 as mock_create_file_client:
             mock_create_client.return_value = mock_3parclient
             _get_etcd_client.return_value = mock_etcd
+            # Mount and Unmount read the volume along with its index
+            mock_etcd.get_vol_byname_with_index.side_effect = \
+                lambda volname: (1, mock_etcd.get_vol_byname(volname))
             mock_get_connector.return_value = mock_protocol_connector
             mock_get_node_id.return_value = data.THIS_NODE_ID
             mock_file_get_node_id.return_value = data.THIS_NODE_ID
@@ -0,0 +1,96 @@
+import threading
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import admission_control
+from hpedockerplugin import exception
+
+
+class TestAdmissionController(TestCase):
+    def setUp(self):
+        super(TestAdmissionController, self).setUp()
+        patcher = mock.patch.object(admission_control, 'etcd_latency',
+                                    admission_control.LatencyTracker('etcd'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _queue(self, controller, operation, name, admitted):
+        release = threading.Event()
+
+        def _run():
+            with controller.admitted(operation, name):
+                admitted.append(name)
+                release.wait(5)
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(release.set)
+        return release
+
+    def _wait_for(self, condition):
+        for i in range(200):
+            if condition():
+                return
+            threading.Event().wait(0.01)
+        self.fail('Condition not met')
+
+    def test_unmount_is_admitted_before_mount(self):
+        controller = admission_control.AdmissionController('array', 1)
+        admitted = []
+        release = self._queue(controller, admission_control.MOUNT, 'm1',
+                              admitted)
+        self._wait_for(lambda: admitted == ['m1'])
+
+        self._queue(controller, admission_control.MOUNT, 'm2', admitted)
+        self._wait_for(lambda: controller.stats()['queued_mounts'] == 1)
+        self._queue(controller, admission_control.UNMOUNT, 'u1', admitted)
+        self._wait_for(lambda: controller.stats()['queued_unmounts'] == 1)
+
+        release.set()
+        self._wait_for(lambda: len(admitted) == 2)
+        self.assertEqual(['m1', 'u1'], admitted)
+
+    def test_request_fails_after_queue_timeout(self):
+        controller = admission_control.AdmissionController(
+            'array', 1, queue_timeout=0.05)
+        admitted = []
+        self._queue(controller, admission_control.MOUNT, 'm1', admitted)
+        self._wait_for(lambda: admitted == ['m1'])
+
+        ctxt = controller.admitted(admission_control.MOUNT, 'm2')
+        self.assertRaises(exception.HPEPluginAdmissionTimeout,
+                          ctxt.__enter__)
+        stats = controller.stats()
+        self.assertEqual((1, 0), (stats['timed_out'], stats['queued_mounts']))
+
+    def test_limit_follows_latency(self):
+        controller = admission_control.AdmissionController(
+            'array', 8, min_concurrency=2, wsapi_target_latency=1.0)
+        controller.observe_wsapi_latency(3.0)
+        with controller.admitted(admission_control.MOUNT, 'm1'):
+            pass
+        self.assertEqual(6, controller.stats()['limit'])
+
+        controller._last_decrease = 0
+        admission_control.etcd_latency.observe(1.0)
+        with controller.admitted(admission_control.UNMOUNT, 'u1'):
+            pass
+        self.assertEqual(4, controller.stats()['limit'])
+
+    def test_limit_grows_while_requests_wait(self):
+        controller = admission_control.AdmissionController('array', 8)
+        controller._limit = 2
+        admitted = []
+        self._queue(controller, admission_control.MOUNT, 'm1', admitted)
+        release = self._queue(controller, admission_control.MOUNT, 'm2',
+                              admitted)
+        self._wait_for(lambda: len(admitted) == 2)
+        self._queue(controller, admission_control.MOUNT, 'm3', admitted)
+        self._queue(controller, admission_control.MOUNT, 'm4', admitted)
+        self._wait_for(lambda: controller.stats()['queued_mounts'] == 2)
+
+        release.set()
+        # m2 completing frees its slot and adds one more to the limit
+        self._wait_for(lambda: len(admitted) == 4)
+        self.assertEqual(3, controller.stats()['limit'])
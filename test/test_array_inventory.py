@@ -0,0 +1,67 @@
+import time
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin.hpe import array_inventory
+
+
+def _vlun(hostname, nsp, active=True):
+    node, slot, port = [int(x) for x in nsp.split(':')]
+    return {'hostname': hostname, 'active': active,
+            'portPos': {'node': node, 'slot': slot, 'cardPort': port}}
+
+
+class TestISCSIInventory(TestCase):
+    def setUp(self):
+        super(TestISCSIInventory, self).setUp()
+        self.common = mock.Mock()
+        self.common.client.getiSCSIPorts.return_value = [{'nsp': '0:1:1'}]
+        self.common.client.getVLUNs.return_value = {'members': [
+            _vlun('host1', '0:1:1'), _vlun('host2', '0:1:1'),
+            _vlun('host2', '1:1:1'), _vlun('host3', '1:1:1', active=False)]}
+        self.pool = mock.MagicMock()
+        self.pool.session.return_value.__enter__.return_value = self.common
+        self.inventory = array_inventory.ISCSIInventory('array', self.pool)
+
+    def test_array_is_read_once(self):
+        nsps = ['0:1:1', '1:1:1']
+        self.assertEqual('1:1:1',
+                         self.inventory.get_least_used_nsp(self.common, nsps))
+        self.assertEqual(['0:1:1'],
+                         self.inventory.get_host_nsps(self.common, 'host1'))
+        self.assertEqual([{'nsp': '0:1:1'}],
+                         self.inventory.get_ready_ports(self.common))
+        self.assertEqual(1, self.common.client.getVLUNs.call_count)
+        self.assertEqual(1, self.common.client.getiSCSIPorts.call_count)
+
+    def test_vlun_changes_are_applied(self):
+        nsps = ['0:1:1', '1:1:1']
+        self.inventory.get_ready_ports(self.common)
+        self.inventory.vlun_created('host4', '1:1:1')
+        self.inventory.vlun_created('host4', '1:1:1')
+        self.assertEqual('0:1:1',
+                         self.inventory.get_least_used_nsp(self.common, nsps))
+
+        self.inventory.vluns_removed('host4', [_vlun('host4', '1:1:1',
+                                                     active=False)] * 2)
+        self.assertEqual('1:1:1',
+                         self.inventory.get_least_used_nsp(self.common, nsps))
+        self.assertEqual([],
+                         self.inventory.get_host_nsps(self.common, 'host4'))
+
+    def test_no_nsp_to_choose_from(self):
+        self.assertIsNone(
+            self.inventory.get_least_used_nsp(self.common, []))
+
+    def test_expired_inventory_is_reloaded_in_background(self):
+        self.inventory.get_ready_ports(self.common)
+        self.inventory._loaded_at -= array_inventory.DEFAULT_REFRESH_INTERVAL
+        self.common.client.getiSCSIPorts.return_value = []
+
+        for i in range(100):
+            if not self.inventory.get_ready_ports(self.common):
+                break
+            time.sleep(0.01)
+        self.assertEqual([], self.inventory.get_ready_ports(self.common))
+        self.pool.session.assert_called_once_with()
@@ -0,0 +1,75 @@
+import time
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import detach_reaper
+from hpedockerplugin import volume_manager
+
+
+class TestDetachReaper(TestCase):
+    def test_volume_is_reaped_until_done(self):
+        reap = mock.Mock(side_effect=[False, True])
+        reaper = detach_reaper.DetachReaper('DEFAULT', reap)
+        reaper.add('vol1', time.time() + 60)
+
+        reaper.reap_all()
+        self.assertEqual(['vol1'], list(reaper.pending()))
+        reaper.reap_all()
+        self.assertEqual({}, reaper.pending())
+        self.assertEqual([mock.call('vol1')] * 2, reap.call_args_list)
+
+    def test_failed_reap_is_retried(self):
+        reap = mock.Mock(side_effect=Exception('array unreachable'))
+        reaper = detach_reaper.DetachReaper('DEFAULT', reap)
+        reaper.add('vol1', time.time() - 1)
+
+        reaper.reap_all()
+        self.assertEqual(['vol1'], list(reaper.pending()))
+        # Overdue volumes are retried at the poll interval
+        self.assertEqual(detach_reaper.DEFAULT_POLL_INTERVAL,
+                         reaper._next_wakeup())
+
+    def test_wakeup_at_next_deadline(self):
+        reaper = detach_reaper.DetachReaper('DEFAULT', mock.Mock())
+        reaper.add('vol1', time.time() + 60)
+        reaper.add('vol2', time.time() + 1)
+        self.assertTrue(0 < reaper._next_wakeup() <= 1)
+
+        reaper.discard('vol2')
+        self.assertEqual(detach_reaper.DEFAULT_POLL_INTERVAL,
+                         reaper._next_wakeup())
+
+
+class TestReapPendingDetach(TestCase):
+    def setUp(self):
+        super(TestReapPendingDetach, self).setUp()
+        self.mgr = volume_manager.VolumeManager.__new__(
+            volume_manager.VolumeManager)
+        self.mgr._etcd = mock.Mock()
+        self.mgr._node_id = 'node1'
+        self.mgr._detach_volume = mock.Mock()
+        self.vol = {'id': 'id-1', 'display_name': 'vol1',
+                    'path_info': '{"path": "/dev/dm-1"}'}
+
+    def test_volume_is_not_locked_within_grace_period(self):
+        self.vol['detach_pending'] = {'node_id': 'node1',
+                                      'deadline': time.time() + 60}
+        self.mgr._etcd.get_vol_byname.return_value = self.vol
+
+        self.assertFalse(self.mgr._reap_pending_detach('vol1'))
+        self.mgr._etcd.get_lock.assert_not_called()
+        self.mgr._detach_volume.assert_not_called()
+
+    def test_volume_is_detached_under_lock_after_grace_period(self):
+        self.vol['detach_pending'] = {'node_id': 'node1',
+                                      'deadline': time.time() - 1}
+        self.mgr._etcd.get_vol_byname.return_value = self.vol
+        self.mgr._etcd.get_vol_byname_with_index.return_value = (1, self.vol)
+
+        self.assertTrue(self.mgr._reap_pending_detach('vol1'))
+        lock = self.mgr._etcd.get_lock.return_value
+        lock.lock_name.assert_called_once_with('vol1', 0)
+        lock.try_unlock_name.assert_called_once_with('vol1')
+        self.mgr._detach_volume.assert_called_once_with(
+            self.vol, {'path': '/dev/dm-1'})
@@ -0,0 +1,548 @@
+import json
+import six
+import threading
+import time
+
+import etcd
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import etcdutil
+from hpedockerplugin import exception
+
+
+class FakeEtcdClient(object):
+    """Minimal in-memory stand-in for etcd.Client used by EtcdUtil"""
+    def __init__(self):
+        self.store = {}
+        self.index = 0
+        self.reads = []
+        self.refreshes = []
+        self.events = six.moves.queue.Queue()
+
+    def _result(self, key, action='get'):
+        # Directories are created implicitly by writing a key below them
+        value, modified_index = self.store.get(key, (None, self.index))
+        result = etcd.EtcdResult(action=action,
+                                 node={'key': key, 'value': value,
+                                       'modifiedIndex': modified_index,
+                                       'dir': value is None})
+        result.etcd_index = self.index
+        if value is None:
+            result.dir = True
+            result._children = [
+                {'key': k, 'value': v, 'modifiedIndex': i}
+                for k, (v, i) in sorted(self.store.items())
+                if k.startswith(key.rstrip('/') + '/')]
+        return result
+
+    def read(self, key, **kwargs):
+        self.reads.append(key)
+        key = key.rstrip('/') if key != '/' else key
+        if key not in self.store and \
+                not any(k.startswith(key + '/') for k in self.store):
+            raise etcd.EtcdKeyNotFound()
+        return self._result(key)
+
+    def write(self, key, value, prevExist=None, prevIndex=None,
+              dir=False, **kwargs):
+        if prevExist is False and key in self.store:
+            raise etcd.EtcdAlreadyExist()
+        if prevIndex is not None and \
+                self.store.get(key, (None, None))[1] != prevIndex:
+            raise etcd.EtcdCompareFailed()
+        self.index += 1
+        self.store[key] = (None if dir else value, self.index)
+        return self._result(key, action='set')
+
+    def refresh(self, key, ttl, **kwargs):
+        if key not in self.store:
+            raise etcd.EtcdKeyNotFound()
+        self.refreshes.append((key, ttl))
+
+    def update(self, result):
+        return self.write(result.key, result.value,
+                          prevIndex=result.modifiedIndex)
+
+    def delete(self, key, prevValue=None, prevIndex=None, **kwargs):
+        if key not in self.store:
+            raise etcd.EtcdKeyNotFound()
+        if prevValue is not None and self.store[key][0] != prevValue:
+            raise etcd.EtcdCompareFailed()
+        if prevIndex is not None and self.store[key][1] != prevIndex:
+            raise etcd.EtcdCompareFailed()
+        del self.store[key]
+        self.index += 1
+        return etcd.EtcdResult(action='delete',
+                               node={'key': key,
+                                     'modifiedIndex': self.index})
+
+    def watch(self, key, index=None, timeout=None, recursive=None):
+        try:
+            event = self.events.get(timeout=0.05)
+        except six.moves.queue.Empty:
+            raise etcd.EtcdWatchTimedOut()
+        if isinstance(event, Exception):
+            raise event
+        return event
+
+
+class EtcdUtilTestCase(TestCase):
+    def setUp(self):
+        super(EtcdUtilTestCase, self).setUp()
+        self.client = FakeEtcdClient()
+        patcher = mock.patch.object(etcdutil.etcd, 'Client',
+                                    return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_etcd_util(self):
+        return etcdutil.EtcdUtil('127.0.0.1', 2379, None, None)
+
+    @staticmethod
+    def _vol(vol_id, name):
+        return {'id': vol_id, 'name': vol_id, 'display_name': name}
+
+
+class TestVolumeNameIndex(EtcdUtilTestCase):
+    def test_lookup_uses_index(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+        util.save_vol(self._vol('id-2', 'vol2'))
+
+        del self.client.reads[:]
+        self.assertEqual('id-2', util.get_vol_byname('vol2')['id'])
+        self.assertNotIn(etcdutil.VOLUMEROOT + '/', self.client.reads)
+
+    def test_lookup_by_id_and_missing_name(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+
+        self.assertEqual('vol1', util.get_vol_byname('id-1')['display_name'])
+        self.assertIsNone(util.get_vol_byname('vol'))
+
+    def test_delete_removes_index(self):
+        util = self._get_etcd_util()
+        vol = self._vol('id-1', 'vol1')
+        util.save_vol(vol)
+        util.delete_vol(vol)
+
+        self.assertIsNone(util.get_vol_byname('vol1'))
+        self.assertNotIn(util.nameindexroot + 'vol1', self.client.store)
+
+    def test_stale_index_entry_is_dropped(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+        del self.client.store[util.volumeroot + 'id-1']
+
+        self.assertIsNone(util.get_vol_byname('vol1'))
+        self.assertNotIn(util.nameindexroot + 'vol1', self.client.store)
+
+    def test_failed_index_write_is_recovered(self):
+        util = self._get_etcd_util()
+        write = self.client.write
+
+        def failing_index_write(key, value, **kwargs):
+            if key.startswith(util.nameindexroot) and failing_index_write.on:
+                failing_index_write.on = False
+                raise etcd.EtcdException('etcd unavailable')
+            return write(key, value, **kwargs)
+        failing_index_write.on = True
+
+        with mock.patch.object(self.client, 'write', failing_index_write):
+            util.save_vol(self._vol('id-1', 'vol1'))
+
+        self.assertEqual('id-1', util.get_vol_byname('vol1')['id'])
+        # The index is backfilled by the lookup that missed it
+        self.assertEqual(
+            'id-1', self.client.store[util.nameindexroot + 'vol1'][0])
+
+    def test_outdated_index_entry_is_repointed(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+        # vol1 was re-created but its index entry was not updated
+        del self.client.store[util.volumeroot + 'id-1']
+        self.client.write(util.volumeroot + 'id-2',
+                          json.dumps(self._vol('id-2', 'vol1')))
+
+        self.assertEqual('id-2', util.get_vol_byname('vol1')['id'])
+        self.assertEqual(
+            'id-2', self.client.store[util.nameindexroot + 'vol1'][0])
+
+    def test_existing_volumes_are_backfilled(self):
+        self.client.write(etcdutil.VOLUMEROOT, None, dir=True)
+        self.client.write(etcdutil.VOLUMEROOT + '/id-1',
+                          json.dumps(self._vol('id-1', 'old_vol')))
+
+        util = self._get_etcd_util()
+        self.assertEqual(
+            'id-1', self.client.store[util.nameindexroot + 'old_vol'][0])
+        self.assertEqual('id-1', util.get_vol_byname('old_vol')['id'])
+
+
+class TestEtcdLatency(EtcdUtilTestCase):
+    def test_volume_reads_and_writes_are_observed(self):
+        util = self._get_etcd_util()
+        with mock.patch.object(etcdutil.admission_control,
+                               'etcd_latency') as etcd_latency:
+            util.save_vol(self._vol('id-1', 'vol1'))
+            observed = etcd_latency.observe.call_count
+            self.assertGreater(observed, 0)
+
+            util.get_vol_by_id('id-1')
+            self.assertEqual(observed + 1,
+                             etcd_latency.observe.call_count)
+
+
+class TestUpdateVolFields(EtcdUtilTestCase):
+    def test_fields_are_updated_in_one_write(self):
+        util = self._get_etcd_util()
+        util.save_vol(dict(self._vol('id-1', 'vol1'), old='x'))
+        index = self.client.index
+
+        new_index = util.update_vol_fields('id-1', {'a': 1, 'b': 2},
+                                           remove_fields=['old'])
+        self.assertEqual(index + 1, new_index)
+        vol = util.get_vol_by_id('id-1')
+        self.assertEqual((1, 2), (vol['a'], vol['b']))
+        self.assertNotIn('old', vol)
+
+    def test_concurrent_change_is_retried(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+        write = self.client.write
+
+        def racing_write(key, value, **kwargs):
+            if racing_write.first:
+                racing_write.first = False
+                vol = json.loads(self.client.store[key][0])
+                vol['other'] = 'node2'
+                write(key, json.dumps(vol))
+            return write(key, value, **kwargs)
+        racing_write.first = True
+
+        with mock.patch.object(self.client, 'write', racing_write):
+            util.update_vol_fields('id-1', {'mine': 'node1'})
+        vol = util.get_vol_by_id('id-1')
+        self.assertEqual(('node1', 'node2'), (vol['mine'], vol['other']))
+
+    def test_expected_index_mismatch_raises(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+        index = util.update_vol_fields('id-1', {'a': 1})
+        util.update_vol_fields('id-1', {'a': 2})
+
+        self.assertRaises(exception.HPEPluginUpdateConflict,
+                          util.update_vol_fields, 'id-1', {'a': 3},
+                          expected_index=index)
+        self.assertEqual(2, util.get_vol_by_id('id-1')['a'])
+
+    def test_update_at_index_read_by_name(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+
+        index, vol = util.get_vol_byname_with_index('vol1')
+        self.assertEqual('id-1', vol['id'])
+        util.update_vol_fields('id-1', {'a': 1}, expected_index=index)
+        self.assertEqual(1, util.get_vol_by_id('id-1')['a'])
+        self.assertEqual((None, None),
+                         util.get_vol_byname_with_index('vol2'))
+
+
+class TestWaitForVol(EtcdUtilTestCase):
+    @staticmethod
+    def _is_unmounted(vol):
+        return 'node_mount_info' not in vol
+
+    def _save_mounted_vol(self, util):
+        util.save_vol(dict(self._vol('id-1', 'vol1'),
+                           node_mount_info={'node2': ['mount-1']}))
+
+    def test_returns_once_volume_changes(self):
+        util = self._get_etcd_util()
+        self._save_mounted_vol(util)
+        self.client.write(util.volumeroot + 'id-1',
+                          json.dumps(self._vol('id-1', 'vol1')))
+        self.client.events.put(self.client._result(util.volumeroot + 'id-1',
+                                                   action='set'))
+
+        vol = util.wait_for_vol('id-1', self._is_unmounted, 30)
+        self.assertEqual('vol1', vol['display_name'])
+
+    def test_times_out_while_volume_unchanged(self):
+        util = self._get_etcd_util()
+        self._save_mounted_vol(util)
+
+        self.assertIsNone(util.wait_for_vol('id-1', self._is_unmounted, 30))
+
+    def test_deleted_volume_raises(self):
+        util = self._get_etcd_util()
+        self._save_mounted_vol(util)
+        self.client.events.put(util.client.delete(util.volumeroot + 'id-1'))
+
+        self.assertRaises(etcd.EtcdKeyNotFound, util.wait_for_vol, 'id-1',
+                          self._is_unmounted, 30)
+
+
+class TestVolumeMetadataCache(EtcdUtilTestCase):
+    def _get_etcd_util(self):
+        util = etcdutil.EtcdUtil('127.0.0.1', 2379, None, None,
+                                 cache_max_staleness=5)
+        self.addCleanup(util._cache.stop)
+        return util
+
+    def _wait_for(self, condition):
+        for i in range(100):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail('Condition not met')
+
+    def test_reads_are_served_from_cache(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+
+        del self.client.reads[:]
+        self.assertEqual('id-1', util.get_vol_byname('vol1')['id'])
+        self.assertEqual('vol1', util.get_vol_by_id('id-1')['display_name'])
+        self.assertEqual(1, len(util.get_all_vols()))
+        self.assertEqual([], self.client.reads)
+
+    def test_returned_metadata_is_a_copy(self):
+        util = self._get_etcd_util()
+        util.save_vol(self._vol('id-1', 'vol1'))
+
+        util.get_vol_by_id('id-1')['display_name'] = 'changed'
+        self.assertEqual('vol1', util.get_vol_by_id('id-1')['display_name'])
+
+    def test_changes_from_other_nodes_are_applied(self):
+        util = self._get_etcd_util()
+        self.client.write(util.volumeroot + 'id-2',
+                          json.dumps(self._vol('id-2', 'vol2')))
+        self.client.events.put(self.client._result(util.volumeroot + 'id-2',
+                                                   action='set'))
+
+        self._wait_for(lambda: util.get_vol_byname('vol2') is not None)
+        self.assertRaises(etcd.EtcdKeyNotFound, util.get_vol_by_id, 'id-3')
+
+    def test_watch_gap_reloads_cache(self):
+        util = self._get_etcd_util()
+        # Change that the watch never delivers
+        self.client.write(util.volumeroot + 'id-4',
+                          json.dumps(self._vol('id-4', 'vol4')))
+        self.client.events.put(etcd.EtcdEventIndexCleared())
+
+        self._wait_for(lambda: util.get_vol_byname('vol4') is not None)
+
+    def test_stale_cache_falls_back_to_etcd(self):
+        util = self._get_etcd_util()
+        util._cache.stop()
+        util._cache._last_sync -= 10
+        self.client.write(util.volumeroot + 'id-5',
+                          json.dumps(self._vol('id-5', 'vol5')))
+
+        self.assertEqual('vol5', util.get_vol_by_id('id-5')['display_name'])
+
+
+class TestEtcdLock(EtcdUtilTestCase):
+    def test_lock_is_waited_for(self):
+        util = self._get_etcd_util()
+        lock = util.get_lock('VOL')
+        lock.try_lock_name('vol1')
+        unlock = threading.Timer(0.2, lock.try_unlock_name, ('vol1',))
+        unlock.start()
+        self.addCleanup(unlock.cancel)
+
+        lock.lock_name('vol1', 5)
+        self.assertIn(etcdutil.LOCKROOT + '/vol1', self.client.store)
+
+    def test_lock_wait_times_out(self):
+        lock = self._get_etcd_util().get_lock('VOL')
+        lock.try_lock_name('vol1')
+
+        self.assertRaises(exception.HPEPluginLockFailed,
+                          lock.lock_name, 'vol1', 0.2)
+
+    def test_lock_with_ttl_is_refreshed_until_unlocked(self):
+        lock = etcdutil.EtcdLock(etcdutil.WARM_POOL_LOCKROOT + '/',
+                                 self.client, ttl=0.15)
+        lock.lock_name('DEFAULT', 0)
+        time.sleep(0.2)
+        lock.try_unlock_name('DEFAULT')
+        refreshes = len(self.client.refreshes)
+        time.sleep(0.1)
+
+        self.assertEqual([(etcdutil.WARM_POOL_LOCKROOT + '/DEFAULT', 0.15)],
+                         self.client.refreshes[:1])
+        self.assertEqual(refreshes, len(self.client.refreshes))
+
+
+class TestShares(EtcdUtilTestCase):
+    def test_new_share_is_saved_once(self):
+        share_etcd = etcdutil.HpeShareEtcdClient('127.0.0.1', 2379,
+                                                 None, None)
+        share_etcd.save_new_share({'name': 'share1', 'status': 'QUEUED'})
+
+        self.assertRaises(exception.ShareAlreadyExists,
+                          share_etcd.save_new_share,
+                          {'name': 'share1', 'status': 'QUEUED'})
+        self.assertEqual('QUEUED', share_etcd.get_share('share1')['status'])
+
+    def test_share_is_saved_at_index(self):
+        share_etcd = etcdutil.HpeShareEtcdClient('127.0.0.1', 2379,
+                                                 None, None)
+        share_etcd.save_new_share({'name': 'share1', 'status': 'QUEUED'})
+        index, share = share_etcd.get_share_with_index('share1')
+        share_etcd.update_share('share1', 'status', 'CREATING')
+
+        self.assertRaises(exception.HPEPluginUpdateConflict,
+                          share_etcd.save_share_at_index, share, index)
+        index, share = share_etcd.get_share_with_index('share1')
+        share['status'] = 'AVAILABLE'
+        share_etcd.save_share_at_index(share, index)
+        self.assertEqual('AVAILABLE',
+                         share_etcd.get_share('share1')['status'])
+        self.assertRaises(exception.EtcdMetadataNotFound,
+                          share_etcd.get_share_with_index, 'share2')
+
+
+class TestFpgCapacity(EtcdUtilTestCase):
+    def setUp(self):
+        super(TestFpgCapacity, self).setUp()
+        self.fp_etcd = etcdutil.HpeFilePersonaEtcdClient('127.0.0.1', 2379,
+                                                         None, None)
+        self.fp_etcd.save_fpg_metadata('DEFAULT_FILE', 'fs_cpg',
+                                       'DockerFpg_0', {'fpg': 'DockerFpg_0'})
+
+    def _get_fpg(self):
+        return self.fp_etcd.get_fpg_metadata('DEFAULT_FILE', 'fs_cpg',
+                                             'DockerFpg_0')
+
+    def test_unreconciled_fpg_is_not_charged(self):
+        self.fp_etcd.charge_fpg_capacity('DEFAULT_FILE', 'fs_cpg',
+                                         'DockerFpg_0', 1)
+        self.assertNotIn('used_capacity_gib', self._get_fpg())
+
+        get_capacity = mock.Mock(return_value=(1024, 10, 2))
+        fpg_info = self.fp_etcd.reconcile_fpg_capacity(
+            'DEFAULT_FILE', 'fs_cpg', 'DockerFpg_0', get_capacity)
+        self.assertEqual((1024, 10, 2), (fpg_info['total_capacity_gib'],
+                                         fpg_info['used_capacity_gib'],
+                                         fpg_info['share_count']))
+
+        self.fp_etcd.charge_fpg_capacity('DEFAULT_FILE', 'fs_cpg',
+                                         'DockerFpg_0', 4, 1)
+        self.fp_etcd.charge_fpg_capacity('DEFAULT_FILE', 'fs_cpg',
+                                         'DockerFpg_0', -1, -1)
+        fpg_info = self._get_fpg()
+        self.assertEqual(13, fpg_info['used_capacity_gib'])
+        self.assertEqual(2, fpg_info['share_count'])
+
+    def test_share_charged_during_reconciliation_is_kept(self):
+        self.fp_etcd.reconcile_fpg_capacity(
+            'DEFAULT_FILE', 'fs_cpg', 'DockerFpg_0', lambda: (1024, 10, 1))
+
+        def _get_capacity():
+            if _get_capacity.first:
+                # Share created while the array is queried
+                _get_capacity.first = False
+                self.fp_etcd.charge_fpg_capacity('DEFAULT_FILE', 'fs_cpg',
+                                                 'DockerFpg_0', 5, 1)
+                return 1024, 10, 1
+            return 1024, 15, 2
+        _get_capacity.first = True
+
+        self.fp_etcd.reconcile_fpg_capacity(
+            'DEFAULT_FILE', 'fs_cpg', 'DockerFpg_0', _get_capacity)
+        self.assertEqual(15, self._get_fpg()['used_capacity_gib'])
+
+    def test_fpgs_of_backend_are_listed(self):
+        self.fp_etcd.save_fpg_metadata('DEFAULT_FILE', 'fs_cpg2',
+                                       'DockerFpg_1', {'fpg': 'DockerFpg_1'})
+        self.fp_etcd.save_backend_metadata('DEFAULT_FILE', {'counter': 2})
+        self.fp_etcd.save_fpg_metadata('OTHER_FILE', 'fs_cpg',
+                                       'DockerFpg_2', {'fpg': 'DockerFpg_2'})
+
+        self.assertEqual(
+            [('fs_cpg', {'fpg': 'DockerFpg_0'}),
+             ('fs_cpg2', {'fpg': 'DockerFpg_1'})],
+            sorted(self.fp_etcd.get_all_backend_fpg_metadata('DEFAULT_FILE'),
+                   key=lambda fpg: fpg[0]))
+
+
+class TestBackendKeys(EtcdUtilTestCase):
+    def setUp(self):
+        super(TestBackendKeys, self).setUp()
+        self.fp_etcd = etcdutil.HpeFilePersonaEtcdClient('127.0.0.1', 2379,
+                                                         None, None)
+
+    def test_fpg_counter(self):
+        self.assertEqual(0, self.fp_etcd.next_fpg_counter('DEFAULT_FILE'))
+        self.assertEqual(1, self.fp_etcd.next_fpg_counter('DEFAULT_FILE'))
+
+        # Counter of the backend metadata written by older plugins
+        self.fp_etcd.save_backend_metadata('OTHER_FILE', {'counter': 4})
+        self.assertEqual(5, self.fp_etcd.next_fpg_counter('OTHER_FILE'))
+
+    def test_concurrent_increment_is_retried(self):
+        self.fp_etcd.next_fpg_counter('DEFAULT_FILE')
+        write = self.client.write
+
+        def racing_write(key, value, **kwargs):
+            if racing_write.first:
+                # Another node takes the next number first
+                racing_write.first = False
+                write(key, json.dumps({'counter': 1}))
+            return write(key, value, **kwargs)
+        racing_write.first = True
+
+        with mock.patch.object(self.client, 'write', racing_write):
+            self.assertEqual(2,
+                             self.fp_etcd.next_fpg_counter('DEFAULT_FILE'))
+
+    def test_default_fpgs(self):
+        self.fp_etcd.save_backend_metadata(
+            'DEFAULT_FILE', {'counter': 1,
+                             'default_fpgs': {'fs_cpg': ['DockerFpg_0']}})
+        self.assertEqual(['DockerFpg_0'],
+                         self.fp_etcd.get_default_fpgs('DEFAULT_FILE',
+                                                       'fs_cpg'))
+
+        self.fp_etcd.add_default_fpg('DEFAULT_FILE', 'fs_cpg', 'DockerFpg_1')
+        self.fp_etcd.add_default_fpg('DEFAULT_FILE', 'fs_cpg2',
+                                     'DockerFpg_2')
+        self.fp_etcd.remove_default_fpg('DEFAULT_FILE', 'fs_cpg',
+                                        'DockerFpg_0')
+        self.assertEqual(['DockerFpg_1'],
+                         self.fp_etcd.get_default_fpgs('DEFAULT_FILE',
+                                                       'fs_cpg'))
+        self.assertEqual(['DockerFpg_2'],
+                         self.fp_etcd.get_default_fpgs('DEFAULT_FILE',
+                                                       'fs_cpg2'))
+
+        # Legacy default FPGs are not read again once carried over
+        self.fp_etcd.remove_default_fpg('DEFAULT_FILE', 'fs_cpg',
+                                        'DockerFpg_1')
+        self.assertEqual([], self.fp_etcd.get_default_fpgs('DEFAULT_FILE',
+                                                           'fs_cpg'))
+
+
+class TestVfsIpMap(EtcdUtilTestCase):
+    def test_map_is_saved_with_cas(self):
+        fp_etcd = etcdutil.HpeFilePersonaEtcdClient('127.0.0.1', 2379,
+                                                    None, None)
+        self.assertRaises(exception.EtcdMetadataNotFound,
+                          fp_etcd.get_vfs_ip_map, 'DEFAULT_FILE')
+
+        fp_etcd.save_vfs_ip_map('DEFAULT_FILE', {'subnets': {}})
+        self.assertRaises(exception.HPEPluginUpdateConflict,
+                          fp_etcd.save_vfs_ip_map, 'DEFAULT_FILE',
+                          {'subnets': {}})
+
+        index, ip_map = fp_etcd.get_vfs_ip_map('DEFAULT_FILE')
+        fp_etcd.save_vfs_ip_map('DEFAULT_FILE', {'subnets': {'a': 1}}, index)
+        self.assertRaises(exception.HPEPluginUpdateConflict,
+                          fp_etcd.save_vfs_ip_map, 'DEFAULT_FILE',
+                          ip_map, index)
+        self.assertEqual({'subnets': {'a': 1}},
+                         fp_etcd.get_vfs_ip_map('DEFAULT_FILE')[1])
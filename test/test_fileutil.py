@@ -1,5 +1,8 @@
 from hpedockerplugin import fileutil
 import mock
+import os
+import shutil
+import tempfile
 from testtools import TestCase
 import time
 
@@ -20,3 +23,37 @@ class TestFileSystemCreationFailureWithRetry(TestCase):
             end_time = time.time()
             print('Duration : %d' % (end_time - start_time))
             self.assertTrue((end_time - start_time) >= 40)
+
+
+class TestCreateFileSystem(TestCase):
+    def test_fast_format_options(self):
+        with mock.patch.object(fileutil, 'mkfs') as mock_mkfs:
+            fileutil.create_filesystem("/dev/sde")
+            mock_mkfs.assert_called_with("-F", "/dev/sde")
+
+            fileutil.create_filesystem("/dev/sde", lazy_init=True,
+                                       nodiscard=True)
+            mock_mkfs.assert_called_with(
+                "-F", "-E", "lazy_itable_init=1,lazy_journal_init=1,"
+                "nodiscard", "/dev/sde")
+
+
+class TestRemoveDir(TestCase):
+    def setUp(self):
+        super(TestRemoveDir, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_link_is_removed_but_not_its_target(self):
+        target = os.path.join(self.tmp_dir, 'target')
+        os.mkdir(target)
+        link = os.path.join(self.tmp_dir, 'link')
+        os.symlink(target, link)
+
+        self.assertTrue(fileutil.remove_dir(link))
+        self.assertFalse(os.path.lexists(link))
+        self.assertTrue(os.path.isdir(target))
+
+    def test_missing_dir_is_ignored(self):
+        self.assertTrue(fileutil.remove_dir(
+            os.path.join(self.tmp_dir, 'missing')))
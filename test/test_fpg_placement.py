@@ -0,0 +1,38 @@
+from testtools import TestCase
+
+from hpedockerplugin import fpg_placement
+
+
+def _fpg(name, total, used, share_count):
+    return {'fpg': name, 'total_capacity_gib': total,
+            'used_capacity_gib': used, 'share_count': share_count}
+
+
+FPGS = [
+    _fpg('DockerFpg_0', 1024, 1000, 1),
+    _fpg('DockerFpg_1', 1024, 800, 10),
+    _fpg('DockerFpg_2', 1024, 100, 3),
+    _fpg('DockerFpg_3', 1024, 824, 3),
+]
+
+
+class TestFpgPlacement(TestCase):
+    def _order(self, policy):
+        return [fpg_info['fpg'] for fpg_info in
+                fpg_placement.order_fpgs(FPGS, 100, policy)]
+
+    def test_best_fit(self):
+        # DockerFpg_0 has only 24 GiB left
+        self.assertEqual(['DockerFpg_3', 'DockerFpg_1', 'DockerFpg_2'],
+                         self._order(fpg_placement.BEST_FIT))
+
+    def test_worst_fit(self):
+        self.assertEqual(['DockerFpg_2', 'DockerFpg_1', 'DockerFpg_3'],
+                         self._order(fpg_placement.WORST_FIT))
+
+    def test_share_count_balanced(self):
+        self.assertEqual(['DockerFpg_2', 'DockerFpg_3', 'DockerFpg_1'],
+                         self._order(fpg_placement.SHARE_COUNT_BALANCED))
+
+    def test_no_fpg_can_hold_share(self):
+        self.assertEqual([], fpg_placement.order_fpgs(FPGS, 1024))
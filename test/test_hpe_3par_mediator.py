@@ -0,0 +1,86 @@
+import mock
+from testtools import TestCase
+
+from hpedockerplugin.hpe import hpe_3par_mediator
+from hpedockerplugin.hpe import session_pool
+
+
+class TestMediatorSessions(TestCase):
+    def setUp(self):
+        super(TestMediatorSessions, self).setUp()
+        config = mock.Mock(hpe3par_api_url='https://array:8080/api/v1',
+                           hpe3par_max_sessions=2,
+                           hpe3par_session_idle_timeout=300,
+                           hpe3par_task_poll_interval=1,
+                           hpe3par_debug=False)
+        self.mediator = hpe_3par_mediator.HPE3ParMediator(mock.Mock(),
+                                                          config)
+        self.clients = []
+
+        def _create_client():
+            client = mock.Mock(name='client%s' % len(self.clients))
+            client.http.get.return_value = ({}, {'members': []})
+            self.clients.append(client)
+            return client
+        for patcher in (
+                mock.patch.object(self.mediator, '_create_client',
+                                  side_effect=_create_client),
+                mock.patch.object(session_pool, 'get_ssh_client')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_session_is_reused_across_calls(self):
+        self.mediator.get_all_vfs()
+        self.mediator.get_all_fpgs()
+
+        self.assertEqual(1, len(self.clients))
+        self.clients[0].login.assert_called_once()
+        self.clients[0].http.unauthenticate.assert_not_called()
+        self.assertIsNone(self.mediator._client)
+
+    def test_unit_of_work_holds_one_session(self):
+        with self.mediator.unit_of_work():
+            client = self.mediator._client
+            self.mediator.get_all_vfs()
+            self.assertIs(client, self.mediator._client)
+            self.mediator.get_all_quotas()
+        self.assertIsNone(self.mediator._client)
+
+        # The session was returned to the pool and is picked up again
+        self.mediator.get_all_fpgs()
+        self.assertEqual(1, len(self.clients))
+        self.assertEqual(3, client.http.get.call_count)
+
+    def test_session_is_released_while_waiting_for_task(self):
+        self.mediator._task_client = mock.Mock(TASK_DONE=1)
+        held = []
+
+        def _wait(task_id, on_progress):
+            held.append(self.mediator._client)
+            return {'status': 1}
+        with mock.patch.object(self.mediator._task_tracker, 'wait',
+                               side_effect=_wait):
+            with self.mediator.unit_of_work():
+                self.mediator._wait_for_task_completion(12)
+                self.assertIsNotNone(self.mediator._client)
+
+        self.assertEqual([None], held)
+
+    def test_call_made_while_handling_an_error_keeps_session(self):
+        try:
+            raise IOError('handled by the caller')
+        except IOError:
+            self.mediator.get_all_vfs()
+        self.mediator.get_all_fpgs()
+
+        self.assertEqual(1, len(self.clients))
+        self.clients[0].http.unauthenticate.assert_not_called()
+
+    def test_failed_nested_call_discards_session(self):
+        with self.mediator.unit_of_work():
+            self.mediator.get_all_vfs()
+            self.clients[0].http.get.side_effect = IOError('reset')
+            self.assertRaises(IOError, self.mediator.get_all_fpgs)
+
+        self.clients[0].http.unauthenticate.assert_called_once()
+        self.assertIsNone(self.mediator._client)
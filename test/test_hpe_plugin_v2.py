@@ -92,6 +92,21 @@ class HpeDockerUnitTestsBase(object):
         test = createvolume_tester.TestCreateDedupVolume()
         test.run_test(self)
 
+    @tc_banner_decorator
+    def test_create_volume_from_warm_pool(self):
+        test = createvolume_tester.TestCreateVolumeFromWarmPool()
+        test.run_test(self)
+
+    @tc_banner_decorator
+    def test_create_volume_with_fs_opts_skips_warm_pool(self):
+        test = createvolume_tester.TestCreateVolumeWithFsOptsSkipsWarmPool()
+        test.run_test(self)
+
+    @tc_banner_decorator
+    def test_create_volume_preformat_fails(self):
+        test = createvolume_tester.TestCreateVolumePreformatFails()
+        test.run_test(self)
+
     @tc_banner_decorator
     def test_import_volume(self):
         test = createvolume_tester.TestImportVolume()
@@ -457,6 +472,10 @@ class HpeDockerUnitTestsBase(object):
         test = removevolume_tester.TestRemoveVolumeWithChildSnapshot()
         test.run_test(self)
 
+    def test_remove_clone_being_copied(self):
+        test = removevolume_tester.TestRemoveCloneBeingCopied()
+        test.run_test(self)
+
     """
     REMOVE SNAPSHOT related tests
     """
@@ -557,6 +576,26 @@ class HpeDockerUnitTestsBase(object):
         test = unmountvolume_tester.TestUnmountVolNotOwnedByThisNode()
         test.run_test(self)
 
+    @tc_banner_decorator
+    def test_unmount_volume_with_detach_grace_period(self):
+        test = unmountvolume_tester.TestUnmountVolumeWithDetachGracePeriod()
+        test.run_test(self)
+
+    @tc_banner_decorator
+    def test_unmount_volume_mounted_concurrently(self):
+        test = unmountvolume_tester.TestUnmountVolumeMountedConcurrently()
+        test.run_test(self)
+
+    @tc_banner_decorator
+    def test_mount_volume_with_pending_detach(self):
+        test = mountvolume_tester.TestMountVolumeWithPendingDetach()
+        test.run_test(self)
+
+    @tc_banner_decorator
+    def test_mount_clone_being_copied(self):
+        test = mountvolume_tester.TestMountCloneBeingCopied()
+        test.run_test(self)
+
     """
     INSPECT VOLUME/SNAPSHOT related tests
     """
@@ -614,6 +653,11 @@ class HpeDockerISCSIUnitTests(HpeDockerUnitTestsBase, testtools.TestCase):
         test = clonevolume_tester.TestCloneWithCHAP()
         test.run_test(self)
 
+    @tc_banner_decorator
+    def test_create_volume_with_preformat(self):
+        test = createvolume_tester.TestCreateVolumeWithPreformat()
+        test.run_test(self)
+
     @tc_banner_decorator
     def test_mount_volume_iscsi_host(self):
         test = mountvolume_tester.TestMountVolumeISCSIHostNoVLUN()
@@ -677,6 +721,11 @@ class HpeDockerISCSIUnitTests(HpeDockerUnitTestsBase, testtools.TestCase):
         test = mountvolume_tester.TestVolFencingForcedUnmount(is_snap=True)
         test.run_test(self)
 
+    @tc_banner_decorator
+    def test_mount_volume_with_pending_detach_on_other_node(self):
+        test = mountvolume_tester.TestMountVolumeWithPendingDetachOnOtherNode()
+        test.run_test(self)
+
     @tc_banner_decorator
     def test_vol_fencing_graceful_unmount(self):
         test = mountvolume_tester.TestVolFencingGracefulUnmount()
@@ -731,6 +780,16 @@ class HpeDockerFCUnitTests(HpeDockerUnitTestsBase, testtools.TestCase):
         test = mountvolume_tester.TestMountVolumeFCHost()
         test.run_test(self)
 
+    @tc_banner_decorator
+    def test_mount_preformatted_volume(self):
+        test = mountvolume_tester.TestMountPreformattedVolume()
+        test.run_test(self)
+
+    @tc_banner_decorator
+    def test_mount_volume_being_formatted(self):
+        test = mountvolume_tester.TestMountVolumeBeingFormatted()
+        test.run_test(self)
+
     @tc_banner_decorator
     def test_mount_snap_fc_host(self):
         test = mountvolume_tester.TestMountVolumeFCHost(is_snap=True)
@@ -852,6 +911,12 @@ class HpeDockerShareUnitTests(testtools.TestCase):
         test = deleteshare_tester.TestDeleteShare(del_regular_share)
         test.run_test(self)
 
+    @tc_banner_decorator
+    def test_remove_queued_share(self):
+        del_queued_share = deleteshare_tester.TestDeleteShare.Queued()
+        test = deleteshare_tester.TestDeleteShare(del_queued_share)
+        test.run_test(self)
+
     @tc_banner_decorator
     def test_mount_share(self):
         test = mountshare_tester.TestMountNfsShare()
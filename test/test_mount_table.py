@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from testtools import TestCase
+
+from hpedockerplugin import mount_table
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+95 22 253:3 / %(mnt)s/hpedocker-dm-uuid rw,relatime shared:52 - \
+ext4 /dev/mapper/360002ac0000000000100850 rw
+96 22 0:52 / %(mnt)s/with\\040space rw - nfs 10.0.0.1:/fs/share rw
+"""
+
+
+class TestMountTable(TestCase):
+    def setUp(self):
+        super(TestMountTable, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.mnt = os.path.realpath(self.tmp)
+        self.path = os.path.join(self.tmp, 'mountinfo')
+        self._write(MOUNTINFO)
+        self.table = mount_table.MountTable(self.path)
+
+    def _write(self, content):
+        with open(self.path, 'w') as f:
+            f.write(content % {'mnt': self.mnt})
+
+    def test_parse(self):
+        entries = self.table.entries()
+        self.assertEqual(3, len(entries))
+        self.assertEqual(
+            mount_table.MountEntry(
+                '253:3', '/', self.mnt + '/hpedocker-dm-uuid', 'ext4',
+                '/dev/mapper/360002ac0000000000100850'),
+            entries[1])
+        self.assertEqual(self.mnt + '/with space', entries[2].mount_point)
+
+    def test_source_is_matched_through_symlinks(self):
+        mapper = os.path.join(self.tmp, 'mapper-dev')
+        os.symlink('/dev/mapper/360002ac0000000000100850', mapper)
+        tgt = self.mnt + '/hpedocker-dm-uuid'
+
+        self.assertTrue(self.table.is_mounted(mapper, tgt))
+        self.assertFalse(self.table.is_mounted('/dev/sdb', tgt))
+        self.assertFalse(self.table.is_mounted(mapper, self.mnt + '/other'))
+        self.assertTrue(self.table.is_mount_point(self.mnt + '/with space'))
+
+    def test_table_follows_file(self):
+        tgt = self.mnt + '/hpedocker-dm-uuid'
+        self.assertTrue(self.table.is_mount_point(tgt))
+        self._write(MOUNTINFO.splitlines()[0] + '\n')
+        self.assertFalse(self.table.is_mount_point(tgt))
+
+    def test_proc_mountinfo(self):
+        table = mount_table.MountTable()
+        self.assertTrue(table.is_mount_point('/'))
+        # Unchanged table is not read again
+        entries = table.entries()
+        self.assertIs(entries, table.entries())
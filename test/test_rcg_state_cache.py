@@ -0,0 +1,88 @@
+import time
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin.hpe import rcg_state_cache
+
+RCG_INFO = {'local_rcg_name': 'TEST-RCG',
+            'remote_rcg_name': 'TEST-RCG.r123456'}
+
+
+class TestRcgStateCache(TestCase):
+    def test_active_array_is_resolved_once(self):
+        resolve = mock.Mock(return_value='primary')
+        cache = rcg_state_cache.RcgStateCache('DEFAULT', resolve)
+
+        for i in range(3):
+            self.assertEqual('primary', cache.get_active(RCG_INFO))
+        resolve.assert_called_once_with(RCG_INFO)
+
+        cache.invalidate('TEST-RCG')
+        self.assertEqual('primary', cache.get_active(RCG_INFO))
+        self.assertEqual(2, resolve.call_count)
+
+    def test_error_is_not_cached(self):
+        resolve = mock.Mock(side_effect=[Exception('RCG in transition'),
+                                         'secondary'])
+        cache = rcg_state_cache.RcgStateCache('DEFAULT', resolve)
+
+        self.assertRaises(Exception, cache.get_active, RCG_INFO)
+        self.assertEqual('secondary', cache.get_active(RCG_INFO))
+
+    def test_aging_entry_is_refreshed_in_background(self):
+        resolve = mock.Mock(side_effect=['primary', 'secondary'])
+        cache = rcg_state_cache.RcgStateCache('DEFAULT', resolve, ttl=60)
+        cache.get_active(RCG_INFO)
+        active, resolved_at = cache._entries['TEST-RCG']
+        cache._entries['TEST-RCG'] = (active, resolved_at - 40)
+
+        # The cached array is returned while it is resolved again
+        self.assertEqual('primary', cache.get_active(RCG_INFO))
+        for i in range(100):
+            if cache.get_active(RCG_INFO) == 'secondary':
+                break
+            time.sleep(0.01)
+        self.assertEqual('secondary', cache.get_active(RCG_INFO))
+        self.assertEqual(2, resolve.call_count)
+
+    def test_refresh_started_before_invalidate_is_not_cached(self):
+        cache = None
+
+        def _resolve(rcg_info):
+            if resolve.call_count == 2:
+                # The cached array fails while it is being resolved again
+                cache.invalidate('TEST-RCG')
+            return ['primary', 'primary', 'secondary'][
+                resolve.call_count - 1]
+        resolve = mock.Mock(side_effect=_resolve)
+        cache = rcg_state_cache.RcgStateCache('DEFAULT', resolve, ttl=60)
+        cache.get_active(RCG_INFO)
+        active, resolved_at = cache._entries['TEST-RCG']
+        cache._entries['TEST-RCG'] = (active, resolved_at - 40)
+
+        cache.get_active(RCG_INFO)
+        for i in range(100):
+            if 'TEST-RCG' not in cache._refreshing:
+                break
+            time.sleep(0.01)
+        self.assertEqual({}, cache._entries)
+        self.assertEqual('secondary', cache.get_active(RCG_INFO))
+
+    def test_expired_entry_is_resolved_again(self):
+        resolve = mock.Mock(side_effect=['primary',
+                                         Exception('RCG not found')])
+        cache = rcg_state_cache.RcgStateCache('DEFAULT', resolve, ttl=60)
+        cache.get_active(RCG_INFO)
+        active, resolved_at = cache._entries['TEST-RCG']
+        cache._entries['TEST-RCG'] = (active, resolved_at - 60)
+
+        self.assertRaises(Exception, cache.get_active, RCG_INFO)
+        self.assertEqual({}, cache._entries)
+
+    def test_ttl_0_disables_cache(self):
+        resolve = mock.Mock(return_value='primary')
+        cache = rcg_state_cache.RcgStateCache('DEFAULT', resolve, ttl=0)
+        cache.get_active(RCG_INFO)
+        cache.get_active(RCG_INFO)
+        self.assertEqual(2, resolve.call_count)
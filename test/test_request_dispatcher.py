@@ -0,0 +1,117 @@
+import threading
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import request_dispatcher as req_dispatcher
+
+
+class FakeReactor(object):
+    """Running reactor that fires results on the worker thread"""
+    running = True
+
+    def callWhenRunning(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+    def addSystemEventTrigger(self, phase, event, f, *args, **kwargs):
+        pass
+
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+
+class TestRequestDispatcher(TestCase):
+    def setUp(self):
+        super(TestRequestDispatcher, self).setUp()
+        self.reactor = FakeReactor()
+        self.dispatcher = req_dispatcher.RequestDispatcher(
+            self.reactor, {req_dispatcher.MOUNT: 1})
+        self.addCleanup(self.dispatcher._stop)
+
+    def _dispatch(self, op_class, f):
+        results = []
+        d = self.dispatcher.dispatch(op_class, f)
+        d.addBoth(results.append)
+        return results
+
+    def _wait_for(self, results):
+        for i in range(100):
+            if results:
+                return results[0]
+            threading.Event().wait(0.01)
+        self.fail('Request did not complete')
+
+    def test_handler_runs_inline_without_reactor(self):
+        self.reactor.running = False
+        f = mock.Mock(return_value='{"Err": ""}')
+        self.assertEqual('{"Err": ""}',
+                         self.dispatcher.dispatch(req_dispatcher.READ, f))
+
+    def test_reads_do_not_queue_behind_mounts(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        mount1 = self._dispatch(req_dispatcher.MOUNT, release.wait)
+        mount2 = self._dispatch(req_dispatcher.MOUNT, lambda: 'mounted')
+
+        read = self._dispatch(req_dispatcher.READ, lambda: 'path')
+        self.assertEqual('path', self._wait_for(read))
+        self.assertEqual([], mount1)
+        self.assertEqual(1, self.dispatcher.stats()['mount']['queued'])
+
+        release.set()
+        self.assertEqual('mounted', self._wait_for(mount2))
+        stats = self.dispatcher.stats()['mount']
+        self.assertEqual((0, 2), (stats['queued'], stats['completed']))
+        self.assertGreater(stats['max_wait'], 0)
+
+    def test_unmounts_do_not_queue_behind_mounts(self):
+        # Mounts waiting for admission to the array hold the mount threads
+        release = threading.Event()
+        self.addCleanup(release.set)
+        mount = self._dispatch(req_dispatcher.MOUNT, release.wait)
+
+        unmount = self._dispatch(req_dispatcher.UNMOUNT, lambda: 'unmounted')
+        self.assertEqual('unmounted', self._wait_for(unmount))
+        self.assertEqual([], mount)
+
+    def test_requests_for_same_name_run_one_at_a_time(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.dispatcher = req_dispatcher.RequestDispatcher(
+            self.reactor, {req_dispatcher.MOUNT: 2,
+                           req_dispatcher.PROVISION: 2})
+        self.addCleanup(self.dispatcher._stop)
+        running = []
+
+        def _request(name, result):
+            def _run():
+                running.append(name)
+                release.wait(5)
+                running.remove(name)
+                return result
+            return _run
+        mount = []
+        self.dispatcher.dispatch_by_key(
+            req_dispatcher.MOUNT, 'vol1',
+            _request('vol1', 'mounted')).addBoth(mount.append)
+        remove = []
+        self.dispatcher.dispatch_by_key(
+            req_dispatcher.PROVISION, 'vol1',
+            _request('vol1', 'removed')).addBoth(remove.append)
+        other = []
+        self.dispatcher.dispatch_by_key(
+            req_dispatcher.MOUNT, 'vol2',
+            _request('vol2', 'mounted')).addBoth(other.append)
+
+        for i in range(100):
+            if len(running) == 2:
+                break
+            threading.Event().wait(0.01)
+        # The Remove of vol1 waits for its Mount, vol2 does not
+        self.assertEqual(['vol1', 'vol2'], sorted(running))
+
+        release.set()
+        self.assertEqual('mounted', self._wait_for(mount))
+        self.assertEqual('removed', self._wait_for(remove))
+        self.assertEqual('mounted', self._wait_for(other))
+        self.assertEqual({}, self.dispatcher._key_tails)
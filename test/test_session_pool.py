@@ -0,0 +1,200 @@
+import sys
+import threading
+import time
+
+from hpe3parclient import exceptions as hpeexceptions
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import exception
+from hpedockerplugin.hpe import hpe_3par_fc
+from hpedockerplugin.hpe import hpe_3par_iscsi
+from hpedockerplugin.hpe import session_pool
+
+
+class TestWSAPISessionPool(TestCase):
+    def setUp(self):
+        super(TestWSAPISessionPool, self).setUp()
+        self.create_session = mock.Mock(
+            side_effect=lambda: mock.Mock(name='session'))
+
+    def test_session_is_reused(self):
+        pool = session_pool.WSAPISessionPool('array', self.create_session)
+        session = pool.get()
+        pool.put(session)
+
+        self.assertIs(session, pool.get())
+        self.assertEqual(1, self.create_session.call_count)
+        session.client_logout.assert_not_called()
+
+    def test_idle_session_is_logged_out(self):
+        pool = session_pool.WSAPISessionPool('array', self.create_session,
+                                             idle_timeout=1)
+        session = pool.get()
+        pool.put(session)
+        pool._idle[0] = (session, time.time() - 2)
+
+        self.assertIsNot(session, pool.get())
+        session.client_logout.assert_called_once_with()
+
+    def test_sessions_are_capped(self):
+        pool = session_pool.WSAPISessionPool('array', self.create_session,
+                                             max_sessions=1)
+        session = pool.get()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.get()))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertEqual([], got)
+
+        pool.put(session)
+        waiter.join(1)
+        self.assertEqual([session], got)
+        self.assertEqual(1, self.create_session.call_count)
+
+    def test_failed_login_frees_slot(self):
+        self.create_session.side_effect = [Exception('login failed'),
+                                           mock.Mock()]
+        pool = session_pool.WSAPISessionPool('array', self.create_session,
+                                             max_sessions=1)
+        self.assertRaises(Exception, pool.get)
+        self.assertIsNotNone(pool.get())
+
+    def test_request_timings_are_reported(self):
+        observed = []
+        pool = session_pool.WSAPISessionPool('array', self.create_session,
+                                             latency_observer=observed.append)
+        session = pool.get()
+        session.client.http.get_timings.return_value = [
+            ('GET /volumes', 10.0, 10.5), ('POST /vluns', 11.0, 13.0)]
+        pool.put(session)
+
+        self.assertEqual([0.5, 2.0], observed)
+        session.client.http.reset_timings.assert_called_once_with()
+
+    def _use_session(self, pool, error):
+        def _fail():
+            with pool.session() as session:
+                used.append(session)
+                raise error
+        used = []
+        self.assertRaises(type(error), _fail)
+        return used[0]
+
+    def test_session_is_reused_after_client_error(self):
+        pool = session_pool.WSAPISessionPool('array', self.create_session)
+        session = self._use_session(pool, hpeexceptions.HTTPNotFound())
+
+        self.assertIs(session, pool.get())
+        session.client_logout.assert_not_called()
+
+    def test_session_is_discarded_after_other_errors(self):
+        pool = session_pool.WSAPISessionPool('array', self.create_session)
+        for error in (hpeexceptions.HTTPServiceUnavailable(),
+                      IOError('connection reset')):
+            session = self._use_session(pool, error)
+
+            self.assertIsNot(session, pool.get())
+            session.client_logout.assert_called_once_with()
+
+    def test_plugin_error_is_judged_by_its_cause(self):
+        pool = session_pool.WSAPISessionPool('array', self.create_session)
+        session = pool.get()
+        pool.put(session, error=exception.FpgNotFound(fpg='fpg1'))
+        self.assertIs(session, pool.get())
+
+        try:
+            raise IOError('connection reset')
+        except IOError:
+            error = exception.FpgNotFound(fpg='fpg1')
+            error.__context__ = sys.exc_info()[1]
+        pool.put(session, error=error)
+        session.client_logout.assert_called_once_with()
+
+
+class TestDriverSessions(TestCase):
+    def _get_driver(self, driver_class):
+        config = mock.Mock(hpe3par_api_url='https://array:8080/api/v1',
+                           hpe3par_max_sessions=2,
+                           hpe3par_session_idle_timeout=300,
+                           hpe3par_inventory_refresh_interval=300,
+                           hpe3par_task_poll_interval=1,
+                           mount_admission_max_concurrency=8,
+                           mount_admission_min_concurrency=1,
+                           mount_admission_queue_timeout=120,
+                           wsapi_target_latency=2.0,
+                           etcd_target_latency=0.5)
+        self.sessions = []
+
+        def _create_session(driver):
+            session = mock.Mock(name='session')
+            session.client.http.get_timings.return_value = []
+            self.sessions.append(session)
+            return session
+        with mock.patch.object(driver_class, '_create_session',
+                               autospec=True, side_effect=_create_session):
+            return driver_class(mock.Mock(), config)
+
+    def test_call_made_while_handling_an_error_keeps_session(self):
+        for driver_class in (hpe_3par_iscsi.HPE3PARISCSIDriver,
+                             hpe_3par_fc.HPE3PARFCDriver):
+            driver = self._get_driver(driver_class)
+            try:
+                raise IOError('connection reset')
+            except IOError:
+                # Undo steps are run from exception handlers
+                driver.delete_volume({'id': 'vol1'})
+            driver.delete_volume({'id': 'vol1'})
+
+            self.assertEqual(1, len(self.sessions))
+            self.sessions[0].client_logout.assert_not_called()
+
+    def test_failed_call_discards_session(self):
+        driver = self._get_driver(hpe_3par_iscsi.HPE3PARISCSIDriver)
+        driver.delete_volume({'id': 'vol1'})
+        self.sessions[0].delete_volume.side_effect = \
+            hpeexceptions.HTTPServiceUnavailable()
+
+        self.assertRaises(hpeexceptions.HTTPServiceUnavailable,
+                          driver.delete_volume, {'id': 'vol1'})
+        self.sessions[0].client_logout.assert_called_once_with()
+
+
+class TestSSHSessionPool(TestCase):
+    def setUp(self):
+        super(TestSSHSessionPool, self).setUp()
+        patcher = mock.patch.object(session_pool.ssh, 'HPE3PARSSHClient')
+        self.mock_ssh_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_ssh_client.side_effect = \
+            lambda *args, **kwargs: mock.Mock(name='ssh')
+        self.config = mock.Mock(san_ip='10.50.3.9', san_ssh_port=22,
+                                san_login='3paradm', san_password='pass',
+                                hpe3par_max_ssh_sessions=2,
+                                hpe3par_session_idle_timeout=300,
+                                ssh_keepalive_interval=10)
+        self.host_config = mock.Mock(strict_ssh_host_key_policy=False)
+        self.addCleanup(session_pool._ssh_pools.clear)
+
+    def test_connection_is_shared_and_kept_alive(self):
+        client1 = session_pool.get_ssh_client(self.host_config, self.config)
+        client2 = session_pool.get_ssh_client(self.host_config, self.config)
+        client1.run(['showfsuser', '\r'])
+        client1.close()
+        client2.run(['showfsgroup', '\r'])
+
+        self.assertEqual(1, self.mock_ssh_client.call_count)
+        conn = client1._pool._idle[0][0]
+        conn.ssh.get_transport().set_keepalive.assert_called_once_with(10)
+        self.assertEqual(2, conn.run.call_count)
+        conn.close.assert_not_called()
+
+    def test_dead_connection_is_replaced(self):
+        client = session_pool.get_ssh_client(self.host_config, self.config)
+        client.run(['showfsuser', '\r'])
+        conn = client._pool._idle[0][0]
+        conn.ssh.get_transport().is_active.return_value = False
+
+        client.run(['showfsuser', '\r'])
+        conn.close.assert_called_once_with()
+        self.assertEqual(2, self.mock_ssh_client.call_count)
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import etcdutil
+from hpedockerplugin import file_manager
+from hpedockerplugin import share_queue
+from test import test_etcdutil
+
+
+class TestShareCreationQueue(TestCase):
+    def test_shares_are_created_in_order_by_bounded_workers(self):
+        created = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def _create(share_name, share_args):
+            started.set()
+            release.wait(5)
+            created.append(share_name)
+            return True
+        queue = share_queue.ShareCreationQueue('DEFAULT_FILE', _create,
+                                               workers=1)
+        queue.start()
+        for share_name in ('share1', 'share2', 'share3'):
+            queue.submit(share_name, {'name': share_name})
+        self.assertTrue(started.wait(5))
+
+        # share1 is being created, the other ones wait for the worker
+        self.assertIsNone(queue.position('share1'))
+        self.assertEqual(1, queue.position('share2'))
+        self.assertEqual(2, queue.position('share3'))
+        self.assertEqual(2, queue.stats()['queued'])
+        self.assertEqual(1, queue.stats()['creating'])
+
+        queue.discard('share3')
+        release.set()
+        for i in range(100):
+            if queue.stats()['created'] == 2:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(['share1', 'share2'], created)
+        self.assertEqual({'workers': 1, 'queued': 0, 'creating': 0,
+                          'created': 2, 'failed': 0}, queue.stats())
+
+    def test_outcome_is_counted(self):
+        create = mock.Mock(side_effect=[False, Exception('array down'),
+                                        None])
+        queue = share_queue.ShareCreationQueue('DEFAULT_FILE', create)
+        for share_name in ('share1', 'share2', 'share3'):
+            queue.process(share_name, {'name': share_name})
+
+        stats = queue.stats()
+        self.assertEqual(2, stats['failed'])
+        # Shares removed while queued are neither created nor failed
+        self.assertEqual(0, stats['created'])
+
+    def test_locked_share_is_submitted_again(self):
+        create = mock.Mock(side_effect=[share_queue.RETRY, True])
+        queue = share_queue.ShareCreationQueue('DEFAULT_FILE', create,
+                                               workers=1)
+        queue.start()
+        with mock.patch.object(share_queue, 'RETRY_DELAY', 0.01):
+            queue.submit('share1', {'name': 'share1'})
+            for i in range(100):
+                if queue.stats()['created'] == 1:
+                    break
+                threading.Event().wait(0.05)
+
+        self.assertEqual(2, create.call_count)
+        self.assertEqual({'workers': 1, 'queued': 0, 'creating': 0,
+                          'created': 1, 'failed': 0}, queue.stats())
+
+
+class TestQueuedShareTakeover(test_etcdutil.EtcdUtilTestCase):
+    def setUp(self):
+        super(TestQueuedShareTakeover, self).setUp()
+        self.share_etcd = etcdutil.HpeShareEtcdClient('127.0.0.1', 2379,
+                                                      None, None)
+        self.queue = mock.Mock()
+        self.queue.position.return_value = None
+
+    def _get_file_mgr(self, node_id):
+        mgr = file_manager.FileManager.__new__(file_manager.FileManager)
+        mgr._etcd = self.share_etcd
+        mgr._backend = 'DEFAULT_FILE'
+        mgr._node_id = node_id
+        mgr._share_queue = self.queue
+        return mgr
+
+    def _queue_share(self, name, node_id, queued_at):
+        self.share_etcd.save_new_share(
+            {'name': name, 'backend': 'DEFAULT_FILE', 'size': 1024,
+             'status': share_queue.QUEUED,
+             'queue': {'node_id': node_id, 'queued_at': queued_at}})
+
+    def test_share_of_gone_node_is_taken_over_once(self):
+        self._queue_share('share1', 'node1', time.time() - 600)
+        self._queue_share('share2', 'node1', time.time())
+
+        self._get_file_mgr('node2')._check_queued_shares(300)
+        self.queue.submit.assert_called_once_with(
+            'share1', {'name': 'share1', 'backend': 'DEFAULT_FILE',
+                       'size': 1024})
+        self.assertEqual(
+            'node2', self.share_etcd.get_share('share1')['queue']['node_id'])
+        self.assertEqual(
+            'node1', self.share_etcd.get_share('share2')['queue']['node_id'])
+
+        # The lease of node2 is current, node3 leaves the share alone
+        self._get_file_mgr('node3')._check_queued_shares(300)
+        self.queue.submit.assert_called_once()
+
+    def test_lease_is_renewed_while_queued(self):
+        self._queue_share('share1', 'node1', time.time() - 600)
+        self.queue.position.return_value = 1
+
+        self._get_file_mgr('node1')._check_queued_shares(300)
+        queue = self.share_etcd.get_share('share1')['queue']
+        self.assertGreater(queue['renewed_at'], time.time() - 60)
+        self.queue.submit.assert_not_called()
+
+        self._get_file_mgr('node2')._check_queued_shares(300)
+        self.queue.submit.assert_not_called()
+
+    def test_concurrent_takeover_loses(self):
+        self._queue_share('share1', 'node1', time.time() - 600)
+        get_share_with_index = self.share_etcd.get_share_with_index
+
+        def _read_then_taken_over(name):
+            index, share = get_share_with_index(name)
+            self.share_etcd.update_share(name, 'queue', {
+                'node_id': 'node3', 'queued_at': time.time(),
+                'renewed_at': time.time()})
+            return index, share
+        with mock.patch.object(self.share_etcd, 'get_share_with_index',
+                               side_effect=_read_then_taken_over):
+            self._get_file_mgr('node2')._check_queued_shares(300)
+
+        self.queue.submit.assert_not_called()
+        self.assertEqual(
+            'node3', self.share_etcd.get_share('share1')['queue']['node_id'])
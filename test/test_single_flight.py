@@ -0,0 +1,103 @@
+import threading
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import backend_orchestrator
+from hpedockerplugin import single_flight
+
+
+class TestSingleFlight(TestCase):
+    def _start(self, flight, key, f, results):
+        def _run():
+            try:
+                results.append(flight.do(key, f))
+            except Exception as ex:
+                results.append(ex)
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = single_flight.SingleFlight('reads')
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def _get():
+            started.set()
+            release.wait(5)
+            return '{"Err": ""}'
+        f = mock.Mock(side_effect=_get)
+
+        results = []
+        leader = self._start(flight, 'vol1', f, results)
+        started.wait(5)
+        followers = [self._start(flight, 'vol1', f, results)
+                     for i in range(3)]
+        # Give the followers time to join the call in flight
+        threading.Event().wait(0.2)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(['{"Err": ""}'] * 4, results)
+        self.assertEqual(1, f.call_count)
+        # Nothing is kept once the call completed
+        flight.do('vol1', f)
+        self.assertEqual(2, f.call_count)
+
+    def test_error_is_not_kept(self):
+        flight = single_flight.SingleFlight('list', result_ttl=60)
+        f = mock.Mock(side_effect=[Exception('etcd down'), []])
+
+        self.assertRaises(Exception, flight.do, 'List', f)
+        self.assertEqual([], flight.do('List', f))
+
+    def test_result_is_kept_for_ttl(self):
+        flight = single_flight.SingleFlight('list', result_ttl=60)
+        f = mock.Mock(side_effect=[['vol1'], ['vol1', 'vol2']])
+
+        self.assertEqual(['vol1'], flight.do('List', f))
+        self.assertEqual(['vol1'], flight.do('List', f))
+
+        flight.invalidate()
+        self.assertEqual(['vol1', 'vol2'], flight.do('List', f))
+
+
+class TestOrchestratorReads(TestCase):
+    def test_read_started_after_mount_is_not_joined_to_earlier_one(self):
+        orch = backend_orchestrator.VolumeBackendOrchestrator.__new__(
+            backend_orchestrator.VolumeBackendOrchestrator)
+        orch._reads = single_flight.SingleFlight('reads')
+        orch._listing = single_flight.SingleFlight('list')
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def _get_path(request, volname):
+            if not started.is_set():
+                # Read before the mount, stalled until the mount is done
+                started.set()
+                release.wait(5)
+                return '{"Mountpoint": ""}'
+            return '{"Mountpoint": "/mnt/vol1"}'
+
+        results = []
+        with mock.patch.object(orch, '_execute_request',
+                               side_effect=_get_path), \
+                mock.patch.object(orch, '_execute_admitted_request'):
+            before = threading.Thread(
+                target=lambda: results.append(orch.get_path('vol1')))
+            before.daemon = True
+            before.start()
+            started.wait(5)
+
+            orch.mount_volume('vol1', '/mnt/vol1', 'mount1')
+            after = orch.get_path('vol1')
+            release.set()
+            before.join(5)
+
+        self.assertEqual(['{"Mountpoint": ""}'], results)
+        self.assertEqual('{"Mountpoint": "/mnt/vol1"}', after)
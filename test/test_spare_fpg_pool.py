@@ -0,0 +1,55 @@
+from hpedockerplugin import etcdutil
+from hpedockerplugin import exception
+from hpedockerplugin import spare_fpg_pool
+from test import test_etcdutil
+
+
+class TestSpareFpgPool(test_etcdutil.EtcdUtilTestCase):
+    def setUp(self):
+        super(TestSpareFpgPool, self).setUp()
+        self.fp_etcd = etcdutil.HpeFilePersonaEtcdClient('127.0.0.1', 2379,
+                                                         None, None)
+        # cpg -> available capacity in GiB of each default FPG
+        self.capacities = {'fs_cpg': [], 'fs_cpg2': [2048]}
+
+    def _provision(self, cpg):
+        self.capacities[cpg].append(16384)
+
+    def _get_pool(self, spare_fpgs):
+        return spare_fpg_pool.SpareFpgPool(
+            'DEFAULT_FILE', self.fp_etcd, ['fs_cpg', 'fs_cpg2'],
+            spare_fpgs, 1024, lambda cpg: list(self.capacities[cpg]),
+            self._provision)
+
+    def test_refill(self):
+        pool = self._get_pool(2)
+        pool.refill()
+        self.assertEqual({'fs_cpg': [16384, 16384],
+                          'fs_cpg2': [2048, 16384]}, self.capacities)
+
+        # Shares filled up an FPG
+        self.capacities['fs_cpg'][0] = 100
+        pool.refill()
+        self.assertEqual([100, 16384, 16384], self.capacities['fs_cpg'])
+
+    def test_one_node_provisions_at_a_time(self):
+        lock = self.fp_etcd.get_lock('FP_SPARE_FPG')
+        lock.try_lock_name('DEFAULT_FILE')
+
+        self._get_pool(1).refill()
+        self.assertEqual([], self.capacities['fs_cpg'])
+        lock.try_unlock_name('DEFAULT_FILE')
+
+    def test_provisioning_stops_when_no_ip_is_left(self):
+        provisioned = []
+
+        def _provision(cpg):
+            if provisioned:
+                raise exception.IPAddressPoolExhausted()
+            provisioned.append(cpg)
+        self._provision = _provision
+
+        self._get_pool(2).refill()
+        self.assertEqual(['fs_cpg'], provisioned)
+        # The pool lock was released
+        self.fp_etcd.get_lock('FP_SPARE_FPG').try_lock_name('DEFAULT_FILE')
@@ -0,0 +1,99 @@
+import contextlib
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin.hpe import task_tracker
+
+TASK_ACTIVE = 2
+TASK_FAILED = 3
+
+
+def _task(task_id, status, **kwargs):
+    task = {'id': task_id, 'status': status}
+    task.update(kwargs)
+    return task
+
+
+class TestTaskTracker(TestCase):
+    def setUp(self):
+        super(TestTaskTracker, self).setUp()
+        self.client = mock.Mock()
+        self.client.TASK_ACTIVE = TASK_ACTIVE
+
+        @contextlib.contextmanager
+        def _session():
+            yield self.client
+        self.tracker = task_tracker.TaskTracker('DEFAULT', _session,
+                                                interval=0.01)
+
+    def _hold_poller(self):
+        # Tasks are then polled only by the test
+        self.tracker._poller = mock.Mock()
+
+    def test_wait_until_task_is_finished(self):
+        self.client.getTask.side_effect = [
+            _task(1, TASK_ACTIVE, completedSteps=2, totalSteps=5),
+            _task(1, task_tracker.TASK_DONE)]
+        on_progress = mock.Mock()
+
+        task = self.tracker.wait(1, on_progress)
+        self.assertEqual(task_tracker.TASK_DONE, task['status'])
+        on_progress.assert_called_once_with(
+            _task(1, TASK_ACTIVE, completedSteps=2, totalSteps=5))
+        self.assertEqual([], self.tracker.outstanding())
+        self.client.getAllTasks.assert_not_called()
+
+    def test_outstanding_tasks_are_polled_together(self):
+        self._hold_poller()
+        fpg_task = self.tracker.track(1)
+        copy_task = self.tracker.track('2')
+        self.assertIs(fpg_task, self.tracker.track(1))
+
+        self.client.getAllTasks.return_value = {'members': [
+            _task(1, TASK_ACTIVE), _task(2, TASK_FAILED)]}
+        self.client.getTask.return_value = _task(
+            2, TASK_FAILED, detailedStatus='copy failed')
+        self.tracker.poll()
+
+        self.assertFalse(fpg_task.done())
+        self.assertEqual('copy failed',
+                         copy_task.result()['detailedStatus'])
+        self.client.getTask.assert_called_once_with('2')
+        self.assertEqual([1], self.tracker.outstanding())
+
+    def test_transient_poll_failure_keeps_task_outstanding(self):
+        self._hold_poller()
+        task = self.tracker.track(1)
+        self.client.getTask.side_effect = [
+            Exception('array failing over'),
+            _task(1, task_tracker.TASK_DONE)]
+
+        self.tracker.poll()
+        self.assertFalse(task.done())
+        self.assertEqual([1], self.tracker.outstanding())
+
+        self.tracker.poll()
+        self.assertEqual(task_tracker.TASK_DONE, task.result()['status'])
+        self.assertEqual([], self.tracker.outstanding())
+
+    def test_failed_polls_fail_waiters(self):
+        self._hold_poller()
+        task = self.tracker.track(1)
+        self.client.getTask.side_effect = Exception('array unreachable')
+
+        for i in range(task_tracker.DEFAULT_MAX_POLL_FAILURES - 1):
+            self.tracker.poll()
+        self.assertFalse(task.done())
+
+        self.tracker.poll()
+        self.assertRaises(Exception, task.result)
+        self.assertEqual([], self.tracker.outstanding())
+
+    def test_describe_progress(self):
+        self.assertEqual("2/5 steps completed", task_tracker.describe_progress(
+            {'completedSteps': 2, 'totalSteps': 5}))
+        self.assertEqual("1/3 phases completed",
+                         task_tracker.describe_progress(
+                             {'completedPhases': 1, 'totalPhases': 3}))
+        self.assertEqual("in progress", task_tracker.describe_progress({}))
@@ -0,0 +1,59 @@
+import mock
+import threading
+
+from concurrent import futures
+from testtools import TestCase
+
+from hpedockerplugin.hpe import utils
+
+
+class TestRunConcurrently(TestCase):
+    def setUp(self):
+        super(TestRunConcurrently, self).setUp()
+        self.executor = futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_calls_run_concurrently(self):
+        # Each call waits for the other one to have started
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _call(result):
+            barrier.wait()
+            return result
+        self.assertEqual(
+            ('primary', 'secondary'),
+            utils.run_concurrently(self.executor,
+                                   lambda: _call('primary'),
+                                   lambda: _call('secondary')))
+
+    def test_failure_is_raised_once_both_completed(self):
+        completed = []
+
+        def _primary():
+            threading.Event().wait(0.1)
+            completed.append('primary')
+
+        def _secondary():
+            raise Exception('secondary array unreachable')
+        self.assertRaises(Exception, utils.run_concurrently,
+                          self.executor, _primary, _secondary)
+        self.assertEqual(['primary'], completed)
+
+        def _failing_primary():
+            raise ValueError('primary array unreachable')
+        self.assertRaises(ValueError, utils.run_concurrently,
+                          self.executor, _failing_primary,
+                          lambda: completed.append('secondary'))
+        self.assertEqual(['primary', 'secondary'], completed)
+
+    def test_both_failures_are_reported(self):
+        def _primary():
+            raise ValueError('primary array unreachable')
+
+        def _secondary():
+            raise Exception('secondary array unreachable')
+        with mock.patch.object(utils, 'LOG') as mock_log:
+            self.assertRaises(ValueError, utils.run_concurrently,
+                              self.executor, _primary, _secondary)
+        mock_log.error.assert_called_once_with(
+            "Concurrent call also failed: secondary array unreachable")
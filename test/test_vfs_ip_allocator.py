@@ -0,0 +1,117 @@
+import copy
+
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import exception
+from hpedockerplugin.hpe import vfs_ip_allocator
+
+NETMASK = '255.255.192.0'
+POOL = {NETMASK: {'192.168.98.8', '192.168.98.9', '192.168.98.10'}}
+
+
+class FakeFilePersonaEtcd(object):
+    def __init__(self):
+        self.ip_map = None
+        self.index = 0
+        self.writes = 0
+        self.backend_metadata = None
+
+    def get_backend_metadata(self, backend):
+        if self.backend_metadata is None:
+            raise exception.EtcdMetadataNotFound(msg='Key not found')
+        return self.backend_metadata
+
+    def get_vfs_ip_map(self, backend):
+        if self.ip_map is None:
+            raise exception.EtcdMetadataNotFound(msg='Key not found')
+        return self.index, copy.deepcopy(self.ip_map)
+
+    def save_vfs_ip_map(self, backend, ip_map, prev_index=None):
+        if prev_index != (self.index if self.ip_map is not None else None):
+            raise exception.HPEPluginUpdateConflict(obj=backend)
+        self.index += 1
+        self.writes += 1
+        self.ip_map = copy.deepcopy(ip_map)
+
+
+class TestVfsIpAllocator(TestCase):
+    def setUp(self):
+        super(TestVfsIpAllocator, self).setUp()
+        self.fp_etcd = FakeFilePersonaEtcd()
+        self.get_backend_ips = mock.Mock(return_value=['192.168.98.9',
+                                                       '10.50.3.1'])
+
+    def _allocator(self, pool=POOL):
+        return vfs_ip_allocator.VfsIpAllocator(
+            'DEFAULT_FILE', self.fp_etcd, pool, self.get_backend_ips)
+
+    def _free_map(self):
+        return self.fp_etcd.ip_map['subnets'][NETMASK]['map']
+
+    def test_claim_mark_in_use_and_release(self):
+        allocator = self._allocator()
+
+        self.assertEqual(('192.168.98.8', NETMASK), allocator.claim())
+        # 192.168.98.9 is used by a VFS of the array
+        self.assertEqual(('192.168.98.10', NETMASK), allocator.claim())
+        self.assertEqual('LUL', self._free_map())
+        self.assertRaises(exception.IPAddressPoolExhausted, allocator.claim)
+        # The array is listed only when the map is built
+        self.get_backend_ips.assert_called_once_with()
+
+        allocator.mark_in_use('192.168.98.8', NETMASK)
+        allocator.release('192.168.98.10', NETMASK)
+        self.assertEqual('UU.', self._free_map())
+
+    def test_concurrent_claim_is_retried(self):
+        allocator = self._allocator()
+        allocator.claim()
+        save = self.fp_etcd.save_vfs_ip_map
+
+        def racing_save(backend, ip_map, prev_index=None):
+            if racing_save.first:
+                racing_save.first = False
+                # Another node claims the same address first
+                self.fp_etcd.index += 1
+                raise exception.HPEPluginUpdateConflict(obj=backend)
+            return save(backend, ip_map, prev_index)
+        racing_save.first = True
+
+        with mock.patch.object(self.fp_etcd, 'save_vfs_ip_map',
+                               racing_save):
+            self.assertEqual(('192.168.98.10', NETMASK), allocator.claim())
+
+    def test_array_is_listed_once_when_build_is_retried(self):
+        save = self.fp_etcd.save_vfs_ip_map
+
+        def racing_save(backend, ip_map, prev_index=None):
+            if racing_save.first:
+                racing_save.first = False
+                raise exception.HPEPluginUpdateConflict(obj=backend)
+            return save(backend, ip_map, prev_index)
+        racing_save.first = True
+
+        with mock.patch.object(self.fp_etcd, 'save_vfs_ip_map',
+                               racing_save):
+            self._allocator().claim()
+        self.get_backend_ips.assert_called_once_with()
+        self.assertEqual('LU.', self._free_map())
+
+    def test_legacy_locked_ips_are_kept_locked(self):
+        self.fp_etcd.backend_metadata = {
+            'ips_in_use': ['192.168.98.9'],
+            'ips_locked_for_use': ['192.168.98.8']}
+
+        self.assertEqual(('192.168.98.10', NETMASK),
+                         self._allocator().claim())
+        self.assertEqual('LUL', self._free_map())
+
+    def test_map_is_rebuilt_when_pool_changes(self):
+        self._allocator().claim()
+
+        pool = {NETMASK: POOL[NETMASK] | {'192.168.98.11'}}
+        allocator = self._allocator(pool)
+        self.assertEqual(('192.168.98.8', NETMASK), allocator.claim())
+        self.assertEqual('LU..', self._free_map())
+        self.assertEqual(2, self.get_backend_ips.call_count)
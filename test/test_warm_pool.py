@@ -0,0 +1,85 @@
+import mock
+from testtools import TestCase
+
+from hpedockerplugin import exception
+from hpedockerplugin import warm_pool
+from test import test_etcdutil
+
+
+class TestParseProfiles(TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            [warm_pool.VolumeProfile(10, 'thin', None, None),
+             warm_pool.VolumeProfile(100, 'dedup', 'true', 'FC_r6')],
+            warm_pool.parse_profiles(['10:thin', '100:Dedup:True:FC_r6']))
+
+    def test_invalid_entry(self):
+        for entry in ['10', 'ten:thin', '10:fat', '10:thin:maybe']:
+            self.assertRaises(exception.InvalidInput,
+                              warm_pool.parse_profiles, [entry])
+
+
+class TestWarmVolumePool(test_etcdutil.EtcdUtilTestCase):
+    def setUp(self):
+        super(TestWarmVolumePool, self).setUp()
+        self.util = self._get_etcd_util()
+        self.created = 0
+        self.released = []
+
+    def _provision(self, profile):
+        self.created += 1
+        return {'id': 'vol-%d' % self.created, 'size': profile.size}
+
+    def _get_pool(self, profiles, pool_size, **kwargs):
+        return warm_pool.WarmVolumePool(
+            'DEFAULT', self.util, warm_pool.parse_profiles(profiles),
+            pool_size, self._provision, self.released.append, **kwargs)
+
+    def test_refill_and_claim(self):
+        pool = self._get_pool(['10:thin', '20:full'], 2)
+        pool.refill()
+        pooled = self.util.get_pooled_vols('DEFAULT')
+        self.assertEqual([2, 2], [len(pooled['default-10-thin-default']),
+                                  len(pooled['default-20-full-default'])])
+
+        vol = pool.claim(10, 'thin', None, None)
+        self.assertEqual(10, vol['size'])
+        self.assertIsNone(pool.claim(10, 'dedup', None, None))
+        self.assertIsNone(pool.claim(10, 'thin', 'true', None))
+
+        # Another node claiming the remaining volume of the profile
+        other = self._get_pool(['10:thin'], 2)
+        self.assertNotEqual(vol['id'],
+                            other.claim(10, 'thin', None, None)['id'])
+        self.assertIsNone(pool.claim(10, 'thin', None, None))
+
+        pool.refill()
+        self.assertEqual(6, self.created)
+
+    def test_capacity_ceiling(self):
+        pool = self._get_pool(['10:thin', '20:thin'], 2, max_capacity=45)
+        pool.refill()
+        pooled = self.util.get_pooled_vols('DEFAULT')
+        self.assertEqual(2, len(pooled['default-10-thin-default']))
+        self.assertEqual(1, len(pooled['default-20-thin-default']))
+
+    def test_unconfigured_profile_is_released(self):
+        self._get_pool(['10:thin'], 1).refill()
+        self._get_pool(['20:thin'], 1).refill()
+
+        self.assertEqual(['vol-1'], [vol['id'] for vol in self.released])
+        self.assertEqual(['default-20-thin-default'],
+                         list(self.util.get_pooled_vols('DEFAULT')))
+
+    def test_refill_skipped_while_locked(self):
+        pool = self._get_pool(['10:thin'], 1)
+        lock = self.util.get_lock('WARM_POOL')
+        lock.try_lock_name('DEFAULT')
+        pool.refill()
+        self.assertEqual(0, self.created)
+
+        lock.try_unlock_name('DEFAULT')
+        with mock.patch.object(self.util, 'save_pooled_vol') as save:
+            pool.refill()
+            save.assert_called_once_with('DEFAULT', 'default-10-thin-default',
+                                         {'id': 'vol-1', 'size': 10})
@@ -1,6 +1,8 @@
-# import mock
 import copy
 
+import mock
+
+from hpedockerplugin import exception
 import test.fake_3par_data as data
 import test.hpe_docker_unit_test as hpedockerunittest
 from hpe3parclient import exceptions
@@ -131,9 +133,10 @@ class TestUnmountVolOnceMountedTwiceOnThisNode(UnmountVolumeUnitTest):
         self._test_case.assertEqual(resp, {u"Err": ''})
 
         mock_etcd = self.mock_objects['mock_etcd']
-        mock_etcd.update_vol.assert_called_with(self._vol['id'],
-                                                'node_mount_info',
-                                                self._vol['node_mount_info'])
+        mock_etcd.update_vol_fields.assert_called_with(
+            self._vol['id'],
+            {'node_mount_info': self._vol['node_mount_info']},
+            expected_index=1, remove_fields=())
 
         # node_id_list should have only one node-id left after
         # un-mount is called
@@ -186,15 +189,17 @@ class TestUnmountVolMountedTwiceOnThisNode(UnmountVolumeUnitTest):
         vol = self._vol
         mock_etcd = self.mock_objects['mock_etcd']
         if self._tc_run_cnt == 0:
-            mock_etcd.update_vol.assert_called_with(vol['id'],
-                                                    'node_mount_info',
-                                                    vol['node_mount_info'])
+            mock_etcd.update_vol_fields.assert_called_with(
+                vol['id'], {'node_mount_info': vol['node_mount_info']},
+                expected_index=1, remove_fields=())
             # node_id_list should have only one node-id left after
             # un-mount is called
             self._test_case.assertEqual(len(vol['node_mount_info']
                                             [data.THIS_NODE_ID]), 1)
         elif self._tc_run_cnt == 1:
-            mock_etcd.save_vol.assert_called_with(vol)
+            mock_etcd.update_vol_fields.assert_any_call(
+                vol['id'], {}, expected_index=1,
+                remove_fields=('node_mount_info',))
             self._test_case.assertNotIn('node_mount_info',
                                         self._vol)
 
@@ -248,7 +253,9 @@ class TestUnmountVolNotOwnedByThisNode(UnmountVolumeUnitTest):
 
         vol = self._vol
         mock_etcd = self.mock_objects['mock_etcd']
-        mock_etcd.save_vol.assert_called_with(vol)
+        mock_etcd.update_vol_fields.assert_called_with(
+            vol['id'], {}, expected_index=1,
+            remove_fields=('old_path_info',))
         self._test_case.assertIn('node_mount_info',
                                  self._vol)
 
@@ -259,6 +266,62 @@ class TestUnmountVolNotOwnedByThisNode(UnmountVolumeUnitTest):
         mock_3parclient.deleteVLUN.assert_called()
         mock_3parclient.deleteHost.assert_called()
 
+
+# Last unmount keeps the devices and VLUNs for a remount
+class TestUnmountVolumeWithDetachGracePeriod(UnmountVolumeUnitTest):
+    def override_configuration(self, all_configs):
+        config = all_configs['block'][1]['DEFAULT']
+        config.detach_grace_period = 60
+
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp, {u"Err": ''})
+
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.umount_dir.assert_called_with('/dummy-mnt-dir')
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.update_vol_fields.assert_called_with(
+            self._vol['id'], {'detach_pending': {
+                'node_id': data.THIS_NODE_ID, 'deadline': mock.ANY}})
+
+        mock_protocol_connector = \
+            self.mock_objects['mock_protocol_connector']
+        mock_protocol_connector.disconnect_volume.assert_not_called()
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.deleteVLUN.assert_not_called()
+        mock_3parclient.deleteHost.assert_not_called()
+
+
+# Volume mounted again on this node between the read and the update of its
+# mount IDs by the unmount
+class TestUnmountVolumeMountedConcurrently(UnmountVolumeUnitTest):
+    def _setup_mock_etcd(self):
+        super(TestUnmountVolumeMountedConcurrently, self)._setup_mock_etcd()
+        mock_etcd = self.mock_objects['mock_etcd']
+        remounted_vol = copy.deepcopy(self._vol)
+        remounted_vol['node_mount_info'][data.THIS_NODE_ID].append(
+            'Other-Mount-ID')
+        mock_etcd.get_vol_with_index.return_value = (2, remounted_vol)
+        mock_etcd.update_vol_fields.side_effect = [
+            exception.HPEPluginUpdateConflict(obj=self._vol['id']), 3]
+
+    def check_response(self, resp):
+        self._test_case.assertEqual(resp, {u"Err": ''})
+
+        mock_etcd = self.mock_objects['mock_etcd']
+        mock_etcd.get_vol_with_index.assert_called_once_with(
+            self._vol['id'])
+        mock_etcd.update_vol_fields.assert_called_with(
+            self._vol['id'],
+            {'node_mount_info': {data.THIS_NODE_ID: ['Other-Mount-ID']}},
+            expected_index=2, remove_fields=())
+
+        # The volume is still in use, so it stays attached
+        mock_fileutil = self.mock_objects['mock_fileutil']
+        mock_fileutil.umount_dir.assert_not_called()
+        mock_3parclient = self.mock_objects['mock_3parclient']
+        mock_3parclient.deleteVLUN.assert_not_called()
+
 # # TODO:
 # class TestUnmountVolumeChapCredentialsNotFound(UnmountVolumeUnitTest):
 #     pass